@@ -0,0 +1,63 @@
+"""
+Headless previews rendering benchmark.
+
+Reports the time needed to render a raster preview of points and heatmap layers of
+increasing sizes, with points sampled from the Lifemap tree nodes.
+
+Usage:
+
+    uv run python benchmarks/bench_preview.py [--width W] [--height H]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.geo import project_to_3857
+from pylifemap.data.preview import render_preview
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+GRADIENT = ("#4675ed", "#39a2fc", "#1bcfd4", "#24eca6", "#61fc6c", "#a4fc3b", "#d1e834", "#f3363a")
+
+LAYERS = {
+    "points": {"radius": 5, "fill": None, "opacity": 0.8},
+    "points (radius and fill columns)": {
+        "radius": "value",
+        "radius_range": (2, 30),
+        "fill": "value",
+        "opacity": 0.8,
+    },
+    "heatmap": {"radius": 5.0, "blur": 5.0, "opacity": 1.0, "gradient": GRADIENT, "weight": None},
+}
+
+
+def layer_data(size: int) -> pl.DataFrame:
+    """Sample points layer data from the Lifemap tree nodes."""
+    rng = np.random.default_rng(0)
+    d = BACKEND_DATA.select("taxid", "pylifemap_x", "pylifemap_y").sample(size, with_replacement=True, seed=0)
+    d = project_to_3857(d, x_col="pylifemap_x", y_col="pylifemap_y")
+    return d.rename({"taxid": "pylifemap_taxid"}).with_columns(value=pl.Series(rng.random(size)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--width", type=int, default=800, help="preview width, in pixels")
+    parser.add_argument("--height", type=int, default=600, help="preview height, in pixels")
+    args = parser.parse_args()
+
+    print(f"{'layer':<36}{'rows':>12}{'time (s)':>12}")  # noqa: T201
+    for size in SIZES:
+        d = layer_data(size)
+        for name, options in LAYERS.items():
+            layer = {"id": "layer", "layer": name.split()[0], "options": options}
+            start = time.perf_counter()
+            render_preview([layer], {"layer": d}, width=args.width, height=args.height)
+            print(f"{name:<36}{size:>12}{time.perf_counter() - start:>12.2f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Heatmap raster tiles benchmark.
+
+Reports the number of tiles, the rendering time per tile and the total tiles size for
+each zoom level of a raster heatmap pyramid, and the total rendering time with a pool
+of processes, on points layers data computed from the IUCN and kraken2 datasets.
+
+Usage:
+
+    uv run python benchmarks/bench_raster.py [--max-zoom Z] [--workers N]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.lifemap_data import LifemapData
+from pylifemap.data.raster import heatmap_tiles, render_tile, tile_tasks
+
+ROOT_DIR = Path(__file__).parent.parent
+
+DATASETS = {
+    "iucn": ROOT_DIR / "data" / "iucn.parquet",
+    "kraken2": ROOT_DIR / "doc" / "gallery" / "sources" / "data" / "wuhan_taxid_kraken2.parquet",
+}
+
+GRADIENT = ("#4675ed", "#39a2fc", "#1bcfd4", "#24eca6", "#61fc6c", "#a4fc3b", "#d1e834", "#f3363a")
+
+
+def layer_data(path: Path) -> pl.DataFrame:
+    """Compute heatmap layer data for a dataset, as done by `layer_heatmap`."""
+    data = LifemapData(pl.read_parquet(path), check_taxids=False)
+    return data.points_data({}, [])
+
+
+def bench_zooms(df: pl.DataFrame, max_zoom: int) -> list[tuple]:
+    """Render tiles one by one in the current process, and gather statistics by zoom level."""
+    stats = {}
+    for task in tile_tasks(df, radius=5.0, blur=5.0, gradient=GRADIENT, weight=None, max_zoom=max_zoom):
+        start = time.perf_counter()
+        zoom, _, _, png = render_tile(task)
+        stats.setdefault(zoom, []).append((time.perf_counter() - start, len(png)))
+    results = []
+    for zoom, values in sorted(stats.items()):
+        times, sizes = np.array(values).T
+        results.append((zoom, len(values), times.mean(), np.percentile(times, 95), sizes.sum()))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--max-zoom", type=int, default=6, help="finest zoom level of the pyramid")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: processors)")
+    args = parser.parse_args()
+
+    for name, path in DATASETS.items():
+        df = layer_data(path)
+        print(f"\n{name}: {df.height} points")  # noqa: T201
+        print(f"{'zoom':<8}{'tiles':>8}{'mean (ms)':>12}{'p95 (ms)':>12}{'size (kB)':>12}")  # noqa: T201
+        for zoom, count, mean_time, p95_time, size in bench_zooms(df, args.max_zoom):
+            print(  # noqa: T201
+                f"{zoom:<8}{count:>8}{mean_time * 1000:>12.2f}{p95_time * 1000:>12.2f}{size / 1000:>12.1f}"
+            )
+        start = time.perf_counter()
+        tiles = heatmap_tiles(df, gradient=GRADIENT, max_zoom=args.max_zoom, workers=args.workers)
+        total_time = time.perf_counter() - start
+        total_size = tiles.get_column("pylifemap_tile").bin.size().sum()
+        print(  # noqa: T201
+            f"pool: {tiles.height} tiles in {total_time:.2f} s, {total_size / 1e6:.2f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Layers data serialization benchmark.
+
+Reports encoding time, decoding time and payload size for each Arrow IPC codec and
+writer engine, on points layers data computed from the IUCN and kraken2 datasets.
+
+Usage:
+
+    uv run python benchmarks/bench_serialization.py [--repeat N]
+"""
+
+import argparse
+import io
+import time
+from pathlib import Path
+
+import polars as pl
+import pyarrow as pa
+from pyarrow import ipc
+
+from pylifemap.data.lifemap_data import LifemapData
+from pylifemap.data.serialization import pl_to_arrow
+
+ROOT_DIR = Path(__file__).parent.parent
+
+DATASETS = {
+    "iucn": (ROOT_DIR / "data" / "iucn.parquet", ["status"]),
+    "kraken2": (ROOT_DIR / "doc" / "gallery" / "sources" / "data" / "wuhan_taxid_kraken2.parquet", ["count"]),
+}
+
+CODECS = [
+    # (label, compression, compression_level, engine)
+    ("uncompressed", "uncompressed", None, "pyarrow"),
+    ("lz4", "lz4", None, "pyarrow"),
+    ("lz4 (polars)", "lz4", None, "polars"),
+    ("zstd", "zstd", None, "pyarrow"),
+    ("zstd (polars)", "zstd", None, "polars"),
+    ("zstd level 9", "zstd", 9, "pyarrow"),
+    ("zstd level 19", "zstd", 19, "pyarrow"),
+]
+
+
+def layer_data(path: Path, data_columns: list) -> pl.DataFrame:
+    """Compute points layer data for a dataset, as done by `layer_points`."""
+    data = LifemapData(pl.read_parquet(path), check_taxids=False)
+    return data.points_data({"lazy": True}, data_columns)
+
+
+def decode(payload: bytes) -> pa.Table:
+    """Decode Arrow IPC bytes, as done by the frontend `deserialize_data`."""
+    return ipc.open_file(io.BytesIO(payload)).read_all()
+
+
+def bench(df: pl.DataFrame, repeat: int) -> list[tuple]:
+    results = []
+    for label, compression, level, engine in CODECS:
+        encode_times, decode_times = [], []
+        payload = b""
+        for _ in range(repeat):
+            start = time.perf_counter()
+            payload = pl_to_arrow(df, compression=compression, compression_level=level, engine=engine)
+            encode_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            decode(payload)
+            decode_times.append(time.perf_counter() - start)
+        results.append((label, min(encode_times), min(decode_times), len(payload)))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs per codec (best is kept)")
+    args = parser.parse_args()
+
+    for name, (path, data_columns) in DATASETS.items():
+        df = layer_data(path, data_columns)
+        print(f"\n{name}: {df.height} rows, {df.estimated_size() / 1e6:.1f} MB in memory")  # noqa: T201
+        print(f"{'codec':<16}{'encode (ms)':>14}{'decode (ms)':>14}{'size (kB)':>12}{'ratio':>8}")  # noqa: T201
+        results = bench(df, args.repeat)
+        base_size = results[0][3]
+        for label, encode_time, decode_time, size in results:
+            print(  # noqa: T201
+                f"{label:<16}{encode_time * 1000:>14.1f}{decode_time * 1000:>14.1f}"
+                f"{size / 1000:>12.1f}{base_size / size:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
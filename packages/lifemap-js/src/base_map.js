@@ -20,7 +20,17 @@ import { ExportControl } from "./elements/controls/export"
 import { LabelsLayer } from "./layers/layer_labels"
 import { TilesLayer } from "./layers/layer_tiles"
 
-import { DEFAULT_LON, DEFAULT_LAT, DEFAULT_ZOOM, MAP_EXTENT, DARK_THEMES } from "./utils"
+import {
+    DEFAULT_LON,
+    DEFAULT_LAT,
+    DEFAULT_ZOOM,
+    MAP_EXTENT,
+    DARK_THEMES,
+    WORLD_HALF_SIZE,
+    LAZY_TILES_CACHE_SIZE,
+} from "./utils"
+import { deserialize_data } from "./data/deserialization"
+import { lazy_candidates, segments_candidates } from "./data/lazy_index"
 
 import * as Plot from "@observablehq/plot"
 
@@ -37,6 +47,7 @@ export class BaseMap {
             hide_legend = false,
             hide_labels,
             lang,
+            fetch_lazy_tile = undefined,
         } = options
 
         Object.assign(this, {
@@ -50,7 +61,10 @@ export class BaseMap {
             hide_legend,
             hide_labels,
             lang,
+            fetch_lazy_tile,
         })
+        // Static lazy loading tiles manifests, indexed by layer id
+        this.static_tiles = {}
 
         this.el = el
         this.controls = {}
@@ -294,7 +308,44 @@ export class BaseMap {
 
     // Setup data lazy loading from a data source and an Ope
     setup_lazy_loading(options) {
-        let { data, source, create_feature_fn, lazy_zoom, type } = options
+        let {
+            data,
+            source,
+            create_feature_fn,
+            lazy_zoom,
+            type,
+            lazy_source,
+            data_id,
+            lazy_offsets = undefined,
+        } = options
+
+        // Layer data are kept in the kernel, which is queried for each map tile
+        if (lazy_source == "kernel" && this.fetch_lazy_tile !== undefined) {
+            this.setup_tiles_lazy_loading({
+                source: source,
+                create_feature_fn: create_feature_fn,
+                get_tiles: () => this.get_view_tiles(lazy_zoom),
+                fetch_tile: (t) => this.fetch_lazy_tile(data_id, t.tile, t.max_zoom),
+            })
+            return
+        }
+        // Layer data have been exported as static tiles files, which are displayed as is,
+        // without coordinates refresh
+        if (lazy_source == "static" && this.static_tiles[data_id] !== undefined) {
+            this.setup_tiles_lazy_loading({
+                source: source,
+                create_feature_fn: create_feature_fn,
+                get_tiles: () => this.get_static_view_tiles(this.static_tiles[data_id]),
+                fetch_tile: async (t) => {
+                    const response = await fetch(t.url)
+                    if (!response.ok) {
+                        throw new Error(`${t.url}: HTTP ${response.status}`)
+                    }
+                    return new Uint8Array(await response.arrayBuffer())
+                },
+            })
+            return
+        }
 
         // Points filtering function
         const points_filter_fn = (d, xmin, xmax, ymin, ymax, zoom) =>
@@ -326,12 +377,24 @@ export class BaseMap {
                     d["pylifemap_dest_y"] >= ymin &&
                     d["pylifemap_dest_y"] <= ymax))
 
+        // Lines and arcs bounding boxes filtering function
+        const bbox_filter_fn = (d, xmin, xmax, ymin, ymax, zoom) =>
+            d["pylifemap_zoom"] <= zoom &&
+            d["pylifemap_bbox_xmin"] <= xmax &&
+            d["pylifemap_bbox_xmax"] >= xmin &&
+            d["pylifemap_bbox_ymin"] <= ymax &&
+            d["pylifemap_bbox_ymax"] >= ymin
+
+        const is_segment = type == "lines" || type == "arcs"
         const filter_fn =
-            type == "lines"
-                ? lines_filter_fn
-                : type == "arcs"
-                  ? arcs_filter_fn
-                  : points_filter_fn
+            is_segment && lazy_offsets !== undefined
+                ? bbox_filter_fn
+                : type == "lines"
+                  ? lines_filter_fn
+                  : type == "arcs"
+                    ? arcs_filter_fn
+                    : points_filter_fn
+        const candidates_fn = is_segment ? segments_candidates : lazy_candidates
 
         const display_for_extent = () => {
             const current_zoom = this.map.getView().getZoom()
@@ -346,8 +409,13 @@ export class BaseMap {
             ymin = ymin - yrange * 0.05
             xmax = xmax + xrange * 0.05
             ymax = ymax + yrange * 0.05
-            const zoom = lazy_zoom > 0 ? current_zoom + lazy_zoom : Infinity
-            const extent_features = data
+            const zoom = lazy_zoom >= 0 ? current_zoom + lazy_zoom : Infinity
+            // With an offsets table, only filter rows found by binary search
+            const candidates =
+                lazy_offsets !== undefined
+                    ? candidates_fn(data, lazy_offsets, xmin, xmax, ymin, ymax, zoom)
+                    : data
+            const extent_features = candidates
                 .filter((d) => filter_fn(d, xmin, xmax, ymin, ymax, zoom))
                 .map(create_feature_fn)
                 .flat()
@@ -372,6 +440,126 @@ export class BaseMap {
         })
     }
 
+    // Get the range of tiles of a zoom level covering the current view, with a 5% margin
+    get_view_tiles_range(tile_z) {
+        let extent = this.map.getView().calculateExtent()
+        let [xmin, ymin, xmax, ymax] = [...getBottomLeft(extent), ...getTopRight(extent)]
+        const xrange = xmax - xmin
+        const yrange = ymax - ymin
+        const tile_size = (2 * WORLD_HALF_SIZE) / 2 ** tile_z
+        const to_tile = (v) => Math.floor((v + WORLD_HALF_SIZE) / tile_size)
+        return [
+            to_tile(xmin - xrange * 0.05),
+            to_tile(xmax + xrange * 0.05),
+            to_tile(ymin - yrange * 0.05),
+            to_tile(ymax + yrange * 0.05),
+        ]
+    }
+
+    // Get the tiles covering the current view, with a 5% margin
+    get_view_tiles(lazy_zoom) {
+        const current_zoom = this.map.getView().getZoom()
+        const tile_z = Math.max(0, Math.floor(current_zoom))
+        const max_zoom = lazy_zoom >= 0 ? tile_z + lazy_zoom : null
+        const [x0, x1, y0, y1] = this.get_view_tiles_range(tile_z)
+        let tiles = []
+        for (let x = x0; x <= x1; x++) {
+            for (let y = y0; y <= y1; y++) {
+                tiles.push({
+                    key: `${tile_z}/${x}/${y}/${max_zoom}`,
+                    tile: [tile_z, x, y],
+                    max_zoom: max_zoom,
+                })
+            }
+        }
+        return tiles
+    }
+
+    // Get the static tiles needed by the current view. Rows are bucketed by the minimal
+    // view zoom level at which they are displayed, and each bucket is split into tiles of
+    // the zoom level given by manifest.levels. Only existing tiles of the buckets lower
+    // or equal to the current zoom level and intersecting the view are returned.
+    get_static_view_tiles(manifest) {
+        const current_zoom = this.map.getView().getZoom()
+        const tile_z = Math.max(0, Math.floor(current_zoom))
+        const n_buckets = Math.min(tile_z + 1, manifest.levels.length)
+        let tiles = []
+        for (let bucket = 0; bucket < n_buckets; bucket++) {
+            const [x0, x1, y0, y1] = this.get_view_tiles_range(manifest.levels[bucket])
+            for (let x = x0; x <= x1; x++) {
+                for (let y = y0; y <= y1; y++) {
+                    const key = `${bucket}/${x}/${y}`
+                    if (manifest.tiles[key] !== undefined) {
+                        tiles.push({ key: key, url: manifest.tiles[key] })
+                    }
+                }
+            }
+        }
+        return tiles
+    }
+
+    // Setup data lazy loading by tiles. Rows of each tile returned by get_tiles for the
+    // current view are fetched with fetch_tile as Arrow IPC bytes, and the resulting
+    // features are kept in a least recently used cache.
+    setup_tiles_lazy_loading(options) {
+        let { source, create_feature_fn, get_tiles, fetch_tile } = options
+        const cache = new Map()
+        let current_keys = new Set()
+
+        const cache_get = (key) => {
+            const features = cache.get(key)
+            if (features !== undefined) {
+                cache.delete(key)
+                cache.set(key, features)
+            }
+            return features
+        }
+        const cache_set = (key, features) => {
+            cache.set(key, features)
+            if (cache.size > LAZY_TILES_CACHE_SIZE) {
+                cache.delete(cache.keys().next().value)
+            }
+        }
+
+        const display_for_extent = async () => {
+            const tiles = get_tiles()
+            current_keys = new Set(tiles.map((t) => t.key))
+            // Display cached tiles immediately
+            source.clear()
+            let missing = []
+            for (let t of tiles) {
+                const features = cache_get(t.key)
+                if (features !== undefined) {
+                    source.addFeatures(features)
+                } else {
+                    missing.push(t)
+                }
+            }
+            this.map.render()
+            // Fetch missing tiles
+            await Promise.all(
+                missing.map(async (t) => {
+                    const value = await fetch_tile(t)
+                    const rows = deserialize_data({ serialized: true, value: value })
+                    const features = rows.map(create_feature_fn).flat()
+                    cache_set(t.key, features)
+                    if (current_keys.has(t.key)) {
+                        source.addFeatures(features)
+                    }
+                })
+            )
+            this.map.render()
+        }
+
+        display_for_extent()
+
+        // Refresh features after move or zoom
+        this.add_moveend_callback(() => {
+            this.lazy_spinner.show()
+            display_for_extent().finally(() => this.lazy_spinner.hide())
+        })
+    }
+
     setup_controls() {
         const default_controls_options = {
             zoom: this.controls_list.includes("zoom"),
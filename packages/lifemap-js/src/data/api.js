@@ -37,6 +37,24 @@ function parse_cached_data(key, wanted_key, cache_duration) {
     return null
 }
 
+// Version of the data served by lifemap-back, fetched once
+let data_version = undefined
+
+// Get the version of the data served by lifemap-back, which is the timestamp of its
+// data snapshot. Returns null if it can't be fetched.
+export async function get_data_version() {
+    if (data_version === undefined) {
+        data_version = fetch(`${LIFEMAP_BACK_URL}/data/timestamp.txt`)
+            .then((response) => (response.ok ? response.text() : null))
+            .then((text) => (text === null ? null : Number.parseInt(text)))
+            .catch((error) => {
+                console.error(error)
+                return null
+            })
+    }
+    return data_version
+}
+
 // Get up-to-date taxids coordinates from lifemap-back solr server
 export async function get_data_coords(taxids) {
     const url_taxids = [...taxids].join(" ")
@@ -0,0 +1,57 @@
+// Columnar layers data, as returned by `table_columns`: an object with the number of
+// rows in `length`, and one array per column in `columns`. Numeric columns without null
+// values are typed arrays.
+
+// Convert an Arrow table to columnar data
+export function table_columns(table) {
+    let columns = {}
+    for (const field of table.schema.fields) {
+        const vector = table.getChild(field.name)
+        // Typed arrays can't hold null values
+        columns[field.name] = vector.nullCount > 0 ? [...vector] : vector.toArray()
+    }
+    return { length: table.numRows, columns }
+}
+
+// Check if layer data are columnar
+export function is_columnar(data) {
+    return !Array.isArray(data) && data.columns !== undefined
+}
+
+// Get a row of columnar data as an object
+export function get_row(data, i) {
+    let row = {}
+    for (const name in data.columns) {
+        row[name] = data.columns[name][i]
+    }
+    return row
+}
+
+// Convert columnar data to an array of row objects, for layers without a columnar code
+// path. Other data are returned as is.
+export function to_rows(data) {
+    if (!is_columnar(data)) {
+        return data
+    }
+    return Array.from({ length: data.length }, (_, i) => get_row(data, i))
+}
+
+// Get the rows of columnar data at the given indices
+export function take_rows(data, indices) {
+    let columns = {}
+    for (const [name, values] of Object.entries(data.columns)) {
+        const result = ArrayBuffer.isView(values)
+            ? new values.constructor(indices.length)
+            : new Array(indices.length)
+        indices.forEach((index, i) => {
+            result[i] = values[index]
+        })
+        columns[name] = result
+    }
+    return { length: indices.length, columns }
+}
+
+// Get the values of a data column, from columnar or rows data
+export function column_values(data, column) {
+    return is_columnar(data) ? data.columns[column] : data.map((d) => d[column])
+}
@@ -4,6 +4,8 @@ import {
     CompressionType,
 } from "@apache-arrow/es2015-esm"
 import * as lz4 from "lz4js"
+import { decompress as zstd_decompress } from "fzstd"
+import { table_columns } from "./columns"
 
 // Arrow IPC lz4 compression
 const lz4Codec = {
@@ -16,6 +18,17 @@ const lz4Codec = {
 }
 compressionRegistry.set(CompressionType.LZ4_FRAME, lz4Codec)
 
+// Arrow IPC zstd compression (decoding only, data is always encoded in Python)
+const zstdCodec = {
+    encode(data) {
+        throw new Error("zstd encoding is not supported")
+    },
+    decode(data) {
+        return zstd_decompress(data)
+    },
+}
+compressionRegistry.set(CompressionType.ZSTD, zstdCodec)
+
 // Unserialize data from Arrow IPC to JS Array
 export function deserialize_data(data) {
     if (data["serialized"]) {
@@ -24,3 +37,74 @@ export function deserialize_data(data) {
         return data["value"]
     }
 }
+
+// Unserialize a content-addressed data store. Each store entry is decoded once,
+// and each layer gets its own columns projected out of the shared table.
+// Chunked entries, possibly incomplete, are concatenated in their original order.
+export function deserialize_store(data) {
+    const { store, layers } = data
+    let tables = {}
+    for (let key in store) {
+        if (store[key]["chunks"] !== undefined) {
+            // Chunked entry: restore original rows order
+            const chunks = [...store[key]["chunks"]].sort((a, b) => a.index - b.index)
+            const [first, ...others] = chunks.map((d) => tableFromIPC(d.value))
+            tables[key] = first.concat(...others)
+        } else {
+            tables[key] = tableFromIPC(store[key]["value"])
+        }
+    }
+    let result = {}
+    for (let layer_id in layers) {
+        const layer = layers[layer_id]
+        if (layer["key"] === undefined) {
+            result[layer_id] = deserialize_data(layer)
+            continue
+        }
+        const table = tables[layer["key"]].select(layer["columns"])
+        switch (layer["format"]) {
+            case "attributes":
+                result[layer_id] = table_attributes(table)
+                break
+            case "columnar":
+                result[layer_id] = table_columns(table)
+                break
+            default:
+                result[layer_id] = table.toArray()
+        }
+    }
+    return result
+}
+
+// Convert an Arrow table to binary attributes, without creating one object per row.
+// Each column is converted to a single typed array, fixed size lists values being
+// interleaved.
+export function table_attributes(table) {
+    let attributes = {}
+    for (const field of table.schema.fields) {
+        const chunks = table.getChild(field.name).data.map((data) => {
+            const size = data.type.listSize ?? 1
+            const values =
+                data.type.listSize === undefined ? data.values : data.children[0].values
+            return values.subarray(data.offset * size, (data.offset + data.length) * size)
+        })
+        attributes[field.name] = concat_typed_arrays(chunks)
+    }
+    return { length: table.numRows, attributes }
+}
+
+function concat_typed_arrays(arrays) {
+    if (arrays.length == 0) {
+        return new Float32Array(0)
+    }
+    if (arrays.length == 1) {
+        return arrays[0]
+    }
+    const result = new arrays[0].constructor(arrays.reduce((n, a) => n + a.length, 0))
+    let offset = 0
+    for (const a of arrays) {
+        result.set(a, offset)
+        offset += a.length
+    }
+    return result
+}
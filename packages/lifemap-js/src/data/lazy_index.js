@@ -0,0 +1,105 @@
+import { WORLD_HALF_SIZE } from "../utils"
+
+// Number of bits per coordinate in Morton codes. Must be the same as in pylifemap.
+const MORTON_BITS = 16
+
+// Insert a zero bit between each of the 16 lower bits of an integer
+function spread_bits(v) {
+    v = v & 0x0000ffff
+    v = (v | (v << 8)) & 0x00ff00ff
+    v = (v | (v << 4)) & 0x0f0f0f0f
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+}
+
+// Quantize an EPSG:3857 coordinate on the Morton grid
+function quantize(v) {
+    const n_cells = 2 ** MORTON_BITS
+    const q = Math.floor(((v + WORLD_HALF_SIZE) / (2 * WORLD_HALF_SIZE)) * n_cells)
+    return Math.min(Math.max(q, 0), n_cells - 1)
+}
+
+// Morton (Z-order) code of EPSG:3857 coordinates, same as pylifemap morton_codes
+export function morton_code(x, y) {
+    return (spread_bits(quantize(x)) | (spread_bits(quantize(y)) << 1)) >>> 0
+}
+
+// First index in [start, end) of data whose key_fn value is greater or equal to value
+function lower_bound(data, start, end, value, key_fn) {
+    while (start < end) {
+        const mid = (start + end) >>> 1
+        if (key_fn(data[mid]) < value) {
+            start = mid + 1
+        } else {
+            end = mid
+        }
+    }
+    return start
+}
+
+// First index in [start, end) of data whose key_fn value is greater than value
+export function upper_bound(data, start, end, value, key_fn) {
+    while (start < end) {
+        const mid = (start + end) >>> 1
+        if (key_fn(data[mid]) <= value) {
+            start = mid + 1
+        } else {
+            end = mid
+        }
+    }
+    return start
+}
+
+const row_morton_code = (d) => morton_code(d["pylifemap_x"], d["pylifemap_y"])
+const row_bbox_xmin = (d) => d["pylifemap_bbox_xmin"]
+
+// Index of the first bucket of an offsets table with a zoom level lower or equal to
+// zoom. Zoom levels are in decreasing order.
+function first_bucket(zooms, zoom) {
+    let first = zooms.length
+    while (first > 0 && zooms[first - 1] <= zoom) {
+        first--
+    }
+    return first
+}
+
+// Get the candidate rows of data inside an extent and with a zoom level lower or equal
+// to zoom, using the offsets table computed by pylifemap. Data must be sorted by
+// decreasing zoom level, then by Morton code.
+// As Morton codes grow with both coordinates, rows inside the extent have a code
+// between the codes of its bottom left and top right corners, so candidates are found
+// by binary search in each zoom level range. They still have to be filtered.
+export function lazy_candidates(data, lazy_offsets, xmin, xmax, ymin, ymax, zoom) {
+    const { zooms, offsets } = lazy_offsets
+    const code_min = morton_code(xmin, ymin)
+    const code_max = morton_code(xmax, ymax)
+    let candidates = []
+    for (let i = first_bucket(zooms, zoom); i < zooms.length; i++) {
+        const start = lower_bound(data, offsets[i], offsets[i + 1], code_min, row_morton_code)
+        const end = lower_bound(data, start, offsets[i + 1], code_max + 1, row_morton_code)
+        for (let j = start; j < end; j++) {
+            candidates.push(data[j])
+        }
+    }
+    return candidates
+}
+
+// Get the candidate lines or arcs of data whose bounding box may intersect an extent,
+// and with a zoom level lower or equal to zoom, using the offsets table computed by
+// pylifemap. Data must be sorted by decreasing zoom level, then by size class and
+// minimum x of their bounding box.
+// In each bucket bounding boxes are at most widths[i] wide, so candidates have a
+// minimum x between xmin - widths[i] and xmax. They still have to be filtered.
+export function segments_candidates(data, lazy_offsets, xmin, xmax, ymin, ymax, zoom) {
+    const { zooms, widths, offsets } = lazy_offsets
+    let candidates = []
+    for (let i = first_bucket(zooms, zoom); i < zooms.length; i++) {
+        const start = lower_bound(data, offsets[i], offsets[i + 1], xmin - widths[i], row_bbox_xmin)
+        const end = upper_bound(data, start, offsets[i + 1], xmax, row_bbox_xmin)
+        for (let j = start; j < end; j++) {
+            candidates.push(data[j])
+        }
+    }
+    return candidates
+}
@@ -1,13 +1,42 @@
 import { MAX_SOLR_QUERY } from "../utils"
 import { get_data_coords } from "./api"
+import { toLonLat } from "ol/proj"
+import { is_columnar, take_rows } from "./columns"
 
-// Update coordinates of a data array from the Lifemap API
-export async function update_coordinates(data) {
+// Columns of taxids whose coordinates are updated
+const TAXID_COLUMNS = [
+    "pylifemap_taxid",
+    "pylifemap_parent_taxid",
+    "pylifemap_dest_taxid",
+]
+
+// Update coordinates of layers data from the Lifemap API. The "refresh" option of
+// layers definitions tells if their data are not updated ("none"), if only their
+// coordinates are updated ("positions"), or if their zoom levels are updated too
+// ("full", the default). Returns the ids of the updated layers data.
+export async function update_coordinates(data, layers = []) {
+    const modes = Object.fromEntries(
+        (Array.isArray(layers) ? layers : [layers]).map((l) => [
+            l.id,
+            l.options?.refresh ?? "full",
+        ])
+    )
+    const keys = Object.keys(data).filter((k) => modes[k] != "none")
+    let refreshed = new Set()
     let taxids = new Set()
-    for (let k in data) {
+    for (let k of keys) {
+        if (data[k].attributes !== undefined) {
+            taxids = taxids.union(attributes_taxids(data[k]))
+            continue
+        }
+        if (is_columnar(data[k])) {
+            taxids = taxids.union(columnar_taxids(data[k]))
+            continue
+        }
         taxids = taxids.union(
             new Set(
                 data[k]
+                    .filter((d) => d.pylifemap_taxid != null)
                     .map((d) =>
                         // If lines data, add parent
                         d.pylifemap_parent != null
@@ -29,9 +58,23 @@ export async function update_coordinates(data) {
         let coords = await get_data_coords(taxids)
         // If query succeeded, update coordinates with new values
         if (coords !== null) {
-            for (let k in data) {
+            for (let k of keys) {
+                refreshed.add(k)
+                const update_zoom = modes[k] != "positions"
+                if (data[k].attributes !== undefined) {
+                    update_attributes_coordinates(data[k], coords)
+                    continue
+                }
+                if (is_columnar(data[k])) {
+                    data[k] = update_columnar_coordinates(data[k], coords, update_zoom)
+                    continue
+                }
                 // Filter out data points whose taxid is not in the lifemap database anymore
                 data[k] = data[k].filter((d) => {
+                    // Rows without taxid, such as clusters, are kept as is
+                    if (d.pylifemap_taxid == null) {
+                        return true
+                    }
                     const taxid_coords = coords[d.pylifemap_taxid]
                     if (taxid_coords == null) {
                         console.warn(
@@ -63,8 +106,11 @@ export async function update_coordinates(data) {
                 })
                 // Update coordinates for still existing taxids
                 data[k].forEach((d) => {
+                    if (d.pylifemap_taxid == null) {
+                        return
+                    }
                     const taxid_coords = coords[d.pylifemap_taxid]
-                    if (d.pylifemap_zoom != null) {
+                    if (update_zoom && d.pylifemap_zoom != null) {
                         d.pylifemap_zoom = taxid_coords.zoom
                     }
                     if (d.pylifemap_x != null) {
@@ -89,4 +135,103 @@ export async function update_coordinates(data) {
             }
         }
     }
+    return refreshed
+}
+
+// Get the taxids of binary attributes data
+function attributes_taxids(data) {
+    const { pylifemap_taxid, pylifemap_dest_taxid } = data.attributes
+    let taxids = new Set(pylifemap_taxid ?? [])
+    return pylifemap_dest_taxid ? taxids.union(new Set(pylifemap_dest_taxid)) : taxids
+}
+
+// Update binary attributes positions in place. Positions are longitudes and latitudes,
+// destination ones following source ones for arcs data. Rows whose taxid is not in the
+// lifemap database anymore keep their coordinates, as typed arrays cannot be filtered
+// without a copy.
+function update_attributes_coordinates(data, coords) {
+    const { pylifemap_taxid, pylifemap_dest_taxid, pylifemap_positions } = data.attributes
+    if (pylifemap_taxid === undefined || pylifemap_positions === undefined) {
+        return
+    }
+    const size = pylifemap_positions.length / data.length
+    for (let i = 0; i < data.length; i++) {
+        const taxid_coords = coords[pylifemap_taxid[i]]
+        if (taxid_coords != null) {
+            pylifemap_positions.set(toLonLat([taxid_coords.x, taxid_coords.y]), i * size)
+        }
+        if (pylifemap_dest_taxid !== undefined) {
+            const dest_coords = coords[pylifemap_dest_taxid[i]]
+            if (dest_coords != null) {
+                const dest_lonlat = toLonLat([dest_coords.x, dest_coords.y])
+                pylifemap_positions.set(dest_lonlat, i * size + 2)
+            }
+        }
+    }
+}
+
+// Get the taxids of columnar data, including lines parents and arcs destinations
+function columnar_taxids(data) {
+    let taxids = new Set()
+    for (const column of TAXID_COLUMNS) {
+        for (const taxid of data.columns[column] ?? []) {
+            if (taxid != null) {
+                taxids.add(taxid)
+            }
+        }
+    }
+    return taxids
+}
+
+// Update columnar data coordinates. Rows whose taxids are not in the lifemap database
+// anymore are removed, and the coordinates columns of the other ones are updated in
+// place. Rows without taxid, such as clusters, are kept as is. If update_zoom is false,
+// zoom levels are kept.
+function update_columnar_coordinates(data, coords, update_zoom = true) {
+    const columns = TAXID_COLUMNS.filter((column) => data.columns[column] !== undefined)
+    if (!columns.includes("pylifemap_taxid")) {
+        return data
+    }
+    let indices = []
+    for (let i = 0; i < data.length; i++) {
+        const missing = columns.find((column) => {
+            // Taxids may be null
+            const taxid = data.columns[column][i]
+            return taxid != null && coords[taxid] == null
+        })
+        if (missing !== undefined) {
+            const taxid = data.columns[missing][i]
+            console.warn(`${taxid} not found in updated coords - removed`)
+            continue
+        }
+        indices.push(i)
+    }
+    const result = indices.length == data.length ? data : take_rows(data, indices)
+    const c = result.columns
+    for (let i = 0; i < result.length; i++) {
+        if (c.pylifemap_taxid[i] == null) {
+            continue
+        }
+        const taxid_coords = coords[c.pylifemap_taxid[i]]
+        if (update_zoom && c.pylifemap_zoom !== undefined) {
+            c.pylifemap_zoom[i] = taxid_coords.zoom
+        }
+        if (c.pylifemap_x !== undefined) {
+            c.pylifemap_x[i] = taxid_coords.x
+            c.pylifemap_y[i] = taxid_coords.y
+        }
+        // Lines data
+        if (c.pylifemap_parent_taxid?.[i] != null) {
+            const taxid_parent_coords = coords[c.pylifemap_parent_taxid[i]]
+            c.pylifemap_parent_x[i] = taxid_parent_coords.x
+            c.pylifemap_parent_y[i] = taxid_parent_coords.y
+        }
+        // Arcs data
+        if (c.pylifemap_dest_taxid?.[i] != null) {
+            const taxid_dest_coords = coords[c.pylifemap_dest_taxid[i]]
+            c.pylifemap_dest_x[i] = taxid_dest_coords.x
+            c.pylifemap_dest_y[i] = taxid_dest_coords.y
+        }
+    }
+    return result
 }
@@ -45,6 +45,7 @@ export class ArcsLayer {
             hover = false,
             lazy = false,
             lazy_zoom = 15,
+            lazy_offsets = undefined,
             width_range = [2, 15],
         } = options
 
@@ -65,6 +66,7 @@ export class ArcsLayer {
             hover,
             lazy,
             lazy_zoom,
+            lazy_offsets,
             width_range,
         })
 
@@ -119,6 +121,7 @@ export class ArcsLayer {
                 create_feature_fn: create_feature_fn,
                 lazy_zoom: this.lazy_zoom,
                 type: "arcs",
+                lazy_offsets: this.lazy_offsets,
             })
         } else {
             arc_source.addFeatures(this.data.map(create_feature_fn).flat())
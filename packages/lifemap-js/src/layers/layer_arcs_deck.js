@@ -36,7 +36,8 @@ export class ArcsDeckLayer {
         this.type = "deck"
 
         // Check if width is a fixed width or a data column
-        this.width_is_column = is_data_column(this.data, this.width)
+        this.width_is_column =
+            this.data.attributes === undefined && is_data_column(this.data, this.width)
 
         this.layers = []
     }
@@ -45,15 +46,11 @@ export class ArcsDeckLayer {
         const base_deck_layers = await import("@deck.gl/layers")
 
         const layer = new base_deck_layers.ArcLayer({
-            data: this.data,
+            ...this.data_props(),
             id: this.id,
-            getSourcePosition: (d) => toLonLat([d["pylifemap_x"], d["pylifemap_y"]]),
-            getTargetPosition: (d) =>
-                toLonLat([d["pylifemap_dest_x"], d["pylifemap_dest_y"]]),
             getSourceColor: this.source_color,
             getTargetColor: this.dest_color,
             numSegments: this.n_segments,
-            getWidth: this.get_width_fn(),
             getHeight: this.height,
             getTilt: this.tilt,
             opacity: this.opacity,
@@ -64,6 +61,39 @@ export class ArcsDeckLayer {
         this.layers.push(layer)
     }
 
+    // Data, positions and widths props. Binary attributes computed in Python are given
+    // as is to deck.gl, source and destination positions being interleaved in the same
+    // buffer.
+    data_props() {
+        if (this.data.attributes === undefined) {
+            return {
+                data: this.data,
+                getSourcePosition: (d) => toLonLat([d["pylifemap_x"], d["pylifemap_y"]]),
+                getTargetPosition: (d) =>
+                    toLonLat([d["pylifemap_dest_x"], d["pylifemap_dest_y"]]),
+                getWidth: this.get_width_fn(),
+            }
+        }
+        const { pylifemap_positions, pylifemap_widths } = this.data.attributes
+        const stride = 4 * pylifemap_positions.BYTES_PER_ELEMENT
+        let attributes = {
+            getSourcePosition: { value: pylifemap_positions, size: 2, stride, offset: 0 },
+            getTargetPosition: {
+                value: pylifemap_positions,
+                size: 2,
+                stride,
+                offset: stride / 2,
+            },
+        }
+        if (pylifemap_widths !== undefined) {
+            attributes.getWidth = { value: pylifemap_widths, size: 1 }
+        }
+        return {
+            data: { length: this.data.length, attributes },
+            getWidth: pylifemap_widths === undefined ? this.width : 1,
+        }
+    }
+
     get_width_fn() {
         if (!this.width_is_column) {
             return this.width
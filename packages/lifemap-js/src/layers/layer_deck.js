@@ -25,6 +25,16 @@ export class DeckLayer {
             parent: this.el.querySelector(".ol-viewport"),
             style: { pointerEvents: "none", "z-index": 1 },
             layers: [],
+            // Layers with a zoom range are only drawn inside it. Deck.gl zoom levels are
+            // one less than OpenLayers ones.
+            layerFilter: ({ layer, viewport }) => {
+                const zoom_range = layer.props.zoom_range
+                if (zoom_range === undefined) {
+                    return true
+                }
+                const zoom = viewport.zoom + 1
+                return zoom > zoom_range[0] && zoom <= zoom_range[1]
+            },
         })
 
         this.deck_layer = new Layer({
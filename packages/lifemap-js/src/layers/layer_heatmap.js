@@ -1,9 +1,12 @@
-import { guidGenerator } from "../utils"
+import { guidGenerator, levels_zoom_ranges, filter_data_rows } from "../utils"
+import { column_values, to_rows } from "../data/columns"
 
 import Feature from "ol/Feature.js"
 import Point from "ol/geom/Point.js"
 import Vector from "ol/source/Vector.js"
 import OlHeatmapLayer from "ol/layer/Heatmap.js"
+import TileLayer from "ol/layer/Tile.js"
+import XYZ from "ol/source/XYZ.js"
 
 export class HeatmapLayer {
     constructor(id, data, options = {}) {
@@ -21,9 +24,26 @@ export class HeatmapLayer {
                 "#d1e834",
                 "#f3363a",
             ],
+            weight = null,
+            prebin = false,
+            grid_zooms = null,
+            raster = false,
+            raster_max_zoom = 6,
         } = options
 
-        Object.assign(this, { radius, blur, opacity, gradient })
+        Object.assign(this, {
+            radius,
+            blur,
+            opacity,
+            gradient,
+            weight,
+            prebin,
+            grid_zooms,
+            raster,
+            raster_max_zoom,
+        })
+        // Prebinned data weights are always in the same column
+        this.weight_col = this.prebin ? "pylifemap_weight" : this.weight
 
         this.id = `lifemap-ol-${id ?? guidGenerator()}`
         this.data = data
@@ -33,14 +53,28 @@ export class HeatmapLayer {
 
         this.layers = []
 
-        this.layers.push(this.create_layer())
+        if (this.raster) {
+            this.layers.push(this.create_raster_layer())
+        } else if (this.grid_zooms !== null) {
+            // One layer per prebinned grid, displayed depending on the zoom level
+            const ranges = levels_zoom_ranges(this.grid_zooms)
+            this.grid_zooms.forEach((zoom, i) => {
+                const data = filter_data_rows(this.data, "pylifemap_grid_zoom", zoom)
+                const [min_zoom, max_zoom] = ranges[i]
+                this.layers.push(
+                    this.create_layer(data, `${this.id}-${zoom}`, min_zoom, max_zoom)
+                )
+            })
+        } else {
+            this.layers.push(this.create_layer(this.data, this.id))
+        }
     }
 
-    create_layer() {
-        // Initialize source
-        const create_feature_fn = this.get_create_feature_fn()
+    create_layer(data, id, min_zoom = -Infinity, max_zoom = Infinity) {
+        // Initialize source, features being created by data row index
+        const create_feature_fn = this.get_create_feature_fn(data)
         const source = new Vector({
-            features: this.data.map(create_feature_fn),
+            features: Array.from({ length: data.length }, (_, i) => create_feature_fn(i)),
             useSpatialIndex: false,
         })
 
@@ -49,19 +83,54 @@ export class HeatmapLayer {
             source: source,
             blur: this.blur,
             radius: this.radius,
-            weight: 1.0,
+            weight: this.weight_col === null ? 1.0 : "weight",
             gradient: this.gradient,
             opacity: this.opacity,
+            minZoom: min_zoom,
+            maxZoom: max_zoom,
         })
-        layer.id = this.id
+        layer.id = id
+
+        return layer
+    }
 
+    create_raster_layer() {
+        // Tiles are rendered in Python as PNG images, and served from blob URLs
+        const urls = new Map()
+        for (const d of to_rows(this.data)) {
+            const blob = new Blob([d["pylifemap_tile"]], { type: "image/png" })
+            const { pylifemap_tile_z: z, pylifemap_tile_x: x, pylifemap_tile_y: y } = d
+            urls.set(`${z}/${x}/${y}`, URL.createObjectURL(blob))
+        }
+        // Tiles of the finest zoom level are scaled up when zooming further
+        const source = new XYZ({
+            tileUrlFunction: ([z, x, y]) => urls.get(`${z}/${x}/${y}`),
+            maxZoom: this.raster_max_zoom,
+            wrapX: false,
+        })
+        const layer = new TileLayer({ source: source, opacity: this.opacity })
+        layer.id = this.id
         return layer
     }
 
-    get_create_feature_fn() {
-        return (d) =>
+    get_create_feature_fn(data) {
+        const x = column_values(data, "pylifemap_x")
+        const y = column_values(data, "pylifemap_y")
+        if (this.weight_col === null) {
+            return (i) => new Feature({ geometry: new Point([x[i], y[i]]) })
+        }
+        // Heatmap weights must be between 0 and 1, they are log scaled so that cells
+        // with few observations stay visible
+        const weights = column_values(data, this.weight_col)
+        let max_weight = 0
+        for (const w of weights) {
+            max_weight = Math.max(max_weight, Number(w) || 0)
+        }
+        const scale = max_weight > 0 ? Math.log1p(max_weight) : 1
+        return (i) =>
             new Feature({
-                geometry: new Point([d["pylifemap_x"], d["pylifemap_y"]]),
+                geometry: new Point([x[i], y[i]]),
+                weight: Math.log1p(Math.max(Number(weights[i]) || 0, 0)) / scale,
             })
     }
 }
@@ -8,7 +8,7 @@ import VectorLayer from "ol/layer/Vector.js"
 import { Style, Icon } from "ol/style.js"
 
 export class IconsLayer {
-    constructor(id, map, data, options = {}) {
+    constructor(id, map, data, options = {}, assets = {}) {
         let {
             width = null,
             height = null,
@@ -25,6 +25,9 @@ export class IconsLayer {
             declutter = true,
             lazy = false,
             lazy_zoom = 10,
+            lazy_source = "browser",
+            lazy_offsets = undefined,
+            icons = undefined,
             icons_cache = {},
         } = options
 
@@ -44,9 +47,14 @@ export class IconsLayer {
             declutter,
             lazy,
             lazy_zoom,
+            lazy_source,
+            lazy_offsets,
+            icons,
             icons_cache,
         })
+        this.assets = assets
 
+        this.data_id = id
         this.id = `lifemap-ol-${id ?? guidGenerator()}`
         this.map = map
         this.data = data
@@ -86,6 +94,9 @@ export class IconsLayer {
                 create_feature_fn: create_feature_fn,
                 lazy_zoom: this.lazy_zoom,
                 type: "points",
+                lazy_source: this.lazy_source,
+                lazy_offsets: this.lazy_offsets,
+                data_id: this.data_id,
             })
         } else {
             source.addFeatures(this.data.map(create_feature_fn))
@@ -116,26 +127,58 @@ export class IconsLayer {
     }
 
     get_style() {
+        // Icons styles are shared by all the features with the same icon
+        const styles = new Map()
         return (feature) => {
             const icon = feature.get("icon")
-            const style =
-                icon === null
-                    ? null
-                    : new Style({
-                          image: new Icon({
-                              anchor: [this.x_anchor, this.y_anchor],
-                              anchorXUnits: "fraction",
-                              anchorYUnitsUnits: "fraction",
-                              width: this.width ?? undefined,
-                              height: this.height ?? undefined,
-                              scale: this.scale ?? undefined,
-                              displacement: [this.x_offset, this.y_offset],
-                              src: this.icons_cache[icon],
-                              color: this.color ?? undefined,
-                          }),
-                      })
-
-            return style
+            if (icon === null) {
+                return null
+            }
+            if (!styles.has(icon)) {
+                styles.set(
+                    icon,
+                    new Style({
+                        image: new Icon({
+                            anchor: [this.x_anchor, this.y_anchor],
+                            anchorXUnits: "fraction",
+                            anchorYUnitsUnits: "fraction",
+                            displacement: [this.x_offset, this.y_offset],
+                            color: this.color ?? undefined,
+                            ...this.get_icon_options(icon),
+                        }),
+                    })
+                )
+            }
+            return styles.get(icon)
+        }
+    }
+
+    // Get an icon source and size. Icons sent by pylifemap reference an entry of the
+    // assets store, possibly packed in a sprite atlas, and give their displayed size
+    // when it is known, as they may have been downscaled
+    get_icon_options(icon) {
+        const layer_size = {
+            width: this.width ?? undefined,
+            height: this.height ?? undefined,
+            scale: this.scale ?? undefined,
+        }
+        const entry = this.icons?.[icon]
+        if (entry === undefined) {
+            return { src: this.icons_cache[icon], ...layer_size }
+        }
+        const size =
+            entry.size === null
+                ? layer_size
+                : { width: entry.size[0], height: entry.size[1] }
+        const offset = this.assets.offsets?.[entry.key]
+        if (offset === undefined) {
+            return { src: this.assets.icons?.[entry.key], ...size }
+        }
+        return {
+            src: this.assets.atlas,
+            offset: [offset[0], offset[1]],
+            size: [offset[2], offset[3]],
+            ...size,
         }
     }
 
@@ -28,6 +28,7 @@ export class LinesLayer {
             hover = false,
             lazy = false,
             lazy_zoom = 15,
+            lazy_offsets = undefined,
             width_range = [1, 20],
         } = options
 
@@ -43,6 +44,7 @@ export class LinesLayer {
             hover,
             lazy,
             lazy_zoom,
+            lazy_offsets,
             width_range,
         })
 
@@ -91,6 +93,7 @@ export class LinesLayer {
                 create_feature_fn: create_feature_fn,
                 lazy_zoom: this.lazy_zoom,
                 type: "lines",
+                lazy_offsets: this.lazy_offsets,
             })
         } else {
             source.addFeatures(this.data.map(create_feature_fn))
@@ -6,6 +6,7 @@ import {
     DEFAULT_NUM_SCHEME,
 } from "../utils"
 import { get_popup_title } from "../data/api"
+import { column_values, get_row, is_columnar, to_rows } from "../data/columns"
 
 import Feature from "ol/Feature.js"
 import Point from "ol/geom/Point.js"
@@ -33,7 +34,12 @@ export class PointsLayer {
             hover = false,
             lazy = false,
             lazy_zoom = 15,
+            lazy_source = "browser",
+            lazy_offsets = undefined,
             radius_range = [1, 20],
+            radius_domain = null,
+            cluster_zooms = null,
+            lod_zooms = null,
         } = options
 
         Object.assign(this, {
@@ -49,12 +55,23 @@ export class PointsLayer {
             hover,
             lazy,
             lazy_zoom,
+            lazy_source,
+            lazy_offsets,
             radius_range,
+            radius_domain,
+            cluster_zooms,
+            lod_zooms,
         })
 
+        this.data_id = id
         this.id = `lifemap-ol-${id ?? guidGenerator()}`
         this.map = map
-        this.data = data
+        // Clusters, levels of detail and lazy loading work on rows, other points features
+        // are created from columnar data by row index
+        this.data =
+            this.cluster_zooms === null && this.lod_zooms === null && !this.lazy
+                ? data
+                : to_rows(data)
         this.color_ranges = color_ranges
         this.label = this.label ?? this.fill
 
@@ -89,17 +106,37 @@ export class PointsLayer {
         layer.id = this.id
 
         // Features creation
-        const create_feature_fn = this.get_create_feature_fn()
-        if (this.lazy) {
+        if (this.cluster_zooms !== null) {
+            const levels = d3.group(this.data, (d) => d["pylifemap_cluster_zoom"])
+            this.setup_levels(
+                source,
+                this.cluster_zooms,
+                (level) => levels.get(level) ?? []
+            )
+        } else if (this.lod_zooms !== null) {
+            this.setup_levels(source, this.lod_zooms, (level) =>
+                this.data.filter(
+                    (d) =>
+                        d["pylifemap_lod_min"] <= level &&
+                        level <= d["pylifemap_lod_max"]
+                )
+            )
+        } else if (this.lazy) {
             this.map.setup_lazy_loading({
                 data: this.data,
                 source: source,
-                create_feature_fn: create_feature_fn,
+                create_feature_fn: this.get_create_feature_fn(),
                 lazy_zoom: this.lazy_zoom,
                 type: "points",
+                lazy_source: this.lazy_source,
+                lazy_offsets: this.lazy_offsets,
+                data_id: this.data_id,
             })
         } else {
-            source.addFeatures(this.data.map(create_feature_fn))
+            const create_feature_fn = this.get_create_feature_at_fn()
+            source.addFeatures(
+                Array.from({ length: this.data.length }, (_, i) => create_feature_fn(i))
+            )
         }
 
         // Hover
@@ -131,13 +168,93 @@ export class PointsLayer {
             })
     }
 
+    // Create the feature of a data row from its index, data being columnar or rows
+    get_create_feature_at_fn() {
+        const fill_fn = this.get_fill_fn()
+        const radius_fn = this.get_radius_fn()
+        const x = column_values(this.data, "pylifemap_x")
+        const y = column_values(this.data, "pylifemap_y")
+        const radius = radius_fn != null ? column_values(this.data, this.radius) : null
+        const fill = fill_fn != null ? column_values(this.data, this.fill) : null
+        const row = is_columnar(this.data)
+            ? (i) => get_row(this.data, i)
+            : (i) => this.data[i]
+        return (i) =>
+            new Feature({
+                geometry: new Point([x[i], y[i]]),
+                data: this.popup ? row(i) : null,
+                radius: radius_fn != null ? radius_fn(radius[i]) : null,
+                fill: fill_fn != null ? fill_fn(fill[i]) : null,
+            })
+    }
+
+    // Display the clusters or levels of detail level corresponding to the current zoom.
+    // The features of each level are only created when it is displayed for the first
+    // time.
+    setup_levels(source, zooms, level_data_fn) {
+        const fill_fn = this.get_fill_fn()
+        // Last level contains the original points
+        const points_level = zooms[zooms.length - 1]
+        const radius_col = this.radius_is_column ? this.radius : "pylifemap_count"
+        let features = new Map()
+        let current_level = undefined
+
+        const level_features = (level) => {
+            const level_data = level_data_fn(level)
+            // Aggregated points radius scale is computed for each level
+            let radius_fn
+            if (level != points_level || this.radius_is_column) {
+                radius_fn = this.get_radius_scale_fn(level_data, radius_col)
+            } else {
+                radius_fn = () => this.radius ?? DEFAULT_RADIUS
+            }
+            return level_data.map(
+                (d) =>
+                    new Feature({
+                        geometry: new Point([d["pylifemap_x"], d["pylifemap_y"]]),
+                        data: this.popup ? d : null,
+                        radius: radius_fn(d[radius_col]),
+                        fill: fill_fn != null ? fill_fn(d[this.fill]) : null,
+                    })
+            )
+        }
+
+        const display_level = () => {
+            const zoom = Math.floor(this.map.map.getView().getZoom())
+            const level = zooms.find((z) => z >= zoom) ?? points_level
+            if (level == current_level) {
+                return
+            }
+            current_level = level
+            if (!features.has(level)) {
+                features.set(level, level_features(level))
+            }
+            source.clear()
+            source.addFeatures(features.get(level))
+        }
+
+        display_level()
+        this.map.add_moveend_callback(display_level)
+    }
+
     get_radius_fn() {
         if (!this.radius_is_column) {
             return null
         }
-        const min_domain = d3.min(this.data, (d) => Number(d[this.radius]))
-        const max_domain = d3.max(this.data, (d) => Number(d[this.radius]))
+        return this.get_radius_scale_fn(this.data, this.radius, this.radius_domain)
+    }
+
+    get_radius_scale_fn(data, column, domain = null) {
+        // Radius domain can be given as option if data is only a sample
+        const values = domain === null ? column_values(data, column) : null
+        const [min_domain, max_domain] = domain ?? [
+            d3.min(values, (d) => Number(d)),
+            d3.max(values, (d) => Number(d)),
+        ]
         const [min_range, max_range] = this.radius_range
+        if (max_domain == min_domain) {
+            return () => min_range
+        }
 
         return (d) =>
             min_range +
@@ -160,8 +277,9 @@ export class PointsLayer {
             min_value = this.color_ranges[this.fill].min
             max_value = this.color_ranges[this.fill].max
         } else {
-            max_value = d3.max(this.data, (d) => Number(d[this.fill]))
-            min_value = d3.min(this.data, (d) => Number(d[this.fill]))
+            const values = column_values(this.data, this.fill)
+            max_value = d3.max(values, (d) => Number(d))
+            min_value = d3.min(values, (d) => Number(d))
         }
         const scheme = this.scheme ?? DEFAULT_NUM_SCHEME
         const scale = {
@@ -181,7 +299,7 @@ export class PointsLayer {
     get_categorical_fill_fn() {
         const scheme = this.scheme ?? DEFAULT_CAT_SCHEME
         let domain =
-            this.categories ?? [...new Set(this.data.map((d) => d[this.fill]))].sort()
+            this.categories ?? [...new Set(column_values(this.data, this.fill))].sort()
         domain = domain.map((d) => d.toString())
         const scale = {
             color: { type: "categorical", scheme: scheme, domain: domain },
@@ -195,10 +313,13 @@ export class PointsLayer {
     }
 
     get_style() {
-        // Radius style
-        const circle_radius = this.radius_is_column
-            ? ["get", "radius"]
-            : (this.radius ?? DEFAULT_RADIUS)
+        // Radius style, clusters and levels of detail radius always depend on data
+        const circle_radius =
+            this.radius_is_column ||
+            this.cluster_zooms !== null ||
+            this.lod_zooms !== null
+                ? ["get", "radius"]
+                : (this.radius ?? DEFAULT_RADIUS)
 
         // Fill style
         let circle_fill = this.fill_is_column
@@ -215,6 +336,40 @@ export class PointsLayer {
     }
 
     get_popup_content_fn() {
+        const content_fn = this.get_taxon_popup_content_fn()
+        if (this.lod_zooms !== null) {
+            // Levels of detail popup gives the ancestor and its number of taxa
+            return async (feature) => {
+                const data = feature.get("data")
+                if (data["pylifemap_count"] == 1) {
+                    return content_fn(feature)
+                }
+                let content = await get_popup_title(data["pylifemap_taxid"])
+                content += `<p><strong>${data["pylifemap_count"]} taxa</strong></p>`
+                if (this.fill_is_column && data[this.fill] !== null) {
+                    content += `<table><tbody><tr><td class='right'><strong>${this.label}:</strong></td><td>${data[this.fill]}</td></tr></tbody></table>`
+                }
+                return content
+            }
+        }
+        if (this.cluster_zooms === null) {
+            return content_fn
+        }
+        // Clusters popup gives their number of taxa
+        return (feature) => {
+            const data = feature.get("data")
+            if (data["pylifemap_count"] == 1) {
+                return content_fn(feature)
+            }
+            let content = `<strong>${data["pylifemap_count"]} taxa</strong>`
+            if (this.fill_is_column && data[this.fill] !== null) {
+                content += `<table><tbody><tr><td class='right'><strong>${this.label}:</strong></td><td>${data[this.fill]}</td></tr></tbody></table>`
+            }
+            return content
+        }
+    }
+
+    get_taxon_popup_content_fn() {
         return this.popup_col
             ? (feature) => feature.get("data")[this.popup_col]
             : async (feature) => {
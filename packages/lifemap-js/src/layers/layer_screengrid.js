@@ -1,12 +1,21 @@
 //import { ScreenGridLayer } from "@deck.gl/aggregation-layers"
-import { guidGenerator } from "../utils"
+import { guidGenerator, levels_zoom_ranges, filter_data_rows } from "../utils"
 import { toLonLat } from "ol/proj"
 
 export class ScreengridLayer {
     constructor(id, data, options = {}) {
-        let { cell_size = 30, opacity = 0.5, extruded = false } = options
+        let {
+            cell_size = 30,
+            opacity = 0.5,
+            extruded = false,
+            weight = null,
+            prebin = false,
+            grid_zooms = null,
+        } = options
 
-        Object.assign(this, { cell_size, opacity, extruded })
+        Object.assign(this, { cell_size, opacity, extruded, weight, prebin, grid_zooms })
+        // Prebinned data weights are always in the same column
+        this.weight_col = this.prebin ? "pylifemap_weight" : this.weight
 
         this.id = `lifemap-deck-${id ?? guidGenerator()}`
         this.data = data
@@ -20,17 +29,56 @@ export class ScreengridLayer {
     async init() {
         const aggregation_layers = await import("@deck.gl/aggregation-layers")
 
-        const layer = new aggregation_layers.ScreenGridLayer({
-            data: this.data,
-            id: this.id,
+        const props = {
             pickable: false,
-            getPosition: (d) => toLonLat([d["pylifemap_x"], d["pylifemap_y"]]),
-            getWeight: 1,
             cellSizePixels: this.cell_size,
             extruded: this.extruded,
             opacity: this.opacity,
-        })
+        }
 
-        this.layers.push(layer)
+        this.layers.push(...this.create_layers(aggregation_layers.ScreenGridLayer, props))
+    }
+
+    // Create the deck.gl layer, or one layer per prebinned grid. Grids layers are given
+    // a zoom range used by the deck layers filter.
+    create_layers(layer_class, props) {
+        if (this.grid_zooms === null) {
+            return [
+                new layer_class({ ...props, ...this.data_props(this.data), id: this.id }),
+            ]
+        }
+        const ranges = levels_zoom_ranges(this.grid_zooms)
+        return this.grid_zooms.map(
+            (zoom, i) =>
+                new layer_class({
+                    ...props,
+                    ...this.data_props(
+                        filter_data_rows(this.data, "pylifemap_grid_zoom", zoom)
+                    ),
+                    id: `${this.id}-${zoom}`,
+                    zoom_range: ranges[i],
+                })
+        )
+    }
+
+    // Data, positions and weights props. Binary attributes computed in Python are
+    // given as is to deck.gl.
+    data_props(data) {
+        if (data.attributes === undefined) {
+            return {
+                data: data,
+                getPosition: (d) => toLonLat([d["pylifemap_x"], d["pylifemap_y"]]),
+                getWeight:
+                    this.weight_col === null
+                        ? 1
+                        : (d) => Number(d[this.weight_col]) || 0,
+            }
+        }
+        const { pylifemap_positions, pylifemap_weights } = data.attributes
+        let attributes = { getPosition: { value: pylifemap_positions, size: 2 } }
+        if (pylifemap_weights !== undefined) {
+            attributes.getWeight = { value: pylifemap_weights, size: 1 }
+        }
+        return { data: { length: data.length, attributes }, getWeight: 1 }
     }
 }
@@ -1,4 +1,5 @@
 import { guidGenerator } from "../utils"
+import { upper_bound } from "../data/lazy_index"
 
 import Feature from "ol/Feature.js"
 import Point from "ol/geom/Point.js"
@@ -20,8 +21,11 @@ export class TextLayer {
             stroke = null,
             opacity = 1.0,
             declutter = true,
+            declutter_mode = "browser",
             lazy = true,
             lazy_zoom = 15,
+            lazy_source = "browser",
+            lazy_offsets = undefined,
         } = options
 
         Object.assign(this, {
@@ -32,10 +36,14 @@ export class TextLayer {
             stroke,
             opacity,
             declutter,
+            declutter_mode,
             lazy,
             lazy_zoom,
+            lazy_source,
+            lazy_offsets,
         })
 
+        this.data_id = id
         this.id = `lifemap-ol-${id ?? guidGenerator()}`
         this.map = map
         this.data = data
@@ -71,13 +79,43 @@ export class TextLayer {
                 create_feature_fn: create_feature_fn,
                 lazy_zoom: this.lazy_zoom,
                 type: "points",
+                lazy_source: this.lazy_source,
+                lazy_offsets: this.lazy_offsets,
+                data_id: this.data_id,
             })
+        } else if (this.declutter_mode == "precompute") {
+            this.setup_label_zooms(source, this.data.map(create_feature_fn))
         } else {
             source.addFeatures(this.data.map(create_feature_fn))
         }
         return layer
     }
 
+    // Only display labels with a precomputed label zoom lower or equal to the current
+    // zoom. Data are sorted by label zoom, so they are a prefix of the features.
+    setup_label_zooms(source, features) {
+        let current_count = undefined
+        const display_labels = () => {
+            const zoom = Math.floor(this.map.map.getView().getZoom())
+            const count = upper_bound(
+                this.data,
+                0,
+                this.data.length,
+                zoom,
+                (d) => d["pylifemap_label_zoom"]
+            )
+            if (count == current_count) {
+                return
+            }
+            current_count = count
+            source.clear()
+            source.addFeatures(features.slice(0, count))
+        }
+
+        display_labels()
+        this.map.add_moveend_callback(display_labels)
+    }
+
     get_create_feature_fn() {
         return (d) =>
             new Feature({
@@ -14,8 +14,9 @@ import { ArcsDeckLayer } from "./layers/layer_arcs_deck"
 
 import { ErrorMessage } from "./elements/error"
 
-import { deserialize_data } from "./data/deserialization"
+import { deserialize_data, deserialize_store } from "./data/deserialization"
 import { update_coordinates } from "./data/update_coordinates"
+import { get_data_version } from "./data/api"
 
 import { stringify_scale, LANG } from "./utils"
 
@@ -40,6 +41,8 @@ export class Lifemap {
             hide_labels = false,
             hide_legend = false,
             theme = "dark",
+            fetch_lazy_tile = undefined,
+            data_version = undefined,
         } = options
 
         // Init container
@@ -50,6 +53,9 @@ export class Lifemap {
         // Theme
         this.theme = theme
 
+        // Version of the lifemap-back data used to compute layers data
+        this.data_version = data_version
+
         // Base map object
         this.base_map = new BaseMap(el, {
             zoom: zoom,
@@ -59,6 +65,7 @@ export class Lifemap {
             legend_width: legend_width,
             hide_legend: hide_legend,
             lang: LANG,
+            fetch_lazy_tile: fetch_lazy_tile,
         })
 
         // Data layers
@@ -66,6 +73,11 @@ export class Lifemap {
 
         this.scales = []
         this.data = undefined
+        // Ids of layers whose data are kept in the kernel
+        this.kernel_layers = []
+        // Ids of layers whose data coordinates have been refreshed
+        this.refreshed_layers = new Set()
+        this.assets = {}
 
         // Global spinner
         this.spinner = new Spinner(el)
@@ -101,48 +113,71 @@ export class Lifemap {
     }
 
     async update(options) {
-        const { data, layers, color_ranges } = options
+        // If update_coords is false, skip the up-to-date coordinates query, for example
+        // when displaying partial data
+        const { data, layers, color_ranges, update_coords = true } = options
 
         const is_update = this.data_layers.length > 0
         this.spinner.show("Processing data")
 
-        requestAnimationFrame(() => {
-            this.update_data(data).then(() => {
-                this.spinner.update_message("Creating layers")
-                this.update_layers(layers, color_ranges)
-                    .then(async () => {
-                        if (!is_update) {
-                            this.spinner.update_message("Updating view")
-                            await this.base_map.init_view({
-                                // We filter out lazy loading layers in case center is "auto"
-                                ol_layers: this.get_ol_layers({ filter_lazy: true }),
-                                animate: false,
-                            })
-                        }
-                    })
-                    .then(this.spinner.hide())
+        await new Promise((resolve) => requestAnimationFrame(resolve))
+        await this.update_data(data, { update_coords: update_coords, layers: layers })
+        this.spinner.update_message("Creating layers")
+        await this.update_layers(layers, color_ranges)
+        if (!is_update) {
+            this.spinner.update_message("Updating view")
+            await this.base_map.init_view({
+                // We filter out lazy loading layers in case center is "auto"
+                ol_layers: this.get_ol_layers({ filter_lazy: true }),
+                animate: false,
             })
-        })
+        }
+        this.spinner.hide()
     }
 
-    async update_data(data) {
+    async update_data(data, options = {}) {
+        const { update_coords = true, layers = [] } = options
         try {
             // Deserialize data
             this.spinner.update_message("Deserializing data")
             let deserialized_data = {}
-            for (let k in data) {
-                deserialized_data[k] = deserialize_data(data[k])
+            if (data["store"] !== undefined && data["layers"] !== undefined) {
+                // Content-addressed data store sent by pylifemap
+                deserialized_data = deserialize_store(data)
+            } else {
+                for (let k in data) {
+                    deserialized_data[k] = deserialize_data(data[k])
+                }
+            }
+            // Update coordinates, unless layers data have been computed from the data
+            // currently served by lifemap-back
+            let refreshed_layers = new Set()
+            if (update_coords && (await this.is_data_outdated())) {
+                this.spinner.update_message("Getting up-to-date taxids coordinates")
+                refreshed_layers = await update_coordinates(deserialized_data, layers)
             }
-            // Update coordinates
-            this.spinner.update_message("Getting up-to-date taxids coordinates")
-            await update_coordinates(deserialized_data)
+            this.refreshed_layers = refreshed_layers
             this.data = deserialized_data
+            this.kernel_layers = data["kernel_layers"] ?? []
+            // Manifest of lazy loading layers exported as static tiles
+            if (data["lazy_tiles"] !== undefined) {
+                const response = await fetch(data["lazy_tiles"])
+                this.base_map.static_tiles = (await response.json()).layers
+            }
+            this.assets = data["assets"] ?? {}
         } catch (e) {
             this.error_message.show_message(e)
             console.error(e)
         }
     }
 
+    async is_data_outdated() {
+        if (this.data_version === undefined || this.data_version === null) {
+            return true
+        }
+        return (await get_data_version()) !== this.data_version
+    }
+
     async update_layers(layers_def, color_ranges) {
         try {
             this.dispose_ol_layers()
@@ -189,6 +224,23 @@ export class Lifemap {
             if (layer_data.length == 0) {
                 return undefined
             }
+            // Fall back to browser lazy loading if layer data are not kept in the kernel
+            if (l.options?.lazy_source == "kernel" && !this.kernel_layers.includes(layer_id)) {
+                l = { ...l, options: { ...l.options, lazy_source: "browser" } }
+            }
+            if (
+                l.options?.lazy_source == "static" &&
+                this.base_map.static_tiles[layer_id] === undefined
+            ) {
+                l = { ...l, options: { ...l.options, lazy_source: "browser" } }
+            }
+            // Offsets tables don't match refreshed data anymore, all rows are then scanned
+            if (
+                this.refreshed_layers.has(layer_id) &&
+                l.options?.lazy_offsets !== undefined
+            ) {
+                l = { ...l, options: { ...l.options, lazy_offsets: undefined } }
+            }
 
             switch (l.layer) {
                 // Deck.gl layers
@@ -262,7 +314,8 @@ export class Lifemap {
                         layer_id,
                         this.base_map,
                         layer_data,
-                        l.options ?? {}
+                        l.options ?? {},
+                        this.assets
                     )
                 default:
                     throw new Error(`Invalid layer type: ${l.layer}`)
@@ -1,5 +1,6 @@
 import { boundingExtent } from "ol/extent"
 import { inAndOut } from "ol/easing"
+import { column_values, is_columnar, take_rows } from "./data/columns"
 
 // Lifemap backend URL
 export const LIFEMAP_BACK_URL = "https://lifemap-back.univ-lyon1.fr"
@@ -16,6 +17,11 @@ export const LUCA_LON = 0
 export const LUCA_LAT = -4.226497
 export const LUCA_ZOOM = 5
 export const MAP_EXTENT = [-74.203515625, -33.7091796875, 68.003515625, 35.1091796875]
+// Half size of the EPSG:3857 world extent
+export const WORLD_HALF_SIZE = 20037508.342789244
+
+// Maximum number of kernel lazy loading tiles kept in cache
+export const LAZY_TILES_CACHE_SIZE = 256
 
 // Default color schemes
 export const DEFAULT_NUM_SCHEME = "viridis"
@@ -33,6 +39,9 @@ export function stringify_scale(scale) {
 
 // Check if column is the name of a column of data
 export function is_data_column(data, column) {
+    if (is_columnar(data)) {
+        return typeof column === "string" && data.columns[column] !== undefined
+    }
     return typeof column === "string" && Object.keys(data[0]).includes(column)
 }
 
@@ -40,13 +49,14 @@ export function is_data_column(data, column) {
 // Any column which is not numerical or is numerical with fewer
 // than 10 different values is considered categorical
 export function is_categorical_column(data, column) {
-    const test_value = data[0][column]
-    if ((typeof data[0][column] == "number") & !Number.isInteger(test_value)) {
+    const values = column_values(data, column)
+    const test_value = values[0]
+    if ((typeof test_value == "number") & !Number.isInteger(test_value)) {
         return false
     }
     if (
-        ["number", "bigint"].includes(typeof data[0][column]) &
-        ([...new Set(data.map((d) => d[column]))].length > 10)
+        ["number", "bigint"].includes(typeof test_value) &
+        ([...new Set(values)].length > 10)
     ) {
         return false
     }
@@ -102,3 +112,43 @@ export function generate_hash(string) {
     }
     return hash
 }
+
+// Zoom range of each level of precomputed grids or clusters. Each level is displayed
+// for view zooms greater than the previous level zoom, and lower or equal to its own
+// zoom, the last level being displayed for all finer zooms.
+export function levels_zoom_ranges(zooms) {
+    return zooms.map((zoom, i) => [
+        i == 0 ? -Infinity : zooms[i - 1],
+        i == zooms.length - 1 ? Infinity : zoom,
+    ])
+}
+
+// Get the rows of layer data with a given column value. Binary attributes data (see
+// `table_attributes`) must be sorted by this column: each attribute is then sliced
+// without copy.
+export function filter_data_rows(data, column, value) {
+    if (is_columnar(data)) {
+        let indices = []
+        data.columns[column].forEach((d, i) => {
+            if (d == value) {
+                indices.push(i)
+            }
+        })
+        return take_rows(data, indices)
+    }
+    if (data.attributes === undefined) {
+        return data.filter((d) => d[column] == value)
+    }
+    const values = data.attributes[column]
+    let start = values.indexOf(value)
+    let end = values.lastIndexOf(value) + 1
+    if (start == -1) {
+        start = end = 0
+    }
+    let attributes = {}
+    for (const [name, array] of Object.entries(data.attributes)) {
+        const size = array.length / data.length
+        attributes[name] = array.subarray(start * size, end * size)
+    }
+    return { length: end - start, attributes }
+}
@@ -1,11 +1,119 @@
 import { Lifemap } from "../../packages/lifemap-js/index.js"
 
-// Data value change callback
-async function _onDataLayersChanged(model, lifemap) {
-    let data = () => model.get("data")
+// Get widget data. If layers data are pending, request them from the kernel, which
+// sends them back as binary buffers, one custom message per data store entry or chunk.
+// Each received message is acknowledged, so that the kernel can send the next ones.
+// on_partial_data is called with incomplete data when an overview of every layer has been
+// received, then each time the number of received chunks doubles.
+function _getData(model, on_partial_data = undefined) {
+    const data = model.get("data")
+    const pending = data.pending ?? []
+    if (pending.length == 0) {
+        return Promise.resolve(data)
+    }
+    return new Promise((resolve) => {
+        let chunks = {}
+        let n_chunks = {}
+        let n_received = 0
+        let next_checkpoint = pending.length
+        const get_store = () => {
+            let store = { ...data.store }
+            for (let key in chunks) {
+                store[key] = { serialized: true, chunks: Object.values(chunks[key]) }
+            }
+            return store
+        }
+        const on_message = (msg, buffers) => {
+            if (msg.type != "layer_data" || !pending.includes(msg.key)) {
+                return
+            }
+            model.send({ type: "ack", key: msg.key, index: msg.index })
+            chunks[msg.key] = chunks[msg.key] ?? {}
+            if (chunks[msg.key][msg.index] !== undefined) {
+                return
+            }
+            const buffer = buffers[0]
+            chunks[msg.key][msg.index] = {
+                index: msg.index,
+                value: new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength),
+            }
+            n_chunks[msg.key] = msg.n_chunks
+            n_received += 1
+
+            const complete = pending.every(
+                (key) =>
+                    chunks[key] !== undefined &&
+                    Object.keys(chunks[key]).length == n_chunks[key]
+            )
+            if (complete) {
+                model.off("msg:custom", on_message)
+                resolve({ ...data, store: get_store() })
+                return
+            }
+            const overview = pending.every((key) => chunks[key] !== undefined)
+            if (on_partial_data !== undefined && overview && n_received >= next_checkpoint) {
+                next_checkpoint = n_received * 2
+                on_partial_data({ ...data, store: get_store() })
+            }
+        }
+        model.on("msg:custom", on_message)
+        model.send({ type: "request_data" })
+    })
+}
+
+// Update lifemap with widget data, displaying partial data while they are received
+async function _updateLifemap(model, lifemap) {
     let layers = () => model.get("layers")
     let color_ranges = () => model.get("color_ranges")
-    lifemap.update({ data: data(), layers: layers(), color_ranges: color_ranges() })
+    let updating = Promise.resolve()
+    const on_partial_data = (data) => {
+        updating = updating.then(() =>
+            lifemap.update({
+                data: data,
+                layers: layers(),
+                color_ranges: color_ranges(),
+                update_coords: false,
+            })
+        )
+    }
+    const data = await _getData(model, on_partial_data)
+    await updating
+    await lifemap.update({ data: data, layers: layers(), color_ranges: color_ranges() })
+}
+
+// Create a function querying the kernel for the rows of a kernel lazy loading layer
+// in a map tile. It returns a promise of the Arrow IPC bytes of the rows.
+function _createLazyTileFetcher(model) {
+    const view_id = Math.random().toString(16).substring(2)
+    let request_counter = 0
+    let pending = new Map()
+    model.on("msg:custom", (msg, buffers) => {
+        if (msg.type != "lazy_tile" || !pending.has(msg.request_id)) {
+            return
+        }
+        const resolve = pending.get(msg.request_id)
+        pending.delete(msg.request_id)
+        const buffer = buffers[0]
+        resolve(new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength))
+    })
+    return (layer_id, tile, max_zoom) =>
+        new Promise((resolve) => {
+            request_counter += 1
+            const request_id = `${view_id}-${request_counter}`
+            pending.set(request_id, resolve)
+            model.send({
+                type: "lazy_tile",
+                request_id: request_id,
+                layer: layer_id,
+                tile: tile,
+                max_zoom: max_zoom,
+            })
+        })
+}
+
+// Data value change callback
+async function _onDataLayersChanged(model, lifemap) {
+    await _updateLifemap(model, lifemap)
 }
 
 // Width value change callback
@@ -23,14 +131,11 @@ function _onHeightChanged(model, lifemap) {
 export default {
     initialize({ model }) {},
 
-    render({ model, el }) {
+    async render({ model, el }) {
         // Traitlets
         let width = () => model.get("width")
         let height = () => model.get("height")
-        let data = () => model.get("data")
-        let layers = () => model.get("layers")
         let options = () => model.get("options")
-        let color_ranges = () => model.get("color_ranges")
 
         // Add container div
         const container = document.createElement("div")
@@ -40,9 +145,11 @@ export default {
         let lifemap_options = options()
         lifemap_options.width = width()
         lifemap_options.height = height()
+        lifemap_options.fetch_lazy_tile = _createLazyTileFetcher(model)
 
         let lifemap = new Lifemap(container, lifemap_options)
-        lifemap.update({ data: data(), layers: layers(), color_ranges: color_ranges() })
+        lifemap.spinner.show("Receiving data")
+        _updateLifemap(model, lifemap)
 
         // Add traitlets change callback
         model.on("change:data", () => _onDataLayersChanged(model, lifemap))
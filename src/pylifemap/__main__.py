@@ -0,0 +1,62 @@
+"""
+Command line interface.
+
+Usage:
+
+    python -m pylifemap batch SPEC DATA --partition-col COL --output-dir DIR
+"""
+
+import argparse
+import sys
+
+from pylifemap.batch import BATCH_FORMATS, run_batch
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run the command line interface.
+
+    Parameters
+    ----------
+    argv : list[str] | None, optional
+        Command line arguments. If `None`, use `sys.argv`. By default `None`.
+
+    Returns
+    -------
+    int
+        Exit status, 1 if any map could not be rendered.
+    """
+    parser = argparse.ArgumentParser(prog="python -m pylifemap", description="Lifemap visualizations.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    batch = subparsers.add_parser(
+        "batch",
+        help="render one map for each partition of a parquet dataset",
+        description="Render one map for each partition of a parquet dataset, with a pool of processes.",
+    )
+    batch.add_argument("spec", help="JSON map spec file, with Lifemap options, layers and output options")
+    batch.add_argument("data", help="parquet file, directory or glob pattern")
+    batch.add_argument("--partition-col", required=True, help="column whose values define the partitions")
+    batch.add_argument("--output-dir", required=True, help="directory of the outputs")
+    batch.add_argument(
+        "--format", choices=list(BATCH_FORMATS), default=None, help="override the spec output format"
+    )
+    batch.add_argument("--workers", type=int, default=None, help="number of processes (default: processors)")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run_batch(
+            args.spec,
+            args.data,
+            args.partition_col,
+            args.output_dir,
+            output_format=args.format,
+            workers=args.workers,
+            progress=sys.stderr,
+        )
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"error: {e}\n")
+    return 1 if any(r["error"] is not None for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
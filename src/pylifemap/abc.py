@@ -21,6 +21,9 @@ class LifemapABC(ABC):
         self._layers_data = {}
         self._color_ranges = {}
         self._has_deck_layers = False
+        # Serialized layers data and icons assets of created widgets, reset when layers change
+        self._serialized_data = {}
+        self._icons_assets = None
 
     def __repr__(self) -> str:
         # Override default __repr__ to avoid very long and slow text output
@@ -33,8 +36,8 @@ class LifemapABC(ABC):
         """
         Process a layer options dictionary.
 
-        The method increments layer counter, generates a layer id and deletes a `self`
-        option.
+        The method increments layer counter, generates a layer id, deletes a `self`
+        option and resets the serialized layers data and icons assets caches.
 
         Parameters
         ----------
@@ -47,6 +50,8 @@ class LifemapABC(ABC):
             Processed dictionary.
         """
         self._layers_counter += 1
+        self._serialized_data = {}
+        self._icons_assets = None
         layer_id = f"layer{self._layers_counter}"
         del options["self"]
         if options["data"] is not None:
@@ -0,0 +1,282 @@
+"""
+Batch generation of maps, one for each partition of a dataset.
+"""
+
+import inspect
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import TextIO
+
+import polars as pl
+
+from pylifemap.data.workers import workers_environment
+from pylifemap.lifemap import Lifemap
+
+# Output formats, and their file name suffix
+BATCH_FORMATS = {"html": ".html", "directory": "", "png": ".png"}
+
+
+def load_spec(spec: dict | str | Path) -> dict:
+    """
+    Load and check a map spec.
+
+    A map spec is a dictionary with an `"options"` dictionary of `Lifemap` arguments, a
+    `"layers"` list of layers, each one being a dictionary with a `"layer"` type (such
+    as `"points"`) and the arguments of the corresponding layer method, and an
+    `"output"` dictionary with a `"format"` (`"html"`, `"directory"` or `"png"`) and
+    the arguments of `save()` or `to_png()`.
+
+    Parameters
+    ----------
+    spec : dict | str | Path
+        Map spec, or path to a JSON map spec file.
+
+    Returns
+    -------
+    dict
+        Map spec, with default options and output format.
+
+    Raises
+    ------
+    ValueError
+        If the spec has unknown entries, layer types or arguments, or an unknown output
+        format.
+    """
+    if not isinstance(spec, dict):
+        spec = json.loads(Path(spec).read_text())
+    unknown = set(spec) - {"options", "layers", "output"}
+    if unknown:
+        msg = f"unknown map spec entries: {sorted(unknown)}"
+        raise ValueError(msg)
+    options = spec.get("options", {})
+    layers = spec.get("layers", [])
+    output = {"format": "html", **spec.get("output", {})}
+
+    def check_arguments(fn, name: str, kwargs: dict) -> None:
+        try:
+            inspect.signature(fn).bind(None, **kwargs)
+        except TypeError as e:
+            msg = f"invalid {name} arguments: {e}"
+            raise ValueError(msg) from e
+
+    check_arguments(Lifemap.__init__, "Lifemap", options)
+    for layer in layers:
+        kwargs = {k: v for k, v in layer.items() if k != "layer"}
+        method = getattr(Lifemap, f"layer_{layer.get('layer')}", None)
+        if method is None:
+            msg = f"unknown layer type: {layer.get('layer')}"
+            raise ValueError(msg)
+        check_arguments(method, f"layer_{layer['layer']}", kwargs)
+    output_format = output.pop("format")
+    if output_format not in BATCH_FORMATS:
+        msg = f"output format must be one of {tuple(BATCH_FORMATS)}"
+        raise ValueError(msg)
+    if "mode" in output:
+        msg = "output save mode is given by the output format"
+        raise ValueError(msg)
+    check_arguments(
+        Lifemap.to_png if output_format == "png" else Lifemap.save, "output", {"path": "", **output}
+    )
+    return {"options": options, "layers": layers, "output": {"format": output_format, **output}}
+
+
+def output_name(value: object) -> str:
+    """
+    Get the output file name of a partition, without suffix.
+
+    Parameters
+    ----------
+    value : object
+        Partition value.
+
+    Returns
+    -------
+    str
+        Partition value, with characters other than letters, digits, dots and hyphens
+        replaced by underscores.
+    """
+    return re.sub(r"[^\w.-]", "_", "null" if value is None else str(value))
+
+
+def render_partition(task: tuple) -> tuple[int, float]:
+    """
+    Render the map of a partition.
+
+    Parameters
+    ----------
+    task : tuple
+        Map spec, parquet source, partition column, partition value and output path,
+        as generated by `run_batch`.
+
+    Returns
+    -------
+    tuple[int, float]
+        Number of partition rows, and rendering time in seconds.
+    """
+    spec, source, partition_col, value, path = task
+    start = time.perf_counter()
+    d = pl.scan_parquet(source).filter(pl.col(partition_col).eq_missing(value)).collect()
+    m = Lifemap(d, **spec["options"])
+    for layer in spec["layers"]:
+        m = getattr(m, f"layer_{layer['layer']}")(**{k: v for k, v in layer.items() if k != "layer"})
+    output = dict(spec["output"])
+    output_format = output.pop("format")
+    if output_format == "png":
+        m.to_png(path, **output)
+    else:
+        m.save(path, mode=output_format, **output)
+    return d.height, time.perf_counter() - start
+
+
+def run_batch(
+    spec: dict | str | Path,
+    source: str | Path,
+    partition_col: str,
+    output_dir: str | Path,
+    *,
+    output_format: str | None = None,
+    workers: int | None = None,
+    progress: TextIO | None = None,
+) -> list[dict]:
+    """
+    Render one map for each partition of a parquet dataset.
+
+    Partitions are rendered concurrently by a pool of processes, each one reading its
+    partition rows from `source`.
+
+    Parameters
+    ----------
+    spec : dict | str | Path
+        Map spec, or path to a JSON map spec file. See `load_spec`.
+    source : str | Path
+        Parquet file, directory or glob pattern. Hive partitioned directories are
+        supported.
+    partition_col : str
+        Name of the column whose values define the partitions.
+    output_dir : str | Path
+        Directory of the outputs, named after the partition values.
+    output_format : str | None, optional
+        If given, overrides the spec output format. By default `None`.
+    workers : int | None, optional
+        Number of processes. If 1, partitions are rendered in the current process. If
+        `None`, use the number of processors. Polars threads and raster heatmap tiles
+        rendering processes are split between processes. By default `None`.
+    progress : TextIO | None, optional
+        Stream where the progress and a timing summary are written, such as
+        `sys.stderr`. If `None`, nothing is written. By default `None`.
+
+    Returns
+    -------
+    list[dict]
+        For each partition, in partition values order, its `"partition"` value, output
+        `"path"`, number of `"rows"`, rendering time in `"seconds"` and `"error"`
+        message, `None` if rendered successfully.
+
+    Raises
+    ------
+    ValueError
+        If the spec is invalid, or if several partitions have the same output name.
+    """
+    spec = load_spec(spec)
+    if output_format is not None:
+        spec["output"]["format"] = output_format
+        spec = load_spec(spec)
+    suffix = BATCH_FORMATS[spec["output"]["format"]]
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    values = pl.scan_parquet(source).select(pl.col(partition_col).unique()).collect().to_series()
+    values = values.sort(nulls_last=True).to_list()
+    paths = [output_dir / f"{output_name(value)}{suffix}" for value in values]
+    if len(set(paths)) < len(paths):
+        msg = f"several {partition_col} values have the same output file name"
+        raise ValueError(msg)
+    tasks = [(spec, str(source), partition_col, v, p) for v, p in zip(values, paths, strict=True)]
+    results = [
+        {"partition": v, "path": p, "rows": None, "seconds": None, "error": None}
+        for v, p in zip(values, paths, strict=True)
+    ]
+
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    start = time.perf_counter()
+
+    def report(i: int, outcome: tuple | BaseException) -> None:
+        if isinstance(outcome, BaseException):
+            results[i]["error"] = str(outcome) or type(outcome).__name__
+        else:
+            results[i]["rows"], results[i]["seconds"] = outcome
+        if progress is not None:
+            done = sum(r["rows"] is not None or r["error"] is not None for r in results)
+            r = results[i]
+            status = (
+                f"failed: {r['error']}"
+                if r["error"] is not None
+                else f"{r['rows']} rows in {r['seconds']:.2f} s"
+            )
+            print(f"[{done}/{len(results)}] {r['partition']}: {status}", file=progress)
+
+    if workers == 1:
+        for i, task in enumerate(tasks):
+            try:
+                report(i, render_partition(task))
+            except Exception as e:
+                # Errors of a partition must not stop the rendering of the other ones
+                report(i, e)
+    else:
+        # Worker processes are spawned rather than forked, polars being not fork safe
+        context = multiprocessing.get_context("spawn")
+        with (
+            workers_environment(workers),
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor,
+        ):
+            futures = {executor.submit(render_partition, task): i for i, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                try:
+                    report(futures[future], future.result())
+                except Exception as e:
+                    # Errors of a partition must not stop the rendering of the other ones
+                    report(futures[future], e)
+
+    if progress is not None:
+        print(batch_summary(results, time.perf_counter() - start, workers), file=progress)
+    return results
+
+
+def batch_summary(results: list, elapsed: float, workers: int) -> str:
+    """
+    Summarize the timings of a batch.
+
+    Parameters
+    ----------
+    results : list
+        Partitions results, see `run_batch`.
+    elapsed : float
+        Batch duration, in seconds.
+    workers : int
+        Number of processes.
+
+    Returns
+    -------
+    str
+        Summary text.
+    """
+    rendered = [r for r in results if r["error"] is None]
+    processes = "process" if workers == 1 else "processes"
+    lines = [f"{len(rendered)} of {len(results)} maps rendered in {elapsed:.2f} s with {workers} {processes}"]
+    if rendered:
+        times = [r["seconds"] for r in rendered]
+        slowest = max(rendered, key=lambda r: r["seconds"])
+        lines.append(
+            f"{sum(r['rows'] for r in rendered)} rows, {sum(times) / len(times):.2f} s per map, "
+            f"slowest {slowest['partition']} in {slowest['seconds']:.2f} s"
+        )
+    failed = [r for r in results if r["error"] is not None]
+    if failed:
+        lines.append(f"{len(failed)} failed:")
+        lines.extend(f"- {r['partition']}: {r['error']}" for r in failed)
+    return "\n".join(lines)
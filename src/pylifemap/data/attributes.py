@@ -0,0 +1,106 @@
+"""
+Binary attributes of deck.gl layers data.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.geo import project_to_4326
+from pylifemap.utils import TAXID_COL
+
+
+def positions_attribute(d: pl.DataFrame, coords: Sequence[tuple[str, str]]) -> pl.Series:
+    """
+    Compute an interleaved positions attribute from EPSG:3857 coordinates columns.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Layer data.
+    coords : Sequence[tuple[str, str]]
+        Names of the x and y columns of each position of a row.
+
+    Returns
+    -------
+    pl.Series
+        "pylifemap_positions" Float32 array series, with the longitude and latitude of
+        each position of a row, in `coords` order.
+    """
+    lonlat = []
+    for x_col, y_col in coords:
+        projected = project_to_4326(d.select(x_col, y_col), x_col=x_col, y_col=y_col)
+        lonlat.extend(projected.get_column(c).to_numpy() for c in (x_col, y_col))
+    values = (
+        np.column_stack(lonlat).astype(np.float32)
+        if d.height > 0
+        else np.empty((0, 2 * len(coords)), np.float32)
+    )
+    return pl.Series("pylifemap_positions", values, dtype=pl.Array(pl.Float32, 2 * len(coords)))
+
+
+def points_attributes(d: pl.DataFrame, *, weight: str | None = None) -> pl.DataFrame:
+    """
+    Convert points data to deck.gl binary attributes.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Points data, with EPSG:3857 "pylifemap_x" and "pylifemap_y" columns, as returned
+        by `points_data` or `density_grids`.
+    weight : str | None, optional
+        Name of a points weights column. By default `None`.
+
+    Returns
+    -------
+    pl.DataFrame
+        Data with "pylifemap_positions" longitudes and latitudes, a Float32
+        "pylifemap_weights" column if `weight` is not `None`, and the "pylifemap_taxid"
+        and "pylifemap_grid_zoom" columns of `d`, if any.
+    """
+    columns = [c for c in (TAXID_COL, "pylifemap_grid_zoom") if c in d.columns]
+    attributes = d.select(*columns, positions_attribute(d, [("pylifemap_x", "pylifemap_y")]))
+    if weight is not None:
+        weights = d.get_column(weight).cast(pl.Float32).fill_null(0).fill_nan(0)
+        attributes = attributes.with_columns(weights.alias("pylifemap_weights"))
+    return attributes
+
+
+def arcs_attributes(
+    d: pl.DataFrame, *, width: str | None = None, width_range: Sequence = (1, 20)
+) -> pl.DataFrame:
+    """
+    Convert arcs data to deck.gl binary attributes.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Arcs data, as returned by `arcs_data`.
+    width : str | None, optional
+        Name of a numerical column to compute arcs widths from. Values are linearly
+        scaled to `width_range`. By default `None`.
+    width_range : Sequence, optional
+        Min and max arcs widths. By default (1, 20).
+
+    Returns
+    -------
+    pl.DataFrame
+        Data with "pylifemap_taxid" and "pylifemap_dest_taxid" columns,
+        "pylifemap_positions" source and destination longitudes and latitudes, and a
+        Float32 "pylifemap_widths" column if `width` is not `None`.
+    """
+    positions = positions_attribute(
+        d, [("pylifemap_x", "pylifemap_y"), ("pylifemap_dest_x", "pylifemap_dest_y")]
+    )
+    attributes = d.select(TAXID_COL, "pylifemap_dest_taxid", positions)
+    if width is not None:
+        values = d.get_column(width).cast(pl.Float64)
+        min_value, max_value = values.min(), values.max()
+        min_range, max_range = width_range
+        extent = max_value - min_value if min_value is not None and max_value > min_value else 1
+        widths = (values - min_value) / extent * (max_range - min_range) + min_range
+        attributes = attributes.with_columns(
+            widths.fill_null(min_range).cast(pl.Float32).alias("pylifemap_widths")
+        )
+    return attributes
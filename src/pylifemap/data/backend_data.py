@@ -1,3 +1,6 @@
+import os
+from pathlib import Path
+
 import polars as pl
 import requests
 from platformdirs import user_cache_path
@@ -11,6 +14,30 @@ BACKEND_DATA_DIR = user_cache_path("pylifemap") / "data"
 BACKEND_DATA_PATH = BACKEND_DATA_DIR / "lmdata.parquet"
 BACKEND_DATA_TIMESTAMP_PATH = BACKEND_DATA_DIR / "timestamp.txt"
 
+# Environment variable giving the directory of a read-only data snapshot, loaded instead
+# of the cached data without checking the remote version
+BACKEND_SNAPSHOT_ENV = "PYLIFEMAP_BACKEND_SNAPSHOT"
+
+
+def fetch_backend_version() -> int | None:
+    """
+    Get the version of the data currently served by lifemap-back.
+
+    The version is the data timestamp, a small text file, so that checking it is much
+    cheaper than querying taxids coordinates.
+
+    Returns
+    -------
+    int | None
+        Remote data timestamp, or `None` if it could not be fetched.
+    """
+    try:
+        response = requests.get(BACKEND_DATA_TIMESTAMP_URL, timeout=10)
+        response.raise_for_status()
+        return int(response.text)
+    except (requests.RequestException, ValueError):
+        return None
+
 
 class BackendData:
     """
@@ -28,6 +55,12 @@ class BackendData:
         Sets up the data storage and checks for updates upon instantiation.
         """
         self._data: pl.DataFrame | None = None
+        self.version: int | None = None
+
+        snapshot = os.environ.get(BACKEND_SNAPSHOT_ENV)
+        if snapshot:
+            self.load_snapshot(Path(snapshot))
+            return
 
         BACKEND_DATA_DIR.mkdir(exist_ok=True, parents=True)
 
@@ -36,7 +69,62 @@ class BackendData:
             self.download_timestamp()
             self.download_data()
 
+        self.load()
+
+    def load(self) -> None:
+        """
+        Load the local data and its version.
+        """
         self._data = pl.read_parquet(BACKEND_DATA_PATH)
+        self.version = int(BACKEND_DATA_TIMESTAMP_PATH.read_text())
+
+    def save_snapshot(self, directory: Path) -> None:
+        """
+        Save the loaded data and its version as a snapshot.
+
+        Data are written as an uncompressed Arrow IPC file, so that processes loading
+        the snapshot memory-map it and share its pages instead of each holding a copy.
+
+        Parameters
+        ----------
+        directory : Path
+            Snapshot directory.
+        """
+        directory.mkdir(exist_ok=True, parents=True)
+        self.data.write_ipc(directory / "lmdata.arrow", compression="uncompressed")
+        (directory / "timestamp.txt").write_text(str(self.version))
+
+    def load_snapshot(self, directory: Path) -> None:
+        """
+        Load data and its version from a snapshot saved by `save_snapshot`.
+
+        Parameters
+        ----------
+        directory : Path
+            Snapshot directory.
+        """
+        # Uncompressed IPC files are memory-mapped by polars
+        self._data = pl.read_ipc(directory / "lmdata.arrow")
+        self.version = int((directory / "timestamp.txt").read_text())
+
+    def refresh(self) -> bool:
+        """
+        Download and load the latest data if lifemap-back serves a new version.
+
+        Returns
+        -------
+        bool
+            True if a new data version has been loaded, False otherwise, including when
+            the remote version could not be fetched.
+        """
+        remote_version = fetch_backend_version()
+        if remote_version is None or remote_version == self.version:
+            return False
+        # Download data first, so that an interrupted download is retried next time
+        self.download_data()
+        self.download_timestamp()
+        self.load()
+        return True
 
     def lmdata_ok(self) -> bool:
         """
@@ -95,4 +183,8 @@ class BackendData:
 
 
 # Load lifemap-back NCBI data
-BACKEND_DATA = BackendData().data
+BACKEND = BackendData()
+BACKEND_DATA = BACKEND.data
+# Version of the data used to compute layers data. BACKEND.version may be more recent
+# after a refresh.
+BACKEND_DATA_VERSION = BACKEND.version
@@ -0,0 +1,265 @@
+"""
+Spatial clustering of points layers data.
+"""
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+from pylifemap.utils import TAXID_COL
+
+# Size of map tiles, in pixels
+TILE_SIZE = 256
+# Finest clustering zoom level
+MAX_CLUSTER_ZOOM = 22
+# A level is kept only if it has at most this ratio of the clusters of the previous
+# kept level, so that the whole pyramid has less rows than the points data
+MAX_CLUSTERS_RATIO = 0.5
+
+
+def spread_bits_64(v: np.ndarray) -> np.ndarray:
+    """
+    Insert a zero bit between each of the 32 lower bits of integers.
+
+    Parameters
+    ----------
+    v : np.ndarray
+        Integers array.
+
+    Returns
+    -------
+    np.ndarray
+        uint64 array with the bits of `v` at even positions.
+    """
+    v = v.astype(np.uint64) & np.uint64(0x00000000FFFFFFFF)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def clusters_pyramid(
+    d: pl.DataFrame,
+    *,
+    cluster_size: int = 64,
+    fill: str | None = None,
+    fill_cat: bool = False,
+    radius: str | None = None,
+) -> tuple[pl.DataFrame, list[int]]:
+    """
+    Compute a pyramid of grid clusters of points, one level per integer zoom.
+
+    At zoom level `z`, points are binned on a regular grid over their EPSG:3857
+    coordinates, with cells of `cluster_size` pixels. Each cell with at least one point
+    gives a cluster located at its points centroid, with the number of points in a
+    "pylifemap_count" column.
+
+    Points are sorted once by the Morton code of their finest level cell, so that the
+    cells of every coarser level are contiguous ranges of this order. Each level is
+    then aggregated from the previous kept one. Levels which don't divide the number of
+    clusters of the previous kept level by at least 2 are skipped, the frontend
+    displaying the next finer level instead.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Points data, with EPSG:3857 "pylifemap_x" and "pylifemap_y" columns.
+    cluster_size : int, optional
+        Size of the grid cells, in pixels. By default 64.
+    fill : str | None, optional
+        Name of a fill values column. If `fill_cat` is `False`, clusters get the mean of
+        their points values, otherwise the most frequent value. By default `None`.
+    fill_cat : bool, optional
+        Whether `fill` values are categorical. By default `False`.
+    radius : str | None, optional
+        Name of a radius values column. Clusters get the sum of their points values.
+        By default `None`.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, list[int]]
+        Clusters of all kept levels, coarsest first, with a "pylifemap_cluster_zoom"
+        column giving their level, followed by the original points as last level, and
+        the sorted list of levels. Clusters taxids are null unless they contain a single
+        point.
+
+    Raises
+    ------
+    ValueError
+        If `cluster_size` is not a positive integer.
+    """
+    if cluster_size < 1:
+        msg = "cluster_size must be a positive integer"
+        raise ValueError(msg)
+
+    n = d.height
+    cell = cluster_size * 2 * WORLD_HALF_SIZE / TILE_SIZE / 2**MAX_CLUSTER_ZOOM
+    x = d.get_column("pylifemap_x").to_numpy()
+    y = d.get_column("pylifemap_y").to_numpy()
+    ix = np.floor((x + WORLD_HALF_SIZE) / cell).astype(np.int64)
+    iy = np.floor((y + WORLD_HALF_SIZE) / cell).astype(np.int64)
+    keys = spread_bits_64(ix) | (spread_bits_64(iy) << np.uint64(1))
+    order = np.argsort(keys, kind="stable")
+
+    # Sums of the current kept level clusters values, starting with one cluster per point
+    current = {
+        "key": keys[order],
+        "count": np.ones(n, dtype=np.int64),
+        "x_sum": x[order],
+        "y_sum": y[order],
+    }
+    if radius is not None:
+        current["radius_sum"] = d.get_column(radius).cast(pl.Float64).fill_null(0).to_numpy()[order]
+    categories = None
+    if fill is not None and fill_cat:
+        # Number of points of each category in each cluster
+        categories = pl.DataFrame(
+            {"key": keys, "count": np.ones(n, dtype=np.int64), fill: d.get_column(fill)}
+        )
+        categories = categories.drop_nulls(fill)
+    elif fill is not None:
+        values = d.get_column(fill).cast(pl.Float64)
+        current["fill_sum"] = values.fill_null(0).to_numpy()[order]
+        current["fill_n"] = values.is_not_null().cast(pl.Int64).to_numpy()[order]
+    current["taxid"] = d.get_column(TAXID_COL).to_numpy()[order]
+    current_zoom = MAX_CLUSTER_ZOOM
+
+    levels = []
+    for zoom in range(MAX_CLUSTER_ZOOM, -1, -1):
+        if n == 0:
+            break
+        # Clusters of the next finer kept level in the same cell are contiguous
+        level_keys = current["key"] >> np.uint64(2 * (current_zoom - zoom))
+        starts = np.flatnonzero(np.r_[True, level_keys[1:] != level_keys[:-1]])
+        if len(starts) > MAX_CLUSTERS_RATIO * len(level_keys):
+            continue
+        current = {
+            k: v[starts] if k in ("key", "taxid") else np.add.reduceat(v, starts) for k, v in current.items()
+        }
+        current["key"] = level_keys[starts]
+        if categories is not None:
+            categories = categories.with_columns(pl.col("key") // 4 ** (current_zoom - zoom))
+            categories = categories.group_by("key", fill).agg(pl.col("count").sum())
+        current_zoom = zoom
+        levels.append(level_clusters(current, zoom, fill=fill, categories=categories, radius=radius))
+
+    # Coarsest level first, original points are displayed after the finest level
+    levels.reverse()
+    zooms = [level.get_column("pylifemap_cluster_zoom")[0] for level in levels]
+    raw_zoom = zooms[-1] + 1 if levels else 0
+    raw = d.with_columns(
+        pl.lit(1, dtype=pl.Int64).alias("pylifemap_count"),
+        pl.lit(raw_zoom, dtype=pl.Int8).alias("pylifemap_cluster_zoom"),
+    )
+    return pl.concat([*levels, raw], how="diagonal_relaxed"), [*zooms, raw_zoom]
+
+
+def level_clusters(
+    sums: dict,
+    zoom: int,
+    *,
+    fill: str | None,
+    categories: pl.DataFrame | None,
+    radius: str | None,
+) -> pl.DataFrame:
+    """
+    Convert the aggregated values of a clusters level to clusters data.
+
+    Parameters
+    ----------
+    sums : dict
+        Clusters keys, first taxid and sums of values, as computed by
+        `clusters_pyramid`.
+    zoom : int
+        Clusters level.
+    fill : str | None
+        Name of the fill values column.
+    categories : pl.DataFrame | None
+        Number of points of each category in each cluster, if fill values are
+        categorical.
+    radius : str | None
+        Name of the radius values column.
+
+    Returns
+    -------
+    pl.DataFrame
+        Clusters data.
+    """
+    count = sums["count"]
+    columns = {
+        TAXID_COL: pl.Series(sums["taxid"]).set(pl.Series(count > 1), None),
+        "pylifemap_x": sums["x_sum"] / count,
+        "pylifemap_y": sums["y_sum"] / count,
+        "pylifemap_count": count,
+    }
+    if radius is not None:
+        columns[radius] = sums["radius_sum"]
+    if fill is not None and categories is None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns[fill] = pl.Series(sums["fill_sum"] / sums["fill_n"]).set(
+                pl.Series(sums["fill_n"] == 0), None
+            )
+    clusters = pl.DataFrame(columns).with_columns(pl.lit(zoom, dtype=pl.Int8).alias("pylifemap_cluster_zoom"))
+    if categories is not None:
+        # Most frequent category of each cluster
+        modes = categories.group_by("key").agg(
+            pl.col(fill).sort_by("count", fill, descending=[True, False]).first()
+        )
+        clusters = (
+            clusters.with_columns(pl.Series("key", sums["key"]))
+            .join(modes, on="key", how="left", maintain_order="left")
+            .drop("key")
+        )
+    return clusters
+
+
+def density_grids(
+    d: pl.DataFrame,
+    *,
+    cell_size: int = 4,
+    weight: str | None = None,
+) -> tuple[pl.DataFrame, list[int]]:
+    """
+    Compute multi-resolution density grids of points.
+
+    Grids are the levels of a clusters pyramid (see `clusters_pyramid`), without the
+    original points level, so that the result size depends on the number of non empty
+    cells rather than on the number of points. If no level has less cells than half
+    the number of points, the original points are kept as a single level.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Points data, with EPSG:3857 "pylifemap_x" and "pylifemap_y" columns.
+    cell_size : int, optional
+        Size of the grid cells, in pixels. By default 4.
+    weight : str | None, optional
+        Name of a points weights column. If `None`, each point has a weight of 1.
+        By default `None`.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, list[int]]
+        Non empty cells of all levels, coarsest first, located at their points centroid,
+        with their total weight in a "pylifemap_weight" column and their level in a
+        "pylifemap_grid_zoom" column, and the sorted list of levels.
+    """
+    columns = [TAXID_COL, "pylifemap_x", "pylifemap_y", *([weight] if weight is not None else [])]
+    grids, zooms = clusters_pyramid(d.select(columns), cluster_size=cell_size, radius=weight)
+    if len(zooms) > 1:
+        grids = grids.filter(pl.col("pylifemap_cluster_zoom") != zooms[-1])
+        zooms = zooms[:-1]
+    return (
+        grids.select(
+            "pylifemap_x",
+            "pylifemap_y",
+            pl.col(weight or "pylifemap_count").cast(pl.Float64).fill_null(0).alias("pylifemap_weight"),
+            pl.col("pylifemap_cluster_zoom").alias("pylifemap_grid_zoom"),
+        ),
+        zooms,
+    )
@@ -1,8 +1,13 @@
+import numpy as np
 import polars as pl
 from pyproj import Transformer
 
 # Projection from GPS (longitude, latitude) to Web mercator
 TRANSFORMER = Transformer.from_crs(4326, 3857, always_xy=True)
+# Projection from Web mercator to GPS (longitude, latitude)
+INVERSE_TRANSFORMER = Transformer.from_crs(3857, 4326, always_xy=True)
+# Earth radius of the Web mercator projection, in meters
+EARTH_RADIUS = 6378137.0
 
 
 def project_to_3857(data: pl.DataFrame, x_col: str, y_col: str) -> pl.DataFrame:
@@ -29,3 +34,143 @@ def project_to_3857(data: pl.DataFrame, x_col: str, y_col: str) -> pl.DataFrame:
         pl.Series(y_proj).alias(y_col),
     )
     return data
+
+
+def unwrapped_to_3857(lon: np.ndarray, lat: np.ndarray) -> tuple:
+    """
+    Project longitudes and latitudes to EPSG 3857 (Web Mercator) as the frontend
+    `fromLonLat` function does.
+
+    Unlike `project_to_3857`, longitudes beyond ±180° are not wrapped, so that points
+    computed past the antimeridian, such as arcs control points, keep their side.
+    Latitudes are clamped to the Web Mercator extent.
+
+    Parameters
+    ----------
+    lon : np.ndarray
+        Longitudes, in degrees.
+    lat : np.ndarray
+        Latitudes, in degrees.
+
+    Returns
+    -------
+    tuple
+        x and y coordinates arrays.
+    """
+    half_size = EARTH_RADIUS * np.pi
+    x = EARTH_RADIUS * np.radians(lon)
+    with np.errstate(divide="ignore"):
+        y = EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, np.clip(y, -half_size, half_size)
+
+
+def project_to_4326(data: pl.DataFrame, x_col: str, y_col: str) -> pl.DataFrame:
+    """
+    Reproject two x,y columns in a DataFrame from EPSG 3857 (Web Mercator) to EPSG 4326 (GPS)
+
+    Parameters
+    ----------
+    data : pl.DataFrame
+        Source DataFrame
+    x_col : str
+        Name of column with x coordinates
+    y_col : str
+        Name of column with y coordinates
+
+    Returns
+    -------
+    pl.DataFrame
+        DataFrame with reprojected columns
+    """
+    lon, lat = INVERSE_TRANSFORMER.transform(data.get_column(x_col), data.get_column(y_col))
+    data = data.with_columns(
+        pl.Series(lon).alias(x_col),
+        pl.Series(lat).alias(y_col),
+    )
+    return data
+
+
+def destination(lon: np.ndarray, lat: np.ndarray, distance: np.ndarray, bearing: np.ndarray) -> tuple:
+    """
+    Compute the destination points from origin points, angular distances and bearings
+    on a sphere, as turf.js `destination`.
+
+    Parameters
+    ----------
+    lon : np.ndarray
+        Origin longitudes, in radians.
+    lat : np.ndarray
+        Origin latitudes, in radians.
+    distance : np.ndarray
+        Angular distances, in radians.
+    bearing : np.ndarray
+        Bearings, in radians.
+
+    Returns
+    -------
+    tuple
+        Destination longitudes and latitudes, in radians.
+    """
+    dest_lat = np.arcsin(np.sin(lat) * np.cos(distance) + np.cos(lat) * np.sin(distance) * np.cos(bearing))
+    dest_lon = lon + np.arctan2(
+        np.sin(bearing) * np.sin(distance) * np.cos(lat),
+        np.cos(distance) - np.sin(lat) * np.sin(dest_lat),
+    )
+    return dest_lon, dest_lat
+
+
+def arcs_bbox(
+    x: pl.Series, y: pl.Series, dest_x: pl.Series, dest_y: pl.Series, sharpness: float = 1.1
+) -> tuple:
+    """
+    Compute the bounding boxes of the arcs drawn by the frontend between source and
+    destination points, in EPSG 4326 (GPS) coordinates.
+
+    As `compute_arc` in the frontend arcs layer, each arc is a turf.js bezier spline going
+    through its source point, a center point shifted perpendicularly from the middle of
+    the arc, and its destination point. A bezier spline lies inside the convex hull of
+    its control points, so the bounding box of these points is returned.
+
+    Parameters
+    ----------
+    x : pl.Series
+        Source points longitudes.
+    y : pl.Series
+        Source points latitudes.
+    dest_x : pl.Series
+        Destination points longitudes.
+    dest_y : pl.Series
+        Destination points latitudes.
+    sharpness : float, optional
+        Bezier spline sharpness, by default 1.1.
+
+    Returns
+    -------
+    tuple
+        Arrays of bounding boxes minimum longitudes, minimum latitudes, maximum
+        longitudes and maximum latitudes.
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(s.to_numpy()) for s in (x, y, dest_x, dest_y))
+    # Haversine angular distance and initial bearing
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    distance = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    bearing = np.arctan2(
+        np.sin(lon2 - lon1) * np.cos(lat2),
+        np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1),
+    )
+    mid_lon, mid_lat = destination(lon1, lat1, distance / 2, bearing)
+    center_lon, center_lat = destination(mid_lon, mid_lat, 0.15 * distance, bearing - np.pi / 2)
+
+    points = [np.degrees(v) for v in (lon1, lat1, center_lon, center_lat, lon2, lat2)]
+    p0, p1, p2 = np.stack(points[0:2]), np.stack(points[2:4]), np.stack(points[4:6])
+    # Spline control points around the center point
+    c0 = (p0 + p1) / 2
+    c1 = (p1 + p2) / 2
+    shift = p1 - (c0 + c1) / 2
+    ctrl0 = (1 - sharpness) * p1 + sharpness * (c0 + shift)
+    ctrl1 = (1 - sharpness) * p1 + sharpness * (c1 + shift)
+
+    hull = np.stack([p0, p1, p2, ctrl0, ctrl1])
+    xmin, ymin = hull.min(axis=0)
+    xmax, ymax = hull.max(axis=0)
+    return xmin, ymin, xmax, ymax
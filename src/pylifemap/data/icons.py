@@ -0,0 +1,535 @@
+"""
+Icons fetching, on-disk caching and widget asset store.
+"""
+
+import base64
+import hashlib
+import io
+import math
+import mimetypes
+import os
+import threading
+import warnings
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from platformdirs import user_cache_path
+from requests.adapters import HTTPAdapter
+
+from pylifemap.utils import mime_type_from_url
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    # Pillow is optional, icons are then sent to the widget at their original size
+    Image = None
+
+ICONS_CACHE_DIR = user_cache_path("pylifemap") / "icons"
+# Maximum total size of cached icons, in bytes
+ICONS_CACHE_MAX_SIZE = 100 * 1024 * 1024
+# Maximum number of icons fetched at once
+ICONS_FETCH_WORKERS = 8
+# Connection and read timeouts of icons requests, in seconds
+ICONS_FETCH_TIMEOUT = (5, 10)
+# Screen pixel ratio for which icons are downscaled, so that they stay sharp on high
+# density displays
+ICONS_PIXEL_RATIO = 2
+# Maximum width of the icons sprite atlas, in pixels
+ICONS_ATLAS_MAX_WIDTH = 2048
+# Space between icons in the sprite atlas, in pixels
+ICONS_ATLAS_PADDING = 1
+
+
+class IconsCache:
+    """
+    On-disk content cache of fetched icons, indexed by URL.
+
+    Each icon is stored in a file named after the hash of its URL, with an extension
+    giving its MIME type, so icons whose MIME type has no such extension are not cached.
+    When the total size of cached icons exceeds `max_size`, the least recently used ones
+    are removed.
+    """
+
+    def __init__(self, path: Path, max_size: int = ICONS_CACHE_MAX_SIZE):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        path : Path
+            Cache directory, created when the first icon is stored.
+        max_size : int, optional
+            Maximum total size of cached icons, in bytes. By default
+            `ICONS_CACHE_MAX_SIZE`.
+        """
+        self.path = Path(path)
+        self.max_size = max_size
+
+    def _files(self, url: str) -> list[Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return list(self.path.glob(f"{key}.*")) if self.path.exists() else []
+
+    def get(self, url: str) -> tuple[bytes, str] | None:
+        """
+        Get a cached icon.
+
+        Parameters
+        ----------
+        url : str
+            Icon URL.
+
+        Returns
+        -------
+        tuple[bytes, str] | None
+            Icon content and MIME type, or `None` if the icon is not cached.
+        """
+        for file in self._files(url):
+            mime_type, _ = mimetypes.guess_type(file.name)
+            if mime_type is None:
+                continue
+            try:
+                content = file.read_bytes()
+                # File modification time is its last access time
+                os.utime(file)
+            except OSError:
+                continue
+            return content, mime_type
+        return None
+
+    def put(self, url: str, content: bytes, mime_type: str) -> None:
+        """
+        Store an icon in the cache.
+
+        Parameters
+        ----------
+        url : str
+            Icon URL.
+        content : bytes
+            Icon content.
+        mime_type : str
+            Icon MIME type.
+        """
+        extension = mimetypes.guess_extension(mime_type)
+        # The MIME type must be found again from the file extension
+        if extension is None or mimetypes.guess_type(f"icon{extension}")[0] != mime_type:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        key = hashlib.sha256(url.encode()).hexdigest()
+        file = self.path / f"{key}{extension}"
+        # Write to a temporary file first so that concurrent readers never see partial icons
+        tmp_file = self.path / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_file.write_bytes(content)
+        tmp_file.replace(file)
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used icons until the cache size is below `max_size`.
+        """
+        if not self.path.exists():
+            return
+        files = []
+        for file in self.path.iterdir():
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        total_size = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files, key=lambda f: f[0]):
+            if total_size <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            total_size -= size
+
+
+# Default icons cache
+ICONS_CACHE = IconsCache(ICONS_CACHE_DIR)
+
+
+def icon_mime_type(url: str, content_type: str | None = None) -> str:
+    """
+    Get the MIME type of an icon.
+
+    Parameters
+    ----------
+    url : str
+        Icon URL or file path.
+    content_type : str | None, optional
+        HTTP Content-Type header of the icon response, used if the URL has no known image
+        extension. By default `None`.
+
+    Returns
+    -------
+    str
+        Icon MIME type.
+
+    Raises
+    ------
+    ValueError
+        If the MIME type can be found neither from the URL nor from `content_type`.
+    """
+    try:
+        return mime_type_from_url(url.split("?", maxsplit=1)[0])
+    except ValueError:
+        mime_type = (content_type or "").split(";", maxsplit=1)[0].strip().lower()
+        if not mime_type.startswith("image/"):
+            raise
+        return mime_type
+
+
+def fetch_icon(url: str, session: requests.Session, cache: IconsCache | None, timeout: tuple | float) -> str:
+    """
+    Get the data URI of an icon.
+
+    Parameters
+    ----------
+    url : str
+        Icon data URI, HTTP(S) URL or file path.
+    session : requests.Session
+        HTTP session used to download the icon.
+    cache : IconsCache | None
+        Cache of downloaded icons. If `None`, icons are always downloaded.
+    timeout : tuple | float
+        HTTP requests timeout, in seconds.
+
+    Returns
+    -------
+    str
+        Icon data URI.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the icon is a file which doesn't exist.
+    ValueError
+        If the icon could not be downloaded or its type is unknown.
+    """
+    if url.startswith("data:"):
+        return url
+    if url.startswith("http"):
+        cached = cache.get(url) if cache is not None else None
+        if cached is not None:
+            content, mime_type = cached
+        else:
+            response = session.get(url, timeout=timeout)
+            if response.status_code != 200:  # noqa: PLR2004
+                msg = f"HTTP {response.status_code}"
+                raise ValueError(msg)
+            content = response.content
+            mime_type = icon_mime_type(url, response.headers.get("Content-Type"))
+            if cache is not None:
+                cache.put(url, content, mime_type)
+    else:
+        img_file = Path(url)
+        if not img_file.exists():
+            msg = "file not found"
+            raise FileNotFoundError(msg)
+        content = img_file.read_bytes()
+        mime_type = icon_mime_type(url)
+    return f"data:{mime_type};base64,{base64.b64encode(content).decode('utf-8')}"
+
+
+def fetch_icons(
+    urls: Iterable[str],
+    *,
+    workers: int = ICONS_FETCH_WORKERS,
+    timeout: tuple | float = ICONS_FETCH_TIMEOUT,
+    cache: IconsCache | None = ICONS_CACHE,
+) -> dict[str, str]:
+    """
+    Get the data URIs of icons.
+
+    Unique icons are fetched concurrently by a pool of threads sharing an HTTP session,
+    downloaded icons being stored in an on-disk cache.
+
+    Parameters
+    ----------
+    urls : Iterable[str]
+        Icons data URIs, HTTP(S) URLs or file paths. `None` values are ignored.
+    workers : int, optional
+        Maximum number of icons fetched at once. By default `ICONS_FETCH_WORKERS`.
+    timeout : tuple | float, optional
+        HTTP requests connection and read timeouts, in seconds. By default
+        `ICONS_FETCH_TIMEOUT`.
+    cache : IconsCache | None, optional
+        Cache of downloaded icons. If `None`, icons are always downloaded. By default
+        `ICONS_CACHE`, in the user cache directory.
+
+    Returns
+    -------
+    dict[str, str]
+        Data URI of each icon, indexed by URL.
+
+    Raises
+    ------
+    FileNotFoundError
+        If any icon is a file which doesn't exist, with the reason of each failure.
+    ValueError
+        If any other icon could not be fetched, with the reason of each failure.
+    """
+    unique_urls = list(dict.fromkeys(url for url in urls if url is not None))
+    results, errors = {}, {}
+    missing_file = False
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {url: executor.submit(fetch_icon, url, session, cache, timeout) for url in unique_urls}
+            for url, future in futures.items():
+                try:
+                    results[url] = future.result()
+                except (OSError, ValueError) as e:
+                    errors[url] = str(e) or type(e).__name__
+                    missing_file = missing_file or isinstance(e, FileNotFoundError)
+    if cache is not None:
+        cache.evict()
+    if errors:
+        report = "\n".join(f"- {url}: {error}" for url, error in errors.items())
+        msg = f"Failed to fetch {len(errors)} of {len(unique_urls)} icons:\n{report}"
+        if missing_file:
+            raise FileNotFoundError(msg)
+        raise ValueError(msg)
+    return results
+
+
+def icon_url_to_data_uri(image_url: str) -> str:
+    """
+    Get the data URI of an icon.
+
+    Parameters
+    ----------
+    image_url : str
+        Icon data URI, HTTP(S) URL or file path.
+
+    Returns
+    -------
+    str
+        Icon data URI.
+    """
+    return fetch_icons([image_url], workers=1)[image_url]
+
+
+def parse_data_uri(data_uri: str) -> tuple[bytes, str]:
+    """
+    Get the content and MIME type of a base64 data URI.
+
+    Parameters
+    ----------
+    data_uri : str
+        Data URI, as returned by `fetch_icons`.
+
+    Returns
+    -------
+    tuple[bytes, str]
+        Decoded content and MIME type.
+
+    Raises
+    ------
+    ValueError
+        If `data_uri` is not a base64 data URI.
+    """
+    header, _, content = data_uri.partition(",")
+    if not header.startswith("data:") or not header.endswith(";base64"):
+        msg = f"{data_uri[:40]} is not a base64 data URI"
+        raise ValueError(msg)
+    return base64.b64decode(content), header.removeprefix("data:").removesuffix(";base64")
+
+
+def load_icon_image(content: bytes) -> "Image.Image | None":
+    """
+    Decode a raster icon with Pillow.
+
+    Parameters
+    ----------
+    content : bytes
+        Icon content.
+
+    Returns
+    -------
+    Image.Image | None
+        Decoded icon, or `None` if Pillow is not installed or if the icon is a vector or
+        animated image which should be sent as is.
+    """
+    if Image is None:
+        return None
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except (OSError, Image.DecompressionBombError):
+        return None
+    if getattr(image, "n_frames", 1) > 1:
+        return None
+    return image
+
+
+def icon_display_size(
+    size: tuple[int, int], width: int | None, height: int | None, scale: float | None
+) -> tuple[float, float]:
+    """
+    Compute the size at which an icon is displayed.
+
+    Parameters
+    ----------
+    size : tuple[int, int]
+        Icon original width and height, in pixels.
+    width : int | None
+        Layer `width` option.
+    height : int | None
+        Layer `height` option.
+    scale : float | None
+        Layer `scale` option.
+
+    Returns
+    -------
+    tuple[float, float]
+        Displayed width and height, in CSS pixels.
+    """
+    icon_width, icon_height = size
+    if width is not None and height is not None:
+        return float(width), float(height)
+    if width is not None:
+        return float(width), icon_height * width / icon_width
+    if height is not None:
+        return icon_width * height / icon_height, float(height)
+    if scale is not None:
+        return icon_width * scale, icon_height * scale
+    return float(icon_width), float(icon_height)
+
+
+def encode_png(image: "Image.Image") -> bytes:
+    """
+    Encode an image as PNG.
+
+    Parameters
+    ----------
+    image : Image.Image
+        Image to encode.
+
+    Returns
+    -------
+    bytes
+        PNG content.
+    """
+    output = io.BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+def pack_atlas(images: dict[str, "Image.Image"]) -> tuple[bytes | None, dict[str, list[int]]]:
+    """
+    Pack icons into a sprite atlas.
+
+    Icons are sorted by decreasing height and placed on shelves of at most
+    `ICONS_ATLAS_MAX_WIDTH` pixels. Icons larger than this width are not packed.
+
+    Parameters
+    ----------
+    images : dict[str, Image.Image]
+        Icons, indexed by asset key.
+
+    Returns
+    -------
+    tuple[bytes | None, dict[str, list[int]]]
+        PNG content of the atlas, or `None` if no icon has been packed, and x offset,
+        y offset, width and height of each packed icon in the atlas, indexed by asset key.
+    """
+    offsets = {}
+    x, y, shelf_height, atlas_width = 0, 0, 0, 0
+    for key, image in sorted(images.items(), key=lambda item: -item[1].height):
+        if image.width > ICONS_ATLAS_MAX_WIDTH:
+            continue
+        if x + image.width > ICONS_ATLAS_MAX_WIDTH:
+            x, y, shelf_height = 0, y + shelf_height + ICONS_ATLAS_PADDING, 0
+        offsets[key] = [x, y, image.width, image.height]
+        x += image.width + ICONS_ATLAS_PADDING
+        shelf_height = max(shelf_height, image.height)
+        atlas_width = max(atlas_width, x - ICONS_ATLAS_PADDING)
+    if not offsets:
+        return None, {}
+    atlas = Image.new("RGBA", (atlas_width, y + shelf_height), (0, 0, 0, 0))
+    for key, (x, y, _, _) in offsets.items():
+        atlas.paste(images[key].convert("RGBA"), (x, y))
+    return encode_png(atlas), offsets
+
+
+def icons_assets(layers: list[dict], *, atlas: bool = False) -> tuple[list[dict], dict]:
+    """
+    Build the widget icons asset store from the icons of its layers.
+
+    The data URIs of the icons fetched by each icons layer, in its `icons_cache` option,
+    are replaced by references to a single store of unique icons, indexed by content hash,
+    so that icons used by several layers are sent once. If Pillow is installed, raster
+    icons are downscaled to the largest size the layer can display them at, taking
+    `ICONS_PIXEL_RATIO` into account, and can be packed into a sprite atlas.
+
+    Parameters
+    ----------
+    layers : list[dict]
+        Widget layers definitions.
+    atlas : bool, optional
+        If `True` and Pillow is installed, pack raster icons into a single PNG sprite
+        atlas. By default `False`.
+
+    Returns
+    -------
+    tuple[list[dict], dict]
+        Layers definitions, where icons layers `icons_cache` option is replaced by an
+        `icons` option giving the asset key and displayed size of each icon, and asset
+        store, with an "icons" dictionary of icons data URIs indexed by asset key, and
+        an "atlas" data URI with the "offsets" of its icons.
+    """
+    if atlas and Image is None:
+        msg = "Pillow must be installed to pack icons into a sprite atlas, icons are sent separately."
+        warnings.warn(msg, stacklevel=0)
+    contents = {}
+    images = {}
+    res = []
+    for layer in layers:
+        options = layer["options"]
+        if layer["layer"] != "icons" or "icons_cache" not in options:
+            res.append(layer)
+            continue
+        new_options = {k: v for k, v in options.items() if k != "icons_cache"}
+        icons = {}
+        for url, data_uri in options["icons_cache"].items():
+            content, mime_type = parse_data_uri(data_uri)
+            image = load_icon_image(content)
+            size = None
+            if image is not None:
+                size = icon_display_size(image.size, options["width"], options["height"], options["scale"])
+                max_size = tuple(
+                    min(current, max(1, math.ceil(s * ICONS_PIXEL_RATIO)))
+                    for current, s in zip(image.size, size, strict=True)
+                )
+                if max_size != image.size:
+                    image = image.resize(max_size, Image.Resampling.LANCZOS)
+                    content, mime_type = encode_png(image), "image/png"
+                size = [round(s, 2) for s in size]
+            key = hashlib.sha256(content).hexdigest()[:16]
+            contents[key] = (content, mime_type)
+            if image is not None:
+                images[key] = image
+            name = url
+            if url == options["icon"] and url.startswith("data:"):
+                # Don't repeat inline icons in the layer options
+                new_options["icon"] = name = f"asset:{key}"
+            icons[name] = {"key": key, "size": size}
+        new_options["icons"] = icons
+        res.append({**layer, "options": new_options})
+
+    atlas_content, offsets = pack_atlas(images) if atlas and images else (None, {})
+    store = {
+        "icons": {
+            key: f"data:{mime_type};base64,{base64.b64encode(content).decode('utf-8')}"
+            for key, (content, mime_type) in contents.items()
+            if key not in offsets
+        },
+        "atlas": None,
+        "offsets": offsets,
+    }
+    if atlas_content is not None:
+        store["atlas"] = f"data:image/png;base64,{base64.b64encode(atlas_content).decode('utf-8')}"
+    return res, store
@@ -0,0 +1,207 @@
+"""
+Precomputed placement of text layers labels.
+"""
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.clustering import TILE_SIZE
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+from pylifemap.utils import TAXID_COL
+
+# Finest zoom level of labels placement
+MAX_LABEL_ZOOM = 22
+# Estimated mean width of a character, relative to the font size
+CHAR_WIDTH_RATIO = 0.6
+# Estimated line height, relative to the font size
+LINE_HEIGHT_RATIO = 1.2
+# Labels vertical offset and stroke width, in pixels, as drawn by the frontend
+LABEL_OFFSET_Y = 10
+LABEL_STROKE_WIDTH = 2
+
+
+def label_zooms(
+    d: pl.DataFrame,
+    *,
+    text: str,
+    font_size: int = 12,
+    priority: str | None = None,
+    min_zooms: pl.Series | None = None,
+) -> pl.Series:
+    """
+    Compute the minimal zoom level at which each label is displayed without colliding
+    with other labels.
+
+    Labels extents are estimated from their font size and number of characters. At each
+    integer zoom level, labels not displayed yet are considered by decreasing priority,
+    and a label is displayed if its extent doesn't intersect the one of an already
+    displayed label. As distances between labels grow with the zoom level, a label
+    displayed at zoom `z` is displayed at every finer zoom level.
+
+    At each zoom level, labels colliding with labels displayed at a coarser zoom are
+    first discarded with a vectorized join on a grid of the size of the largest label,
+    so that only the remaining labels are placed one by one.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Data frame with "pylifemap_taxid", and EPSG:3857 "pylifemap_x" and "pylifemap_y"
+        columns.
+    text : str
+        Name of the labels text column.
+    font_size : int, optional
+        Labels font size, in pixels. By default 12.
+    priority : str | None, optional
+        Name of a numeric column. Labels with higher values are displayed first. If
+        `None`, labels of taxa with a lower zoom level in the tree are displayed first.
+        By default `None`.
+    min_zooms : pl.Series | None, optional
+        Minimal zoom level of each label, for example when lazy loading hides some
+        labels at coarser zooms. By default `None`.
+
+    Returns
+    -------
+    pl.Series
+        Labels zoom levels, as a "pylifemap_label_zoom" Int8 series. Labels still not
+        displayed at `MAX_LABEL_ZOOM` get a zoom level of `MAX_LABEL_ZOOM + 1`, empty
+        labels get their minimal zoom level.
+    """
+    n = d.height
+    texts = d.get_column(text).cast(pl.String)
+    widths = (
+        texts.str.len_chars().fill_null(0).to_numpy() * CHAR_WIDTH_RATIO * font_size
+    ) + 2 * LABEL_STROKE_WIDTH
+    height = LINE_HEIGHT_RATIO * font_size + 2 * LABEL_STROKE_WIDTH
+    # Labels anchors in pixels at zoom 0
+    px = (d.get_column("pylifemap_x").to_numpy() + WORLD_HALF_SIZE) / (2 * WORLD_HALF_SIZE) * TILE_SIZE
+    py = (WORLD_HALF_SIZE - d.get_column("pylifemap_y").to_numpy()) / (2 * WORLD_HALF_SIZE) * TILE_SIZE
+    first_zooms = np.zeros(n, dtype=np.int64) if min_zooms is None else np.clip(min_zooms.to_numpy(), 0, None)
+
+    # Labels indices in priority order, ties broken by tree zoom then taxid
+    if "pylifemap_zoom" in d.columns:
+        tree_zooms = d.get_column("pylifemap_zoom")
+    else:
+        tree_zooms = d.select(TAXID_COL).join(
+            BACKEND_DATA.select(pl.col("taxid").alias(TAXID_COL), "pylifemap_zoom"),
+            on=TAXID_COL,
+            how="left",
+            maintain_order="left",
+        )["pylifemap_zoom"]
+    sort_keys = [d.get_column(TAXID_COL).to_numpy(), tree_zooms.fill_null(0).to_numpy()]
+    if priority is not None:
+        sort_keys.append(-d.get_column(priority).cast(pl.Float64).fill_null(-np.inf).to_numpy())
+    order = np.lexsort(sort_keys)
+
+    result = np.full(n, MAX_LABEL_ZOOM + 1, dtype=np.int8)
+    empty = texts.fill_null("").str.len_chars().to_numpy() == 0
+    result[empty] = np.minimum(first_zooms[empty], MAX_LABEL_ZOOM + 1)
+    remaining = order[~empty[order]]
+    placed = np.empty(0, dtype=np.int64)
+    cell_w = widths.max() if n > 0 else 1
+
+    for zoom in range(MAX_LABEL_ZOOM + 1):
+        candidates = remaining[first_zooms[remaining] <= zoom]
+        if len(candidates) == 0:
+            if len(remaining) == 0:
+                break
+            continue
+        scale = 2**zoom
+        cx = px * scale
+        top = py * scale + LABEL_OFFSET_Y
+        if len(placed) > 0:
+            collisions = colliding(
+                candidates, placed, cx=cx, top=top, widths=widths, height=height, cell_w=cell_w
+            )
+            candidates = candidates[~collisions]
+
+        # Greedy placement of the remaining candidates, checking only labels placed at
+        # this zoom level
+        grid = {}
+        accepted = []
+        for i in candidates:
+            ix, iy = int(cx[i] // cell_w), int(top[i] // height)
+            collides = False
+            for gx in (ix - 1, ix, ix + 1):
+                for gy in (iy - 1, iy, iy + 1):
+                    for j in grid.get((gx, gy), ()):
+                        if abs(cx[i] - cx[j]) < (widths[i] + widths[j]) / 2 and abs(top[i] - top[j]) < height:
+                            collides = True
+                            break
+                    if collides:
+                        break
+                if collides:
+                    break
+            if not collides:
+                grid.setdefault((ix, iy), []).append(i)
+                accepted.append(i)
+
+        accepted = np.array(accepted, dtype=np.int64)
+        result[accepted] = zoom
+        placed = np.concatenate([placed, accepted])
+        remaining = remaining[result[remaining] > MAX_LABEL_ZOOM]
+
+    return pl.Series("pylifemap_label_zoom", result)
+
+
+def colliding(
+    candidates: np.ndarray,
+    placed: np.ndarray,
+    *,
+    cx: np.ndarray,
+    top: np.ndarray,
+    widths: np.ndarray,
+    height: float,
+    cell_w: float,
+) -> np.ndarray:
+    """
+    Find the candidate labels intersecting at least one placed label.
+
+    Parameters
+    ----------
+    candidates : np.ndarray
+        Candidate labels indices.
+    placed : np.ndarray
+        Placed labels indices.
+    cx : np.ndarray
+        Labels horizontal centers, in pixels.
+    top : np.ndarray
+        Labels top positions, in pixels.
+    widths : np.ndarray
+        Labels widths, in pixels.
+    height : float
+        Labels height, in pixels.
+    cell_w : float
+        Grid cells width, at least the largest label width.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask of the colliding candidates.
+    """
+
+    def boxes(indices: np.ndarray) -> pl.DataFrame:
+        return pl.DataFrame(
+            {
+                "index": indices,
+                "ix": np.floor(cx[indices] / cell_w).astype(np.int64),
+                "iy": np.floor(top[indices] / height).astype(np.int64),
+                "cx": cx[indices],
+                "top": top[indices],
+                "w": widths[indices],
+            }
+        )
+
+    # Labels can only intersect labels of the same or of a neighbouring grid cell
+    neighbours = pl.DataFrame({"dx": [-1, -1, -1, 0, 0, 0, 1, 1, 1], "dy": [-1, 0, 1] * 3})
+    pairs = (
+        boxes(candidates)
+        .join(neighbours, how="cross")
+        .with_columns(pl.col("ix") + pl.col("dx"), pl.col("iy") + pl.col("dy"))
+        .join(boxes(placed), on=["ix", "iy"], suffix="_placed")
+        .filter(
+            ((pl.col("cx") - pl.col("cx_placed")).abs() < (pl.col("w") + pl.col("w_placed")) / 2)
+            & ((pl.col("top") - pl.col("top_placed")).abs() < height)
+        )
+    )
+    return np.isin(candidates, pairs.get_column("index").to_numpy())
@@ -1,8 +1,18 @@
+import numpy as np
 import polars as pl
 
 from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.clustering import TILE_SIZE, spread_bits_64
 
 ROOT_ZOOM_LEVEL = 4
+# Half size of the EPSG:3857 world extent
+WORLD_HALF_SIZE = 20037508.342789244
+# Number of bits per coordinate in Morton codes
+MORTON_BITS = 16
+# Maximum size class of lines and arcs bounding boxes
+MAX_SIZE_CLASS = 24
+# Finest zoom level of features budgets
+MAX_BUDGET_ZOOM = 22
 
 
 def propagate_parent_zoom(d: pl.DataFrame) -> pl.DataFrame:
@@ -43,3 +53,277 @@ def propagate_parent_zoom(d: pl.DataFrame) -> pl.DataFrame:
     result = d.select(pl.all().exclude("pylifemap_zoom")).join(parent_zooms, how="left", on="pylifemap_taxid")
 
     return result
+
+
+def spread_bits(v: np.ndarray) -> np.ndarray:
+    """
+    Insert a zero bit between each of the 16 lower bits of integers.
+
+    Parameters
+    ----------
+    v : np.ndarray
+        Integers array.
+
+    Returns
+    -------
+    np.ndarray
+        uint32 array with the bits of `v` at even positions.
+    """
+    v = v.astype(np.uint32) & 0x0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def morton_codes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Compute the Morton (Z-order) codes of EPSG:3857 coordinates.
+
+    Coordinates are quantized on a `2**MORTON_BITS` grid over the world extent, and the
+    bits of both grid indices are interleaved. The frontend computes the same codes to
+    binary search rows in a bounding box, so both implementations must stay identical.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        x coordinates.
+    y : np.ndarray
+        y coordinates.
+
+    Returns
+    -------
+    np.ndarray
+        uint32 Morton codes.
+    """
+    n_cells = 2**MORTON_BITS
+    qx = np.clip(
+        np.floor((np.asarray(x) + WORLD_HALF_SIZE) / (2 * WORLD_HALF_SIZE) * n_cells), 0, n_cells - 1
+    )
+    qy = np.clip(
+        np.floor((np.asarray(y) + WORLD_HALF_SIZE) / (2 * WORLD_HALF_SIZE) * n_cells), 0, n_cells - 1
+    )
+    return spread_bits(qx) | (spread_bits(qy) << 1)
+
+
+def sort_lazy_data(d: pl.DataFrame) -> pl.DataFrame:
+    """
+    Sort lazy loading data by decreasing zoom level, then by Morton code of their
+    projected coordinates.
+
+    Rows of each zoom level are then spatially clustered, which allows the frontend to
+    find the rows of a bounding box by binary search, and improves compression of the
+    coordinates columns.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Data frame with "pylifemap_zoom", and EPSG:3857 "pylifemap_x" and "pylifemap_y"
+        columns.
+
+    Returns
+    -------
+    pl.DataFrame
+        Sorted data frame.
+    """
+    morton = pl.Series(
+        morton_codes(d.get_column("pylifemap_x").to_numpy(), d.get_column("pylifemap_y").to_numpy())
+    )
+    return d.sort(
+        [pl.col("pylifemap_zoom"), morton, pl.col("pylifemap_taxid")],
+        descending=[True, False, False],
+        maintain_order=True,
+    )
+
+
+def lazy_offsets(d: pl.DataFrame) -> dict:
+    """
+    Compute the offsets table of data sorted with `sort_lazy_data`.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Sorted data frame with a "pylifemap_zoom" column.
+
+    Returns
+    -------
+    dict
+        Dictionary with a "zooms" entry listing the distinct zoom levels in decreasing
+        order, and an "offsets" entry with the first row index of each zoom level
+        followed by the number of rows.
+    """
+    zooms = d.get_column("pylifemap_zoom").to_numpy()
+    # Zoom levels are sorted in decreasing order, so the first row of a level is where
+    # the zoom level changes
+    starts = np.flatnonzero(np.diff(zooms, prepend=np.inf) != 0)
+    return {
+        "zooms": zooms[starts].tolist(),
+        "offsets": [*starts.tolist(), d.height],
+    }
+
+
+def sort_segments_data(d: pl.DataFrame) -> pl.DataFrame:
+    """
+    Sort lazy loading data of lines or arcs by decreasing zoom level, then by size class
+    and minimum x of their bounding box.
+
+    The size class of a segment is the largest `k <= MAX_SIZE_CLASS` such that its
+    bounding box width is at most the world width divided by `2**k`. In each
+    (zoom level, size class) bucket, the frontend can then find the segments whose
+    bounding box intersects the view by binary search on their minimum x.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Data frame with "pylifemap_zoom", "pylifemap_bbox_xmin" and "pylifemap_bbox_xmax"
+        columns, in EPSG:3857 coordinates.
+
+    Returns
+    -------
+    pl.DataFrame
+        Sorted data frame.
+    """
+    return d.sort(
+        [pl.col("pylifemap_zoom"), segments_size_class(d), pl.col("pylifemap_bbox_xmin")],
+        descending=[True, False, False],
+        maintain_order=True,
+    )
+
+
+def segments_size_class(d: pl.DataFrame) -> pl.Series:
+    """
+    Compute the size classes of segments bounding boxes. See `sort_segments_data`.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Data frame with "pylifemap_bbox_xmin" and "pylifemap_bbox_xmax" columns.
+
+    Returns
+    -------
+    pl.Series
+        Size classes.
+    """
+    width = (d.get_column("pylifemap_bbox_xmax") - d.get_column("pylifemap_bbox_xmin")).to_numpy()
+    with np.errstate(divide="ignore"):
+        size_class = np.floor(np.log2(2 * WORLD_HALF_SIZE / width))
+    return pl.Series("pylifemap_size_class", np.clip(size_class, 0, MAX_SIZE_CLASS).astype(np.int8))
+
+
+def segments_offsets(d: pl.DataFrame) -> dict:
+    """
+    Compute the offsets table of lines or arcs data sorted with `sort_segments_data`.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Sorted data frame.
+
+    Returns
+    -------
+    dict
+        Dictionary with "zooms" and "widths" entries giving the zoom level and maximum
+        bounding box width of each (zoom level, size class) bucket, and an "offsets"
+        entry with the first row index of each bucket followed by the number of rows.
+    """
+    zooms = d.get_column("pylifemap_zoom").to_numpy()
+    size_class = segments_size_class(d).to_numpy()
+    starts = np.flatnonzero((np.diff(zooms, prepend=np.inf) != 0) | (np.diff(size_class, prepend=-1) != 0))
+    return {
+        "zooms": zooms[starts].tolist(),
+        "widths": (2 * WORLD_HALF_SIZE / 2.0 ** size_class[starts]).tolist(),
+        "offsets": [*starts.tolist(), d.height],
+    }
+
+
+def display_zooms(
+    d: pl.DataFrame,
+    *,
+    budget: int,
+    tile_size: int = TILE_SIZE,
+    priority: str | None = None,
+) -> pl.Series:
+    """
+    Compute the minimal display zoom of each row so that no tile holds more than
+    `budget` rows.
+
+    At each integer zoom level `z`, the map is split into tiles of `tile_size` pixels.
+    Rows are considered by decreasing priority, and a row not displayed yet gets a
+    display zoom of `z` if its tile holds less than `budget` rows with a display zoom
+    lower or equal to `z`. As tiles of zoom `z + 1` are included in tiles of zoom `z`,
+    the budget is then respected at every zoom level.
+
+    Rows are sorted once by priority. At each zoom level, the tiles of the remaining
+    rows are given by their finest tile Morton code shifted, and rows are ranked inside
+    their tile with a stable sort, so that each zoom level is a vectorized pass.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Data frame with "pylifemap_taxid", "pylifemap_zoom", and EPSG:3857 "pylifemap_x"
+        and "pylifemap_y" columns.
+    budget : int
+        Maximum number of rows per tile.
+    tile_size : int, optional
+        Size of the tiles, in pixels. By default `TILE_SIZE`.
+    priority : str | None, optional
+        Name of a numeric column. Rows with higher values are displayed first. If `None`,
+        rows with a lower "pylifemap_zoom" are displayed first. By default `None`.
+
+    Returns
+    -------
+    pl.Series
+        Display zooms, as a "pylifemap_zoom" Int8 series. Rows still not displayed at
+        `MAX_BUDGET_ZOOM` get a display zoom of `MAX_BUDGET_ZOOM + 1`.
+
+    Raises
+    ------
+    ValueError
+        If `budget` or `tile_size` is not a positive integer.
+    """
+    if budget < 1:
+        msg = "lazy_budget must be a positive integer"
+        raise ValueError(msg)
+    if tile_size < 1:
+        msg = "lazy_budget_size must be a positive integer"
+        raise ValueError(msg)
+
+    n = d.height
+    cell = tile_size * 2 * WORLD_HALF_SIZE / TILE_SIZE / 2**MAX_BUDGET_ZOOM
+    ix = np.floor((d.get_column("pylifemap_x").to_numpy() + WORLD_HALF_SIZE) / cell).astype(np.int64)
+    iy = np.floor((d.get_column("pylifemap_y").to_numpy() + WORLD_HALF_SIZE) / cell).astype(np.int64)
+    keys = spread_bits_64(ix) | (spread_bits_64(iy) << np.uint64(1))
+
+    # Rows in priority order, ties broken by tree zoom then taxid
+    sort_keys = [d.get_column("pylifemap_taxid").to_numpy(), d.get_column("pylifemap_zoom").to_numpy()]
+    if priority is not None:
+        values = d.get_column(priority).cast(pl.Float64)
+        sort_keys.append(-values.fill_null(-np.inf).to_numpy())
+    order = np.lexsort(sort_keys)
+    keys = keys[order]
+
+    result = np.full(n, MAX_BUDGET_ZOOM + 1, dtype=np.int8)
+    remaining = np.arange(n)
+    placed_keys = np.empty(0, dtype=np.uint64)
+    for zoom in range(MAX_BUDGET_ZOOM + 1):
+        if len(remaining) == 0:
+            break
+        shift = np.uint64(2 * (MAX_BUDGET_ZOOM - zoom))
+        tile_keys, placed_counts = np.unique(placed_keys >> shift, return_counts=True)
+        # Rank of remaining rows inside their tile, stable sort keeps priority order
+        tiles = keys[remaining] >> shift
+        tiles_order = np.argsort(tiles, kind="stable")
+        tiles = tiles[tiles_order]
+        starts = np.flatnonzero(np.r_[True, tiles[1:] != tiles[:-1]])
+        ranks = np.arange(len(tiles)) - np.repeat(starts, np.diff(np.r_[starts, len(tiles)]))
+        # Number of rows already displayed in each tile
+        pos = np.clip(np.searchsorted(tile_keys, tiles), 0, max(len(tile_keys) - 1, 0))
+        counts = np.where(tile_keys[pos] == tiles, placed_counts[pos], 0) if len(tile_keys) > 0 else 0
+        accept = np.zeros(len(remaining), dtype=bool)
+        accept[tiles_order] = ranks < budget - counts
+        result[order[remaining[accept]]] = zoom
+        placed_keys = np.concatenate([placed_keys, keys[remaining[accept]]])
+        remaining = remaining[~accept]
+
+    return pl.Series("pylifemap_zoom", result)
@@ -2,16 +2,19 @@
 Handling of Lifemap objects data.
 """
 
+import hashlib
 import warnings
 
 import pandas as pd
 import polars as pl
 
+from pylifemap.data import memoization
 from pylifemap.data.backend_data import BACKEND_DATA
 from pylifemap.data.mixins.arcs import ArcsDataMixin
 from pylifemap.data.mixins.donuts import DonutsDataMixin
 from pylifemap.data.mixins.lines import LinesDataMixin
 from pylifemap.data.mixins.points import PointsDataMixin
+from pylifemap.data.serialization import column_fingerprint
 from pylifemap.utils import TAXID_COL
 
 # Custom warning message formatting. We use warnings.warn() to display warnings
@@ -80,6 +83,8 @@ class LifemapData(PointsDataMixin, DonutsDataMixin, LinesDataMixin, ArcsDataMixi
         self._data = data
         # Store pandas categories
         self._categories = categories
+        # Columns fingerprints, computed when needed
+        self._fingerprints = {}
 
         # Check for unknown or duplicated taxids
         if check_taxids:
@@ -101,19 +106,52 @@ class LifemapData(PointsDataMixin, DonutsDataMixin, LinesDataMixin, ArcsDataMixi
         """
         return self._data
 
+    def fingerprint(self, columns: list[str]) -> str:
+        """
+        Compute a content fingerprint of data columns.
+
+        Parameters
+        ----------
+        columns : list[str]
+            Columns names.
+
+        Returns
+        -------
+        str
+            Hexadecimal fingerprint, depending on the columns names, types and values.
+        """
+        for col in columns:
+            if col not in self._fingerprints:
+                self._fingerprints[col] = column_fingerprint(self._data.get_column(col))
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self._data.height}:".encode())
+        h.update("".join(self._fingerprints[col] for col in columns).encode())
+        return h.hexdigest()
+
     def get_unknown_taxids(self) -> list:
         """
         Check and returns a list of taxids in user data not found in
         Lifemap data.
 
+        Results are cached in `LAYERS_DATA_CACHE` along with layers data.
+
         Returns
         -------
         list
             Missing taxids
         """
+        cache = memoization.LAYERS_DATA_CACHE
+        key = None
+        if cache is not None:
+            key = memoization.layer_data_key("get_unknown_taxids", self.fingerprint([TAXID_COL]))
+            cached = cache.get(key)
+            if cached is not None:
+                return cached.get_column(TAXID_COL).to_list()
         lmdata = BACKEND_DATA.select("taxid")
         data = self._data.select(TAXID_COL)
         unknown_ids = data.join(lmdata, how="anti", left_on=TAXID_COL, right_on="taxid")
+        if cache is not None:
+            cache.put(key, unknown_ids)
         return unknown_ids.get_column(TAXID_COL).to_list()
 
     def check_unknown_taxids(self, limit: int = 10) -> None:
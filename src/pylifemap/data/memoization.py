@@ -0,0 +1,257 @@
+"""
+Memoization of layers data.
+
+Layers data computed from the same data columns, layer options and Lifemap data version
+are cached, so that re-running a notebook cell doesn't compute them again.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+import polars as pl
+from platformdirs import user_cache_path
+
+from pylifemap.data.backend_data import BACKEND_DATA_VERSION
+from pylifemap.utils import TAXID_COL
+
+# Default on-disk layers data cache directory
+LAYERS_CACHE_DIR = user_cache_path("pylifemap") / "layers"
+# Maximum total estimated size of layers data cached in memory, in bytes
+LAYERS_CACHE_MEMORY_SIZE = 512 * 1024 * 1024
+# Maximum total size of layers data cached on disk, in bytes
+LAYERS_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+
+class LayersDataCache:
+    """
+    Two tiers cache of layers data.
+
+    Layers data are kept in memory, the least recently used ones being dropped when
+    their total estimated size exceeds `memory_size`. If `path` is not `None`, they are
+    also stored on disk as Arrow IPC files, so that they can be reused across sessions.
+    When the total size of these files exceeds `max_size`, the least recently used ones
+    are removed.
+    """
+
+    def __init__(
+        self,
+        memory_size: int = LAYERS_CACHE_MEMORY_SIZE,
+        path: str | Path | None = None,
+        max_size: int = LAYERS_CACHE_MAX_SIZE,
+    ):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        memory_size : int, optional
+            Maximum total estimated size of layers data cached in memory, in bytes. If 0,
+            data are not cached in memory. By default `LAYERS_CACHE_MEMORY_SIZE`.
+        path : str | Path | None, optional
+            On-disk cache directory, created when the first data are stored, such as
+            `LAYERS_CACHE_DIR`. If `None`, data are not cached on disk. By default
+            `None`.
+        max_size : int, optional
+            Maximum total size of layers data cached on disk, in bytes. By default
+            `LAYERS_CACHE_MAX_SIZE`.
+        """
+        self.memory_size = memory_size
+        self.path = Path(path) if path is not None else None
+        self.max_size = max_size
+        self._memory: OrderedDict[str, pl.DataFrame] = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> pl.DataFrame | None:
+        """
+        Get cached layer data.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        pl.DataFrame | None
+            Cached data, or `None` if they are not cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self.path is None:
+            return None
+        file = self.path / f"{key}.arrow"
+        try:
+            data = pl.read_ipc(file)
+            # File modification time is its last access time
+            os.utime(file)
+        except (OSError, pl.exceptions.PolarsError):
+            return None
+        self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: pl.DataFrame) -> None:
+        """
+        Store layer data in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        data : pl.DataFrame
+            Layer data.
+        """
+        self._put_memory(key, data)
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so that concurrent readers never see partial data
+        tmp_file = self.path / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data.write_ipc(tmp_file, compression="lz4")
+        tmp_file.replace(self.path / f"{key}.arrow")
+        self.evict()
+
+    def _put_memory(self, key: str, data: pl.DataFrame) -> None:
+        size = data.estimated_size()
+        if size > self.memory_size:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_used -= self._memory.pop(key).estimated_size()
+            self._memory[key] = data
+            self._memory_used += size
+            while self._memory_used > self.memory_size:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_used -= dropped.estimated_size()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used files until the on-disk cache size is below
+        `max_size`.
+        """
+        if self.path is None or not self.path.exists():
+            return
+        files = []
+        for file in self.path.glob("*.arrow"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        total_size = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files, key=lambda f: f[0]):
+            if total_size <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self) -> None:
+        """
+        Remove all cached layers data, in memory and on disk.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+        if self.path is not None and self.path.exists():
+            for file in self.path.glob("*.arrow"):
+                file.unlink(missing_ok=True)
+
+
+# Default layers data cache, in memory only. If `None`, layers data are not cached.
+LAYERS_DATA_CACHE: LayersDataCache | None = LayersDataCache()
+
+
+def layer_data_key(name: str, fingerprint: str, *args: object, **kwargs: object) -> str:
+    """
+    Compute the cache key of layer data.
+
+    Parameters
+    ----------
+    name : str
+        Name of the method computing the layer data.
+    fingerprint : str
+        Fingerprint of the data columns used to compute the layer data.
+    *args, **kwargs : object
+        Arguments of the method, such as layer options.
+
+    Returns
+    -------
+    str
+        Hexadecimal key, which also depends on the Lifemap data version and on the polars
+        version, as hashes of values may change between polars versions.
+    """
+    arguments = json.dumps([args, kwargs], sort_keys=True, default=repr)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{name}:{fingerprint}:{BACKEND_DATA_VERSION}:{pl.__version__}:".encode())
+    h.update(arguments.encode())
+    return h.hexdigest()
+
+
+def used_columns(data: pl.DataFrame, options: dict, data_columns: tuple | list) -> list[str]:
+    """
+    Get the data columns which layer data may be computed from.
+
+    Parameters
+    ----------
+    data : pl.DataFrame
+        Lifemap data.
+    options : dict
+        Layer options. Options values which are columns names, such as a counts or
+        destination taxids column, are considered used.
+    data_columns : tuple | list
+        Data columns kept in the layer data.
+
+    Returns
+    -------
+    list[str]
+        Used columns, in `data` order: taxids, `data_columns`, columns named by an
+        option value, and already computed `pylifemap_` columns.
+    """
+    names = {TAXID_COL, *data_columns}
+    names.update(v for v in options.values() if isinstance(v, str))
+    return [col for col in data.columns if col in names or col.startswith("pylifemap_")]
+
+
+def memoize_layer_data(method: Callable) -> Callable:
+    """
+    Cache the results of a `LifemapData` layer data method in `LAYERS_DATA_CACHE`.
+
+    Results are indexed by the fingerprint of the data columns used by the method, its
+    arguments and the Lifemap data version, so that computing the same layer from the
+    same data returns the cached result, even from another `LifemapData` object.
+
+    Parameters
+    ----------
+    method : Callable
+        Layer data method, taking an options dictionary and data columns as first
+        arguments.
+
+    Returns
+    -------
+    Callable
+        Memoized method.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, options: dict, data_columns: tuple | list = (), *args, **kwargs) -> pl.DataFrame:
+        cache = LAYERS_DATA_CACHE
+        if cache is None:
+            return method(self, options, data_columns, *args, **kwargs)
+        columns = used_columns(self._data, options, data_columns)
+        fingerprint = self.fingerprint(columns)
+        key = layer_data_key(method.__name__, fingerprint, options, list(data_columns), *args, **kwargs)
+        data = cache.get(key)
+        if data is None:
+            data = method(self, options, data_columns, *args, **kwargs)
+            cache.put(key, data)
+        return data
+
+    return wrapper
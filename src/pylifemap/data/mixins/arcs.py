@@ -3,13 +3,15 @@ from typing import Literal
 import polars as pl
 
 from pylifemap.data.backend_data import BACKEND_DATA
-from pylifemap.data.geo import project_to_3857
-from pylifemap.data.lazy_loading import propagate_parent_zoom
+from pylifemap.data.geo import arcs_bbox, project_to_3857, unwrapped_to_3857
+from pylifemap.data.lazy_loading import propagate_parent_zoom, sort_segments_data
+from pylifemap.data.memoization import memoize_layer_data
 from pylifemap.data.mixins.interfaces import DataMixin
 from pylifemap.utils import TAXID_COL
 
 
 class ArcsDataMixin:
+    @memoize_layer_data
     def arcs_data(
         self: DataMixin,
         options: dict,
@@ -33,7 +35,8 @@ class ArcsDataMixin:
         Returns
         -------
         pl.DataFrame
-            DataFrame with generated data.
+            DataFrame with generated data. If lazy loading is enabled, arcs bounding
+            boxes are added and rows are sorted with `sort_segments_data`.
         """
 
         data = self._data
@@ -97,7 +100,31 @@ class ArcsDataMixin:
         elif lazy_mode == "parent":
             data = propagate_parent_zoom(data)
 
+        lazy = "pylifemap_zoom" in data.columns
+        if lazy:
+            # Arcs are curved, so their bounding box is computed before projection. Arcs
+            # crossing the antimeridian have control points beyond ±180°, which are not
+            # wrapped, as by the frontend
+            xmin, ymin, xmax, ymax = arcs_bbox(
+                data.get_column("pylifemap_x"),
+                data.get_column("pylifemap_y"),
+                data.get_column("pylifemap_dest_x"),
+                data.get_column("pylifemap_dest_y"),
+            )
+            bbox = [*unwrapped_to_3857(xmin, ymin), *unwrapped_to_3857(xmax, ymax)]
+            bbox_cols = [
+                "pylifemap_bbox_xmin",
+                "pylifemap_bbox_ymin",
+                "pylifemap_bbox_xmax",
+                "pylifemap_bbox_ymax",
+            ]
+            data = data.with_columns(
+                pl.Series(col, values) for col, values in zip(bbox_cols, bbox, strict=True)
+            )
+
         data = project_to_3857(data, x_col="pylifemap_x", y_col="pylifemap_y")
         data = project_to_3857(data, x_col="pylifemap_dest_x", y_col="pylifemap_dest_y")
+        if lazy:
+            data = sort_segments_data(data)
 
         return data
@@ -6,11 +6,13 @@ import polars as pl
 
 from pylifemap.data.backend_data import BACKEND_DATA
 from pylifemap.data.geo import project_to_3857
+from pylifemap.data.memoization import memoize_layer_data
 from pylifemap.data.mixins.interfaces import DataMixin
 from pylifemap.utils import TAXID_COL
 
 
 class DonutsDataMixin:
+    @memoize_layer_data
     def donuts_data(self: DataMixin, options: dict, data_columns: tuple | list = ()) -> pl.DataFrame:
         """
         Generate data for a donuts layer.
@@ -7,3 +7,5 @@ class DataMixin(Protocol):
     _data: pl.DataFrame
 
     def data_with_parents(self) -> pl.DataFrame: ...
+
+    def fingerprint(self, columns: list[str]) -> str: ...
@@ -4,12 +4,14 @@ import polars as pl
 
 from pylifemap.data.backend_data import BACKEND_DATA
 from pylifemap.data.geo import project_to_3857
-from pylifemap.data.lazy_loading import propagate_parent_zoom
+from pylifemap.data.lazy_loading import propagate_parent_zoom, sort_segments_data
+from pylifemap.data.memoization import memoize_layer_data
 from pylifemap.data.mixins.interfaces import DataMixin
 from pylifemap.utils import TAXID_COL
 
 
 class LinesDataMixin:
+    @memoize_layer_data
     def lines_data(
         self: DataMixin,
         options: dict,
@@ -33,7 +35,8 @@ class LinesDataMixin:
         Returns
         -------
         pl.DataFrame
-            DataFrame with generated data.
+            DataFrame with generated data. If lazy loading is enabled, lines bounding
+            boxes are added and rows are sorted with `sort_segments_data`.
         """
         # Add ancestors info to data
         data = self.data_with_parents()
@@ -98,4 +101,14 @@ class LinesDataMixin:
         data = project_to_3857(data, x_col="pylifemap_x", y_col="pylifemap_y")
         data = project_to_3857(data, x_col="pylifemap_parent_x", y_col="pylifemap_parent_y")
 
+        if "pylifemap_zoom" in data.columns:
+            # Lines are straight in EPSG:3857, their bounding box is given by their ends
+            data = data.with_columns(
+                pl.min_horizontal("pylifemap_x", "pylifemap_parent_x").alias("pylifemap_bbox_xmin"),
+                pl.min_horizontal("pylifemap_y", "pylifemap_parent_y").alias("pylifemap_bbox_ymin"),
+                pl.max_horizontal("pylifemap_x", "pylifemap_parent_x").alias("pylifemap_bbox_xmax"),
+                pl.max_horizontal("pylifemap_y", "pylifemap_parent_y").alias("pylifemap_bbox_ymax"),
+            )
+            data = sort_segments_data(data)
+
         return data
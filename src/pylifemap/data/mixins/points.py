@@ -8,12 +8,18 @@ import polars as pl
 
 from pylifemap.data.backend_data import BACKEND_DATA
 from pylifemap.data.geo import project_to_3857
-from pylifemap.data.lazy_loading import propagate_parent_zoom
+from pylifemap.data.lazy_loading import (
+    display_zooms,
+    propagate_parent_zoom,
+    sort_lazy_data,
+)
+from pylifemap.data.memoization import memoize_layer_data
 from pylifemap.data.mixins.interfaces import DataMixin
 from pylifemap.utils import TAXID_COL
 
 
 class PointsDataMixin:
+    @memoize_layer_data
     def points_data(
         self: DataMixin,
         options: dict,
@@ -37,7 +43,9 @@ class PointsDataMixin:
         Returns
         -------
         pl.DataFrame
-            DataFrame with generated data.
+            DataFrame with generated data. If lazy loading is enabled, rows are sorted
+            with `sort_lazy_data`. If a `lazy_budget` option is set, the zoom levels are
+            replaced by display zooms computed with `display_zooms`.
 
         Raises
         ------
@@ -77,7 +85,7 @@ class PointsDataMixin:
             how="inner",
             left_on=TAXID_COL,
             right_on="taxid",
-        ).sort("pylifemap_zoom", descending=True)
+        ).sort(["pylifemap_zoom", TAXID_COL], descending=[True, False], maintain_order=True)
 
         # Check and add data columns to needed columns if they are defined
         for col in data_columns:
@@ -94,5 +102,16 @@ class PointsDataMixin:
             data = propagate_parent_zoom(data)
 
         data = project_to_3857(data, x_col="pylifemap_x", y_col="pylifemap_y")
+        if "pylifemap_zoom" in data.columns:
+            if options.get("lazy_budget") is not None:
+                data = data.with_columns(
+                    display_zooms(
+                        data,
+                        budget=options["lazy_budget"],
+                        tile_size=options.get("lazy_budget_size", 256),
+                        priority=options.get("lazy_priority"),
+                    )
+                )
+            data = sort_lazy_data(data)
 
         return data
@@ -0,0 +1,987 @@
+"""
+Headless raster previews of maps.
+
+Layers data are drawn with NumPy onto a pixel grid, without a browser and without the
+basemap tiles, following the frontend styling rules closely enough for thumbnails in
+reports or continuous integration.
+"""
+
+import math
+import struct
+import warnings
+import zlib
+from functools import cache
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.clustering import TILE_SIZE
+from pylifemap.data.raster import PNG_SIGNATURE, gradient_palette, png_chunk
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+from pylifemap.utils import is_categorical_column, is_hex_color
+
+# Layer types drawn in previews
+PREVIEW_LAYERS = ("points", "lines", "arcs", "donuts", "heatmap")
+
+# Relative margin added around layers data extent
+PREVIEW_MARGIN = 0.05
+
+# Frontend default colors and color schemes
+DEFAULT_COLOR = "#DD0000"
+NUM_SCHEMES = {
+    "viridis": (
+        "#440154",
+        "#482878",
+        "#3e4989",
+        "#31688e",
+        "#26828e",
+        "#1f9e89",
+        "#35b779",
+        "#6ece58",
+        "#b5de2b",
+        "#fde725",
+    ),
+}
+CAT_SCHEMES = {
+    "observable10": (
+        "#4269d0",
+        "#efb118",
+        "#ff725c",
+        "#6cc5b0",
+        "#3ca951",
+        "#ff8ab7",
+        "#a463f2",
+        "#97bbf5",
+        "#9c6b4e",
+        "#9498a0",
+    ),
+    "tableau10": (
+        "#4e79a7",
+        "#f28e2c",
+        "#e15759",
+        "#76b7b2",
+        "#59a14f",
+        "#edc949",
+        "#af7aa1",
+        "#ff9da7",
+        "#9c755f",
+        "#bab0ab",
+    ),
+    "category10": (
+        "#1f77b4",
+        "#ff7f0e",
+        "#2ca02c",
+        "#d62728",
+        "#9467bd",
+        "#8c564b",
+        "#e377c2",
+        "#7f7f7f",
+        "#bcbd22",
+        "#17becf",
+    ),
+}
+DEFAULT_NUM_SCHEME = "viridis"
+DEFAULT_CAT_SCHEME = "observable10"
+
+# Disks groups are drawn by dilation if their number of pixels offsets is larger than
+# this ratio times their radius times the number of pixels
+DENSE_DISKS_RATIO = 0.5
+
+# Number of segments of the polylines approximating arcs
+ARC_SEGMENTS = 32
+
+# Color of donuts centers when totals are displayed
+DONUTS_TOTALS_COLOR = ("#000000", 0.7)
+
+
+def hex_rgb(color: str) -> np.ndarray:
+    """
+    Convert an hexadecimal color code to RGB values.
+
+    Parameters
+    ----------
+    color : str
+        Hexadecimal color code.
+
+    Returns
+    -------
+    np.ndarray
+        float64 array of the red, green and blue values, between 0 and 255.
+    """
+    value = color[1:] if len(color) == 7 else "".join(c * 2 for c in color[1:])  # noqa: PLR2004
+    return np.array([int(value[i : i + 2], 16) for i in (0, 2, 4)], dtype=np.float64)
+
+
+def fixed_color(color: str | None) -> np.ndarray:
+    """
+    Get the RGB values of a fixed layer color.
+
+    Parameters
+    ----------
+    color : str | None
+        Hexadecimal color code. If `None`, use the frontend default color.
+
+    Returns
+    -------
+    np.ndarray
+        float64 array of shape (3,). Colors which are not hexadecimal color codes are
+        replaced by the default color, with a warning.
+    """
+    if color is None:
+        color = DEFAULT_COLOR
+    elif not is_hex_color(color):
+        msg = f"{color!r} is not an hexadecimal color code, preview uses {DEFAULT_COLOR} instead"
+        warnings.warn(msg, stacklevel=0)
+        color = DEFAULT_COLOR
+    return hex_rgb(color)
+
+
+def scheme_colors(scheme: str | None, *, categorical: bool) -> np.ndarray:
+    """
+    Get the colors of a color scheme.
+
+    Parameters
+    ----------
+    scheme : str | None
+        Scheme name. If `None`, use the frontend default scheme.
+    categorical : bool
+        If `True`, get a categorical scheme, otherwise a sequential one.
+
+    Returns
+    -------
+    np.ndarray
+        float64 array of shape (n, 3) of the scheme colors. Unavailable schemes are
+        replaced by the default one, with a warning.
+    """
+    schemes, default = (CAT_SCHEMES, DEFAULT_CAT_SCHEME) if categorical else (NUM_SCHEMES, DEFAULT_NUM_SCHEME)
+    if scheme is None:
+        scheme = default
+    elif scheme.lower() not in schemes:
+        msg = f"{scheme} color scheme is not available in previews, {default} is used instead"
+        warnings.warn(msg, stacklevel=0)
+        scheme = default
+    return np.array([hex_rgb(color) for color in schemes[scheme.lower()]])
+
+
+def linear_scale(values: pl.Series, domain: tuple | list | None, value_range: tuple | list) -> np.ndarray:
+    """
+    Apply a linear scale to numerical values.
+
+    Parameters
+    ----------
+    values : pl.Series
+        Values to be scaled. Null values are scaled as the domain minimum.
+    domain : tuple | list | None
+        Minimum and maximum values of the domain. If `None`, use the values range.
+    value_range : tuple | list
+        Output values range.
+
+    Returns
+    -------
+    np.ndarray
+        float64 array of scaled values.
+    """
+    values = values.cast(pl.Float64)
+    if domain is None:
+        domain = (values.min(), values.max())
+    min_domain, max_domain = (float(v) if v is not None else 0.0 for v in domain)
+    min_range, max_range = value_range
+    if max_domain == min_domain:
+        return np.full(len(values), float(min_range))
+    t = (values.fill_null(min_domain).to_numpy() - min_domain) / (max_domain - min_domain)
+    return min_range + t * (max_range - min_range)
+
+
+def column_colors(
+    values: pl.Series,
+    *,
+    categorical: bool | None,
+    categories: tuple | list | None,
+    scheme: str | None,
+    domain: tuple | list | None,
+) -> np.ndarray:
+    """
+    Compute the colors of the values of a data column.
+
+    Parameters
+    ----------
+    values : pl.Series
+        Column values.
+    categorical : bool | None
+        If `True`, use a categorical scale, if `False` a linear one. If `None`, the
+        scale type is guessed from the values.
+    categories : tuple | list | None
+        Categorical scale domain. If `None`, use the sorted distinct values.
+    scheme : str | None
+        Color scheme name.
+    domain : tuple | list | None
+        Linear scale domain. If `None`, use the values range.
+
+    Returns
+    -------
+    np.ndarray
+        float64 array of shape (n, 3) of the values colors.
+    """
+    if categorical is None:
+        categorical = is_categorical_column(values)
+    if categorical:
+        colors = scheme_colors(scheme, categorical=True)
+        strings = values.cast(pl.String)
+        if categories is None:
+            categories = sorted(strings.drop_nulls().unique().to_list())
+        ranks = {str(category): i for i, category in enumerate(categories)}
+        indices = strings.replace_strict(ranks, default=0, return_dtype=pl.Int64).to_numpy()
+        return colors[indices % len(colors)]
+    colors = scheme_colors(scheme, categorical=False)
+    t = linear_scale(values, domain, (0, 1))
+    stops = np.linspace(0, 1, len(colors))
+    return np.column_stack([np.interp(t, stops, colors[:, i]) for i in range(3)])
+
+
+def preview_view(
+    width: int, height: int, extent: tuple | list, zoom: float | None
+) -> tuple[float, float, float, float]:
+    """
+    Compute the view of a preview.
+
+    Parameters
+    ----------
+    width : int
+        Preview width, in pixels.
+    height : int
+        Preview height, in pixels.
+    extent : tuple | list
+        EPSG:3857 minimum x, minimum y, maximum x and maximum y of the area to display.
+    zoom : float | None
+        Zoom level of the view, centered on `extent`. If `None`, use the zoom level which
+        fits `extent` in the preview.
+
+    Returns
+    -------
+    tuple[float, float, float, float]
+        EPSG:3857 coordinates of the top left corner of the view, resolution in map
+        units per pixel, and zoom level.
+    """
+    xmin, ymin, xmax, ymax = extent
+    if zoom is None:
+        resolution = max((xmax - xmin) / width, (ymax - ymin) / height)
+        if resolution <= 0:
+            # Single point extent
+            zoom = 5.0
+        else:
+            zoom = math.log2(2 * WORLD_HALF_SIZE / (TILE_SIZE * resolution))
+    resolution = 2 * WORLD_HALF_SIZE / (TILE_SIZE * 2**zoom)
+    x_center, y_center = (xmin + xmax) / 2, (ymin + ymax) / 2
+    return x_center - resolution * width / 2, y_center + resolution * height / 2, resolution, zoom
+
+
+def data_extent(layers: list, layers_data: dict) -> tuple[float, float, float, float]:
+    """
+    Compute the extent of previewed layers data, with a margin.
+
+    Parameters
+    ----------
+    layers : list
+        Layers definitions.
+    layers_data : dict
+        Layers data, indexed by layer id.
+
+    Returns
+    -------
+    tuple[float, float, float, float]
+        EPSG:3857 minimum x, minimum y, maximum x and maximum y. The whole world if
+        there is no data to preview.
+    """
+    bounds = []
+    for layer in layers:
+        d = layers_data.get(layer["id"])
+        if layer["layer"] not in PREVIEW_LAYERS or not isinstance(d, pl.DataFrame) or d.height == 0:
+            continue
+        for prefix in ("pylifemap", "pylifemap_parent", "pylifemap_dest"):
+            x_col, y_col = f"{prefix}_x", f"{prefix}_y"
+            if x_col in d.columns and y_col in d.columns:
+                bounds.append(
+                    d.select(
+                        pl.col(x_col).min().alias("xmin"),
+                        pl.col(y_col).min().alias("ymin"),
+                        pl.col(x_col).max().alias("xmax"),
+                        pl.col(y_col).max().alias("ymax"),
+                    )
+                )
+    if not bounds:
+        return -WORLD_HALF_SIZE, -WORLD_HALF_SIZE, WORLD_HALF_SIZE, WORLD_HALF_SIZE
+    b = pl.concat(bounds).select(pl.col("xmin", "ymin").min(), pl.col("xmax", "ymax").max()).row(0)
+    if any(v is None for v in b):
+        return -WORLD_HALF_SIZE, -WORLD_HALF_SIZE, WORLD_HALF_SIZE, WORLD_HALF_SIZE
+    xmin, ymin, xmax, ymax = b
+    dx, dy = (xmax - xmin) * PREVIEW_MARGIN, (ymax - ymin) * PREVIEW_MARGIN
+    return xmin - dx, ymin - dy, xmax + dx, ymax + dy
+
+
+def display_level(zooms: list, zoom: float) -> int:
+    """
+    Get the level of a multi-resolution layer displayed at a zoom level.
+
+    Parameters
+    ----------
+    zooms : list
+        Sorted levels of the layer.
+    zoom : float
+        View zoom level.
+
+    Returns
+    -------
+    int
+        Displayed level, as chosen by the frontend.
+    """
+    return next((z for z in zooms if z >= math.floor(zoom)), zooms[-1])
+
+
+def visible_data(layer: dict, d: pl.DataFrame, zoom: float) -> pl.DataFrame:
+    """
+    Get the layer data rows displayed at a zoom level.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition.
+    d : pl.DataFrame
+        Layer data.
+    zoom : float
+        View zoom level.
+
+    Returns
+    -------
+    pl.DataFrame
+        Rows of the displayed level for clustered, levels of detail and prebinned
+        layers, and rows loaded at `zoom` for lazy loading layers.
+    """
+    options = layer["options"]
+    if options.get("cluster_zooms") is not None:
+        level = display_level(options["cluster_zooms"], zoom)
+        return d.filter(pl.col("pylifemap_cluster_zoom") == level)
+    if options.get("lod_zooms") is not None:
+        level = display_level(options["lod_zooms"], zoom)
+        return d.filter((pl.col("pylifemap_lod_min") <= level) & (level <= pl.col("pylifemap_lod_max")))
+    if options.get("grid_zooms") is not None:
+        level = display_level(options["grid_zooms"], zoom)
+        return d.filter(pl.col("pylifemap_grid_zoom") == level)
+    lazy_zoom = options.get("lazy_zoom", -1)
+    if options.get("lazy") and lazy_zoom >= 0 and "pylifemap_zoom" in d.columns:
+        return d.filter(pl.col("pylifemap_zoom") <= zoom + lazy_zoom)
+    return d
+
+
+@cache
+def disk_offsets(radius: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the pixel offsets of a disk.
+
+    Parameters
+    ----------
+    radius : int
+        Disk radius, in pixels.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Column and row offsets of the pixels of the disk, relative to its center.
+    """
+    dy, dx = np.mgrid[-radius : radius + 1, -radius : radius + 1]
+    inside = dx**2 + dy**2 <= radius**2 + radius
+    return dx[inside], dy[inside]
+
+
+def dilate_disks(grid: np.ndarray, centers: np.ndarray, radius: int, stride: int) -> None:
+    """
+    Draw disks of the same radius by dilating the grid of their centers.
+
+    The disk is decomposed into horizontal spans: centers are dilated horizontally one
+    pixel at a time, and each span row is drawn when the dilation reaches its half
+    width, so that the cost is proportional to the radius rather than to the disk area.
+
+    Parameters
+    ----------
+    grid : np.ndarray
+        Flat grid of drawn values, updated in place.
+    centers : np.ndarray
+        Flat grid of the disks values at their center, -1 elsewhere. Centers must
+        be farther than `radius` from the grid rows ends.
+    radius : int
+        Disks radius, in pixels.
+    stride : int
+        Grid row length.
+    """
+    dx, dy = disk_offsets(radius)
+    # Half width of each span row
+    half_widths = {row: int(dx[dy == row].max()) for row in range(-radius, radius + 1)}
+    spans = centers.copy()
+    shifted = np.empty_like(spans)
+    for half_width in range(radius + 1):
+        if half_width > 0:
+            shifted[1:] = spans[:-1]
+            np.maximum(spans[1:], shifted[1:], out=spans[1:])
+            shifted[:-1] = spans[1:]
+            np.maximum(spans[:-1], shifted[:-1], out=spans[:-1])
+        for row, row_half_width in half_widths.items():
+            if row_half_width != half_width:
+                continue
+            shift = row * stride
+            if shift >= 0:
+                np.maximum(grid[shift:], spans[: len(spans) - shift], out=grid[shift:])
+            else:
+                np.maximum(grid[:shift], spans[-shift:], out=grid[:shift])
+
+
+def draw_disks(
+    size: tuple,
+    px: np.ndarray,
+    py: np.ndarray,
+    radii: np.ndarray,
+    *,
+    keys: np.ndarray | None = None,
+    offset_keys_fn=None,
+) -> np.ndarray:
+    """
+    Draw disks on a pixel grid.
+
+    Disks drawn later are drawn on top, as with the frontend. Disks are grouped by
+    rounded radius, and the disks of each group are drawn at once, one disk pixel offset
+    after the other, or by dilating the whole grid of their centers for large groups.
+    Disks whose centers fall in the same pixel are drawn only once, so that the drawing
+    cost does not depend on the number of disks beyond the number of pixels.
+
+    Parameters
+    ----------
+    size : tuple
+        Grid width and height, in pixels.
+    px : np.ndarray
+        Disks centers columns.
+    py : np.ndarray
+        Disks centers rows.
+    radii : np.ndarray
+        Disks radii, in pixels.
+    keys : np.ndarray | None, optional
+        Increasing non negative integer value drawn by each disk. If `None`, use the disks
+        indices. By default `None`.
+    offset_keys_fn : Callable | None, optional
+        If given, function of disks keys, column offsets, row offsets and radius
+        returning the value drawn at these offsets, -1 to draw nothing. Values must
+        keep the order of the keys. By default `None`.
+
+    Returns
+    -------
+    np.ndarray
+        Integer array of shape (height, width), giving the value drawn on top at each
+        pixel, -1 for empty pixels.
+    """
+    width, height = size
+    if keys is None:
+        keys = np.arange(len(px), dtype=np.int64)
+    # Smaller values make the drawing faster
+    if len(keys) == 0 or keys.max() < np.iinfo(np.int32).max:
+        keys = keys.astype(np.int32)
+    r = np.maximum(np.rint(radii), 0).astype(np.int64)
+    pad = 2 * int(r.max()) + 1 if len(r) > 0 else 1
+    stride = width + 2 * pad
+    size = (height + 2 * pad) * stride
+    # Pixels are indexed on a grid padded by twice the maximum radius, so that the
+    # offsets of disks intersecting the preview stay inside the grid
+    ix = np.floor(px).astype(np.int64) + pad
+    iy = np.floor(py).astype(np.int64) + pad
+    inside = (ix >= pad - r) & (ix < pad + width + r) & (iy >= pad - r) & (iy < pad + height + r)
+    grid = np.full(size, -1, dtype=keys.dtype)
+    for radius in np.unique(r[inside]):
+        group = np.flatnonzero(inside & (r == radius))
+        centers = np.full(size, -1, dtype=keys.dtype)
+        np.maximum.at(centers, iy[group] * stride + ix[group], keys[group])
+        pixels = np.flatnonzero(centers >= 0)
+        group_keys = centers[pixels]
+        offsets = disk_offsets(int(radius))
+        if offset_keys_fn is None and len(pixels) * len(offsets[0]) > DENSE_DISKS_RATIO * radius * size:
+            dilate_disks(grid, centers, int(radius), stride)
+            continue
+        for dx, dy in zip(*offsets, strict=True):
+            values = group_keys if offset_keys_fn is None else offset_keys_fn(group_keys, dx, dy, radius)
+            target = pixels + (dy * stride + dx)
+            grid[target] = np.maximum(grid[target], values)
+    return grid.reshape(height + 2 * pad, stride)[pad : pad + height, pad : pad + width]
+
+
+def clip_segments(
+    x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray, bounds: tuple
+) -> tuple[np.ndarray, ...]:
+    """
+    Clip segments to a rectangle, using the Liang-Barsky algorithm.
+
+    Parameters
+    ----------
+    x0, y0, x1, y1 : np.ndarray
+        Segments start and end coordinates.
+    bounds : tuple
+        Minimum x, minimum y, maximum x and maximum y of the rectangle.
+
+    Returns
+    -------
+    tuple[np.ndarray, ...]
+        Indices of the segments intersecting the rectangle, and their clipped start and
+        end coordinates.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = np.zeros(len(x0)), np.ones(len(x0))
+    keep = np.ones(len(x0), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+            parallel = p == 0
+            keep &= ~(parallel & (q < 0))
+            t = q / p
+            t0 = np.where(~parallel & (p < 0), np.maximum(t0, t), t0)
+            t1 = np.where(~parallel & (p > 0), np.minimum(t1, t), t1)
+    keep &= t0 <= t1
+    idx = np.flatnonzero(keep)
+    t0, t1 = t0[idx], t1[idx]
+    return (
+        idx,
+        x0[idx] + t0 * dx[idx],
+        y0[idx] + t0 * dy[idx],
+        x0[idx] + t1 * dx[idx],
+        y0[idx] + t1 * dy[idx],
+    )
+
+
+def draw_segments(
+    size: tuple,
+    x0: np.ndarray,
+    y0: np.ndarray,
+    x1: np.ndarray,
+    y1: np.ndarray,
+    *,
+    widths: np.ndarray,
+    keys: np.ndarray,
+) -> np.ndarray:
+    """
+    Draw thick segments on a pixel grid.
+
+    Segments are clipped to the grid, sampled every pixel, and drawn as disks of their
+    half width at each sample.
+
+    Parameters
+    ----------
+    size : tuple
+        Grid width and height, in pixels.
+    x0, y0, x1, y1 : np.ndarray
+        Segments start and end pixel coordinates.
+    widths : np.ndarray
+        Segments widths, in pixels.
+    keys : np.ndarray
+        Increasing non negative integer value drawn by each segment.
+
+    Returns
+    -------
+    np.ndarray
+        Integer array of shape (height, width), see `draw_disks`.
+    """
+    width, height = size
+    pad = float(widths.max()) if len(widths) > 0 else 0.0
+    idx, x0, y0, x1, y1 = clip_segments(x0, y0, x1, y1, (-pad, -pad, width + pad, height + pad))
+    n = np.ceil(np.hypot(x1 - x0, y1 - y0)).astype(np.int64) + 1
+    segment = np.repeat(np.arange(len(idx)), n)
+    # Position of each sample along its segment
+    starts = np.cumsum(n) - n
+    t = (np.arange(n.sum()) - np.repeat(starts, n)) / np.repeat(np.maximum(n - 1, 1), n)
+    px = x0[segment] + t * (x1 - x0)[segment]
+    py = y0[segment] + t * (y1 - y0)[segment]
+    return draw_disks(size, px, py, widths[idx][segment] / 2, keys=keys[idx][segment])
+
+
+def to_pixels(x: np.ndarray, y: np.ndarray, view: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert EPSG:3857 coordinates to preview pixel coordinates.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        EPSG:3857 coordinates.
+    view : tuple
+        Preview view, see `preview_view`.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Pixel columns and rows, from the top left corner.
+    """
+    left, top, resolution, _ = view
+    return (x - left) / resolution, (top - y) / resolution
+
+
+def render_points(layer: dict, d: pl.DataFrame, view: tuple, size: tuple, color_ranges: dict) -> tuple:
+    """
+    Render a points layer, see `render_layer`.
+    """
+    options = layer["options"]
+    px, py = to_pixels(d.get_column("pylifemap_x").to_numpy(), d.get_column("pylifemap_y").to_numpy(), view)
+    radius = options.get("radius")
+    zooms = options.get("cluster_zooms") or options.get("lod_zooms")
+    if isinstance(radius, str) and radius in d.columns:
+        # Aggregated points radius scale is computed for each level
+        domain = options.get("radius_domain") if zooms is None else None
+        radii = linear_scale(d.get_column(radius), domain, options["radius_range"])
+    elif zooms is not None and display_level(zooms, view[3]) != zooms[-1]:
+        # Aggregated points radius depends on their number of points
+        radii = linear_scale(d.get_column("pylifemap_count"), None, options["radius_range"])
+    else:
+        radii = np.full(d.height, float(radius) if radius is not None else 5.0)
+    fill = options.get("fill")
+    if isinstance(fill, str) and fill in d.columns:
+        colors = column_colors(
+            d.get_column(fill),
+            categorical=options.get("fill_cat"),
+            categories=options.get("categories"),
+            scheme=options.get("scheme"),
+            domain=(color_ranges[fill]["min"], color_ranges[fill]["max"]) if fill in color_ranges else None,
+        )
+    else:
+        colors = np.broadcast_to(fixed_color(fill), (d.height, 3))
+    drawn = draw_disks(size, px, py, radii)
+    return colors, drawn, options.get("opacity", 0.8)
+
+
+def line_styles(layer: dict, d: pl.DataFrame, color_ranges: dict, *, default_width: float) -> tuple:
+    """
+    Compute the widths and colors of lines or arcs.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition.
+    d : pl.DataFrame
+        Layer data.
+    color_ranges : dict
+        Linear color scales domains, indexed by column.
+    default_width : float
+        Width used if the width option is not set.
+
+    Returns
+    -------
+    tuple
+        float64 arrays of the widths and of the RGB colors of each row.
+    """
+    options = layer["options"]
+    width = options.get("width")
+    if isinstance(width, str) and width in d.columns:
+        widths = linear_scale(d.get_column(width), None, options["width_range"])
+    else:
+        widths = np.full(d.height, float(width) if width is not None else default_width)
+    color = options.get("color")
+    if isinstance(color, str) and color in d.columns:
+        colors = column_colors(
+            d.get_column(color),
+            # Lines colors scales are always linear
+            categorical=options.get("color_cat") if layer["layer"] == "arcs" else False,
+            categories=options.get("categories"),
+            scheme=options.get("scheme"),
+            domain=(color_ranges[color]["min"], color_ranges[color]["max"])
+            if color in color_ranges
+            else None,
+        )
+    else:
+        colors = np.broadcast_to(fixed_color(color), (d.height, 3))
+    return widths, colors
+
+
+def render_lines(layer: dict, d: pl.DataFrame, view: tuple, size: tuple, color_ranges: dict) -> tuple:
+    """
+    Render a lines layer, see `render_layer`.
+    """
+    # Root rows have no parent
+    d = d.drop_nulls(["pylifemap_parent_x", "pylifemap_parent_y"])
+    widths, colors = line_styles(layer, d, color_ranges, default_width=3)
+    x0, y0 = to_pixels(
+        d.get_column("pylifemap_parent_x").to_numpy(), d.get_column("pylifemap_parent_y").to_numpy(), view
+    )
+    x1, y1 = to_pixels(d.get_column("pylifemap_x").to_numpy(), d.get_column("pylifemap_y").to_numpy(), view)
+    drawn = draw_segments(size, x0, y0, x1, y1, widths=widths, keys=np.arange(d.height, dtype=np.int64))
+    return colors, drawn, layer["options"].get("opacity", 0.8)
+
+
+def render_arcs(layer: dict, d: pl.DataFrame, view: tuple, size: tuple, color_ranges: dict) -> tuple:
+    """
+    Render an arcs layer, see `render_layer`.
+
+    Arcs are approximated by quadratic Bézier curves, passing at the middle of the
+    segment between their source and destination shifted to its left by 15% of its
+    length, as with the frontend.
+    """
+    widths, colors = line_styles(layer, d, color_ranges, default_width=3)
+    x0, y0 = to_pixels(d.get_column("pylifemap_x").to_numpy(), d.get_column("pylifemap_y").to_numpy(), view)
+    x2, y2 = to_pixels(
+        d.get_column("pylifemap_dest_x").to_numpy(), d.get_column("pylifemap_dest_y").to_numpy(), view
+    )
+    # Pixel rows go downwards, so the left normal of (dx, dy) is (dy, -dx)
+    mid_x, mid_y = (x0 + x2) / 2, (y0 + y2) / 2
+    top_x, top_y = mid_x + 0.15 * (y2 - y0), mid_y - 0.15 * (x2 - x0)
+    x1, y1 = 2 * top_x - mid_x, 2 * top_y - mid_y
+    t = np.linspace(0, 1, ARC_SEGMENTS + 1)[:, np.newaxis]
+    curve_x = (1 - t) ** 2 * x0 + 2 * (1 - t) * t * x1 + t**2 * x2
+    curve_y = (1 - t) ** 2 * y0 + 2 * (1 - t) * t * y1 + t**2 * y2
+    drawn = draw_segments(
+        size,
+        curve_x[:-1].T.ravel(),
+        curve_y[:-1].T.ravel(),
+        curve_x[1:].T.ravel(),
+        curve_y[1:].T.ravel(),
+        widths=np.repeat(widths, ARC_SEGMENTS),
+        keys=np.repeat(np.arange(d.height, dtype=np.int64), ARC_SEGMENTS),
+    )
+    return colors, drawn, layer["options"].get("opacity", 1.0)
+
+
+def render_donuts(layer: dict, d: pl.DataFrame, view: tuple, size: tuple, _color_ranges: dict) -> tuple:
+    """
+    Render a donuts layer, see `render_layer`.
+
+    Donuts have the same geometry as with the frontend: rings of a 12 pixels maximum
+    thickness, with slices ordered by category and starting from the top.
+    """
+    options = layer["options"]
+    counts = d.get_column(options["counts_col"])
+    fields = [field.name for field in counts.dtype.fields]
+    categories = [str(c) for c in options.get("categories") or sorted(fields)]
+    fields = sorted(fields, key=lambda f: categories.index(f) if f in categories else len(categories))
+    values = np.column_stack(
+        [counts.struct.field(f).cast(pl.Float64).fill_null(0).to_numpy() for f in fields]
+    )
+    totals = values.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bounds = np.where(totals[:, np.newaxis] > 0, np.cumsum(values, axis=1) / totals[:, np.newaxis], 1)
+    radius = options.get("radius", 50)
+    if isinstance(radius, list | tuple):
+        sizes = np.rint(linear_scale(d.get_column("pylifemap_total"), None, radius))
+    else:
+        sizes = np.full(d.height, float(radius))
+    outer = sizes / 2 - 1
+    inner = np.maximum(8, outer - 12)
+
+    # Drawn values encode the donut index and the slice index, the last one being the
+    # donut center
+    n_keys = len(fields) + 1
+    show_totals = options.get("show_totals", True)
+
+    def offset_keys(keys: np.ndarray, dx: int, dy: int, _radius: int) -> np.ndarray:
+        rows = keys // n_keys
+        distance = math.hypot(dx, dy)
+        fraction = (math.atan2(dx, -dy) / (2 * math.pi)) % 1
+        slices = (bounds[rows] <= fraction).sum(axis=1)
+        slices = np.where(distance < inner[rows], n_keys - 1, np.minimum(slices, n_keys - 2))
+        return np.where(
+            (distance > outer[rows]) | ((slices == n_keys - 1) & (not show_totals)),
+            -1,
+            rows * n_keys + slices,
+        )
+
+    px, py = to_pixels(d.get_column("pylifemap_x").to_numpy(), d.get_column("pylifemap_y").to_numpy(), view)
+    keys = np.arange(d.height, dtype=np.int64) * n_keys
+    drawn = draw_disks(size, px, py, outer, keys=keys, offset_keys_fn=offset_keys)
+    palette = scheme_colors(options.get("scheme"), categorical=True)
+    slice_colors = [
+        palette[categories.index(f) % len(palette)] if f in categories else palette[0] for f in fields
+    ]
+    center_color, center_opacity = DONUTS_TOTALS_COLOR
+    colors = np.array([*slice_colors, hex_rgb(center_color)])
+    opacity = options.get("opacity")
+    opacity = 1.0 if opacity is None else opacity
+    opacities = np.array([opacity] * len(fields) + [center_opacity])
+    slices = np.where(drawn >= 0, drawn % n_keys, 0)
+    alpha = np.where(drawn >= 0, opacities[slices], 0)
+    return colors[slices], drawn >= 0, alpha
+
+
+def render_heatmap(layer: dict, d: pl.DataFrame, view: tuple, size: tuple, _color_ranges: dict) -> tuple:
+    """
+    Render an heatmap layer, see `render_layer`.
+
+    Points weights are binned on the preview pixels grid, and the grid is convolved with
+    the same gaussian kernel as raster heatmap tiles.
+    """
+    options = layer["options"]
+    width, height = size
+    weight = "pylifemap_weight" if options.get("grid_zooms") is not None else options.get("weight")
+    if weight is None:
+        weights = np.ones(d.height)
+    else:
+        weights = np.log1p(np.clip(d.get_column(weight).cast(pl.Float64).fill_null(0).to_numpy(), 0, None))
+        max_weight = weights.max() if d.height > 0 else 0
+        weights = weights / max_weight if max_weight > 0 else weights
+    sigma = max(options.get("radius", 5) + options.get("blur", 5), 1) / 3
+    margin = int(np.ceil(3 * sigma))
+    kernel = np.exp(-0.5 * (np.arange(-margin, margin + 1) / sigma) ** 2)
+    px, py = to_pixels(d.get_column("pylifemap_x").to_numpy(), d.get_column("pylifemap_y").to_numpy(), view)
+    ix = np.floor(px).astype(np.int64) + margin
+    iy = np.floor(py).astype(np.int64) + margin
+    grid_width, grid_height = width + 2 * margin, height + 2 * margin
+    inside = (ix >= 0) & (ix < grid_width) & (iy >= 0) & (iy < grid_height) & (weights > 0)
+    grid = np.bincount(
+        iy[inside] * grid_width + ix[inside], weights=weights[inside], minlength=grid_width * grid_height
+    ).reshape(grid_height, grid_width)
+    rows = sum(k * grid[:, i : i + width] for i, k in enumerate(kernel))
+    density = sum(k * rows[i : i + height, :] for i, k in enumerate(kernel))
+    levels = np.rint((1 - np.exp(-density)) * 255).astype(np.uint8)
+    palette = gradient_palette(options["gradient"]).astype(np.float64)
+    alpha = palette[levels, 3] / 255 * options.get("opacity", 1.0)
+    return palette[levels, :3], levels > 0, alpha
+
+
+RENDERERS = {
+    "points": render_points,
+    "lines": render_lines,
+    "arcs": render_arcs,
+    "donuts": render_donuts,
+    "heatmap": render_heatmap,
+}
+
+
+def render_layer(layer: dict, d: pl.DataFrame, view: tuple, size: tuple, color_ranges: dict) -> tuple | None:
+    """
+    Render a layer.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition.
+    d : pl.DataFrame
+        Layer data.
+    view : tuple
+        Preview view, see `preview_view`.
+    size : tuple
+        Preview width and height, in pixels.
+    color_ranges : dict
+        Linear color scales domains, indexed by column.
+
+    Returns
+    -------
+    tuple | None
+        RGB colors, drawn pixels and opacities of the layer, or `None` if the layer
+        type or data cannot be previewed. Colors and opacities are either given for
+        each pixel, or for each row, drawn pixels then giving the row drawn at each
+        pixel.
+    """
+    if layer["layer"] not in RENDERERS or layer["options"].get("raster", False):
+        return None
+    d = visible_data(layer, d, view[3])
+    return RENDERERS[layer["layer"]](layer, d, view, size, color_ranges)
+
+
+def render_preview(
+    layers: list,
+    layers_data: dict,
+    color_ranges: dict | None = None,
+    *,
+    width: int = 800,
+    height: int = 600,
+    extent: tuple | list | None = None,
+    zoom: float | None = None,
+    background: str | None = None,
+) -> np.ndarray:
+    """
+    Render a raster preview of map layers.
+
+    Points, lines, arcs, donuts and heatmap layers are drawn, in their definition order.
+    Raster heatmap, text, icons and deck.gl layers are not drawn, and neither are the
+    basemap tiles.
+
+    Parameters
+    ----------
+    layers : list
+        Layers definitions.
+    layers_data : dict
+        Layers data, indexed by layer id.
+    color_ranges : dict | None, optional
+        Linear color scales domains, indexed by column. By default `None`.
+    width : int, optional
+        Preview width, in pixels. By default 800.
+    height : int, optional
+        Preview height, in pixels. By default 600.
+    extent : tuple | list | None, optional
+        EPSG:3857 minimum x, minimum y, maximum x and maximum y of the area to display. If
+        `None`, use the extent of the layers data. By default `None`.
+    zoom : float | None, optional
+        Zoom level of the preview, centered on `extent`. If `None`, use the zoom level
+        which fits `extent` in the preview. By default `None`.
+    background : str | None, optional
+        Hexadecimal background color. If `None`, the background is transparent. By
+        default `None`.
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array of shape (height, width, 4) of RGBA pixels.
+
+    Raises
+    ------
+    ValueError
+        If `width` or `height` is not a positive integer.
+    """
+    if width < 1 or height < 1:
+        msg = "preview width and height must be positive integers"
+        raise ValueError(msg)
+    if extent is None:
+        extent = data_extent(layers, layers_data)
+    view = preview_view(width, height, extent, zoom)
+    color_ranges = color_ranges or {}
+
+    # Layers are composited with premultiplied alpha
+    rgb = np.zeros((height, width, 3))
+    alpha = np.zeros((height, width))
+    if background is not None:
+        rgb[:] = fixed_color(background)
+        alpha[:] = 1
+    for layer in layers:
+        d = layers_data.get(layer["id"])
+        if not isinstance(d, pl.DataFrame):
+            continue
+        rendered = render_layer(layer, d, view, (width, height), color_ranges)
+        if rendered is None:
+            continue
+        colors, drawn, opacity = rendered
+        if drawn.dtype == np.bool_:
+            layer_alpha = np.where(drawn, opacity, 0)
+            layer_rgb = colors
+        else:
+            layer_alpha = np.where(drawn >= 0, opacity, 0)
+            layer_rgb = colors[np.maximum(drawn, 0)] if len(colors) > 0 else np.zeros((height, width, 3))
+        rgb = layer_rgb * layer_alpha[..., np.newaxis] + rgb * (1 - layer_alpha[..., np.newaxis])
+        alpha = layer_alpha + alpha * (1 - layer_alpha)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rgb = np.where(alpha[..., np.newaxis] > 0, rgb / alpha[..., np.newaxis], 0)
+    return np.dstack([np.rint(rgb), np.rint(alpha * 255)]).astype(np.uint8)
+
+
+def encode_rgba_png(image: np.ndarray) -> bytes:
+    """
+    Encode an RGBA image as a PNG.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        uint8 array of shape (height, width, 4).
+
+    Returns
+    -------
+    bytes
+        PNG file content.
+    """
+    height, width, _ = image.shape
+    # Each scanline is prefixed by its filter type, 2 being the difference with the
+    # previous scanline
+    pixels = image.reshape(height, width * 4)
+    raw = np.full((height, width * 4 + 1), 2, dtype=np.uint8)
+    raw[:, 1:] = np.diff(pixels, axis=0, prepend=np.zeros((1, width * 4), dtype=np.uint8))
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + png_chunk(b"IEND", b"")
+    )
@@ -0,0 +1,330 @@
+"""
+Heatmap raster tiles rendering.
+"""
+
+import multiprocessing
+import os
+import struct
+import zlib
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.clustering import TILE_SIZE
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+from pylifemap.data.tree_lod import MIN_VIEW_ZOOM
+from pylifemap.data.workers import RASTER_WORKERS_ENV, workers_environment
+from pylifemap.utils import is_hex_color
+
+# Number of rendered tiles sent at once to each worker process
+TASKS_CHUNKSIZE = 16
+# Minimum number of tiles rendered with worker processes
+MIN_POOL_TILES = 256
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def gradient_palette(gradient: tuple | list) -> np.ndarray:
+    """
+    Compute the colors palette of an heatmap gradient.
+
+    As with the frontend heatmap layers, gradient colors are evenly spaced, and the
+    opacity of a pixel is its density value.
+
+    Parameters
+    ----------
+    gradient : tuple | list
+        Hexadecimal colors of the gradient.
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array of shape (256, 4), giving the RGBA color of each density level.
+
+    Raises
+    ------
+    ValueError
+        If a gradient color is not an hexadecimal color code.
+    """
+    for color in gradient:
+        if not is_hex_color(color):
+            msg = f"raster heatmap gradient colors must be hexadecimal color codes, got {color!r}"
+            raise ValueError(msg)
+    colors = []
+    for color in gradient:
+        value = color[1:] if len(color) == 7 else "".join(c * 2 for c in color[1:])  # noqa: PLR2004
+        colors.append([int(value[i : i + 2], 16) for i in (0, 2, 4)])
+    colors = np.array(colors, dtype=np.float64)
+    levels = np.linspace(0, 1, 256)
+    stops = np.linspace(0, 1, len(colors))
+    rgb = np.column_stack([np.interp(levels, stops, colors[:, i]) for i in range(3)])
+    return np.column_stack([np.rint(rgb), np.arange(256)]).astype(np.uint8)
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    """
+    Encode a PNG chunk.
+
+    Parameters
+    ----------
+    kind : bytes
+        Chunk type.
+    data : bytes
+        Chunk data.
+
+    Returns
+    -------
+    bytes
+        Chunk, with its length and CRC.
+    """
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(levels: np.ndarray, palette: np.ndarray) -> bytes:
+    """
+    Encode a density levels image as an indexed color PNG.
+
+    Scanlines are encoded with the "up" filter, as densities vary smoothly between
+    neighbouring rows.
+
+    Parameters
+    ----------
+    levels : np.ndarray
+        uint8 array of shape (height, width) of palette indices.
+    palette : np.ndarray
+        uint8 array of shape (256, 4), giving the RGBA color of each index.
+
+    Returns
+    -------
+    bytes
+        PNG file content.
+    """
+    height, width = levels.shape
+    # Each scanline is prefixed by its filter type, 2 being the difference with the
+    # previous scanline
+    raw = np.full((height, width + 1), 2, dtype=np.uint8)
+    raw[:, 1:] = np.diff(levels, axis=0, prepend=np.zeros((1, width), dtype=np.uint8))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"PLTE", palette[:, :3].tobytes())
+        + png_chunk(b"tRNS", palette[:, 3].tobytes())
+        + png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + png_chunk(b"IEND", b"")
+    )
+
+
+def render_tile(task: tuple) -> tuple[int, int, int, bytes]:
+    """
+    Render an heatmap tile.
+
+    Points weights are binned on the tile pixels grid, extended by the kernel radius so
+    that points of neighbouring tiles are taken into account. The grid is then convolved
+    with the separable gaussian kernel, one axis after the other.
+
+    Parameters
+    ----------
+    task : tuple
+        Tile zoom, x and y indices, points pixel coordinates relative to the extended
+        grid, points weights, gaussian kernel, colors palette and tile size, as
+        generated by `tile_tasks`.
+
+    Returns
+    -------
+    tuple[int, int, int, bytes]
+        Tile zoom, x and y indices, and PNG image.
+    """
+    zoom, tx, ty, px, py, weights, kernel, palette, tile_size = task
+    margin = len(kernel) // 2
+    size = tile_size + 2 * margin
+    ix = np.floor(px).astype(np.int64)
+    iy = np.floor(py).astype(np.int64)
+    inside = (ix >= 0) & (ix < size) & (iy >= 0) & (iy < size)
+    grid = np.bincount(iy[inside] * size + ix[inside], weights=weights[inside], minlength=size * size)
+    grid = grid.reshape(size, size)
+    rows = sum(k * grid[:, i : i + tile_size] for i, k in enumerate(kernel))
+    density = sum(k * rows[i : i + tile_size, :] for i, k in enumerate(kernel))
+    # Overlapping points opacities are composited, as with the frontend heatmap layers
+    levels = np.rint((1 - np.exp(-density)) * 255).astype(np.uint8)
+    return zoom, tx, ty, encode_png(levels, palette)
+
+
+def tile_tasks(
+    d: pl.DataFrame,
+    *,
+    radius: float,
+    blur: float,
+    gradient: tuple | list,
+    weight: str | None,
+    max_zoom: int,
+    tile_size: int = TILE_SIZE,
+) -> Iterator[tuple]:
+    """
+    Generate the rendering tasks of the non empty tiles of an heatmap pyramid.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Points data, with EPSG:3857 "pylifemap_x" and "pylifemap_y" columns.
+    radius : float
+        Heatmap radius, in pixels.
+    blur : float
+        Heatmap blur, in pixels.
+    gradient : tuple | list
+        Hexadecimal colors of the gradient.
+    weight : str | None
+        Name of a points weights column. Weights are log scaled, as with the frontend
+        heatmap layers.
+    max_zoom : int
+        Finest zoom level of the pyramid.
+    tile_size : int, optional
+        Size of the tiles, in pixels. By default 256.
+
+    Yields
+    ------
+    tuple
+        `render_tile` task, by increasing zoom level.
+    """
+    x = d.get_column("pylifemap_x").to_numpy()
+    y = d.get_column("pylifemap_y").to_numpy()
+    if weight is None:
+        weights = np.ones(d.height)
+    else:
+        weights = np.log1p(np.clip(d.get_column(weight).cast(pl.Float64).fill_null(0).to_numpy(), 0, None))
+        max_weight = weights.max() if d.height > 0 else 0
+        weights = weights / max_weight if max_weight > 0 else weights
+    keep = weights > 0
+    x, y, weights = x[keep], y[keep], weights[keep]
+
+    # The frontend draws points as blurred circles of radius `radius + blur`
+    sigma = max(radius + blur, 1) / 3
+    margin = int(np.ceil(3 * sigma))
+    kernel = np.exp(-0.5 * (np.arange(-margin, margin + 1) / sigma) ** 2)
+    palette = gradient_palette(gradient)
+    span = int(np.ceil(2 * margin / tile_size))
+
+    for zoom in range(MIN_VIEW_ZOOM, max_zoom + 1):
+        n_tiles = 2**zoom
+        scale = tile_size * n_tiles / (2 * WORLD_HALF_SIZE)
+        px = (x + WORLD_HALF_SIZE) * scale
+        py = (WORLD_HALF_SIZE - y) * scale
+        # Each point is assigned to every tile its kernel intersects
+        tx0 = np.floor((px - margin) / tile_size).astype(np.int64)
+        ty0 = np.floor((py - margin) / tile_size).astype(np.int64)
+        tx1 = np.floor((px + margin) / tile_size).astype(np.int64)
+        ty1 = np.floor((py + margin) / tile_size).astype(np.int64)
+        keys, indices = [], []
+        for dx in range(span + 1):
+            for dy in range(span + 1):
+                tx, ty = tx0 + dx, ty0 + dy
+                valid = (tx <= tx1) & (ty <= ty1) & (tx >= 0) & (tx < n_tiles) & (ty >= 0) & (ty < n_tiles)
+                keys.append(ty[valid] * n_tiles + tx[valid])
+                indices.append(np.flatnonzero(valid))
+        keys = np.concatenate(keys)
+        if len(keys) == 0:
+            continue
+        indices = np.concatenate(indices)
+        order = np.argsort(keys, kind="stable")
+        keys, indices = keys[order], indices[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        for start, end in zip(starts, [*starts[1:], len(keys)], strict=True):
+            ty, tx = divmod(int(keys[start]), n_tiles)
+            tile = indices[start:end]
+            yield (
+                zoom,
+                tx,
+                ty,
+                px[tile] - tx * tile_size + margin,
+                py[tile] - ty * tile_size + margin,
+                weights[tile],
+                kernel,
+                palette,
+                tile_size,
+            )
+
+
+def heatmap_tiles(
+    d: pl.DataFrame,
+    *,
+    radius: float = 5.0,
+    blur: float = 5.0,
+    gradient: tuple | list,
+    weight: str | None = None,
+    max_zoom: int = 6,
+    workers: int | None = None,
+) -> pl.DataFrame:
+    """
+    Render an heatmap as a pyramid of PNG raster tiles.
+
+    Only tiles with at least one point in their kernel extent are rendered, from the
+    minimum map zoom level up to `max_zoom`. The frontend scales the `max_zoom` tiles
+    when zooming further.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Points data, with EPSG:3857 "pylifemap_x" and "pylifemap_y" columns.
+    radius : float, optional
+        Heatmap radius, in pixels. By default 5.0.
+    blur : float, optional
+        Heatmap blur, in pixels. By default 5.0.
+    gradient : tuple | list
+        Hexadecimal colors of the gradient.
+    weight : str | None, optional
+        Name of a points weights column. By default `None`.
+    max_zoom : int, optional
+        Finest zoom level of the pyramid. By default 6.
+    workers : int | None, optional
+        Number of processes used to render and encode the tiles. If 1, or if there are
+        less than `MIN_POOL_TILES` tiles, tiles are rendered in the current process. If
+        `None`, use the `PYLIFEMAP_RASTER_WORKERS` environment variable, set in batch
+        worker processes, or the number of processors, tiles being rendered in the
+        current process if it is itself a worker process. By default `None`.
+
+    Returns
+    -------
+    pl.DataFrame
+        Tiles with "pylifemap_tile_z", "pylifemap_tile_x" and "pylifemap_tile_y" XYZ
+        indices, y indices starting from the top, and a "pylifemap_tile" PNG column.
+
+    Raises
+    ------
+    ValueError
+        If `max_zoom` is lower than the minimum map zoom level.
+    """
+    if max_zoom < MIN_VIEW_ZOOM:
+        msg = f"raster max zoom must be at least {MIN_VIEW_ZOOM}"
+        raise ValueError(msg)
+    tasks = tile_tasks(d, radius=radius, blur=blur, gradient=gradient, weight=weight, max_zoom=max_zoom)
+    if workers is None:
+        if RASTER_WORKERS_ENV in os.environ:
+            workers = int(os.environ[RASTER_WORKERS_ENV])
+        elif multiprocessing.parent_process() is not None:
+            workers = 1
+        else:
+            workers = os.cpu_count() or 1
+    first_tasks = list(islice(tasks, MIN_POOL_TILES))
+    tasks = chain(first_tasks, tasks)
+    if workers == 1 or len(first_tasks) < MIN_POOL_TILES:
+        tiles = list(map(render_tile, tasks))
+    else:
+        # Worker processes are spawned rather than forked, polars being not fork safe
+        context = multiprocessing.get_context("spawn")
+        with (
+            workers_environment(workers),
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor,
+        ):
+            tiles = list(executor.map(render_tile, tasks, chunksize=TASKS_CHUNKSIZE))
+    zooms, xs, ys, images = zip(*tiles, strict=True) if tiles else ((), (), (), ())
+    return pl.DataFrame(
+        {
+            "pylifemap_tile_z": pl.Series(zooms, dtype=pl.Int8),
+            "pylifemap_tile_x": pl.Series(xs, dtype=pl.Int32),
+            "pylifemap_tile_y": pl.Series(ys, dtype=pl.Int32),
+            "pylifemap_tile": pl.Series(images, dtype=pl.Binary),
+        }
+    )
@@ -0,0 +1,175 @@
+"""
+Bulk refresh of layers data coordinates from a new backend data version.
+"""
+
+import polars as pl
+
+from pylifemap.data.geo import project_to_3857
+from pylifemap.data.lazy_loading import lazy_offsets, sort_lazy_data
+from pylifemap.utils import TAXID_COL
+
+# Coordinates columns of layers data, indexed by their taxid column
+COORDS_COLUMNS = {
+    TAXID_COL: ("pylifemap_x", "pylifemap_y"),
+    "pylifemap_parent_taxid": ("pylifemap_parent_x", "pylifemap_parent_y"),
+    "pylifemap_dest_taxid": ("pylifemap_dest_x", "pylifemap_dest_y"),
+}
+
+
+def refresh_mode(options: dict) -> str:
+    """
+    Get how the coordinates of a layer data can be refreshed.
+
+    Layers exported as static tiles are not refreshed, as their tiles are fetched as is.
+    Layers whose zoom levels are not the taxids ones, such as display zooms computed
+    with `lazy_budget`, parent zooms, precomputed labels decluttering zooms, clusters or
+    tree level of detail zooms, only get their coordinates refreshed.
+
+    Parameters
+    ----------
+    options : dict
+        Layer options.
+
+    Returns
+    -------
+    str
+        "none", "positions" or "full".
+    """
+    if options.get("lazy_source") == "static":
+        return "none"
+    if (
+        options.get("lazy_budget") is not None
+        or options.get("lazy_mode") == "parent"
+        or options.get("declutter_mode") == "precompute"
+        or options.get("cluster")
+        or options.get("lod")
+    ):
+        return "positions"
+    return "full"
+
+
+def refresh_layer_data(d: pl.DataFrame, backend: pl.DataFrame, *, zoom: bool = True) -> pl.DataFrame:
+    """
+    Update the coordinates of layer data from backend data.
+
+    As done by the frontend with coordinates queried from lifemap-back, rows whose taxid,
+    parent taxid or destination taxid is not in `backend` anymore are removed, and
+    coordinates, zoom levels and deck.gl positions columns of other rows are updated.
+    Rows without taxid, such as clusters, and data without taxids, such as prebinned
+    grids or raster tiles, are kept as is.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Layer data, with EPSG:3857 coordinates.
+    backend : pl.DataFrame
+        Backend data, with "taxid", "pylifemap_x" and "pylifemap_y" longitudes and
+        latitudes, and "pylifemap_zoom" columns.
+    zoom : bool, optional
+        If `False`, zoom levels are not updated. By default `True`.
+
+    Returns
+    -------
+    pl.DataFrame
+        Updated layer data, with the same columns and data types as `d`.
+    """
+    if TAXID_COL not in d.columns:
+        return d
+    lonlat = backend.select("taxid", "pylifemap_x", "pylifemap_y", "pylifemap_zoom")
+    coords = project_to_3857(lonlat, x_col="pylifemap_x", y_col="pylifemap_y")
+    taxid_cols = [col for col in COORDS_COLUMNS if col in d.columns]
+
+    # Remove rows with unknown taxids, null taxids being kept
+    known = pl.lit(value=True)
+    for col in taxid_cols:
+        found = pl.col(col).is_in(coords.get_column("taxid").cast(d.schema[col]))
+        known = known & (found | pl.col(col).is_null())
+    d = d.filter(known)
+
+    def lookup(col: str, values: pl.Series, name: str) -> pl.Expr:
+        # Values of rows with a null taxid are kept
+        taxids = coords.get_column("taxid").cast(d.schema[col])
+        return (
+            pl.when(pl.col(col).is_null())
+            .then(pl.col(name))
+            .otherwise(pl.col(col).replace_strict(taxids, values, default=None))
+        )
+
+    updates = []
+    for col in taxid_cols:
+        for name, values in zip(
+            COORDS_COLUMNS[col],
+            (coords["pylifemap_x"], coords["pylifemap_y"]),
+            strict=True,
+        ):
+            if name in d.columns:
+                updates.append(lookup(col, values, name).cast(d.schema[name]).alias(name))
+    if zoom and "pylifemap_zoom" in d.columns:
+        zooms = lookup(TAXID_COL, coords["pylifemap_zoom"], "pylifemap_zoom")
+        updates.append(zooms.cast(d.schema["pylifemap_zoom"]).alias("pylifemap_zoom"))
+    if "pylifemap_positions" in d.columns:
+        # deck.gl positions are longitudes and latitudes, destinations following sources
+        parts = [
+            pl.col(col).replace_strict(
+                lonlat.get_column("taxid").cast(d.schema[col]),
+                lonlat[name],
+                default=None,
+            )
+            for col in (TAXID_COL, "pylifemap_dest_taxid")
+            if col in d.columns
+            for name in ("pylifemap_x", "pylifemap_y")
+        ]
+        dtype = d.schema["pylifemap_positions"]
+        positions = pl.concat_list(parts).list.to_array(dtype.size).cast(dtype)
+        updates.append(
+            pl.when(pl.col(TAXID_COL).is_null())
+            .then(pl.col("pylifemap_positions"))
+            .otherwise(positions)
+            .alias("pylifemap_positions")
+        )
+    return d.with_columns(updates)
+
+
+def refresh_layers_data(layers: list, layers_data: dict, backend: pl.DataFrame) -> tuple[list, dict]:
+    """
+    Update the coordinates of layers data from backend data.
+
+    Lazy loading points data are sorted again and their offsets table is recomputed.
+    Lines and arcs offsets tables are dropped, as their bounding boxes are outdated, so
+    that the frontend scans all their rows.
+
+    Parameters
+    ----------
+    layers : list
+        Layers definitions.
+    layers_data : dict
+        Layers data, indexed by layer id.
+    backend : pl.DataFrame
+        Backend data.
+
+    Returns
+    -------
+    tuple[list, dict]
+        Updated layers definitions and layers data. See `refresh_mode` and
+        `refresh_layer_data`.
+    """
+    layers_data = dict(layers_data)
+    result = []
+    for layer in layers:
+        d = layers_data.get(layer["id"])
+        mode = refresh_mode(layer["options"])
+        if not isinstance(d, pl.DataFrame) or mode == "none":
+            result.append(layer)
+            continue
+        d = refresh_layer_data(d, backend, zoom=mode == "full")
+        options = layer["options"]
+        if "lazy_offsets" in options:
+            options = dict(options)
+            if "pylifemap_bbox_xmin" in d.columns:
+                del options["lazy_offsets"]
+            else:
+                d = sort_lazy_data(d)
+                options["lazy_offsets"] = lazy_offsets(d)
+        layers_data[layer["id"]] = d
+        result.append({**layer, "options": options})
+    return result, layers_data
@@ -0,0 +1,160 @@
+"""
+Frontend data contract of layers.
+
+Each layer type requires some columns in its layers data, with given data types. Layers
+data are sent to the frontend in one of three formats:
+
+- `'columnar'`: one vector per column, numeric columns being typed arrays, and features
+  created by row index.
+- `'attributes'`: deck.gl binary attributes, see `pylifemap.data.attributes`.
+- `'rows'`: one object per row.
+"""
+
+import polars as pl
+
+from pylifemap.utils import TAXID_COL
+
+FLOAT = (pl.Float32, pl.Float64)
+INTEGER = (pl.Int8, pl.Int16, pl.Int32, pl.Int64, pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64)
+NUMERIC = FLOAT + INTEGER
+
+# Layer types whose frontend creates features from columnar data
+COLUMNAR_LAYERS = ("points", "heatmap")
+
+COORDS = {"pylifemap_x": FLOAT, "pylifemap_y": FLOAT}
+
+# Required layers data columns and their allowed data types, by layer type
+LAYER_SCHEMAS = {
+    "points": {TAXID_COL: INTEGER, **COORDS},
+    "lines": {
+        TAXID_COL: INTEGER,
+        **COORDS,
+        "pylifemap_parent_taxid": INTEGER,
+        "pylifemap_parent_x": FLOAT,
+        "pylifemap_parent_y": FLOAT,
+    },
+    "arcs": {
+        TAXID_COL: INTEGER,
+        **COORDS,
+        "pylifemap_dest_taxid": INTEGER,
+        "pylifemap_dest_x": FLOAT,
+        "pylifemap_dest_y": FLOAT,
+    },
+    "heatmap": COORDS,
+    "text": {TAXID_COL: INTEGER, **COORDS},
+    "icons": {TAXID_COL: INTEGER, **COORDS},
+    "donuts": {TAXID_COL: INTEGER, **COORDS, "pylifemap_total": NUMERIC},
+    "arcs_deck": {TAXID_COL: INTEGER, "pylifemap_dest_taxid": INTEGER, "pylifemap_positions": (pl.Array,)},
+    "heatmap_deck": {"pylifemap_positions": (pl.Array,)},
+    "screengrid": {"pylifemap_positions": (pl.Array,)},
+}
+
+# Required raster heatmap layers data columns
+RASTER_SCHEMA = {
+    "pylifemap_tile_z": INTEGER,
+    "pylifemap_tile_x": INTEGER,
+    "pylifemap_tile_y": INTEGER,
+    "pylifemap_tile": (pl.Binary,),
+}
+
+
+def layer_schema(layer: dict) -> dict:
+    """
+    Get the required data columns of a layer.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition, with "layer" and "options" entries.
+
+    Returns
+    -------
+    dict
+        Allowed data types of each required column, indexed by column name.
+
+    Raises
+    ------
+    ValueError
+        If the layer type is unknown.
+    """
+    if layer["layer"] not in LAYER_SCHEMAS:
+        msg = f"unknown layer type: {layer['layer']}"
+        raise ValueError(msg)
+    if layer["layer"] == "heatmap" and layer.get("options", {}).get("raster", False):
+        return RASTER_SCHEMA
+    return LAYER_SCHEMAS[layer["layer"]]
+
+
+def is_vector_dtype(dtype: pl.DataType) -> bool:
+    """
+    Check if a column data type can be sent to the frontend as a single vector.
+
+    Parameters
+    ----------
+    dtype : pl.DataType
+        Column data type.
+
+    Returns
+    -------
+    bool
+        `True` if the data type is not nested.
+    """
+    return not dtype.is_nested()
+
+
+def layer_format(layer: dict, d: pl.DataFrame) -> str:
+    """
+    Get the frontend data format of a layer.
+
+    Layers with an explicit "format" entry keep it. Layers whose type has a columnar
+    frontend code path and whose data columns are all vectors use the `'columnar'`
+    format, the other ones the `'rows'` format.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition.
+    d : pl.DataFrame
+        Layer data.
+
+    Returns
+    -------
+    str
+        `'columnar'`, `'attributes'` or `'rows'`.
+    """
+    if "format" in layer:
+        return layer["format"]
+    if layer["layer"] in COLUMNAR_LAYERS and all(is_vector_dtype(dtype) for dtype in d.schema.values()):
+        return "columnar"
+    return "rows"
+
+
+def check_layer_data(layer: dict, d: pl.DataFrame) -> None:
+    """
+    Check that layer data follow the frontend data contract of the layer.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition.
+    d : pl.DataFrame
+        Layer data.
+
+    Raises
+    ------
+    ValueError
+        If a required column is missing or has a wrong data type, or if a binary
+        attributes column is not numeric.
+    """
+    for col, dtypes in layer_schema(layer).items():
+        if col not in d.columns:
+            msg = f"{layer['layer']} layer data must have a {col} column"
+            raise ValueError(msg)
+        if d.schema[col].base_type() not in dtypes:
+            msg = f"{layer['layer']} layer data {col} column has an invalid {d.schema[col]} data type"
+            raise ValueError(msg)
+    if layer_format(layer, d) == "attributes":
+        for col, dtype in d.schema.items():
+            if dtype.base_type() not in (*NUMERIC, pl.Array):
+                msg = f"{col} column of binary attributes layer data must be numeric"
+                raise ValueError(msg)
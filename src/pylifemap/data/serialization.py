@@ -2,14 +2,29 @@
 Functions for DataFrame objects conversion to Arrow IPC bytes.
 """
 
+import hashlib
 import io
-from typing import Any
+from typing import Any, Literal
 
 import polars as pl
 import pyarrow.feather as pf
 
+# Available Arrow IPC compression codecs
+SERIALIZATION_COMPRESSIONS = ("uncompressed", "lz4", "zstd")
+# Available Arrow IPC writers
+SERIALIZATION_ENGINES = ("pyarrow", "polars")
 
-def serialize_data(data: Any) -> dict:
+Compression = Literal["uncompressed", "lz4", "zstd"]
+Engine = Literal["pyarrow", "polars"]
+
+
+def serialize_data(
+    data: Any,
+    *,
+    compression: Compression = "lz4",
+    compression_level: int | None = None,
+    engine: Engine = "pyarrow",
+) -> dict:
     """
     Serialize an object.
 
@@ -20,6 +35,12 @@ def serialize_data(data: Any) -> dict:
     ----------
     data : Any
         Object to serialize.
+    compression : Literal["uncompressed", "lz4", "zstd"], optional
+        Arrow IPC compression codec. By default `'lz4'`.
+    compression_level : int | None, optional
+        Compression level, only used with the `'pyarrow'` engine. By default `None`.
+    engine : Literal["pyarrow", "polars"], optional
+        Arrow IPC writer to use. By default `'pyarrow'`.
 
     Returns
     -------
@@ -30,13 +51,233 @@ def serialize_data(data: Any) -> dict:
 
     # If polars DataFrame, serialize to Arrow IPC
     if isinstance(data, pl.DataFrame):
-        return {"serialized": True, "value": pl_to_arrow(data)}
+        value = pl_to_arrow(data, compression=compression, compression_level=compression_level, engine=engine)
+        return {"serialized": True, "value": value}
     # Else, keep as is
     else:
         return {"serialized": False, "value": data}
 
 
-def pl_to_arrow(df: pl.DataFrame) -> bytes:
+def column_fingerprint(column: pl.Series) -> str:
+    """
+    Compute a content fingerprint of a DataFrame column.
+
+    The fingerprint depends on the column name, data type, and values in order.
+
+    Parameters
+    ----------
+    column : pl.Series
+        Column to fingerprint.
+
+    Returns
+    -------
+    str
+        Hexadecimal fingerprint.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{column.name}:{column.dtype}:{column.len()}".encode())
+    h.update(column.hash(seed=0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def serialize_layers_data(
+    layers_data: dict,
+    *,
+    compression: Compression = "lz4",
+    compression_level: int | None = None,
+    engine: Engine = "pyarrow",
+    chunk_size: int | None = None,
+    formats: dict | None = None,
+) -> dict:
+    """
+    Serialize layers data into a content-addressed data store.
+
+    Each layer DataFrame is fingerprinted column by column. If a layer data is equal to
+    a subset of the columns of another layer data, both layers reference the same store
+    entry and only the largest one is serialized. The frontend then projects each layer
+    columns out of the shared table.
+
+    Parameters
+    ----------
+    layers_data : dict
+        Dictionary of layers data, indexed by layer id.
+    compression : Literal["uncompressed", "lz4", "zstd"], optional
+        Arrow IPC compression codec. By default `'lz4'`.
+    compression_level : int | None, optional
+        Compression level, only used with the `'pyarrow'` engine. By default `None`.
+    engine : Literal["pyarrow", "polars"], optional
+        Arrow IPC writer to use. By default `'pyarrow'`.
+    chunk_size : int | None, optional
+        If not `None`, store entries with more rows than `chunk_size` are split into
+        separately serialized chunks, listed in a "chunks" entry instead of "value". See
+        `serialize_chunks`. By default `None`.
+    formats : dict | None, optional
+        Frontend data format of layers, indexed by layer id. With the `'columnar'` and
+        `'attributes'` formats, the frontend gets each column as a vector, typed array
+        for numeric columns, instead of building one object per row. Other layers are
+        converted to rows. See `pylifemap.data.schema`. By default `None`.
+
+    Returns
+    -------
+    dict
+        Dictionary with a "store" entry with serialized data indexed by content key, and
+        a "layers" entry giving for each layer id the store key, the columns to use and
+        the data format, if any. Non DataFrame layers data are kept as is in the "layers"
+        entry.
+    """
+    entries = []
+    layers = {}
+
+    # Process larger DataFrames first so that subsets can reference them
+    frames = {k: v for k, v in layers_data.items() if isinstance(v, pl.DataFrame)}
+    for layer_id in sorted(frames, key=lambda k: frames[k].width, reverse=True):
+        df = frames[layer_id]
+        fingerprints = {col.name: column_fingerprint(col) for col in df.get_columns()}
+        entry = next(
+            (
+                e
+                for e in entries
+                if e["height"] == df.height and fingerprints.items() <= e["fingerprints"].items()
+            ),
+            None,
+        )
+        if entry is None:
+            key = hashlib.blake2b("".join(sorted(fingerprints.values())).encode(), digest_size=16).hexdigest()
+            entry = {"key": key, "height": df.height, "fingerprints": fingerprints, "data": df}
+            entries.append(entry)
+        layers[layer_id] = {"key": entry["key"], "columns": df.columns}
+        if formats is not None and layer_id in formats:
+            layers[layer_id]["format"] = formats[layer_id]
+
+    for layer_id, data in layers_data.items():
+        if layer_id not in layers:
+            layers[layer_id] = serialize_data(data)
+
+    serialization_options = {
+        "compression": compression,
+        "compression_level": compression_level,
+        "engine": engine,
+    }
+    store = {}
+    for e in entries:
+        if chunk_size is not None and e["height"] > chunk_size:
+            store[e["key"]] = {
+                "serialized": True,
+                "chunks": serialize_chunks(e["data"], chunk_size, **serialization_options),
+            }
+        else:
+            store[e["key"]] = serialize_data(e["data"], **serialization_options)
+    # Keep original layers order
+    layers = {k: layers[k] for k in layers_data}
+
+    return {"store": store, "layers": layers}
+
+
+def serialize_chunks(
+    df: pl.DataFrame,
+    chunk_size: int,
+    *,
+    compression: Compression = "lz4",
+    compression_level: int | None = None,
+    engine: Engine = "pyarrow",
+) -> list[dict]:
+    """
+    Split a DataFrame into chunks of rows, each serialized to Arrow IPC.
+
+    Chunks are ordered coarsest zoom level first, so that the frontend can display an
+    overview of the data before all chunks are received. Each chunk carries its "index"
+    in the original DataFrame row order, so that the frontend can restore it.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        DataFrame to split.
+    chunk_size : int
+        Maximum number of rows per chunk.
+    compression : Literal["uncompressed", "lz4", "zstd"], optional
+        Arrow IPC compression codec. By default `'lz4'`.
+    compression_level : int | None, optional
+        Compression level, only used with the `'pyarrow'` engine. By default `None`.
+    engine : Literal["pyarrow", "polars"], optional
+        Arrow IPC writer to use. By default `'pyarrow'`.
+
+    Returns
+    -------
+    list[dict]
+        List of chunks as dictionaries with "index" and "value" entries.
+
+    Raises
+    ------
+    ValueError
+        If `chunk_size` is not a positive integer.
+    """
+    if chunk_size < 1:
+        msg = "chunk_size must be a positive integer"
+        raise ValueError(msg)
+    offsets = range(0, max(df.height, 1), chunk_size)
+    if "pylifemap_zoom" in df.columns:
+        # Sort chunks by their coarsest zoom level
+        min_zooms = [df.get_column("pylifemap_zoom").slice(o, chunk_size).min() for o in offsets]
+        order = sorted(range(len(offsets)), key=lambda i: (min_zooms[i], -i))
+    else:
+        # Layers data are sorted by decreasing zoom, so send last rows first
+        order = list(reversed(range(len(offsets))))
+    return [
+        {
+            "index": i,
+            "value": pl_to_arrow(
+                df.slice(offsets[i], chunk_size),
+                compression=compression,
+                compression_level=compression_level,
+                engine=engine,
+            ),
+        }
+        for i in order
+    ]
+
+
+def check_serialization_options(
+    compression: str, compression_level: int | None = None, engine: str = "pyarrow"
+) -> None:
+    """
+    Check serialization options values.
+
+    Parameters
+    ----------
+    compression : str
+        Arrow IPC compression codec.
+    compression_level : int | None, optional
+        Compression level. By default `None`.
+    engine : str, optional
+        Arrow IPC writer. By default `'pyarrow'`.
+
+    Raises
+    ------
+    ValueError
+        If `compression` or `engine` is not an allowed value, or if a `compression_level`
+        is given with an engine or a codec which doesn't support it.
+    """
+    if compression not in SERIALIZATION_COMPRESSIONS:
+        msg = f"compression must be one of {SERIALIZATION_COMPRESSIONS}"
+        raise ValueError(msg)
+    if engine not in SERIALIZATION_ENGINES:
+        msg = f"engine must be one of {SERIALIZATION_ENGINES}"
+        raise ValueError(msg)
+    if compression_level is not None:
+        if engine != "pyarrow":
+            msg = "compression_level can only be used with the 'pyarrow' engine"
+            raise ValueError(msg)
+        if compression == "uncompressed":
+            msg = "compression_level cannot be used without compression"
+            raise ValueError(msg)
+
+
+def pl_to_arrow(
+    df: pl.DataFrame,
+    compression: Compression = "lz4",
+    compression_level: int | None = None,
+    engine: Engine = "pyarrow",
+) -> bytes:
     """
     Convert a polars DataFrame to Arrow IPC bytes.
 
@@ -44,12 +285,27 @@ def pl_to_arrow(df: pl.DataFrame) -> bytes:
     ---------
     df : pl.DataFrame
         Polars DataFrame to convert.
+    compression : Literal["uncompressed", "lz4", "zstd"], optional
+        Arrow IPC compression codec. `'zstd'` gives smaller payloads, `'lz4'` faster
+        encoding and decoding. By default `'lz4'`.
+    compression_level : int | None, optional
+        Compression level, only used with the `'pyarrow'` engine. If `None`, the codec
+        default level is used. By default `None`.
+    engine : Literal["pyarrow", "polars"], optional
+        If `'pyarrow'`, convert the DataFrame to a pyarrow Table and write it as feather.
+        If `'polars'`, use the native polars IPC writer, which avoids the conversion.
+        By default `'pyarrow'`.
 
     Returns
     -------
     bytes
         Arrow IPC bytes
     """
+    check_serialization_options(compression, compression_level, engine)
     f = io.BytesIO()
-    pf.write_feather(df.to_arrow(), f, compression="lz4")
+    if engine == "polars":
+        # Oldest compat level to avoid string views, not supported by the JS Arrow reader
+        df.write_ipc(f, compression=compression, compat_level=pl.CompatLevel.oldest())
+    else:
+        pf.write_feather(df.to_arrow(), f, compression=compression, compression_level=compression_level)
     return f.getvalue()
@@ -0,0 +1,229 @@
+"""
+Spatial and zoom index of layers data, used to answer lazy loading viewport queries
+from the kernel.
+"""
+
+import math
+
+import numpy as np
+import polars as pl
+
+# Half size of the EPSG:3857 world extent
+WORLD_HALF_SIZE = 20037508.342789244
+# Number of grid cells along each axis
+GRID_SIZE = 128
+
+
+def tile_extent(tile_z: int, tile_x: int, tile_y: int) -> tuple[float, float, float, float]:
+    """
+    Compute the extent of a map tile.
+
+    Tiles split the EPSG:3857 world extent into a `2**tile_z` x `2**tile_z` grid, with
+    `tile_x` and `tile_y` counted from the bottom left corner.
+
+    Parameters
+    ----------
+    tile_z : int
+        Tile zoom level.
+    tile_x : int
+        Tile column.
+    tile_y : int
+        Tile row.
+
+    Returns
+    -------
+    tuple[float, float, float, float]
+        Tile extent as (xmin, ymin, xmax, ymax).
+    """
+    size = 2 * WORLD_HALF_SIZE / 2**tile_z
+    xmin = tile_x * size - WORLD_HALF_SIZE
+    ymin = tile_y * size - WORLD_HALF_SIZE
+    return (xmin, ymin, xmin + size, ymin + size)
+
+
+def ranges_to_indices(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Concatenate integer ranges into a single indices array.
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Ranges starts.
+    ends : np.ndarray
+        Ranges ends (excluded).
+
+    Returns
+    -------
+    np.ndarray
+        Concatenation of `range(start, end)` for each range.
+    """
+    lengths = ends - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if len(lengths) == 0:
+        return np.empty(0, dtype=np.int64)
+    # Offset of each range start relative to its position in the output
+    shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return shifts + np.arange(lengths.sum())
+
+
+class GridIndex:
+    """
+    Spatial and zoom index of a layer data.
+
+    Rows are bucketed by `pylifemap_zoom` value, then by cell of a regular grid over the
+    data projected coordinates. Rows are sorted by (zoom bucket, grid cell), so that the
+    rows of a rectangle of cells at a given zoom bucket are stored in one contiguous
+    range per grid row, found with an offsets table.
+    """
+
+    def __init__(self, data: pl.DataFrame, grid_size: int = GRID_SIZE):
+        """
+        GridIndex constructor.
+
+        Parameters
+        ----------
+        data : pl.DataFrame
+            Layer data, with `pylifemap_x`, `pylifemap_y` and `pylifemap_zoom` columns.
+        grid_size : int, optional
+            Number of grid cells along each axis. By default `GRID_SIZE`.
+
+        Raises
+        ------
+        ValueError
+            If one of the needed columns is not in `data`.
+        """
+        for col in ("pylifemap_x", "pylifemap_y", "pylifemap_zoom"):
+            if col not in data.columns:
+                msg = f"{col} must be a column of data."
+                raise ValueError(msg)
+
+        x = data.get_column("pylifemap_x").to_numpy()
+        y = data.get_column("pylifemap_y").to_numpy()
+        zoom = data.get_column("pylifemap_zoom").to_numpy()
+
+        self.grid_size = grid_size
+        self.bounds = (
+            (float(x.min()), float(y.min()), float(x.max()), float(y.max()))
+            if data.height > 0
+            else (0, 0, 0, 0)
+        )
+        self.zooms, zoom_bucket = np.unique(zoom, return_inverse=True)
+
+        cell_x, cell_y = self._cells(x, y)
+        bucket_size = grid_size * grid_size
+        key = zoom_bucket.astype(np.int64) * bucket_size + cell_y * grid_size + cell_x
+        order = np.argsort(key, kind="stable")
+
+        # offsets[k] is the position of the first row with a key greater or equal to k
+        self.offsets = np.searchsorted(key[order], np.arange(len(self.zooms) * bucket_size + 1))
+        self.order = order
+        self.x = x[order]
+        self.y = y[order]
+        self.data = data
+
+    def __len__(self) -> int:
+        return self.data.height
+
+    def _cells(self, x: np.ndarray | float, y: np.ndarray | float) -> tuple:
+        """
+        Compute the grid cells of coordinates, clipped to the grid.
+        """
+        xmin, ymin, xmax, ymax = self.bounds
+        width = max(xmax - xmin, 1e-9)
+        height = max(ymax - ymin, 1e-9)
+        cell_x = np.clip(
+            ((np.asarray(x) - xmin) / width * self.grid_size).astype(np.int64), 0, self.grid_size - 1
+        )
+        cell_y = np.clip(
+            ((np.asarray(y) - ymin) / height * self.grid_size).astype(np.int64), 0, self.grid_size - 1
+        )
+        return cell_x, cell_y
+
+    def query_indices(
+        self, extent: tuple[float, float, float, float], max_zoom: float | None = None
+    ) -> np.ndarray:
+        """
+        Get the indices of the rows inside an extent and with a zoom level lower or equal
+        to `max_zoom`.
+
+        Parameters
+        ----------
+        extent : tuple[float, float, float, float]
+            Extent as (xmin, ymin, xmax, ymax). Rows on the left and bottom edges are
+            included, rows on the right and top edges are excluded.
+        max_zoom : float | None, optional
+            Maximum zoom level. If `None`, all zoom levels are kept. By default `None`.
+
+        Returns
+        -------
+        np.ndarray
+            Sorted row indices in the original data.
+        """
+        xmin, ymin, xmax, ymax = extent
+        bxmin, bymin, bxmax, bymax = self.bounds
+        if len(self) == 0 or xmin > bxmax or xmax < bxmin or ymin > bymax or ymax < bymin:
+            return np.empty(0, dtype=np.int64)
+
+        n_buckets = (
+            len(self.zooms) if max_zoom is None else int(np.searchsorted(self.zooms, max_zoom, side="right"))
+        )
+        (cx0, cx1), (cy0, cy1) = self._cells([xmin, xmax], [ymin, ymax])
+
+        # One contiguous range for each (zoom bucket, grid row)
+        buckets = np.arange(n_buckets)[:, None] * self.grid_size * self.grid_size
+        rows = np.arange(cy0, cy1 + 1)[None, :] * self.grid_size
+        first_keys = (buckets + rows + cx0).ravel()
+        starts = self.offsets[first_keys]
+        ends = self.offsets[first_keys + (cx1 - cx0 + 1)]
+        candidates = ranges_to_indices(starts, ends)
+
+        # Exact filtering of candidates in border cells
+        x = self.x[candidates]
+        y = self.y[candidates]
+        keep = (x >= xmin) & (x < xmax) & (y >= ymin) & (y < ymax)
+        return np.sort(self.order[candidates[keep]])
+
+    def query(self, extent: tuple[float, float, float, float], max_zoom: float | None = None) -> pl.DataFrame:
+        """
+        Get the rows inside an extent and with a zoom level lower or equal to `max_zoom`.
+
+        Parameters
+        ----------
+        extent : tuple[float, float, float, float]
+            Extent as (xmin, ymin, xmax, ymax).
+        max_zoom : float | None, optional
+            Maximum zoom level. If `None`, all zoom levels are kept. By default `None`.
+
+        Returns
+        -------
+        pl.DataFrame
+            Selected rows, in their original order.
+        """
+        return self.data[self.query_indices(extent, max_zoom)]
+
+    def query_tile(
+        self, tile_z: int, tile_x: int, tile_y: int, max_zoom: float | None = None
+    ) -> pl.DataFrame:
+        """
+        Get the rows of a map tile with a zoom level lower or equal to `max_zoom`.
+
+        Parameters
+        ----------
+        tile_z : int
+            Tile zoom level.
+        tile_x : int
+            Tile column.
+        tile_y : int
+            Tile row.
+        max_zoom : float | None, optional
+            Maximum zoom level. If `None`, all zoom levels are kept. By default `None`.
+
+        Returns
+        -------
+        pl.DataFrame
+            Selected rows, in their original order.
+        """
+        if max_zoom is not None and math.isinf(max_zoom):
+            max_zoom = None
+        return self.query(tile_extent(tile_z, tile_x, tile_y), max_zoom)
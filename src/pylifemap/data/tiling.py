@@ -0,0 +1,123 @@
+"""
+Split of lazy loading layers data into static tiles, for exports without a kernel.
+"""
+
+import numpy as np
+import polars as pl
+
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+
+# Maximum zoom level of static tiles
+STATIC_TILES_MAX_ZOOM = 12
+# Minimum average number of rows of static tiles, used to choose the zoom level of the
+# tiles of each bucket
+STATIC_TILES_MIN_ROWS = 1000
+
+
+def static_tiles_keys(
+    d: pl.DataFrame,
+    lazy_zoom: float,
+    max_tile_zoom: int = STATIC_TILES_MAX_ZOOM,
+    min_rows: int = STATIC_TILES_MIN_ROWS,
+) -> tuple[list[int], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the static tile of each row of a lazy loading layer data.
+
+    With lazy loading, a row is displayed when the map view zoom level is at least its
+    `pylifemap_zoom` value minus `lazy_zoom`. Rows are bucketed by this minimal view zoom
+    level, and each bucket is split into the map tiles of a zoom level lower or equal to
+    the bucket and to `max_tile_zoom`: the deepest one whose non empty tiles have at least
+    `min_rows` rows on average. A view at zoom level `z` then needs, for each bucket lower
+    or equal to `z`, only the tiles of the bucket intersecting the view extent.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Layer data, with `pylifemap_x`, `pylifemap_y` and `pylifemap_zoom` columns.
+    lazy_zoom : float
+        Layer `lazy_zoom` option. If negative, all rows are displayed at any zoom level.
+    max_tile_zoom : int, optional
+        Maximum zoom level of tiles. By default `STATIC_TILES_MAX_ZOOM`.
+    min_rows : int, optional
+        Minimum average number of rows of tiles. By default `STATIC_TILES_MIN_ROWS`.
+
+    Returns
+    -------
+    tuple[list[int], np.ndarray, np.ndarray, np.ndarray]
+        Tiles zoom level of each bucket, and bucket, tile column and tile row of each row.
+        Tiles columns and rows are counted from the bottom left corner of the EPSG:3857
+        world extent.
+    """
+    zoom = d.get_column("pylifemap_zoom").to_numpy().astype(np.float64)
+    if lazy_zoom < 0:
+        bucket = np.zeros(d.height, dtype=np.int64)
+    else:
+        bucket = np.maximum(np.ceil(zoom - lazy_zoom), 0).astype(np.int64)
+
+    # Tiles of the maximum zoom level, tiles of lower levels being obtained by bit shifts
+    n_tiles = 2**max_tile_zoom
+    tile_size = 2 * WORLD_HALF_SIZE / n_tiles
+
+    def to_tile(values: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor((values + WORLD_HALF_SIZE) / tile_size), 0, n_tiles - 1).astype(np.int64)
+
+    max_x = to_tile(d.get_column("pylifemap_x").to_numpy())
+    max_y = to_tile(d.get_column("pylifemap_y").to_numpy())
+
+    levels = [0] * (int(bucket.max()) + 1 if d.height > 0 else 0)
+    shift = np.full(d.height, max_tile_zoom, dtype=np.int64)
+    for b in np.unique(bucket):
+        rows = bucket == b
+        level = 0
+        for candidate in range(1, min(int(b), max_tile_zoom) + 1):
+            codes = ((max_x[rows] >> (max_tile_zoom - candidate)) << 32) | (
+                max_y[rows] >> (max_tile_zoom - candidate)
+            )
+            if rows.sum() / len(np.unique(codes)) < min_rows:
+                break
+            level = candidate
+        levels[b] = level
+        shift[rows] = max_tile_zoom - level
+    return levels, bucket, max_x >> shift, max_y >> shift
+
+
+def split_static_tiles(
+    d: pl.DataFrame,
+    lazy_zoom: float,
+    max_tile_zoom: int = STATIC_TILES_MAX_ZOOM,
+    min_rows: int = STATIC_TILES_MIN_ROWS,
+) -> tuple[list[int], dict[tuple[int, int, int], pl.DataFrame]]:
+    """
+    Split a lazy loading layer data into static tiles.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Layer data, with `pylifemap_x`, `pylifemap_y` and `pylifemap_zoom` columns.
+    lazy_zoom : float
+        Layer `lazy_zoom` option.
+    max_tile_zoom : int, optional
+        Maximum zoom level of tiles. By default `STATIC_TILES_MAX_ZOOM`.
+    min_rows : int, optional
+        Minimum average number of rows of tiles. By default `STATIC_TILES_MIN_ROWS`.
+
+    Returns
+    -------
+    tuple[list[int], dict[tuple[int, int, int], pl.DataFrame]]
+        Tiles zoom level of each bucket, and non empty tiles data, in their original rows
+        order, indexed by (bucket, tile column, tile row). See `static_tiles_keys`.
+    """
+    if d.height == 0:
+        return [], {}
+    levels, bucket, tile_x, tile_y = static_tiles_keys(d, lazy_zoom, max_tile_zoom, min_rows)
+    # Stable sort, so that rows keep their order inside each tile
+    order = np.lexsort((tile_y, tile_x, bucket))
+    keys = np.stack([bucket[order], tile_x[order], tile_y[order]], axis=1)
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    ends = [*starts[1:], len(keys)]
+    sorted_data = d[order]
+    tiles = {
+        tuple(int(v) for v in keys[start]): sorted_data.slice(start, end - start)
+        for start, end in zip(starts, ends, strict=True)
+    }
+    return levels, tiles
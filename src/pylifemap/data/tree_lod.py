@@ -0,0 +1,134 @@
+"""
+Tree-based level of detail of points layers data.
+"""
+
+import polars as pl
+
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.geo import project_to_3857
+from pylifemap.utils import TAXID_COL
+
+# Minimum zoom level of the map view
+MIN_VIEW_ZOOM = 4
+
+
+def tree_lod_levels(
+    d: pl.DataFrame,
+    *,
+    depth: int,
+    sum_cols: tuple | list = (),
+    mean_cols: tuple | list = (),
+) -> tuple[pl.DataFrame, list[int]]:
+    """
+    Compute the tree-based levels of detail of points data.
+
+    At view zoom `z`, taxa with a zoom level lower or equal to `z + depth` are displayed
+    as is, and deeper taxa are collapsed into their nearest ancestor with a zoom level
+    lower or equal to `z + depth`. Each displayed taxon gets the number of collapsed taxa
+    in a "pylifemap_count" column, and aggregated values of `sum_cols` and `mean_cols`.
+    Other columns of `d` are kept for displayed taxa which are rows of `d`.
+
+    Ancestors are computed in a single sweep over the taxa paths to the root: each
+    ancestor represents a taxon for an interval of view zooms. As the taxa represented by
+    an ancestor only change at these intervals bounds, the result is a compact table where
+    each row is valid for an interval of view zooms, given by "pylifemap_lod_min" and
+    "pylifemap_lod_max" columns.
+
+    Parameters
+    ----------
+    d : pl.DataFrame
+        Points data, with a "pylifemap_taxid" column.
+    depth : int
+        Zoom depth displayed under the current view zoom.
+    sum_cols : tuple | list, optional
+        Numeric columns to aggregate as sums. By default `()`.
+    mean_cols : tuple | list, optional
+        Numeric columns to aggregate as means of non null values. By default `()`.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, list[int]]
+        Levels of detail data, with EPSG:3857 "pylifemap_x" and "pylifemap_y" columns,
+        and the sorted list of view zooms. At the last view zoom, all taxa are displayed
+        as is.
+    """
+    value_cols = [*sum_cols, *mean_cols]
+    rows = d.select(TAXID_COL, *value_cols).with_columns(
+        pl.col(c).is_not_null().cast(pl.Int64).alias(f"{c}_n") for c in mean_cols
+    )
+    zooms = BACKEND_DATA.select(pl.col("taxid").alias("node"), pl.col("pylifemap_zoom").alias("node_zoom"))
+
+    # Path from each taxon to the root, with the taxon itself first
+    paths = (
+        BACKEND_DATA.select(pl.col("taxid").alias(TAXID_COL), "pylifemap_ascend")
+        .join(rows.select(TAXID_COL).unique(), on=TAXID_COL, how="semi")
+        .select(TAXID_COL, pl.concat_list(TAXID_COL, "pylifemap_ascend").alias("node"))
+        .explode("node")
+        .join(zooms, on="node", how="left", maintain_order="left")
+    )
+    # A node represents a taxon for view zooms where its zoom is lower or equal to the
+    # threshold, and the zooms of all the nodes before it in the path are greater
+    paths = paths.with_columns(
+        pl.col("node_zoom").cum_min().shift(1).over(TAXID_COL).alias("upper"),
+    )
+    max_zoom = max(MIN_VIEW_ZOOM, (paths.get_column("node_zoom").max() or 0) - depth)
+    intervals = (
+        paths.with_columns(
+            pl.max_horizontal(pl.col("node_zoom") - depth, MIN_VIEW_ZOOM).alias("lo"),
+            pl.min_horizontal(pl.col("upper") - 1 - depth, max_zoom).fill_null(max_zoom).alias("hi"),
+        )
+        .filter(pl.col("lo") <= pl.col("hi"))
+        .join(rows, on=TAXID_COL)
+    )
+
+    # Number of represented taxa and values sums change at intervals bounds
+    values = ["count", *value_cols, *(f"{c}_n" for c in mean_cols)]
+    intervals = intervals.with_columns(pl.lit(1, dtype=pl.Int64).alias("count"))
+    events = pl.concat(
+        [
+            intervals.select("node", pl.col("lo").alias("zoom"), *(pl.col(c).fill_null(0) for c in values)),
+            intervals.select(
+                "node", (pl.col("hi") + 1).alias("zoom"), *(-pl.col(c).fill_null(0) for c in values)
+            ),
+        ],
+        how="vertical_relaxed",
+    )
+    segments = (
+        events.group_by("node", "zoom")
+        .agg(pl.col(c).sum() for c in values)
+        .sort("node", "zoom")
+        .with_columns(
+            *(pl.col(c).cum_sum().over("node") for c in values),
+            (pl.col("zoom").shift(-1).over("node") - 1).alias("pylifemap_lod_max"),
+        )
+        .filter(pl.col("count") > 0)
+    )
+
+    result = (
+        segments.join(
+            BACKEND_DATA.select(pl.col("taxid").alias("node"), "pylifemap_x", "pylifemap_y"),
+            on="node",
+            how="left",
+        )
+        .select(
+            pl.col("node").alias(TAXID_COL),
+            "pylifemap_x",
+            "pylifemap_y",
+            pl.col("count").alias("pylifemap_count"),
+            *sum_cols,
+            *(pl.when(pl.col(f"{c}_n") > 0).then(pl.col(c) / pl.col(f"{c}_n")).alias(c) for c in mean_cols),
+            pl.col("zoom").cast(pl.Int8).alias("pylifemap_lod_min"),
+            pl.col("pylifemap_lod_max").cast(pl.Int8),
+        )
+        .sort("pylifemap_lod_min", TAXID_COL)
+    )
+    other_cols = [
+        c
+        for c in d.columns
+        if c not in (TAXID_COL, "pylifemap_x", "pylifemap_y", "pylifemap_zoom", *value_cols)
+    ]
+    if other_cols:
+        others = d.select(TAXID_COL, *other_cols).unique(TAXID_COL, keep="first")
+        result = result.join(others, on=TAXID_COL, how="left", maintain_order="left")
+    result = project_to_3857(result, x_col="pylifemap_x", y_col="pylifemap_y")
+    return result, list(range(MIN_VIEW_ZOOM, max_zoom + 1))
@@ -0,0 +1,52 @@
+"""
+Environment of worker processes.
+"""
+
+import os
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from pylifemap.data.backend_data import BACKEND, BACKEND_SNAPSHOT_ENV
+
+# Environment variable giving the default number of raster tiles rendering processes
+RASTER_WORKERS_ENV = "PYLIFEMAP_RASTER_WORKERS"
+
+
+@contextmanager
+def workers_environment(workers: int) -> Iterator[None]:
+    """
+    Set up the environment inherited by spawned worker processes.
+
+    The backend data are saved once as a memory-mapped snapshot shared read-only by the
+    workers, which load it instead of checking and reading the cached data. If the
+    current process already uses such a snapshot, as a worker process, it is shared
+    too. The polars threads and the raster tiles rendering processes of each worker are
+    split between workers, so that nested pools don't oversubscribe the processors.
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes.
+    """
+    with ExitStack() as stack:
+        env = {}
+        if BACKEND_SNAPSHOT_ENV not in os.environ:
+            snapshot_dir = stack.enter_context(TemporaryDirectory())
+            BACKEND.save_snapshot(Path(snapshot_dir))
+            env[BACKEND_SNAPSHOT_ENV] = snapshot_dir
+        share = str(max((os.cpu_count() or 1) // workers, 1))
+        for name in ("POLARS_MAX_THREADS", RASTER_WORKERS_ENV):
+            if name not in os.environ:
+                env[name] = share
+        previous = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            yield
+        finally:
+            for k, v in previous.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
@@ -0,0 +1,347 @@
+"""
+Export of Lifemap widgets to a directory with sidecar data files, or to HTML pages
+referencing a shared JavaScript bundle.
+"""
+
+import base64
+import hashlib
+import html
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from string import Template
+
+import polars as pl
+
+from pylifemap.data.serialization import pl_to_arrow
+from pylifemap.data.tiling import split_static_tiles
+from pylifemap.widget import LifemapWidget
+
+# HTML page template of directory exports
+DIRECTORY_TEMPLATE = Path(__file__).parent / "templates" / "directory.html"
+
+# Widget bundle export modes
+BUNDLE_MODES = ("inline", "external", "url")
+
+
+def write_asset(directory: Path, name: str, suffix: str, content: bytes, *, hash_assets: bool) -> str:
+    """
+    Write an exported file.
+
+    Parameters
+    ----------
+    directory : Path
+        Export directory.
+    name : str
+        File path relative to `directory`, without suffix.
+    suffix : str
+        File suffix.
+    content : bytes
+        File content.
+    hash_assets : bool
+        If `True`, a hash of `content` is added to the file name.
+
+    Returns
+    -------
+    str
+        File path relative to `directory`.
+    """
+    if hash_assets:
+        name = f"{name}.{hashlib.sha256(content).hexdigest()[:16]}"
+    file = directory / f"{name}{suffix}"
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_bytes(content)
+    return f"{name}{suffix}"
+
+
+def bundle_files(widget: LifemapWidget) -> dict[str, bytes]:
+    """
+    Get the widget JavaScript and CSS bundle files, named after their content.
+
+    Parameters
+    ----------
+    widget : LifemapWidget
+        Exported widget.
+
+    Returns
+    -------
+    dict[str, bytes]
+        Content of the JavaScript and CSS bundle files, indexed by file name.
+    """
+    files = {}
+    for suffix, bundle in ((".js", widget._esm), (".css", widget._css)):
+        content = str(bundle).encode()
+        files[f"widget.{hashlib.sha256(content).hexdigest()[:16]}{suffix}"] = content
+    return files
+
+
+def bundle_references(
+    widget: LifemapWidget, directory: Path, bundle: str, bundle_url: str | None
+) -> list[str]:
+    """
+    Get the references of a page to a shared widget bundle.
+
+    With `bundle="external"`, the bundle files are written to `directory` unless they
+    already exist. As they are named after their content, they can be shared by every
+    export using the same bundle. With `bundle="url"`, they are expected to be hosted
+    at `bundle_url`.
+
+    Parameters
+    ----------
+    widget : LifemapWidget
+        Exported widget.
+    directory : Path
+        Directory of the page.
+    bundle : str
+        Bundle mode, `"external"` or `"url"`.
+    bundle_url : str | None
+        Base URL of the hosted bundle files.
+
+    Returns
+    -------
+    list[str]
+        JavaScript and CSS bundle files URLs, relative to `directory` or absolute.
+    """
+    files = bundle_files(widget)
+    if bundle == "url":
+        return [f"{bundle_url.rstrip('/')}/{name}" for name in files]
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, content in files.items():
+        file = directory / name
+        if not file.exists():
+            # Several processes may write the same bundle concurrently
+            tmp = directory / f".{name}.{os.getpid()}.tmp"
+            tmp.write_bytes(content)
+            tmp.replace(file)
+    return [f"./{name}" for name in files]
+
+
+def check_bundle(bundle: str, bundle_url: str | None) -> None:
+    """
+    Check bundle export arguments.
+
+    Parameters
+    ----------
+    bundle : str
+        Bundle mode.
+    bundle_url : str | None
+        Base URL of the hosted bundle files.
+
+    Raises
+    ------
+    ValueError
+        If `bundle` is not a bundle mode, or if `bundle_url` is missing with
+        `bundle="url"`.
+    """
+    if bundle not in BUNDLE_MODES:
+        msg = f"bundle must be one of {BUNDLE_MODES}"
+        raise ValueError(msg)
+    if bundle == "url" and not bundle_url:
+        msg = "bundle_url is required when bundle is 'url'"
+        raise ValueError(msg)
+
+
+def write_page(
+    path: Path, widget: LifemapWidget, title: str, *, js: str, css: str, data: dict, layers: list
+) -> None:
+    """
+    Write the HTML page of an exported widget.
+
+    Parameters
+    ----------
+    path : Path
+        HTML file path.
+    widget : LifemapWidget
+        Exported widget.
+    title : str
+        HTML page title.
+    js : str
+        URL of the widget JavaScript bundle.
+    css : str
+        URL of the widget CSS bundle.
+    data : dict
+        Widget data, whose data store entries are replaced by the URLs of their files.
+    layers : list
+        Widget layers.
+    """
+    state = {
+        "data": data,
+        "layers": layers,
+        "options": widget.options,
+        "color_ranges": widget.color_ranges,
+        "width": widget.width,
+        "height": widget.height,
+    }
+    # Prevent the state from closing its script element
+    state_json = json.dumps(state, separators=(",", ":")).replace("</", "<\\/")
+    page = Template(DIRECTORY_TEMPLATE.read_text(encoding="utf-8")).substitute(
+        title=html.escape(title), js=js, css=css, state=state_json
+    )
+    path.write_text(page, encoding="utf-8")
+
+
+def export_lazy_tiles(
+    widget: LifemapWidget, path: Path, lazy_tiles_data: dict[str, pl.DataFrame], *, hash_assets: bool
+) -> dict:
+    """
+    Write the data of lazy loading layers as static tiles.
+
+    Each layer data is split into tiles by `split_static_tiles`, which are serialized
+    and written in parallel into a `tiles` subdirectory.
+
+    Parameters
+    ----------
+    widget : LifemapWidget
+        Exported widget, whose layers options and serialization options are used.
+    path : Path
+        Export directory.
+    lazy_tiles_data : dict[str, pl.DataFrame]
+        Full data of lazy loading layers, indexed by layer id.
+    hash_assets : bool
+        If `True`, a hash of their content is added to the tiles files names.
+
+    Returns
+    -------
+    dict
+        Tiles manifest, with a "layers" dictionary giving for each layer its `lazy_zoom`,
+        the tiles zoom level of each of its buckets, and the path of each tile file
+        relative to `path`, indexed by "bucket/column/row".
+    """
+    manifest = {"layers": {}}
+    for layer in widget.layers:
+        layer_id = layer["id"]
+        if layer_id not in lazy_tiles_data:
+            continue
+        lazy_zoom = layer["options"]["lazy_zoom"]
+        levels, tiles = split_static_tiles(lazy_tiles_data[layer_id], lazy_zoom)
+
+        def write_tile(key: tuple[int, int, int], tile: pl.DataFrame, layer_id: str = layer_id) -> str:
+            content = pl_to_arrow(tile, **widget._serialization_options)
+            name = "tiles/{}/{}/{}/{}".format(layer_id, *key)
+            return write_asset(path, name, ".arrow", content, hash_assets=hash_assets)
+
+        with ThreadPoolExecutor() as executor:
+            files = list(executor.map(write_tile, tiles.keys(), tiles.values()))
+        manifest["layers"][layer_id] = {
+            "lazy_zoom": lazy_zoom,
+            "levels": levels,
+            "tiles": {"{}/{}/{}".format(*key): file for key, file in zip(tiles, files, strict=True)},
+        }
+    return manifest
+
+
+def export_directory(
+    widget: LifemapWidget,
+    path: str | Path,
+    title: str,
+    *,
+    hash_assets: bool = False,
+    lazy_tiles_data: dict[str, pl.DataFrame] | None = None,
+    bundle: str = "inline",
+    bundle_url: str | None = None,
+) -> None:
+    """
+    Export a widget as a static web page with sidecar files.
+
+    The directory contains an `index.html` page with the widget state, the widget
+    JavaScript and CSS bundle, and one Arrow IPC file per layers data store entry in a
+    `data` subdirectory. Data files are fetched in parallel when the page is loaded,
+    without being base64 encoded in the page. As browsers don't allow pages opened from
+    the file system to fetch other files, the directory must be served over HTTP.
+
+    Parameters
+    ----------
+    widget : LifemapWidget
+        Widget to export, without binary transfer.
+    path : str | Path
+        Export directory, created if it doesn't exist.
+    title : str
+        HTML page title.
+    hash_assets : bool, optional
+        If `True`, a hash of their content is added to the bundle and data files names,
+        so that they can be cached indefinitely by browsers and web servers. By default
+        `False`.
+    lazy_tiles_data : dict[str, pl.DataFrame] | None, optional
+        Full data of lazy loading layers, indexed by layer id, of which the widget only
+        has a sample. These data are written as static tiles listed in a
+        `tiles/manifest.json` file, and the page only fetches the tiles intersecting the
+        current view. See `export_lazy_tiles`. By default `None`.
+    bundle : str, optional
+        If `"inline"`, the widget bundle is written in the directory. If `"external"`,
+        it is written once in its parent directory, and shared by the directories
+        exported alongside. If `"url"`, it is loaded from `bundle_url`. See
+        `bundle_references`. By default `"inline"`.
+    bundle_url : str | None, optional
+        Base URL of the hosted bundle files, with `bundle="url"`. By default `None`.
+    """
+    check_bundle(bundle, bundle_url)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    if bundle == "inline":
+        js = "./" + write_asset(path, "widget", ".js", str(widget._esm).encode(), hash_assets=hash_assets)
+        css = "./" + write_asset(path, "widget", ".css", str(widget._css).encode(), hash_assets=hash_assets)
+    else:
+        js, css = bundle_references(widget, path.parent, bundle, bundle_url)
+        if bundle == "external":
+            # Bundle files are in the parent directory
+            js, css = f"../{js[2:]}", f"../{css[2:]}"
+
+    # Layers data store entries are written to files, which replace them in the state
+    store = widget.data["store"]
+    files = {
+        key: write_asset(path, f"data/{key}", ".arrow", entry["value"], hash_assets=hash_assets)
+        for key, entry in store.items()
+    }
+    data = {**widget.data, "store": {}, "pending": list(store), "files": files}
+    layers = widget.layers
+    if lazy_tiles_data:
+        manifest = export_lazy_tiles(widget, path, lazy_tiles_data, hash_assets=hash_assets)
+        manifest_content = json.dumps(manifest, separators=(",", ":")).encode()
+        data["lazy_tiles"] = write_asset(
+            path, "tiles/manifest", ".json", manifest_content, hash_assets=hash_assets
+        )
+        # Tiles are fetched as is, their coordinates are not refreshed by the frontend
+        layers = [
+            {**layer, "options": {**layer["options"], "lazy_source": "static", "refresh": "none"}}
+            if layer["id"] in manifest["layers"]
+            else layer
+            for layer in layers
+        ]
+    write_page(path / "index.html", widget, title, js=js, css=css, data=data, layers=layers)
+
+
+def export_page(
+    widget: LifemapWidget, path: str | Path, title: str, *, bundle: str, bundle_url: str | None = None
+) -> None:
+    """
+    Export a widget as a single HTML page referencing a shared widget bundle.
+
+    Layers data are embedded in the page as base64 encoded data URLs, but not the widget
+    bundle, which is written once alongside the page or loaded from `bundle_url`. As the
+    page loads the bundle as a JavaScript module, it must be served over HTTP.
+
+    Parameters
+    ----------
+    widget : LifemapWidget
+        Widget to export, without binary transfer.
+    path : str | Path
+        HTML file path.
+    title : str
+        HTML page title.
+    bundle : str
+        Bundle mode, `"external"` or `"url"`. See `bundle_references`.
+    bundle_url : str | None, optional
+        Base URL of the hosted bundle files, with `bundle="url"`. By default `None`.
+    """
+    check_bundle(bundle, bundle_url)
+    path = Path(path)
+    js, css = bundle_references(widget, path.parent, bundle, bundle_url)
+    store = widget.data["store"]
+    files = {
+        key: "data:application/vnd.apache.arrow.file;base64," + base64.b64encode(entry["value"]).decode()
+        for key, entry in store.items()
+    }
+    data = {**widget.data, "store": {}, "pending": list(store), "files": files}
+    write_page(path, widget, title, js=js, css=css, data=data, layers=widget.layers)
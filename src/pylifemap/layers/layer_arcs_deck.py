@@ -4,6 +4,7 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
+from pylifemap.data.attributes import arcs_attributes
 from pylifemap.utils import is_hex_color
 
 
@@ -98,14 +99,15 @@ class ArcsDeckMixin:
         """
         layer_id, options, df = self._process_layer_options(locals())
 
-        layer = {"id": layer_id, "layer": "arcs_deck", "options": options}
+        layer = {"id": layer_id, "layer": "arcs_deck", "options": options, "format": "attributes"}
         self._layers.append(layer)
 
         data_columns = [
             options[k] for k in ("width",) if isinstance(options[k], str) and not is_hex_color(options[k])
         ]
         d = df.arcs_data(options, data_columns)
-        self._layers_data[layer_id] = d
+        width = data_columns[0] if data_columns else None
+        self._layers_data[layer_id] = arcs_attributes(d, width=width, width_range=options["width_range"])
         self._has_deck_layers = True
 
         return self
@@ -2,6 +2,8 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
+from pylifemap.data.clustering import density_grids
+from pylifemap.data.raster import heatmap_tiles
 
 
 class HeatmapMixin:
@@ -23,6 +25,12 @@ class HeatmapMixin:
             "#d1e834",
             "#f3363a",
         ),
+        weight: str | None = None,
+        prebin: bool = False,
+        prebin_size: int = 4,
+        raster: bool = False,
+        raster_max_zoom: int = 6,
+        raster_workers: int | None = None,
     ) -> LifemapABC:
         """
         Add an heatmap layer.
@@ -44,12 +52,39 @@ class HeatmapMixin:
         gradient: tuple
             Tuple of CSS colors to define the heatmap gradient. By default gradient
             inspired from the 'turbo' color ramp.
+        weight : str | None, optional
+            Name of a numerical data column giving observations weights. If `None`, all observations
+            have the same weight. By default `None`.
+        prebin : bool, optional
+            If `True`, observations are binned in Python into grids of increasing resolution, and only
+            the non empty cells and their total weight are sent to the widget, which displays the grid
+            corresponding to the current zoom level. Useful with millions of observations. By default
+            `False`.
+        prebin_size : int, optional
+            If `prebin` is `True`, size in pixels of the grids cells. By default 4.
+        raster : bool, optional
+            If `True`, the heatmap is rendered in Python as a pyramid of PNG image tiles, and only
+            the tiles are sent to the widget. The widget payload then depends on the number of tiles
+            rather than on the number of observations. Gradient colors must be hexadecimal color
+            codes. By default `False`.
+        raster_max_zoom : int, optional
+            If `raster` is `True`, finest zoom level of the rendered tiles. Tiles are scaled up when
+            zooming further. By default 6.
+        raster_workers : int | None, optional
+            If `raster` is `True`, number of processes used to render the tiles. Small pyramids are
+            rendered in the current process. If `None`, use the number of processors, or the share
+            of a batch worker process. By default `None`.
 
         Returns
         -------
         Lifemap
             A Lifemap visualization object.
 
+        Raises
+        ------
+        ValueError
+            If `prebin` and `raster` are both `True`.
+
         Examples
         --------
         >>> import polars as pl
@@ -76,7 +111,26 @@ class HeatmapMixin:
         """
 
         layer_id, options, df = self._process_layer_options(locals())
+        if options["prebin"] and options["raster"]:
+            msg = "prebin and raster cannot be used together"
+            raise ValueError(msg)
+        data_columns = [options["weight"]] if options["weight"] is not None else []
+        d = df.points_data(options, data_columns)
+        if options["prebin"]:
+            d, options["grid_zooms"] = density_grids(
+                d, cell_size=options["prebin_size"], weight=options["weight"]
+            )
+        if options["raster"]:
+            d = heatmap_tiles(
+                d,
+                radius=options["radius"],
+                blur=options["blur"],
+                gradient=options["gradient"],
+                weight=options["weight"],
+                max_zoom=options["raster_max_zoom"],
+                workers=options["raster_workers"],
+            )
         layer = {"id": layer_id, "layer": "heatmap", "options": options}
         self._layers.append(layer)
-        self._layers_data[layer_id] = df.points_data(options)
+        self._layers_data[layer_id] = d
         return self
@@ -4,7 +4,9 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
-from pylifemap.utils import icon_url_to_data_uri, init_lazy
+from pylifemap.data.icons import fetch_icons
+from pylifemap.data.lazy_loading import lazy_offsets
+from pylifemap.utils import init_lazy
 
 
 class IconsMixin:
@@ -29,6 +31,10 @@ class IconsMixin:
         lazy: bool | None = None,
         lazy_zoom: int = 10,
         lazy_mode: Literal["self", "parent"] = "self",
+        lazy_source: Literal["browser", "kernel"] = "browser",
+        lazy_budget: int | None = None,
+        lazy_budget_size: int = 256,
+        lazy_priority: str | None = None,
     ) -> LifemapABC:
         """
         Add an icons layer.
@@ -78,6 +84,21 @@ class IconsMixin:
         lazy_mode : Literal["self", "parent"], optional
             If `lazy` is `True`, choose the zoom level to apply to each taxa. If `'self'`, keep the taxa zoom
             level. If `'parent'`, get the nearest ancestor zoom level. Defaults to `'self'`.
+        lazy_source : Literal["browser", "kernel"], optional
+            If `'kernel'`, lazy loading is enabled and the layer data stay in the Python kernel, which
+            sends to the widget only the icons of the currently displayed map tiles. It allows to
+            display datasets too large to be loaded in the browser, but requires a running kernel: in exported
+            HTML files, the whole data is embedded and filtered by the browser. Defaults to `'browser'`.
+        lazy_budget : int | None, optional
+            If not `None`, lazy loading is enabled and each icon gets its own display zoom level,
+            computed so that no map tile of `lazy_budget_size` pixels displays more than `lazy_budget`
+            icons, at any zoom level. Icons with a higher `lazy_priority` are displayed first.
+            `lazy_zoom` and `lazy_mode` are then ignored. Defaults to `None`.
+        lazy_budget_size : int, optional
+            Size in pixels of the map tiles used by `lazy_budget`. Defaults to 256.
+        lazy_priority : str | None, optional
+            Name of a numerical data column giving the display priority of icons when `lazy_budget` is set.
+            If `None`, icons with a lower zoom level in the tree are displayed first. Defaults to `None`.
 
         Returns
         -------
@@ -110,7 +131,15 @@ class IconsMixin:
         """
         layer_id, options, df = self._process_layer_options(locals())
 
-        options["lazy"] = init_lazy(lazy=options["lazy"], df_len=len(df))
+        options["lazy"] = init_lazy(
+            lazy=options["lazy"],
+            df_len=len(df),
+            lazy_source=options["lazy_source"],
+            lazy_budget=options["lazy_budget"],
+        )
+        if options["lazy_budget"] is not None:
+            # Rows display zooms already take the budget into account
+            options["lazy_zoom"] = 0
 
         lazy_mode_values = ["self", "parent"]
         if options["lazy_mode"] not in lazy_mode_values:
@@ -132,19 +161,19 @@ class IconsMixin:
         )
         if popup_col is not None:
             data_columns.append(options["popup_col"])
+        if lazy_priority is not None and options["lazy_budget"] is not None:
+            data_columns.append(options["lazy_priority"])
         d = df.points_data(options, data_columns, lazy_mode=lazy_mode)
         self._layers_data[layer_id] = d
+        if options["lazy"]:
+            options["lazy_offsets"] = lazy_offsets(d)
 
         if not is_icon_column:
             # Convert icon url to data uri
-            options["icons_cache"] = {options["icon"]: icon_url_to_data_uri(options["icon"])}
+            options["icons_cache"] = fetch_icons([options["icon"]])
         else:
             # If icon is a data column, build a cache dictionary of urls => data uris
-            icon_values = d.get_column(options["icon"]).unique().to_list()
-
-            options["icons_cache"] = {
-                uri: icon_url_to_data_uri(uri) for uri in icon_values if uri is not None
-            }
+            options["icons_cache"] = fetch_icons(d.get_column(options["icon"]).unique().to_list())
 
         layer = {"id": layer_id, "layer": "icons", "options": options}
         self._layers.append(layer)
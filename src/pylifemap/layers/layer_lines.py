@@ -4,6 +4,7 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
+from pylifemap.data.lazy_loading import segments_offsets
 from pylifemap.utils import MAX_HOVER_DATA_LEN, init_lazy, is_hex_color
 
 
@@ -135,6 +136,8 @@ class LinesMixin:
             data_columns.append(options["popup_col"])
         d = df.lines_data(options, data_columns, lazy_mode=lazy_mode)
         self._layers_data[layer_id] = d
+        if options["lazy"]:
+            options["lazy_offsets"] = segments_offsets(d)
 
         # Compute color range
         key = options["color"]
@@ -5,7 +5,15 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
-from pylifemap.utils import MAX_HOVER_DATA_LEN, init_lazy, is_hex_color
+from pylifemap.data.clustering import clusters_pyramid
+from pylifemap.data.lazy_loading import lazy_offsets
+from pylifemap.data.tree_lod import tree_lod_levels
+from pylifemap.utils import (
+    MAX_HOVER_DATA_LEN,
+    init_lazy,
+    is_categorical_column,
+    is_hex_color,
+)
 
 
 class PointsMixin:
@@ -29,6 +37,13 @@ class PointsMixin:
         lazy: bool | None = None,
         lazy_zoom: int = 10,
         lazy_mode: Literal["self", "parent"] = "self",
+        lazy_source: Literal["browser", "kernel"] = "browser",
+        lazy_budget: int | None = None,
+        lazy_budget_size: int = 256,
+        lazy_priority: str | None = None,
+        cluster: bool = False,
+        cluster_size: int = 64,
+        lod: bool = False,
     ) -> LifemapABC:
         """
         Add a points layer.
@@ -86,6 +101,36 @@ class PointsMixin:
         lazy_mode : Literal["self", "parent"], optional
             If `lazy` is `True`, choose the zoom level to apply to each taxa. If `'self'`, keep the taxa zoom
             level. If `'parent'`, get the nearest ancestor zoom level. Defaults to `'self'`.
+        lazy_source : Literal["browser", "kernel"], optional
+            If `'kernel'`, lazy loading is enabled and the layer data stay in the Python kernel, which
+            sends to the widget only the points of the currently displayed map tiles. It allows to
+            display datasets too large to be loaded in the browser, but requires a running kernel: in exported
+            HTML files, the whole data is embedded and filtered by the browser. Defaults to `'browser'`.
+        lazy_budget : int | None, optional
+            If not `None`, lazy loading is enabled and each point gets its own display zoom level,
+            computed so that no map tile of `lazy_budget_size` pixels displays more than `lazy_budget`
+            points, at any zoom level. Points with a higher `lazy_priority` are displayed first.
+            `lazy_zoom` and `lazy_mode` are then ignored. Defaults to `None`.
+        lazy_budget_size : int, optional
+            Size in pixels of the map tiles used by `lazy_budget`. Defaults to 256.
+        lazy_priority : str | None, optional
+            Name of a numerical data column giving the display priority of points when `lazy_budget` is set.
+            If `None`, points with a lower zoom level in the tree are displayed first. Defaults to `None`.
+        cluster : bool, optional
+            If `True`, points are grouped into clusters at each zoom level, and clusters are displayed
+            instead of points until they can all be displayed separately. Clusters radius depends on their
+            number of points, or on the sum of their `radius` values if it is a data column. Their fill
+            color is given by the mean of their `fill` values, or by the most frequent one if `fill` is
+            categorical. Cannot be used with lazy loading. Defaults to `False`.
+        cluster_size : int, optional
+            If `cluster` is `True`, size in pixels of the grid cells used to group points. Defaults to 64.
+        lod : bool, optional
+            If `True`, points with a zoom level greater than (current zoom + `lazy_zoom`) are not hidden
+            but collapsed into their nearest ancestor with a lower zoom level, which is displayed
+            instead. Collapsed points radius depends on their number of points, or on the sum of their
+            `radius` values if it is a data column, and their fill color is given by the mean of their
+            `fill` values. Cannot be used with lazy loading, clustering, or categorical `fill` values.
+            Only available for points layers. Defaults to `False`.
 
         Returns
         -------
@@ -96,6 +141,10 @@ class PointsMixin:
         ------
         ValueError
             If leaves is not one of the allowed values.
+        ValueError
+            If cluster is `True` and lazy loading is enabled.
+        ValueError
+            If lod is `True` and lazy loading or clustering is enabled, or `fill` is categorical.
 
         Examples
         --------
@@ -149,10 +198,29 @@ class PointsMixin:
 
         if options["hover"] is None:
             options["hover"] = len(df) < MAX_HOVER_DATA_LEN
-        options["lazy"] = init_lazy(lazy=options["lazy"], df_len=len(df))
-
-        layer = {"id": layer_id, "layer": "points", "options": options}
-        self._layers.append(layer)
+        if options["cluster"] and options["lod"]:
+            msg = "cluster and lod cannot be used together"
+            raise ValueError(msg)
+        if options["cluster"]:
+            if options["lazy"] or options["lazy_source"] == "kernel" or options["lazy_budget"] is not None:
+                msg = "cluster cannot be used with lazy loading"
+                raise ValueError(msg)
+            options["lazy"] = False
+        elif options["lod"]:
+            if options["lazy"] or options["lazy_source"] == "kernel" or options["lazy_budget"] is not None:
+                msg = "lod cannot be used with lazy loading"
+                raise ValueError(msg)
+            options["lazy"] = False
+        else:
+            options["lazy"] = init_lazy(
+                lazy=options["lazy"],
+                df_len=len(df),
+                lazy_source=options["lazy_source"],
+                lazy_budget=options["lazy_budget"],
+            )
+            if options["lazy_budget"] is not None:
+                # Rows display zooms already take the budget into account
+                options["lazy_zoom"] = 0
 
         data_columns = [
             options[k]
@@ -161,8 +229,38 @@ class PointsMixin:
         ]
         if popup_col is not None:
             data_columns.append(options["popup_col"])
+        if lazy_priority is not None and options["lazy_budget"] is not None:
+            data_columns.append(options["lazy_priority"])
         d = df.points_data(options, data_columns, lazy_mode=lazy_mode)
+        if options["cluster"]:
+            # Clusters fill values are aggregated depending on the fill scale type
+            fill_scale_options(options, d, data_columns)
+            d, options["cluster_zooms"] = clusters_pyramid(
+                d,
+                cluster_size=options["cluster_size"],
+                fill=options["fill"] if options["fill"] in data_columns else None,
+                fill_cat=bool(options["fill_cat"]),
+                radius=options["radius"] if options["radius"] in data_columns else None,
+            )
+        elif options["lod"]:
+            fill_scale_options(options, d, data_columns)
+            if options["fill"] in data_columns and options["fill_cat"]:
+                msg = "lod cannot be used with a categorical fill variable"
+                raise ValueError(msg)
+            d, options["lod_zooms"] = tree_lod_levels(
+                d,
+                depth=options["lazy_zoom"],
+                sum_cols=[options["radius"]]
+                if options["radius"] in data_columns and options["radius"] != options["fill"]
+                else [],
+                mean_cols=[options["fill"]] if options["fill"] in data_columns else [],
+            )
+
+        layer = {"id": layer_id, "layer": "points", "options": options}
+        self._layers.append(layer)
         self._layers_data[layer_id] = d
+        if options["lazy"]:
+            options["lazy_offsets"] = lazy_offsets(d)
 
         # Compute color range
         key = options["fill"]
@@ -175,4 +273,80 @@ class PointsMixin:
             else:
                 self._color_ranges[key] = {"min": min_value, "max": max_value}
 
+        # With kernel lazy loading the widget only gets a sample of the data, so scales
+        # domains have to be computed here
+        if options["lazy_source"] == "kernel":
+            kernel_lazy_scales(options, d, data_columns)
+
         return self
+
+
+def kernel_lazy_scales(options: dict, d: pl.DataFrame, data_columns: list) -> None:
+    """
+    Compute radius and fill scales domains of a points layer from its whole data.
+
+    Sets the `radius_domain`, `fill_cat` and `categories` options when relevant, using the
+    same rules as the frontend.
+
+    Parameters
+    ----------
+    options : dict
+        Layer options dictionary, updated in place.
+    d : pl.DataFrame
+        Layer data.
+    data_columns : list
+        Layer data columns.
+    """
+    radius = options["radius"]
+    if radius in data_columns:
+        options["radius_domain"] = [d.get_column(radius).min(), d.get_column(radius).max()]
+    fill_scale_options(options, d, data_columns)
+
+
+def sample_layer_scales(layer: dict, d: pl.DataFrame) -> dict:
+    """
+    Compute scales domains of a layer whose widget only gets a sample of the data, such
+    as a layer exported as static tiles.
+
+    Parameters
+    ----------
+    layer : dict
+        Layer definition.
+    d : pl.DataFrame
+        Layer data.
+
+    Returns
+    -------
+    dict
+        Layer definition, with updated options if it is a points layer.
+    """
+    if layer["layer"] != "points":
+        return layer
+    options = dict(layer["options"])
+    kernel_lazy_scales(options, d, d.columns)
+    return {**layer, "options": options}
+
+
+def fill_scale_options(options: dict, d: pl.DataFrame, data_columns: list) -> None:
+    """
+    Compute the fill scale type and categories of a points layer from its whole data.
+
+    Sets the `fill_cat` and `categories` options when relevant, using the same rules as
+    the frontend.
+
+    Parameters
+    ----------
+    options : dict
+        Layer options dictionary, updated in place.
+    d : pl.DataFrame
+        Layer data.
+    data_columns : list
+        Layer data columns.
+    """
+    fill = options["fill"]
+    if fill in data_columns:
+        values = d.get_column(fill)
+        if options["fill_cat"] is None:
+            options["fill_cat"] = is_categorical_column(values)
+        if options["fill_cat"] and options["categories"] is None:
+            options["categories"] = sorted(str(v) for v in values.drop_nulls().unique().to_list())
@@ -2,6 +2,8 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
+from pylifemap.data.attributes import points_attributes
+from pylifemap.data.clustering import density_grids
 
 
 class ScreengridMixin:
@@ -13,6 +15,9 @@ class ScreengridMixin:
         cell_size: int = 30,
         extruded: bool = False,
         opacity: float = 0.5,
+        weight: str | None = None,
+        prebin: bool = False,
+        prebin_size: int = 4,
     ) -> LifemapABC:
         """
         Add a screengrid layer.
@@ -33,6 +38,16 @@ class ScreengridMixin:
         opacity : float, optional
             Screengrid opacity as a floating point number between 0 and 1.
             By default 0.5.
+        weight : str | None, optional
+            Name of a numerical data column giving observations weights. If `None`, all observations
+            have the same weight. By default `None`.
+        prebin : bool, optional
+            If `True`, observations are binned in Python into grids of increasing resolution, and only
+            the non empty cells and their total weight are sent to the widget, which displays the grid
+            corresponding to the current zoom level. Useful with millions of observations. By default
+            `False`.
+        prebin_size : int, optional
+            If `prebin` is `True`, size in pixels of the grids cells. By default 4.
 
         Returns
         -------
@@ -64,8 +79,15 @@ class ScreengridMixin:
 
         """
         layer_id, options, df = self._process_layer_options(locals())
-        layer = {"id": layer_id, "layer": "screengrid", "options": options}
+        layer = {"id": layer_id, "layer": "screengrid", "options": options, "format": "attributes"}
         self._layers.append(layer)
-        self._layers_data[layer_id] = df.points_data(options)
+        data_columns = [options["weight"]] if options["weight"] is not None else []
+        d = df.points_data(options, data_columns)
+        if options["prebin"]:
+            d, options["grid_zooms"] = density_grids(
+                d, cell_size=options["prebin_size"], weight=options["weight"]
+            )
+        weight = "pylifemap_weight" if options["prebin"] else options["weight"]
+        self._layers_data[layer_id] = points_attributes(d, weight=weight)
         self._has_deck_layers = True
         return self
@@ -4,6 +4,8 @@ import pandas as pd
 import polars as pl
 
 from pylifemap.abc import LifemapABC
+from pylifemap.data.labels import label_zooms
+from pylifemap.data.lazy_loading import lazy_offsets, sort_lazy_data
 from pylifemap.utils import init_lazy
 
 
@@ -20,9 +22,15 @@ class TextMixin:
         stroke: str = "#000000",
         opacity: float = 1.0,
         declutter: bool = True,
+        declutter_mode: Literal["browser", "precompute"] = "browser",
+        declutter_priority: str | None = None,
         lazy: bool | None = None,
         lazy_zoom: int = 10,
         lazy_mode: Literal["self", "parent"] = "self",
+        lazy_source: Literal["browser", "kernel"] = "browser",
+        lazy_budget: int | None = None,
+        lazy_budget_size: int = 256,
+        lazy_priority: str | None = None,
     ) -> LifemapABC:
         """
         Add a text labels layer.
@@ -49,6 +57,15 @@ class TextMixin:
             Text opacity as a floating number between 0 and 1. By default 1.0.
         declutter : bool, optional
             If `True`, use OpenLayers decluttering option for this layer. Defaults to `True`.
+        declutter_mode : Literal["browser", "precompute"], optional
+            If `'precompute'`, labels collisions are computed in Python instead of being handled by
+            OpenLayers in the browser: each label gets the minimal zoom level at which it doesn't
+            collide with other labels, and only these labels are drawn. Much faster with many labels,
+            but labels extents are estimated from their number of characters. Defaults to `'browser'`.
+        declutter_priority : str | None, optional
+            If `declutter_mode` is `'precompute'`, name of a numerical data column giving the labels
+            display priority. If `None`, labels of taxa with a lower zoom level in the tree are
+            displayed first. Defaults to `None`.
         lazy : bool | None
             If `True`, points are displayed depending on the widget view. If `False`, all points are
             displayed. Can be useful when displaying a great number of items. Defaults to `None`.
@@ -58,6 +75,21 @@ class TextMixin:
         lazy_mode : Literal["self", "parent"], optional
             If `lazy` is `True`, choose the zoom level to apply to each taxa. If `'"self'`, keep the taxa zoom
             level. If `'parent'`, get the nearest ancestor zoom level. Defaults to `'self'`.
+        lazy_source : Literal["browser", "kernel"], optional
+            If `'kernel'`, lazy loading is enabled and the layer data stay in the Python kernel, which
+            sends to the widget only the texts of the currently displayed map tiles. It allows to
+            display datasets too large to be loaded in the browser, but requires a running kernel: in exported
+            HTML files, the whole data is embedded and filtered by the browser. Defaults to `'browser'`.
+        lazy_budget : int | None, optional
+            If not `None`, lazy loading is enabled and each text gets its own display zoom level,
+            computed so that no map tile of `lazy_budget_size` pixels displays more than `lazy_budget`
+            texts, at any zoom level. Texts with a higher `lazy_priority` are displayed first.
+            `lazy_zoom` and `lazy_mode` are then ignored. Defaults to `None`.
+        lazy_budget_size : int, optional
+            Size in pixels of the map tiles used by `lazy_budget`. Defaults to 256.
+        lazy_priority : str | None, optional
+            Name of a numerical data column giving the display priority of texts when `lazy_budget` is set.
+            If `None`, texts with a lower zoom level in the tree are displayed first. Defaults to `None`.
 
 
 
@@ -92,13 +124,51 @@ class TextMixin:
 
         """
         layer_id, options, df = self._process_layer_options(locals())
-        options["lazy"] = init_lazy(lazy=options["lazy"], df_len=len(df))
+        options["lazy"] = init_lazy(
+            lazy=options["lazy"],
+            df_len=len(df),
+            lazy_source=options["lazy_source"],
+            lazy_budget=options["lazy_budget"],
+        )
+        if options["lazy_budget"] is not None:
+            # Rows display zooms already take the budget into account
+            options["lazy_zoom"] = 0
+
+        declutter_mode_values = ["browser", "precompute"]
+        if options["declutter_mode"] not in declutter_mode_values:
+            msg = f"declutter_mode must be one of {declutter_mode_values}"
+            raise ValueError(msg)
 
         layer = {"id": layer_id, "layer": "text", "options": options}
         self._layers.append(layer)
 
-        data_columns = (text,)
+        data_columns = [text]
+        if lazy_priority is not None and options["lazy_budget"] is not None:
+            data_columns.append(options["lazy_priority"])
+        if declutter_priority is not None and options["declutter_mode"] == "precompute":
+            data_columns.append(options["declutter_priority"])
         d = df.points_data(options, data_columns, lazy_mode=lazy_mode)
+        if options["declutter_mode"] == "precompute":
+            # Labels hidden by lazy loading must not hide other labels
+            min_zooms = None
+            if options["lazy"] and options["lazy_zoom"] >= 0:
+                min_zooms = d.get_column("pylifemap_zoom") - options["lazy_zoom"]
+            zooms = label_zooms(
+                d,
+                text=text,
+                font_size=font_size,
+                priority=options["declutter_priority"],
+                min_zooms=min_zooms,
+            )
+            if options["lazy"]:
+                # Labels zooms replace lazy loading zooms
+                d = sort_lazy_data(d.with_columns(zooms.alias("pylifemap_zoom")))
+                options["lazy_zoom"] = 0
+            else:
+                d = d.with_columns(zooms).sort("pylifemap_label_zoom", maintain_order=True)
+            options["declutter"] = False
         self._layers_data[layer_id] = d
+        if options["lazy"]:
+            options["lazy_offsets"] = lazy_offsets(d)
 
         return self
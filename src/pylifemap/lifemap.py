@@ -18,6 +18,12 @@ from IPython.display import display
 from ipywidgets.embed import dependency_state, embed_minimal_html
 
 from pylifemap.abc import LifemapABC
+from pylifemap.data.backend_data import BACKEND, BACKEND_DATA_VERSION
+from pylifemap.data.icons import icons_assets
+from pylifemap.data.preview import encode_rgba_png, render_preview
+from pylifemap.data.refresh import refresh_layers_data, refresh_mode
+from pylifemap.data.serialization import check_serialization_options
+from pylifemap.export import check_bundle, export_directory, export_page
 from pylifemap.layers.layer_arcs import ArcsMixin
 from pylifemap.layers.layer_arcs_deck import ArcsDeckMixin
 from pylifemap.layers.layer_donuts import DonutsMixin
@@ -25,7 +31,7 @@ from pylifemap.layers.layer_heatmap import HeatmapMixin
 from pylifemap.layers.layer_heatmap_deck import HeatmapDeckMixin
 from pylifemap.layers.layer_icons import IconsMixin
 from pylifemap.layers.layer_lines import LinesMixin
-from pylifemap.layers.layer_points import PointsMixin
+from pylifemap.layers.layer_points import PointsMixin, sample_layer_scales
 from pylifemap.layers.layer_screengrid import ScreengridMixin
 from pylifemap.layers.layer_text import TextMixin
 from pylifemap.utils import (
@@ -34,7 +40,12 @@ from pylifemap.utils import (
     check_jupyter,
     check_marimo,
 )
-from pylifemap.widget import LifemapWidget, LifemapWidgetDeck, LifemapWidgetNoDeck
+from pylifemap.widget import (
+    DEFAULT_CHUNK_SIZE,
+    LifemapWidget,
+    LifemapWidgetDeck,
+    LifemapWidgetNoDeck,
+)
 
 
 class Lifemap(
@@ -89,7 +100,28 @@ class Lifemap(
         If `True`, hide the taxa name labels. Defaults to `False`.
     hide_legend : bool
         If `True`, hide the map legend, if any. Defaults to `False`.
-
+    compression : Literal["uncompressed", "lz4", "zstd"], optional
+        Compression codec of the layers data sent to the widget. `'zstd'` gives smaller
+        widgets and HTML exports, `'lz4'` is faster. Defaults to `'lz4'`.
+    compression_level : int | None, optional
+        Compression level for the `compression` codec. If `None`, use the codec default
+        level. Only available with the `'pyarrow'` serialization engine. Defaults to `None`.
+    serialization_engine : Literal["pyarrow", "polars"], optional
+        Arrow IPC writer used to serialize layers data. `'polars'` uses the native polars
+        writer without converting data to pyarrow first. Defaults to `'pyarrow'`.
+    chunk_size : int | None, optional
+        In Jupyter, maximum number of rows of layers data sent to the widget at once. Larger
+        layers are sent in chunks, coarsest zoom levels first, and displayed progressively.
+        If `None`, layers data are always sent at once. Defaults to `DEFAULT_CHUNK_SIZE`.
+    force_refresh : bool, optional
+        The frontend queries up-to-date taxids coordinates from lifemap-back unless the
+        layers data have been computed from the data version it currently serves. If
+        `True`, this version is checked when the map is displayed or saved and, if the
+        layers data are stale, the new Lifemap data are downloaded and the layers data
+        coordinates are updated in Python, in bulk. Defaults to `False`.
+    icons_atlas : bool, optional
+        If `True`, the icons of all icons layers are packed into a single sprite image.
+        Requires Pillow. Defaults to `False`.
 
     Examples
     --------
@@ -114,6 +146,12 @@ class Lifemap(
         legend_width: int | None = None,
         hide_labels: bool = False,
         hide_legend: bool = False,
+        compression: Literal["uncompressed", "lz4", "zstd"] = "lz4",
+        compression_level: int | None = None,
+        serialization_engine: Literal["pyarrow", "polars"] = "pyarrow",
+        chunk_size: int | None = DEFAULT_CHUNK_SIZE,
+        force_refresh: bool = False,
+        icons_atlas: bool = False,
     ) -> None:
         super().__init__(data=data, taxid_col=taxid_col)
 
@@ -148,10 +186,40 @@ class Lifemap(
             "hide_legend": hide_legend,
         }
 
-    def _to_widget(self) -> LifemapWidget:
+        # Store layers data serialization options
+        check_serialization_options(compression, compression_level, serialization_engine)
+        self._serialization_options = {
+            "compression": compression,
+            "compression_level": compression_level,
+            "engine": serialization_engine,
+        }
+        if chunk_size is not None and chunk_size < 1:
+            msg = "chunk_size must be a positive integer or None"
+            raise ValueError(msg)
+        self._chunk_size = chunk_size
+        self._force_refresh = force_refresh
+        self._icons_atlas = icons_atlas
+
+    def _to_widget(
+        self, *, binary_transfer: bool = False, lazy_tiles_data: dict | None = None
+    ) -> LifemapWidget:
         """
         Convert current instance to a Jupyter Widget.
 
+        Serialized layers data and icons assets are kept and reused by the next widgets
+        created with the same arguments, until a layer is added.
+
+        Parameters
+        ----------
+        binary_transfer : bool, optional
+            If `True`, layers data are sent to the frontend as binary message buffers
+            instead of being stored in the widget state, and kernel lazy loading layers data
+            are kept in the kernel. By default `False`.
+        lazy_tiles_data : dict | None, optional
+            If not `None`, the full data of lazy loading layers are stored in this
+            dictionary, indexed by layer id, to be exported as static tiles, and the widget
+            only gets a sample of them. By default `None`.
+
         Returns
         -------
         LifemapWidget
@@ -163,14 +231,152 @@ class Lifemap(
         else:
             widget_class = LifemapWidgetNoDeck
 
-        return widget_class(
-            data=self._layers_data,
-            layers=self._layers,
-            options=self._map_options,
+        # Icons are sent once for all layers, downscaled to their displayed size. They are
+        # only processed again when a layer is added.
+        if self._icons_assets is None:
+            self._icons_assets = icons_assets(self._layers, atlas=self._icons_atlas)
+        layers, assets = self._icons_assets
+
+        # Layers data are computed from the backend data loaded at import time
+        layers_data = self._layers_data
+        data_version = BACKEND_DATA_VERSION
+        if self._force_refresh:
+            BACKEND.refresh()
+        if BACKEND.version != BACKEND_DATA_VERSION:
+            layers, layers_data = refresh_layers_data(layers, layers_data, BACKEND.data)
+            data_version = BACKEND.version
+
+        kernel_lazy_data = {}
+        if binary_transfer:
+            kernel_lazy_data = {
+                layer["id"]: layers_data[layer["id"]]
+                for layer in self._layers
+                if layer["options"].get("lazy_source") == "kernel"
+            }
+            # Only send the coarsest row of kernel lazy loading layers, used by the frontend
+            # to detect data columns
+            layers_data = {k: v.tail(1) if k in kernel_lazy_data else v for k, v in layers_data.items()}
+        if lazy_tiles_data is not None:
+            lazy_tiles_data.update(
+                {
+                    layer["id"]: layers_data[layer["id"]]
+                    for layer in self._layers
+                    if layer["options"].get("lazy") and "lazy_source" in layer["options"]
+                }
+            )
+            layers_data = {k: v.tail(1) if k in lazy_tiles_data else v for k, v in layers_data.items()}
+            # Scales domains of these layers are then computed from their whole data
+            layers = [
+                sample_layer_scales(layer, lazy_tiles_data[layer["id"]])
+                if layer["id"] in lazy_tiles_data
+                else layer
+                for layer in layers
+            ]
+
+        # Tell the frontend how layers data coordinates can be refreshed. Kernel lazy
+        # loading layers data are fetched as is from the kernel.
+        layers = [
+            {
+                **layer,
+                "options": {
+                    **layer["options"],
+                    "refresh": "none" if layer["id"] in kernel_lazy_data else refresh_mode(layer["options"]),
+                },
+            }
+            for layer in layers
+        ]
+
+        # Widgets displaying the same layers data share their serialized buffers
+        serialized_key = (data_version, binary_transfer, lazy_tiles_data is not None)
+
+        w = widget_class(
+            data=layers_data,
+            layers=layers,
+            options={**self._map_options, "data_version": data_version},
             color_ranges=self._color_ranges,
             width=self._width,
             height=self._height,
+            serialization_options=self._serialization_options,
+            binary_transfer=binary_transfer,
+            chunk_size=self._chunk_size,
+            kernel_lazy_data=kernel_lazy_data,
+            assets=assets,
+            serialized_data=self._serialized_data.get(serialized_key),
+        )
+        self._serialized_data[serialized_key] = w.serialized_data
+        return w
+
+    def to_png(
+        self,
+        path: str | Path | None = None,
+        *,
+        width: int | None = None,
+        height: int | None = None,
+        extent: tuple | list | None = None,
+        zoom: float | None = None,
+        background: str | None = None,
+    ) -> bytes:
+        """
+        Render a static PNG preview of the layers, without a browser.
+
+        Points, lines, arcs, donuts and heatmap layers are drawn in Python with NumPy,
+        following the widget styling. Raster heatmap, text, icons and deck.gl layers,
+        and the basemap tiles, are not drawn. Useful to generate thumbnails in reports or
+        batch jobs.
+
+        Parameters
+        ----------
+        path : str | Path | None, optional
+            If given, path of the PNG file to write. By default `None`.
+        width : int | None, optional
+            Image width, in pixels. If `None`, use the widget width if given in pixels,
+            or 800. By default `None`.
+        height : int | None, optional
+            Image height, in pixels. If `None`, use the widget height if given in
+            pixels, or 600. By default `None`.
+        extent : tuple | list | None, optional
+            EPSG:3857 minimum x, minimum y, maximum x and maximum y of the area to display.
+            If `None`, use the extent of the layers data. By default `None`.
+        zoom : float | None, optional
+            Zoom level of the image, centered on `extent`. If `None`, use the zoom level
+            which fits `extent` in the image. By default `None`.
+        background : str | None, optional
+            Hexadecimal background color. If `None`, the background is transparent. By
+            default `None`.
+
+        Returns
+        -------
+        bytes
+            PNG image content.
+
+        Examples
+        --------
+        >>> import polars as pl
+        >>> from pylifemap import Lifemap
+        >>> d = pl.DataFrame({"taxid": [9685, 9615, 9994]})
+        >>> Lifemap(d).layer_points().to_png("lifemap.png", width=400, height=300)
+
+        """
+        if width is None:
+            match = re.fullmatch(r"(\d+)px", self._width)
+            width = int(match[1]) if match else 800
+        if height is None:
+            match = re.fullmatch(r"(\d+)px", self._height)
+            height = int(match[1]) if match else 600
+        image = render_preview(
+            self._layers,
+            self._layers_data,
+            self._color_ranges,
+            width=width,
+            height=height,
+            extent=extent,
+            zoom=zoom,
+            background=background,
         )
+        png = encode_rgba_png(image)
+        if path is not None:
+            Path(path).write_bytes(png)
+        return png
 
     def show(self) -> None | LifemapWidget:
         """
@@ -186,7 +392,7 @@ class Lifemap(
         if check_marimo():
             return self._to_widget()
         if check_jupyter():
-            display(self._to_widget())
+            display(self._to_widget(binary_transfer=True))
             return
         self._width = "100%"
         self._height = "100vh"
@@ -201,16 +407,54 @@ class Lifemap(
                 webbrowser.open(str(temp_path))
                 input("Opening widget in browser, press Enter when finished.\n")
 
-    def save(self, path: str | Path, title: str = "Lifemap") -> None:
+    def save(
+        self,
+        path: str | Path,
+        title: str = "Lifemap",
+        *,
+        mode: Literal["html", "directory"] = "html",
+        hash_assets: bool = False,
+        lazy_tiles: bool = True,
+        bundle: Literal["inline", "external", "url"] = "inline",
+        bundle_url: str | None = None,
+    ) -> None:
         """
-        Save the Jupyter widget for this instance to an HTML file.
+        Save the Jupyter widget for this instance to an HTML file or to a directory.
 
         Parameters
         ----------
         path : str | Path
-            Path to the HTML file to save the widget.
+            Path to the HTML file, or to the directory, to save the widget.
         title : str, optional
             Optional HTML page title. By default `'Lifemap'`.
+        mode : Literal["html", "directory"], optional
+            If `'html'`, the widget code and data are embedded in a single HTML file. If
+            `'directory'`, `path` is a directory where an `index.html` page is written
+            alongside the widget JavaScript bundle and one Arrow file per layers data,
+            loaded in parallel when the page is opened. Directory exports are much
+            smaller and faster to open for large data, but must be served over HTTP, for
+            example with `python -m http.server`. By default `'html'`.
+        hash_assets : bool, optional
+            In `'directory'` mode, add a hash of their content to the bundle and data
+            files names, so that they can be cached indefinitely. By default `False`.
+        lazy_tiles : bool, optional
+            In `'directory'` mode, write the data of points, icons and text layers using lazy
+            loading as static tiles, split by display zoom level and map tile. The page
+            then only downloads the tiles of the current view, which allows to publish
+            layers of millions of rows. Tiles coordinates are not refreshed when the
+            Lifemap data are updated. By default `True`.
+        bundle : Literal["inline", "external", "url"], optional
+            If `'inline'`, the widget JavaScript and CSS bundle, about several megabytes,
+            is included in the HTML file or in the directory. If `'external'`, it is
+            written once in the directory of the HTML file (or in the parent directory of
+            the export directory) with a name depending on its content, and shared by all
+            the widgets saved alongside, whose pages only contain a small loader and the
+            widget data. If `'url'`, nothing is written and the bundle is loaded from
+            `bundle_url`. Pages with an external bundle must be served over HTTP. By
+            default `'inline'`.
+        bundle_url : str | None, optional
+            With `bundle='url'`, base URL where the bundle files written by
+            `bundle='external'` are hosted. By default `None`.
 
         Examples
         --------
@@ -224,9 +468,32 @@ class Lifemap(
         ... )
 
         """
+        save_modes = ("html", "directory")
+        if mode not in save_modes:
+            msg = f"mode must be one of {save_modes}"
+            raise ValueError(msg)
+        check_bundle(bundle, bundle_url)
+
+        if mode == "directory":
+            lazy_tiles_data = {} if lazy_tiles else None
+            w = self._to_widget(lazy_tiles_data=lazy_tiles_data)
+            export_directory(
+                w,
+                path,
+                title,
+                hash_assets=hash_assets,
+                lazy_tiles_data=lazy_tiles_data,
+                bundle=bundle,
+                bundle_url=bundle_url,
+            )
+            return
 
         w = self._to_widget()
 
+        if bundle != "inline":
+            export_page(w, path, title, bundle=bundle, bundle_url=bundle_url)
+            return
+
         embed_minimal_html(
             path,
             views=[w],
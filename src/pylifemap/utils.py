@@ -2,14 +2,13 @@
 Misc utilities functions and values.
 """
 
-import base64
 import logging
 import re
 import sys
 import warnings
 from pathlib import Path
 
-import requests
+import polars as pl
 
 DEFAULT_WIDTH = "800px"
 DEFAULT_HEIGHT = "600px"
@@ -20,6 +19,9 @@ MAX_LAZYLOADING_DATA_LEN = 300_000
 
 TAXID_COL = "pylifemap_taxid"
 
+# Maximum number of distinct values of numeric categorical columns
+MAX_NUMERIC_CATEGORIES = 10
+
 logger = logging.getLogger("pylifemap")
 ch = logging.StreamHandler(stream=sys.stdout)
 logger.addHandler(ch)
@@ -75,6 +77,32 @@ def is_hex_color(value: str) -> bool:
     return match is not None
 
 
+def is_categorical_column(values: pl.Series) -> bool:
+    """
+    Check if a column is displayed with a categorical color scale.
+
+    Uses the same rule as the frontend `is_categorical_column` function: numeric columns
+    whose first value is not an integer, or with more than `MAX_NUMERIC_CATEGORIES`
+    distinct values, are not categorical. Other columns are categorical.
+
+    Parameters
+    ----------
+    values : pl.Series
+        Column values.
+
+    Returns
+    -------
+    bool
+        True if the column is categorical.
+    """
+    if not values.dtype.is_numeric() or values.is_empty():
+        return True
+    first = values[0]
+    if isinstance(first, float) and not first.is_integer():
+        return False
+    return values.n_unique() <= MAX_NUMERIC_CATEGORIES
+
+
 def is_icon_url(value: str) -> bool:
     """
     Check if a value is an icon URL.
@@ -113,32 +141,28 @@ def mime_type_from_url(url: str) -> str:
 
 
 def icon_url_to_data_uri(image_url: str) -> str:
-    if image_url.startswith("data:"):
-        return image_url
-    elif image_url.startswith("http"):
-        response = requests.get(image_url, timeout=5000)
-        if response.status_code != 200:  # noqa: PLR2004
-            msg = f"Failed to fetch icon at {image_url} : HTTP {response.status_code}"
-            raise ValueError(msg)
-
-        image_data = response.content
-    else:
-        img_file = Path(image_url)
-        if not img_file.exists():
-            msg = f"Icon file {image_url} not found"
-            raise FileNotFoundError(msg)
-        image_data = img_file.read_bytes()
+    """
+    Get the data URI of an icon. See `pylifemap.data.icons.icon_url_to_data_uri`.
 
-    mime_type = mime_type_from_url(image_url)
+    Parameters
+    ----------
+    image_url : str
+        Icon data URI, HTTP(S) URL or file path.
 
-    # Encode the image data in base64
-    base64_data = base64.b64encode(image_data).decode("utf-8")
+    Returns
+    -------
+    str
+        Icon data URI.
+    """
+    # Imported here as the icons module depends on this one
+    from pylifemap.data.icons import icon_url_to_data_uri as fetch_icon_data_uri  # noqa: PLC0415
 
-    data_uri = f"data:{mime_type};base64,{base64_data}"
-    return data_uri
+    return fetch_icon_data_uri(image_url)
 
 
-def init_lazy(*, lazy: bool | None, df_len: int) -> bool:
+def init_lazy(
+    *, lazy: bool | None, df_len: int, lazy_source: str = "browser", lazy_budget: int | None = None
+) -> bool:
     """
     Check and set lazy loading argument value.
 
@@ -148,12 +172,30 @@ def init_lazy(*, lazy: bool | None, df_len: int) -> bool:
         Current lazy loading argument value
     df_len : int
         Number of rows of the dataset
+    lazy_source : str, optional
+        Lazy loading data source. If `'kernel'`, lazy loading is always enabled.
+        By default `'browser'`.
+    lazy_budget : int | None, optional
+        Maximum number of features per tile. If not `None`, lazy loading is always
+        enabled. By default `None`.
 
     Returns
     -------
     bool
         Updated lazy loading argument value.
+
+    Raises
+    ------
+    ValueError
+        If `lazy_source` is not an allowed value.
     """
+    lazy_source_values = ["browser", "kernel"]
+    if lazy_source not in lazy_source_values:
+        msg = f"lazy_source must be one of {lazy_source_values}"
+        raise ValueError(msg)
+    if lazy_source == "kernel" or lazy_budget is not None:
+        return True
+
     if lazy is None:
         lazy = df_len > MAX_LAZYLOADING_DATA_LEN
         if lazy:
@@ -2,16 +2,28 @@
 Lifemap anywidget objects.
 """
 
+import itertools
 import pathlib
+from collections import OrderedDict
 
 import anywidget
+import polars as pl
 import traitlets
 
-from pylifemap.data.serialization import serialize_data
+from pylifemap.data.schema import check_layer_data, layer_format
+from pylifemap.data.serialization import pl_to_arrow, serialize_layers_data
+from pylifemap.data.spatial_index import GridIndex
 
 # Output directory for bundled js and css files
 BUNDLER_OUTPUT_DIR = pathlib.Path(__file__).parent / "static"
 
+# Default number of rows per chunk for binary transfer of layers data
+DEFAULT_CHUNK_SIZE = 200_000
+# Maximum number of data messages sent and not yet acknowledged by the frontend
+MAX_PENDING_MESSAGES = 4
+# Maximum number of serialized lazy loading tiles kept in cache
+LAZY_TILES_CACHE_SIZE = 256
+
 
 class LifemapWidget(anywidget.AnyWidget):
     """
@@ -20,7 +32,9 @@ class LifemapWidget(anywidget.AnyWidget):
     Attributes
     ----------
     data
-        Widget data dictionary traitlet.
+        Widget data dictionary traitlet, with a "store" of unique serialized layers data,
+        a "layers" dictionary referencing store entries and an "assets" store of unique
+        icons referenced by icons layers.
     layers
         Widget layers list traitlet.
     options
@@ -29,6 +43,12 @@ class LifemapWidget(anywidget.AnyWidget):
         Widget width string traitlet.
     height
         Widget height string traitlet.
+    transfer_progress
+        Fraction of layers data messages received by the frontend when using binary
+        transfer. Not synced, can be observed from Python.
+    serialized_data
+        Serialized layers data, as returned by `serialize_layers_data`, which can be
+        reused by other widgets displaying the same data. Not synced.
     """
 
     # traitlets
@@ -38,9 +58,23 @@ class LifemapWidget(anywidget.AnyWidget):
     color_ranges = traitlets.Dict().tag(sync=True)
     width = traitlets.Unicode().tag(sync=True)
     height = traitlets.Unicode().tag(sync=True)
+    transfer_progress = traitlets.Float(1.0)
 
     def __init__(
-        self, data: dict, layers: list, options: dict, color_ranges: dict, width: str, height: str
+        self,
+        data: dict,
+        layers: list,
+        options: dict,
+        color_ranges: dict,
+        width: str,
+        height: str,
+        *,
+        serialization_options: dict | None = None,
+        binary_transfer: bool = False,
+        chunk_size: int | None = DEFAULT_CHUNK_SIZE,
+        kernel_lazy_data: dict | None = None,
+        assets: dict | None = None,
+        serialized_data: dict | None = None,
     ) -> None:
         """
         Widget class constructor.
@@ -59,11 +93,205 @@ class LifemapWidget(anywidget.AnyWidget):
             Widget width as CSS string.
         height : str
             Widget height as CSS string.
+        serialization_options : dict | None, optional
+            Keyword arguments passed to `serialize_layers_data` (compression, compression
+            level and engine). By default `None`.
+        binary_transfer : bool, optional
+            If `True`, serialized layers data are not stored in the `data` traitlet but sent
+            to the frontend on request as binary buffers of custom messages, one message per
+            data store entry or chunk. Only usable with a live kernel, not for HTML exports.
+            By default `False`.
+        chunk_size : int | None, optional
+            With binary transfer, maximum number of rows per data message. Larger layers
+            data are split into chunks sent coarsest zoom levels first, so that the
+            frontend can display them progressively. If `None`, data are never split.
+            By default `DEFAULT_CHUNK_SIZE`.
+        kernel_lazy_data : dict | None, optional
+            Full data of kernel lazy loading layers, indexed by layer id. These data are
+            kept in the kernel with a spatial and zoom index, and the frontend queries the
+            rows of the map tiles it displays with `'lazy_tile'` messages. `data` should
+            only contain a sample of these layers data. By default `None`.
+        assets : dict | None, optional
+            Icons asset store, as returned by `icons_assets`, always stored in the `data`
+            traitlet. By default `None`.
+        serialized_data : dict | None, optional
+            Result of a previous serialization of the same `data` with the same
+            serialization options, binary transfer and chunk size, as stored in the
+            `serialized_data` attribute of another widget. Its buffers are reused without
+            being checked, serialized or copied again. By default `None`.
         """
-        data = {k: serialize_data(v) for k, v in data.items()}
+        serialization_options = serialization_options or {}
+        self._serialization_options = serialization_options
+        self._lazy_indexes = {k: GridIndex(v) for k, v in (kernel_lazy_data or {}).items()}
+        self._lazy_tiles_cache = OrderedDict()
+        if serialized_data is None:
+            # Check the data frontend contract of each layer and get its data format
+            formats = {}
+            for layer in layers:
+                layer_data = data.get(layer["id"])
+                if isinstance(layer_data, pl.DataFrame):
+                    check_layer_data(layer, layer_data)
+                    formats[layer["id"]] = layer_format(layer, layer_data)
+            serialized_data = serialize_layers_data(
+                data,
+                chunk_size=chunk_size if binary_transfer else None,
+                formats=formats,
+                **serialization_options,
+            )
+        self.serialized_data = serialized_data
+        self._messages_queue = []
+        self._n_messages = 0
+        self._n_acknowledged = 0
+        if binary_transfer:
+            self._pending_data = serialized_data["store"]
+            data = {**serialized_data, "store": {}, "pending": list(serialized_data["store"].keys())}
+            data["kernel_layers"] = list(self._lazy_indexes.keys())
+        else:
+            self._pending_data = {}
+            data = dict(serialized_data)
+        data["assets"] = assets or {}
         super().__init__(
             data=data, layers=layers, options=options, color_ranges=color_ranges, width=width, height=height
         )
+        self.on_msg(self._handle_custom_msg)
+
+    @property
+    def transfer_complete(self) -> bool:
+        """
+        Whether all layers data messages have been acknowledged by the frontend.
+
+        Returns
+        -------
+        bool
+            `True` if the binary transfer is complete or if no binary transfer is used.
+        """
+        return self._n_acknowledged >= self._n_messages
+
+    def _handle_custom_msg(self, _widget: "LifemapWidget", content: dict, _buffers: list) -> None:
+        """
+        Handle custom messages sent by the frontend.
+
+        When the frontend sends a `'request_data'` message, pending layers data are sent
+        back as binary buffers. At most `MAX_PENDING_MESSAGES` messages are sent in
+        advance, the next ones being sent when the frontend acknowledges the reception of
+        the previous ones with `'ack'` messages.
+
+        Parameters
+        ----------
+        content : dict
+            Message content.
+        """
+        msg_type = content.get("type")
+        if msg_type == "request_data":
+            self._messages_queue = data_messages(self._pending_data)
+            self._n_messages = len(self._messages_queue)
+            self._n_acknowledged = 0
+            self._update_transfer_progress()
+            self._send_next_messages(MAX_PENDING_MESSAGES)
+        elif msg_type == "ack" and self._n_acknowledged < self._n_messages:
+            self._n_acknowledged += 1
+            self._update_transfer_progress()
+            self._send_next_messages(1)
+        elif msg_type == "lazy_tile" and content.get("layer") in self._lazy_indexes:
+            tile_z, tile_x, tile_y = content["tile"]
+            payload = self._get_lazy_tile(content["layer"], tile_z, tile_x, tile_y, content.get("max_zoom"))
+            response = {
+                "type": "lazy_tile",
+                "request_id": content.get("request_id"),
+                "layer": content["layer"],
+                "tile": content["tile"],
+            }
+            self.send(response, [memoryview(payload)])
+
+    def _get_lazy_tile(
+        self, layer_id: str, tile_z: int, tile_x: int, tile_y: int, max_zoom: float | None
+    ) -> bytes:
+        """
+        Get the serialized rows of a kernel lazy loading layer for a map tile.
+
+        Results are kept in a least recently used cache of `LAZY_TILES_CACHE_SIZE` tiles.
+
+        Parameters
+        ----------
+        layer_id : str
+            Layer id.
+        tile_z : int
+            Tile zoom level.
+        tile_x : int
+            Tile column.
+        tile_y : int
+            Tile row.
+        max_zoom : float | None
+            Maximum zoom level of the rows to send.
+
+        Returns
+        -------
+        bytes
+            Arrow IPC bytes.
+        """
+        key = (layer_id, tile_z, tile_x, tile_y, max_zoom)
+        if key in self._lazy_tiles_cache:
+            self._lazy_tiles_cache.move_to_end(key)
+            return self._lazy_tiles_cache[key]
+        rows = self._lazy_indexes[layer_id].query_tile(tile_z, tile_x, tile_y, max_zoom)
+        payload = pl_to_arrow(rows, **self._serialization_options)
+        self._lazy_tiles_cache[key] = payload
+        if len(self._lazy_tiles_cache) > LAZY_TILES_CACHE_SIZE:
+            self._lazy_tiles_cache.popitem(last=False)
+        return payload
+
+    def _send_next_messages(self, n: int) -> None:
+        """
+        Send the next `n` data messages from the messages queue.
+
+        Parameters
+        ----------
+        n : int
+            Number of messages to send.
+        """
+        for _ in range(min(n, len(self._messages_queue))):
+            msg_content, msg_buffers = self._messages_queue.pop(0)
+            self.send(msg_content, msg_buffers)
+
+    def _update_transfer_progress(self) -> None:
+        self.transfer_progress = self._n_acknowledged / self._n_messages if self._n_messages > 0 else 1.0
+
+
+def data_messages(store: dict) -> list[tuple[dict, list]]:
+    """
+    Build the custom messages used to send a data store to the frontend.
+
+    Each store entry, or each chunk of a chunked store entry, is sent as its own message,
+    with the Arrow IPC bytes as the only binary buffer, so that payloads are never JSON or
+    base64 encoded. Chunks of the different entries are interleaved, so that the frontend
+    receives an overview of every layer first.
+
+    Parameters
+    ----------
+    store : dict
+        Data store, as returned in the "store" entry of `serialize_layers_data`.
+
+    Returns
+    -------
+    list[tuple[dict, list]]
+        List of (content, buffers) messages.
+    """
+    queues = []
+    for key, entry in store.items():
+        chunks = entry.get("chunks", [{"index": 0, "value": entry.get("value")}])
+        queues.append(
+            [
+                (
+                    {"type": "layer_data", "key": key, "index": chunk["index"], "n_chunks": len(chunks)},
+                    [memoryview(chunk["value"])],
+                )
+                for chunk in chunks
+            ]
+        )
+    messages = []
+    for messages_round in itertools.zip_longest(*queues):
+        messages.extend(m for m in messages_round if m is not None)
+    return messages
 
 
 class LifemapWidgetDeck(LifemapWidget):
@@ -0,0 +1,113 @@
+"""
+Tests for deck.gl binary attributes functions.
+"""
+
+import io
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pytest
+from pyarrow import ipc
+
+from pylifemap import Lifemap
+from pylifemap.data.attributes import arcs_attributes, points_attributes
+from pylifemap.data.geo import project_to_3857
+from pylifemap.data.serialization import pl_to_arrow
+
+lon = [0.0, 10.0, -45.5, 120.25]
+lat = [0.0, 20.0, 60.0, -30.5]
+points_df = project_to_3857(
+    pl.DataFrame(
+        {
+            "pylifemap_taxid": [1, 2, 3, 4],
+            "pylifemap_x": lon,
+            "pylifemap_y": lat,
+            "weight": [1.0, None, 3.0, 4.0],
+        }
+    ),
+    x_col="pylifemap_x",
+    y_col="pylifemap_y",
+)
+arcs_df = project_to_3857(
+    points_df.with_columns(
+        pl.col("pylifemap_taxid").reverse().alias("pylifemap_dest_taxid"),
+        pl.Series("pylifemap_dest_x", lon[::-1]),
+        pl.Series("pylifemap_dest_y", lat[::-1]),
+    ),
+    x_col="pylifemap_dest_x",
+    y_col="pylifemap_dest_y",
+)
+
+
+class TestPointsAttributes:
+    def test_positions(self):
+        attributes = points_attributes(points_df)
+        assert attributes.columns == ["pylifemap_taxid", "pylifemap_positions"]
+        assert attributes.schema["pylifemap_positions"] == pl.Array(pl.Float32, 2)
+        positions = attributes.get_column("pylifemap_positions").to_numpy()
+        assert positions[:, 0] == pytest.approx(lon, abs=1e-4)
+        assert positions[:, 1] == pytest.approx(lat, abs=1e-4)
+
+    def test_weights(self):
+        attributes = points_attributes(points_df, weight="weight")
+        assert attributes.schema["pylifemap_weights"] == pl.Float32
+        assert attributes.get_column("pylifemap_weights").to_list() == [1.0, 0.0, 3.0, 4.0]
+
+    def test_contiguous_buffer(self):
+        # Positions are serialized as a single interleaved float32 buffer
+        payload = pl_to_arrow(points_attributes(points_df), compression="uncompressed")
+        table = ipc.open_file(io.BytesIO(payload)).read_all()
+        column = table.column("pylifemap_positions").combine_chunks()
+        assert column.type == pa.list_(pa.float32(), 2)
+        values = column.flatten().to_numpy()
+        assert values.dtype == np.float32
+        assert values[2:4] == pytest.approx([lon[1], lat[1]], abs=1e-4)
+
+    def test_empty(self):
+        attributes = points_attributes(points_df.clear(), weight="weight")
+        assert attributes.height == 0
+        assert attributes.schema["pylifemap_positions"] == pl.Array(pl.Float32, 2)
+
+
+class TestArcsAttributes:
+    def test_positions(self):
+        attributes = arcs_attributes(arcs_df)
+        assert attributes.columns == ["pylifemap_taxid", "pylifemap_dest_taxid", "pylifemap_positions"]
+        positions = attributes.get_column("pylifemap_positions").to_numpy()
+        assert positions.shape == (4, 4)
+        assert positions[:, 2] == pytest.approx(lon[::-1], abs=1e-4)
+        assert positions[:, 3] == pytest.approx(lat[::-1], abs=1e-4)
+
+    def test_widths(self):
+        attributes = arcs_attributes(arcs_df, width="weight", width_range=(2, 8))
+        assert attributes.get_column("pylifemap_widths").to_list() == pytest.approx([2, 2, 6, 8])
+
+    def test_constant_widths(self):
+        d = arcs_df.with_columns(pl.lit(5.0).alias("weight"))
+        attributes = arcs_attributes(d, width="weight", width_range=(2, 8))
+        assert (attributes.get_column("pylifemap_widths") == 2).all()
+
+
+class TestDeckLayersFormat:
+    d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510, 55_559], "dest": [55_559, 48510, 1_783_263, 2157]})
+
+    @pytest.mark.parametrize("method", ["layer_heatmap_deck", "layer_screengrid"])
+    def test_points_layers(self, method):
+        m = getattr(Lifemap(self.d), method)()
+        layer = m._layers[-1]
+        assert layer["format"] == "attributes"
+        assert m._layers_data[layer["id"]].columns == ["pylifemap_taxid", "pylifemap_positions"]
+
+    def test_prebin(self):
+        m = Lifemap(self.d).layer_heatmap_deck(prebin=True)
+        data = m._layers_data[m._layers[-1]["id"]]
+        assert data.columns == ["pylifemap_grid_zoom", "pylifemap_positions", "pylifemap_weights"]
+        assert data.get_column("pylifemap_grid_zoom").is_sorted()
+
+    def test_arcs_layer(self):
+        m = Lifemap(self.d).layer_arcs_deck(taxid_dest_col="dest")
+        layer = m._layers[-1]
+        assert layer["format"] == "attributes"
+        widget = m._to_widget()
+        assert widget.data["layers"][layer["id"]]["format"] == "attributes"
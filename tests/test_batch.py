@@ -0,0 +1,127 @@
+"""
+Tests for batch maps generation.
+"""
+
+import io
+import json
+
+import polars as pl
+import pytest
+
+from pylifemap import batch
+from pylifemap.__main__ import main
+from pylifemap.batch import load_spec, output_name, run_batch
+from pylifemap.data.backend_data import BACKEND_DATA
+
+SPEC = {
+    "options": {"width": 300, "height": 200},
+    "layers": [{"layer": "points", "fill": "value"}],
+    "output": {"format": "html"},
+}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    taxids = BACKEND_DATA.get_column("taxid").head(30)
+    d = pl.DataFrame({"taxid": taxids, "value": range(30), "group": ["a b"] * 10 + ["c"] * 20})
+    path = tmp_path / "dataset"
+    d.write_parquet(path, partition_by="group")
+    return path
+
+
+class TestSpec:
+    def test_load_spec(self, tmp_path):
+        path = tmp_path / "spec.json"
+        path.write_text(json.dumps({"layers": SPEC["layers"]}))
+        spec = load_spec(path)
+        assert spec["output"] == {"format": "html"}
+        assert spec["options"] == {}
+
+    def test_invalid_spec(self):
+        with pytest.raises(ValueError, match="unknown map spec entries"):
+            load_spec({"layer": []})
+        with pytest.raises(ValueError, match="unknown layer type"):
+            load_spec({"layers": [{"layer": "foo"}]})
+        with pytest.raises(ValueError, match="invalid layer_points arguments"):
+            load_spec({"layers": [{"layer": "points", "foo": 1}]})
+        with pytest.raises(ValueError, match="invalid Lifemap arguments"):
+            load_spec({"options": {"foo": 1}})
+        with pytest.raises(ValueError, match="output format must be one of"):
+            load_spec({"output": {"format": "pdf"}})
+        with pytest.raises(ValueError, match="invalid output arguments"):
+            load_spec({"output": {"format": "png", "title": "Lifemap"}})
+
+    def test_output_name(self):
+        assert output_name("Homo sapiens/1") == "Homo_sapiens_1"
+        assert output_name(None) == "null"
+
+
+class TestRunBatch:
+    def test_serial(self, dataset, tmp_path):
+        progress = io.StringIO()
+        results = run_batch(SPEC, dataset, "group", tmp_path / "out", workers=1, progress=progress)
+        assert [r["partition"] for r in results] == ["a b", "c"]
+        assert [r["rows"] for r in results] == [10, 20]
+        assert all(r["error"] is None for r in results)
+        assert (tmp_path / "out" / "a_b.html").exists()
+        assert (tmp_path / "out" / "c.html").exists()
+        lines = progress.getvalue().splitlines()
+        assert lines[0].startswith("[1/2] a b: 10 rows in")
+        assert lines[2].startswith("2 of 2 maps rendered in")
+
+    def test_png_format(self, dataset, tmp_path):
+        results = run_batch(SPEC, dataset, "group", tmp_path, output_format="png", workers=1, progress=None)
+        assert [r["path"].name for r in results] == ["a_b.png", "c.png"]
+        assert results[0]["path"].read_bytes().startswith(b"\x89PNG")
+
+    def test_failures(self, dataset, tmp_path):
+        spec = {"layers": [{"layer": "points", "fill": "missing"}]}
+        progress = io.StringIO()
+        results = run_batch(spec, dataset, "group", tmp_path, workers=1, progress=progress)
+        assert all(r["error"] is not None for r in results)
+        assert "0 of 2 maps rendered" in progress.getvalue()
+        assert "2 failed:" in progress.getvalue()
+
+    def test_unexpected_errors(self, dataset, tmp_path, monkeypatch):
+        def render_partition(task):
+            if task[3] == "c":
+                raise KeyError(task[3])
+            return 10, 0.0
+
+        monkeypatch.setattr(batch, "render_partition", render_partition)
+        # Errors are recorded whatever their type, as with worker processes
+        results = run_batch(SPEC, dataset, "group", tmp_path, workers=1, progress=None)
+        assert [r["error"] for r in results] == [None, "'c'"]
+
+    def test_pool(self, dataset, tmp_path):
+        results = run_batch(SPEC, dataset, "group", tmp_path, output_format="png", workers=2, progress=None)
+        assert [r["error"] for r in results] == [None, None]
+        assert [r["rows"] for r in results] == [10, 20]
+        assert all(r["path"].exists() for r in results)
+
+
+class TestCli:
+    def test_main(self, dataset, tmp_path, capsys):
+        spec = tmp_path / "spec.json"
+        spec.write_text(json.dumps(SPEC))
+        argv = [
+            "batch",
+            str(spec),
+            str(dataset),
+            "--partition-col",
+            "group",
+            "--output-dir",
+            str(tmp_path / "out"),
+        ]
+        assert main([*argv, "--workers", "1"]) == 0
+        assert "2 of 2 maps rendered" in capsys.readouterr().err
+        assert (tmp_path / "out" / "c.html").exists()
+
+    def test_invalid_spec(self, tmp_path):
+        spec = tmp_path / "spec.json"
+        spec.write_text(json.dumps({"foo": 1}))
+        with pytest.raises(SystemExit) as e:
+            main(
+                ["batch", str(spec), str(tmp_path), "--partition-col", "group", "--output-dir", str(tmp_path)]
+            )
+        assert e.value.code == 2
@@ -0,0 +1,124 @@
+"""
+Tests for points clustering functions.
+"""
+
+import itertools
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pylifemap.data.clustering import TILE_SIZE, clusters_pyramid, density_grids
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+
+rng = np.random.default_rng(0)
+n = 20_000
+df = pl.DataFrame(
+    {
+        "pylifemap_taxid": range(n),
+        "pylifemap_x": rng.normal(0, 3e6, n),
+        "pylifemap_y": rng.normal(0, 3e6, n),
+        "value": rng.uniform(0, 10, n),
+        "cat": rng.choice(["a", "b", "c"], n),
+    }
+)
+
+
+def brute_force(data, zoom, cluster_size=64):
+    cell = cluster_size * 2 * WORLD_HALF_SIZE / TILE_SIZE / 2**zoom
+    return (
+        data.with_columns(
+            ((pl.col("pylifemap_x") + WORLD_HALF_SIZE) / cell).floor().alias("ix"),
+            ((pl.col("pylifemap_y") + WORLD_HALF_SIZE) / cell).floor().alias("iy"),
+        )
+        .group_by("ix", "iy")
+        .agg(
+            pl.len().alias("pylifemap_count"),
+            pl.col("pylifemap_x").mean(),
+            pl.col("pylifemap_y").mean(),
+            pl.col("value").mean(),
+            pl.col("cat").mode().sort().first(),
+        )
+        .sort("pylifemap_x")
+    )
+
+
+class TestClustersPyramid:
+    def test_levels(self):
+        result, zooms = clusters_pyramid(df)
+        assert zooms == sorted(zooms)
+        assert result.get_column("pylifemap_cluster_zoom").unique().sort().to_list() == zooms
+        # Original points in the last level
+        points = result.filter(pl.col("pylifemap_cluster_zoom") == zooms[-1])
+        assert points.height == n
+        assert (points.get_column("pylifemap_count") == 1).all()
+        # Each level has all the points and at most half the clusters of the next one
+        counts = result.group_by("pylifemap_cluster_zoom").agg(pl.col("pylifemap_count").sum(), pl.len())
+        assert (counts.get_column("pylifemap_count") == n).all()
+        lengths = counts.sort("pylifemap_cluster_zoom").get_column("len").to_list()
+        assert all(a <= b / 2 for a, b in itertools.pairwise(lengths))
+        assert result.height < 2 * n
+
+    def test_same_as_brute_force(self):
+        result, zooms = clusters_pyramid(df, fill="value")
+        for zoom in zooms[:-1]:
+            level = result.filter(pl.col("pylifemap_cluster_zoom") == zoom).sort("pylifemap_x")
+            expected = brute_force(df, zoom)
+            assert level.height == expected.height
+            assert level.get_column("pylifemap_count").equals(expected.get_column("pylifemap_count"))
+            for col in ("pylifemap_x", "pylifemap_y", "value"):
+                assert np.allclose(level.get_column(col).to_numpy(), expected.get_column(col).to_numpy())
+
+    def test_categorical_fill(self):
+        result, zooms = clusters_pyramid(df, fill="cat", fill_cat=True)
+        level = result.filter(pl.col("pylifemap_cluster_zoom") == zooms[2]).sort("pylifemap_x")
+        assert level.get_column("cat").equals(brute_force(df, zooms[2]).get_column("cat"))
+
+    def test_radius_sum(self):
+        result, _ = clusters_pyramid(df, radius="value")
+        totals = result.group_by("pylifemap_cluster_zoom").agg(pl.col("value").sum()).get_column("value")
+        assert np.allclose(totals.to_numpy(), df.get_column("value").sum())
+
+    def test_taxids(self):
+        result, zooms = clusters_pyramid(df)
+        clusters = result.filter(pl.col("pylifemap_cluster_zoom") < zooms[-1])
+        single = clusters.get_column("pylifemap_count") == 1
+        assert clusters.filter(~single).get_column("pylifemap_taxid").is_null().all()
+        assert clusters.filter(single).get_column("pylifemap_taxid").is_not_null().all()
+
+    def test_empty_data(self):
+        result, zooms = clusters_pyramid(df.clear())
+        assert result.height == 0
+        assert zooms == [0]
+
+    def test_cluster_size(self):
+        with pytest.raises(ValueError):
+            clusters_pyramid(df, cluster_size=0)
+        # With smaller cells, points are separated at lower zoom levels
+        _, small_zooms = clusters_pyramid(df, cluster_size=16)
+        _, large_zooms = clusters_pyramid(df, cluster_size=128)
+        assert small_zooms[-1] < large_zooms[-1]
+
+
+class TestDensityGrids:
+    def test_weights(self):
+        result, zooms = density_grids(df, weight="value")
+        assert result.columns == ["pylifemap_x", "pylifemap_y", "pylifemap_weight", "pylifemap_grid_zoom"]
+        assert result.get_column("pylifemap_grid_zoom").unique().sort().to_list() == zooms
+        totals = result.group_by("pylifemap_grid_zoom").agg(pl.col("pylifemap_weight").sum())
+        assert np.allclose(totals.get_column("pylifemap_weight").to_numpy(), df.get_column("value").sum())
+
+    def test_counts(self):
+        # Many observations of the same taxa share their coordinates
+        repeated = pl.concat([df.head(100)] * 50)
+        result, zooms = density_grids(repeated)
+        assert result.height < repeated.height
+        finest = result.filter(pl.col("pylifemap_grid_zoom") == zooms[-1])
+        assert finest.height == 100
+        assert (finest.get_column("pylifemap_weight") == 50).all()
+
+    def test_small_data(self):
+        result, zooms = density_grids(df.head(3))
+        assert result.height == 3
+        assert len(zooms) == 1
+        assert (result.get_column("pylifemap_weight") == 1).all()
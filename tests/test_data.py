@@ -213,8 +213,12 @@ class TestLinesData:
 
     def test_lines_data(self, lmd_num):
         tmp = lmd_num.lines_data(options={"lazy": True}, data_columns=("value",))
-        assert tmp.shape == (10, 8)
+        assert tmp.shape == (10, 12)
         assert sorted(tmp.columns) == [
+            "pylifemap_bbox_xmax",
+            "pylifemap_bbox_xmin",
+            "pylifemap_bbox_ymax",
+            "pylifemap_bbox_ymin",
             "pylifemap_parent_taxid",
             "pylifemap_parent_x",
             "pylifemap_parent_y",
@@ -272,8 +276,12 @@ class TestArcsData:
         tmp = lmd_arcs.arcs_data(
             options={"taxid_dest_col": "taxid_dest", "lazy": True}, data_columns=("value",)
         )
-        assert tmp.shape == (4, 8)
+        assert tmp.shape == (4, 12)
         assert sorted(tmp.columns) == [
+            "pylifemap_bbox_xmax",
+            "pylifemap_bbox_xmin",
+            "pylifemap_bbox_ymax",
+            "pylifemap_bbox_ymin",
             "pylifemap_dest_taxid",
             "pylifemap_dest_x",
             "pylifemap_dest_y",
@@ -0,0 +1,137 @@
+"""
+Tests for widget directory and shared bundle exports.
+"""
+
+import hashlib
+import json
+import re
+
+import polars as pl
+import pyarrow.feather as pf
+import pytest
+
+from pylifemap import Lifemap
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.widget import LifemapWidgetDeck, LifemapWidgetNoDeck
+
+d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510, 55_559], "value": [1.0, 2.0, 3.0, 4.0]})
+
+
+def read_state(path):
+    page = (path if path.suffix == ".html" else path / "index.html").read_text()
+    state = re.search(r'<script type="application/json" id="lifemap-state">(.*?)</script>', page, re.DOTALL)
+    return page, json.loads(state.group(1))
+
+
+class TestExportDirectory:
+    def test_export(self, tmp_path):
+        m = Lifemap(d).layer_points(radius="value").layer_points().layer_lines()
+        m.save(tmp_path, title="<Lifemap>", mode="directory")
+        page, state = read_state(tmp_path)
+        assert "<title>&lt;Lifemap&gt;</title>" in page
+        assert 'import widget from "./widget.js"' in page
+        assert (tmp_path / "widget.css").exists()
+        # Layers data are not in the page but in one file per data store entry
+        files = state["data"]["files"]
+        assert state["data"]["store"] == {}
+        assert sorted(state["data"]["pending"]) == sorted(files)
+        assert len(files) == 2
+        assert {layer["key"] for layer in state["data"]["layers"].values()} == set(files)
+        for layer_id, layer in state["data"]["layers"].items():
+            table = pf.read_table(tmp_path / files[layer["key"]])
+            assert table.num_rows == m._layers_data[layer_id].height
+        assert [layer["id"] for layer in state["layers"]] == [layer["id"] for layer in m._layers]
+        assert state["options"]["theme"] == "dark"
+
+    def test_hash_assets(self, tmp_path):
+        Lifemap(d).layer_points().save(tmp_path, mode="directory", hash_assets=True)
+        page, state = read_state(tmp_path)
+        (file,) = state["data"]["files"].values()
+        content = (tmp_path / file).read_bytes()
+        assert file.endswith(f".{hashlib.sha256(content).hexdigest()[:16]}.arrow")
+        (js,) = tmp_path.glob("widget.*.js")
+        assert f'import widget from "./{js.name}"' in page
+
+    def test_lazy_tiles(self, tmp_path):
+        taxids = pl.DataFrame({"taxid": BACKEND_DATA.get_column("taxid").head(500), "value": range(500)})
+        m = Lifemap(taxids).layer_points(lazy=True, lazy_zoom=2, fill="value").layer_lines()
+        points_id, lines_id = (layer["id"] for layer in m._layers)
+        # Scales domains are only computed for tiled layers, from their whole data
+        assert m._layers[0]["options"]["fill_cat"] is None
+        m.save(tmp_path, mode="directory")
+        _, state = read_state(tmp_path)
+        manifest = json.loads((tmp_path / state["data"]["lazy_tiles"]).read_text())
+        # Only lazy loading layers are tiled, and the widget only gets a sample of their data
+        assert list(manifest["layers"]) == [points_id]
+        layers = {layer["id"]: layer for layer in state["layers"]}
+        assert layers[points_id]["options"]["lazy_source"] == "static"
+        assert layers[points_id]["options"]["refresh"] == "none"
+        assert layers[points_id]["options"]["fill_cat"] is False
+        assert layers[lines_id]["options"].get("lazy_source") is None
+        points_file = state["data"]["files"][state["data"]["layers"][points_id]["key"]]
+        assert pf.read_table(tmp_path / points_file).num_rows == 1
+        tiles = manifest["layers"][points_id]["tiles"]
+        assert (
+            sum(pf.read_table(tmp_path / file).num_rows for file in tiles.values())
+            == m._layers_data[points_id].height
+        )
+        assert all(file.startswith(f"tiles/{points_id}/{key}") for key, file in tiles.items())
+
+    def test_no_lazy_tiles(self, tmp_path):
+        taxids = pl.DataFrame({"taxid": BACKEND_DATA.get_column("taxid").head(500)})
+        Lifemap(taxids).layer_points(lazy=True).save(tmp_path, mode="directory", lazy_tiles=False)
+        _, state = read_state(tmp_path)
+        assert "lazy_tiles" not in state["data"]
+        assert not (tmp_path / "tiles").exists()
+
+    def test_invalid_mode(self, tmp_path):
+        with pytest.raises(ValueError, match="mode must be one of"):
+            Lifemap(d).layer_points().save(tmp_path, mode="zip")
+
+
+class TestExportBundle:
+    @pytest.fixture(autouse=True)
+    def large_bundle(self, monkeypatch):
+        # Bundles are a few megabytes
+        for widget_class in (LifemapWidgetDeck, LifemapWidgetNoDeck):
+            monkeypatch.setattr(widget_class, "_esm", "// " + "x" * 2_000_000 + "\nexport default {}")
+
+    def test_external_size(self, tmp_path):
+        m = Lifemap(d).layer_points(radius="value")
+        m.save(tmp_path / "inline.html")
+        m.save(tmp_path / "a.html", bundle="external")
+        m.save(tmp_path / "b.html", bundle="external")
+        # The bundle is written once, and each page is a few kilobytes instead of megabytes
+        (js,) = tmp_path.glob("widget.*.js")
+        assert len(list(tmp_path.glob("widget.*.css"))) == 1
+        inline_size = (tmp_path / "inline.html").stat().st_size
+        external_size = (tmp_path / "a.html").stat().st_size
+        assert inline_size > 2_000_000
+        assert external_size < 20_000
+        assert inline_size - external_size > js.stat().st_size - 20_000
+        page, state = read_state(tmp_path / "a.html")
+        assert f'import widget from "./{js.name}"' in page
+        (file,) = state["data"]["files"].values()
+        assert file.startswith("data:application/vnd.apache.arrow.file;base64,")
+
+    def test_url(self, tmp_path):
+        m = Lifemap(d).layer_points()
+        m.save(tmp_path / "lifemap.html", bundle="url", bundle_url="https://example.org/lifemap/")
+        assert [p.name for p in tmp_path.iterdir()] == ["lifemap.html"]
+        page, _ = read_state(tmp_path / "lifemap.html")
+        assert 'import widget from "https://example.org/lifemap/widget.' in page
+
+    def test_directory(self, tmp_path):
+        m = Lifemap(d).layer_points()
+        m.save(tmp_path / "a", mode="directory", bundle="external")
+        m.save(tmp_path / "b", mode="directory", bundle="external")
+        (js,) = tmp_path.glob("widget.*.js")
+        page, _ = read_state(tmp_path / "b")
+        assert f'import widget from "../{js.name}"' in page
+        assert not list((tmp_path / "b").glob("widget*"))
+
+    def test_invalid_bundle(self, tmp_path):
+        with pytest.raises(ValueError, match="bundle must be one of"):
+            Lifemap(d).layer_points().save(tmp_path / "lifemap.html", bundle="cdn")
+        with pytest.raises(ValueError, match="bundle_url is required"):
+            Lifemap(d).layer_points().save(tmp_path / "lifemap.html", bundle="url")
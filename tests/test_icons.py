@@ -0,0 +1,236 @@
+"""
+Tests for icons fetching and caching functions.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import polars as pl
+import pytest
+
+from pylifemap import Lifemap, lifemap
+from pylifemap.data.icons import IconsCache, fetch_icons, icons_assets
+from pylifemap.utils import icon_url_to_data_uri
+
+PNG = b"\x89PNG\r\n\x1a\nfake png content"
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"/>'
+SVG_URI = f"data:image/svg+xml;base64,{base64.b64encode(SVG).decode()}"
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Serve icons files from a temporary directory, and record requested paths and the
+    maximum number of concurrent requests."""
+    icons_dir = tmp_path / "icons"
+    icons_dir.mkdir()
+    for i in range(20):
+        (icons_dir / f"icon{i}.png").write_bytes(PNG + bytes([i]))
+    (icons_dir / "icon.svg").write_bytes(SVG)
+    requested = []
+    lock = threading.Lock()
+    concurrency = {"current": 0, "max": 0}
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                requested.append(self.path)
+                concurrency["current"] += 1
+                concurrency["max"] = max(concurrency["max"], concurrency["current"])
+            # Simulate network latency
+            time.sleep(0.05)
+            super().do_GET()
+            with lock:
+                concurrency["current"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=str(icons_dir)))
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requested, concurrency
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def decode(data_uri):
+    header, content = data_uri.split(",", 1)
+    return header, base64.b64decode(content)
+
+
+class TestFetchIcons:
+    def test_fetch(self, server, tmp_path):
+        url, requested, concurrency = server
+        urls = [f"{url}/icon{i}.png" for i in range(20)]
+        res = fetch_icons([*urls, urls[0], None], workers=4, cache=IconsCache(tmp_path / "cache"))
+        # Icons are fetched concurrently, within the workers limit, and only once
+        assert 1 < concurrency["max"] <= 4
+        assert sorted(requested) == sorted(f"/icon{i}.png" for i in range(20))
+        assert list(res) == urls
+        assert decode(res[urls[3]]) == ("data:image/png;base64", PNG + bytes([3]))
+
+    def test_cache(self, server, tmp_path):
+        url, requested, _ = server
+        urls = [f"{url}/icon1.png", f"{url}/icon.svg"]
+        cache = IconsCache(tmp_path / "cache")
+        res = fetch_icons(urls, cache=cache)
+        assert len(requested) == 2
+        # Cached icons are not downloaded again
+        assert fetch_icons(urls, cache=cache) == res
+        assert len(requested) == 2
+        assert decode(res[urls[1]]) == ("data:image/svg+xml;base64", SVG)
+        fetch_icons(urls, cache=None)
+        assert len(requested) == 4
+
+    def test_local_icons(self, tmp_path):
+        path = tmp_path / "icon.png"
+        path.write_bytes(PNG)
+        data_uri = "data:image/png;base64,AAAA"
+        res = fetch_icons([str(path), data_uri], cache=None)
+        assert decode(res[str(path)]) == ("data:image/png;base64", PNG)
+        assert res[data_uri] == data_uri
+
+    def test_errors(self, server, tmp_path):
+        url, _, _ = server
+        urls = [f"{url}/icon1.png", f"{url}/missing.png", str(tmp_path / "missing.png")]
+        # All failures are reported at once
+        with pytest.raises(FileNotFoundError, match="Failed to fetch 2 of 3 icons") as e:
+            fetch_icons(urls, cache=None)
+        assert f"{url}/missing.png: HTTP 404" in str(e.value)
+        assert "missing.png: file not found" in str(e.value)
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError, match=r"missing\.png: file not found"):
+            fetch_icons([str(tmp_path / "missing.png")], cache=None)
+
+    def test_utils_data_uri(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            icon_url_to_data_uri(str(tmp_path / "missing.png"))
+
+
+class TestIconsCache:
+    def test_eviction(self, tmp_path):
+        cache = IconsCache(tmp_path, max_size=25)
+        urls = [f"http://icon{i}.png" for i in range(3)]
+        for i, url in enumerate(urls):
+            cache.put(url, b"0123456789", "image/png")
+            path = tmp_path / f"{hashlib.sha256(url.encode()).hexdigest()}.png"
+            os.utime(path, (i, i))
+        # Getting an icon makes it the most recently used one
+        assert cache.get(urls[0]) == (b"0123456789", "image/png")
+        cache.evict()
+        assert cache.get(urls[1]) is None
+        assert cache.get(urls[0]) is not None
+        assert cache.get(urls[2]) is not None
+
+    def test_unknown_mime_type(self, tmp_path):
+        cache = IconsCache(tmp_path)
+        # Icons whose MIME type can't be found again from a file extension are not cached
+        cache.put("http://favicon.ico", b"0123456789", "image/x-icon")
+        assert cache.get("http://favicon.ico") is None
+        assert not list(tmp_path.iterdir())
+
+
+def icons_layer(layer_id, icons_cache, icon="icon", **kwargs):
+    options = {"icon": icon, "width": None, "height": None, "scale": None, **kwargs}
+    return {"id": layer_id, "layer": "icons", "options": {**options, "icons_cache": icons_cache}}
+
+
+def png_uri(width, height, color):
+    image = pytest.importorskip("PIL.Image").new("RGBA", (width, height), color)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(output.getvalue()).decode()}"
+
+
+class TestIconsAssets:
+    def test_unique_icons(self):
+        points = {"id": "points", "layer": "points", "options": {}}
+        layers = [
+            icons_layer("a", {"url1": SVG_URI, "url2": SVG_URI}),
+            icons_layer("b", {SVG_URI: SVG_URI}, icon=SVG_URI),
+            points,
+        ]
+        res, assets = icons_assets(layers)
+        # Icons are stored once, and icons layers only reference them
+        (key,) = assets["icons"]
+        assert assets["icons"][key] == SVG_URI
+        assert res[0]["options"]["icons"] == {
+            "url1": {"key": key, "size": None},
+            "url2": {"key": key, "size": None},
+        }
+        assert "icons_cache" not in res[0]["options"]
+        assert res[1]["options"]["icon"] == f"asset:{key}"
+        assert res[1]["options"]["icons"] == {f"asset:{key}": {"key": key, "size": None}}
+        assert res[2] is points
+        assert "icons_cache" in layers[0]["options"]
+
+    def test_widget(self):
+        d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510]})
+        m = Lifemap(d).layer_icons(icon=SVG_URI).layer_icons(icon=SVG_URI, scale=0.5)
+        widget = m._to_widget()
+        assert list(widget.data["assets"]["icons"].values()) == [SVG_URI]
+        assert SVG_URI not in str(widget.layers)
+
+    def test_widget_cache(self, monkeypatch):
+        calls = []
+
+        def counting_icons_assets(layers, **kwargs):
+            calls.append(len(layers))
+            return icons_assets(layers, **kwargs)
+
+        monkeypatch.setattr(lifemap, "icons_assets", counting_icons_assets)
+        d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510]})
+        m = Lifemap(d).layer_icons(icon=SVG_URI)
+        m._to_widget()
+        m._to_widget(binary_transfer=True)
+        # Icons assets are reused until a layer is added
+        assert calls == [1]
+        m.layer_points()
+        widget = m._to_widget()
+        assert calls == [1, 2]
+        assert list(widget.data["assets"]["icons"].values()) == [SVG_URI]
+
+    def test_downscale(self):
+        pil_image = pytest.importorskip("PIL.Image")
+        big, small = png_uri(256, 128, "red"), png_uri(8, 8, "blue")
+        layers = [
+            icons_layer("a", {"big": big, "small": small}, width=16),
+            icons_layer("b", {"big": big}, scale=0.5),
+        ]
+        res, assets = icons_assets(layers)
+        icons_a, icons_b = (layer["options"]["icons"] for layer in res)
+        assert icons_a["big"]["size"] == [16, 8]
+        assert icons_a["small"]["size"] == [16, 16]
+        assert icons_b["big"]["size"] == [128, 64]
+
+        def image_size(key):
+            content = base64.b64decode(assets["icons"][key].split(",", 1)[1])
+            return pil_image.open(io.BytesIO(content)).size
+
+        # Icons are never upscaled, and downscaled for high density displays
+        assert image_size(icons_a["big"]["key"]) == (32, 16)
+        assert image_size(icons_a["small"]["key"]) == (8, 8)
+        assert image_size(icons_b["big"]["key"]) == (256, 128)
+        assert len(assets["icons"]) == 3
+
+    def test_atlas(self):
+        pil_image = pytest.importorskip("PIL.Image")
+        layers = [
+            icons_layer("a", {"red": png_uri(10, 20, "red"), "blue": png_uri(30, 10, "blue"), "svg": SVG_URI})
+        ]
+        (layer,), assets = icons_assets(layers, atlas=True)
+        icons = layer["options"]["icons"]
+        # Vector icons are not packed
+        assert list(assets["icons"]) == [icons["svg"]["key"]]
+        assert assets["offsets"][icons["red"]["key"]] == [0, 0, 10, 20]
+        assert assets["offsets"][icons["blue"]["key"]] == [11, 0, 30, 10]
+        atlas = pil_image.open(io.BytesIO(base64.b64decode(assets["atlas"].split(",", 1)[1])))
+        assert atlas.size == (41, 20)
+        assert atlas.getpixel((15, 5)) == (0, 0, 255, 255)
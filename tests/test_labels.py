@@ -0,0 +1,103 @@
+"""
+Tests for labels placement functions.
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pylifemap import Lifemap
+from pylifemap.data.labels import (
+    CHAR_WIDTH_RATIO,
+    LABEL_STROKE_WIDTH,
+    LINE_HEIGHT_RATIO,
+    MAX_LABEL_ZOOM,
+    label_zooms,
+)
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+
+rng = np.random.default_rng(0)
+n = 2000
+words = np.array(["Homo sapiens", "Canis", "Felis catus", "Drosophila melanogaster", "E. coli"])
+labels_df = pl.DataFrame(
+    {
+        "pylifemap_taxid": range(n),
+        "pylifemap_x": rng.normal(0, 3e6, n),
+        "pylifemap_y": rng.normal(0, 3e6, n),
+        "pylifemap_zoom": rng.integers(4, 30, n),
+        "label": words[rng.integers(0, len(words), n)],
+        "priority": rng.uniform(0, 1, n),
+    }
+)
+
+
+def collisions(d, zooms, zoom, font_size=12):
+    visible = d.filter(zooms <= zoom)
+    width = visible.get_column("label").str.len_chars().to_numpy() * CHAR_WIDTH_RATIO * font_size
+    width = width + 2 * LABEL_STROKE_WIDTH
+    height = LINE_HEIGHT_RATIO * font_size + 2 * LABEL_STROKE_WIDTH
+    scale = 256 * 2**zoom / (2 * WORLD_HALF_SIZE)
+    x = visible.get_column("pylifemap_x").to_numpy() * scale
+    y = visible.get_column("pylifemap_y").to_numpy() * scale
+    overlap = (np.abs(x[:, None] - x[None, :]) < (width[:, None] + width[None, :]) / 2) & (
+        np.abs(y[:, None] - y[None, :]) < height
+    )
+    return overlap.sum() - len(x)
+
+
+class TestLabelZooms:
+    def test_no_collisions(self):
+        zooms = label_zooms(labels_df, text="label", priority="priority")
+        for zoom in range(0, 12, 2):
+            assert collisions(labels_df, zooms, zoom) == 0
+        # Labels are eventually all displayed
+        assert zooms.max() <= MAX_LABEL_ZOOM
+
+    def test_priority(self):
+        zooms = label_zooms(labels_df, text="label", priority="priority")
+        top = labels_df.with_columns(zooms).sort("priority", descending=True).head(1)
+        assert top.get_column("pylifemap_label_zoom").to_list() == [0]
+
+    def test_overlapping_labels(self):
+        d = pl.DataFrame(
+            {
+                "pylifemap_taxid": [1, 2, 3],
+                "pylifemap_x": [0.0, 1000.0, 1e7],
+                "pylifemap_y": [0.0, 0.0, 0.0],
+                "pylifemap_zoom": [8, 5, 8],
+                "label": ["first", "second", "third"],
+            }
+        )
+        zooms = label_zooms(d, text="label").to_list()
+        # Lowest tree zoom first, the overlapping label is displayed when zoomed in
+        assert zooms[1] == 0
+        assert zooms[2] == 0
+        assert zooms[0] > 5
+
+    def test_min_zooms_and_empty(self):
+        d = labels_df.head(3).with_columns(pl.Series("label", ["a", None, "c"]))
+        zooms = label_zooms(d, text="label", min_zooms=pl.Series([3, 4, 5]))
+        assert zooms.to_list()[1] == 4
+        assert (zooms >= pl.Series([3, 4, 5])).all()
+
+
+class TestLayerTextDeclutter:
+    d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510, 55_559], "name": ["a", "b", "c", "d"]})
+
+    def test_precompute(self):
+        m = Lifemap(self.d).layer_text(text="name", declutter_mode="precompute", lazy=False)
+        layer = m._layers[-1]
+        data = m._layers_data[layer["id"]]
+        assert not layer["options"]["declutter"]
+        zooms = data.get_column("pylifemap_label_zoom")
+        assert zooms.is_sorted()
+
+    def test_precompute_lazy(self):
+        m = Lifemap(self.d).layer_text(text="name", declutter_mode="precompute", lazy=True)
+        layer = m._layers[-1]
+        assert layer["options"]["lazy_zoom"] == 0
+        assert "pylifemap_zoom" in m._layers_data[layer["id"]].columns
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError, match="declutter_mode"):
+            Lifemap(self.d).layer_text(text="name", declutter_mode="foo")
@@ -2,10 +2,23 @@
 Tests for lazy loading utility functions.
 """
 
+import numpy as np
 import polars as pl
 import pytest
 
-from pylifemap.data.lazy_loading import propagate_parent_zoom
+from pylifemap.data.geo import TRANSFORMER, arcs_bbox, unwrapped_to_3857
+from pylifemap.data.lazy_loading import (
+    MAX_BUDGET_ZOOM,
+    WORLD_HALF_SIZE,
+    display_zooms,
+    lazy_offsets,
+    morton_codes,
+    propagate_parent_zoom,
+    segments_offsets,
+    segments_size_class,
+    sort_lazy_data,
+    sort_segments_data,
+)
 from pylifemap.data.lifemap_data import LifemapData
 
 pl_df = pl.DataFrame({"pylifemap_taxid": [2157, 1_783_263, 48510, 55_559]}).with_columns(
@@ -42,3 +55,218 @@ class TestPropagateParentZoom:
         assert data_parent.get_column("pylifemap_taxid").to_list() == [2157, 48510, 55559, 1783263]
         assert data_self.get_column("pylifemap_zoom").to_list() == [6, 8, 18, 13]
         assert data_parent.get_column("pylifemap_zoom").to_list() == [4, 6, 8, 6]
+
+
+class TestLazySort:
+    rng = np.random.default_rng(0)
+    n = 1000
+    lazy_df = pl.DataFrame(
+        {
+            "pylifemap_taxid": range(n),
+            "pylifemap_x": rng.uniform(-1e7, 1e7, n),
+            "pylifemap_y": rng.uniform(-1e7, 1e7, n),
+            "pylifemap_zoom": rng.integers(4, 12, n),
+        }
+    )
+
+    def test_morton_codes(self):
+        h = WORLD_HALF_SIZE
+        codes = morton_codes(np.array([-h, h, -h, h, 0]), np.array([-h, -h, h, h, 0]))
+        assert codes.tolist() == [0, 0x55555555, 0xAAAAAAAA, 0xFFFFFFFF, 0xC0000000]
+
+    def test_morton_codes_monotonic(self):
+        x = np.sort(self.rng.uniform(-1e7, 1e7, 100))
+        assert (np.diff(morton_codes(x, np.zeros(100)).astype(np.int64)) >= 0).all()
+
+    def test_sort_lazy_data(self):
+        res = sort_lazy_data(self.lazy_df)
+        assert res.shape == self.lazy_df.shape
+        zooms = res.get_column("pylifemap_zoom").to_numpy()
+        assert (np.diff(zooms) <= 0).all()
+        codes = morton_codes(
+            res.get_column("pylifemap_x").to_numpy(), res.get_column("pylifemap_y").to_numpy()
+        )
+        for zoom in np.unique(zooms):
+            assert (np.diff(codes[zooms == zoom].astype(np.int64)) >= 0).all()
+
+    def test_lazy_offsets(self):
+        res = sort_lazy_data(self.lazy_df)
+        offsets = lazy_offsets(res)
+        assert offsets["zooms"] == list(range(11, 3, -1))
+        assert offsets["offsets"][0] == 0
+        assert offsets["offsets"][-1] == self.n
+        zooms = res.get_column("pylifemap_zoom")
+        for zoom, start, end in zip(
+            offsets["zooms"], offsets["offsets"][:-1], offsets["offsets"][1:], strict=True
+        ):
+            assert (zooms.slice(start, end - start) == zoom).all()
+
+    def test_lazy_offsets_empty(self):
+        assert lazy_offsets(self.lazy_df.clear()) == {"zooms": [], "offsets": [0]}
+
+
+def segments_query(d, offsets, extent, zoom):
+    """
+    Python version of the frontend segments_candidates lazy filtering.
+    """
+    xmin, ymin, xmax, ymax = extent
+    bbox_xmin = d.get_column("pylifemap_bbox_xmin").to_numpy()
+    result = []
+    for z, width, start, end in zip(
+        offsets["zooms"], offsets["widths"], offsets["offsets"][:-1], offsets["offsets"][1:], strict=True
+    ):
+        if z > zoom:
+            continue
+        first = start + np.searchsorted(bbox_xmin[start:end], xmin - width, side="left")
+        last = start + np.searchsorted(bbox_xmin[start:end], xmax, side="right")
+        candidates = d.slice(first, last - first)
+        result.append(
+            candidates.filter(
+                (pl.col("pylifemap_bbox_xmax") >= xmin)
+                & (pl.col("pylifemap_bbox_ymin") <= ymax)
+                & (pl.col("pylifemap_bbox_ymax") >= ymin)
+            )
+        )
+    return pl.concat(result).get_column("pylifemap_taxid").to_list() if result else []
+
+
+class TestSegmentsIndex:
+    # Long arcs between both sides of the map, and a short arc on the left
+    arcs = pl.DataFrame(
+        {
+            "pylifemap_taxid": [1, 2, 3],
+            "pylifemap_x": [-70.0, 65.0, -60.0],
+            "pylifemap_y": [0.0, 0.0, -20.0],
+            "pylifemap_dest_x": [65.0, -70.0, -58.0],
+            "pylifemap_dest_y": [0.0, 0.0, -21.0],
+            "pylifemap_zoom": [5, 7, 9],
+        }
+    )
+
+    def arcs_data(self):
+        bbox = arcs_bbox(
+            *(
+                self.arcs.get_column(c)
+                for c in ("pylifemap_x", "pylifemap_y", "pylifemap_dest_x", "pylifemap_dest_y")
+            )
+        )
+        xmin, ymin = unwrapped_to_3857(bbox[0], bbox[1])
+        xmax, ymax = unwrapped_to_3857(bbox[2], bbox[3])
+        d = self.arcs.with_columns(
+            pl.Series("pylifemap_bbox_xmin", xmin),
+            pl.Series("pylifemap_bbox_ymin", ymin),
+            pl.Series("pylifemap_bbox_xmax", xmax),
+            pl.Series("pylifemap_bbox_ymax", ymax),
+        )
+        return sort_segments_data(d)
+
+    def test_arcs_bbox_curved(self):
+        xmin, ymin, xmax, ymax = arcs_bbox(
+            *(
+                self.arcs.get_column(c)
+                for c in ("pylifemap_x", "pylifemap_y", "pylifemap_dest_x", "pylifemap_dest_y")
+            )
+        )
+        # Arcs bend on the left of their direction
+        assert ymax[0] > 15
+        assert ymin[0] == pytest.approx(0)
+        assert ymin[1] < -15
+        assert ymax[1] == pytest.approx(0)
+        assert xmin[0] <= -70 and xmax[0] >= 65
+
+    def test_arcs_bbox_antimeridian(self):
+        lon, lat, dest_lon, dest_lat = (pl.Series([v]) for v in (160.0, 10.0, -120.0, 20.0))
+        xmin, ymin, xmax, ymax = arcs_bbox(lon, lat, dest_lon, dest_lat)
+        # The arc goes east across the antimeridian, control points beyond 180° are kept
+        assert xmax[0] > 180
+        x0, _ = unwrapped_to_3857(xmin, ymin)
+        x1, _ = unwrapped_to_3857(xmax, ymax)
+        assert x1[0] > WORLD_HALF_SIZE > x0[0]
+        d = pl.DataFrame({"pylifemap_bbox_xmin": x0, "pylifemap_bbox_xmax": x1})
+        assert segments_size_class(d).to_list() == [0]
+
+    def test_segments_offsets(self):
+        d = self.arcs_data()
+        offsets = segments_offsets(d)
+        assert d.get_column("pylifemap_taxid").to_list() == [3, 2, 1]
+        assert offsets["zooms"] == [9, 7, 5]
+        assert offsets["offsets"] == [0, 1, 2, 3]
+        assert offsets["widths"][0] < offsets["widths"][1]
+
+    def test_long_arcs_spanning_view(self):
+        d = self.arcs_data()
+        offsets = segments_offsets(d)
+        # Small view in the middle of the map, above the equator: both arcs ends are
+        # outside of it, but the first arc crosses it
+        x0, y0 = TRANSFORMER.transform(-1, 18)
+        x1, y1 = TRANSFORMER.transform(1, 20)
+        assert segments_query(d, offsets, (x0, y0, x1, y1), zoom=20) == [1]
+        # Same view below the equator
+        x0, y0 = TRANSFORMER.transform(-1, -20)
+        x1, y1 = TRANSFORMER.transform(1, -18)
+        assert segments_query(d, offsets, (x0, y0, x1, y1), zoom=20) == [2]
+        # Zoom level filtering
+        assert segments_query(d, offsets, (x0, y0, x1, y1), zoom=6) == []
+
+    def test_short_arc(self):
+        d = self.arcs_data()
+        offsets = segments_offsets(d)
+        # View around the short arc, below the long arcs bounding boxes
+        x0, y0 = TRANSFORMER.transform(-61, -22)
+        x1, y1 = TRANSFORMER.transform(-57, -20.5)
+        assert segments_query(d, offsets, (x0, y0, x1, y1), zoom=20) == [3]
+
+
+def tiles_max_count(d, zoom, tile_size=256):
+    size = tile_size * 2 * WORLD_HALF_SIZE / 256 / 2**zoom
+    return (
+        d.filter(pl.col("pylifemap_zoom") <= zoom)
+        .group_by(
+            ((pl.col("pylifemap_x") + WORLD_HALF_SIZE) / size).floor(),
+            ((pl.col("pylifemap_y") + WORLD_HALF_SIZE) / size).floor(),
+        )
+        .len()
+        .get_column("len")
+        .max()
+    )
+
+
+class TestDisplayZooms:
+    rng = np.random.default_rng(0)
+    n = 20_000
+    lazy_df = pl.DataFrame(
+        {
+            "pylifemap_taxid": range(n),
+            "pylifemap_x": rng.normal(0, 3e6, n),
+            "pylifemap_y": rng.normal(0, 3e6, n),
+            "pylifemap_zoom": rng.integers(4, 30, n),
+            "priority": rng.uniform(0, 1, n),
+        }
+    )
+
+    @pytest.mark.parametrize(("budget", "tile_size"), [(1, 256), (20, 256), (10, 64)])
+    def test_budget(self, budget, tile_size):
+        zooms = display_zooms(self.lazy_df, budget=budget, tile_size=tile_size)
+        d = self.lazy_df.with_columns(zooms)
+        for zoom in range(MAX_BUDGET_ZOOM + 1):
+            assert tiles_max_count(d, zoom, tile_size) <= budget
+        # The single zoom 0 tile is filled up to the budget
+        assert tiles_max_count(d, 0, tile_size) == budget
+
+    def test_priority(self):
+        zooms = display_zooms(self.lazy_df, budget=5, priority="priority")
+        d = self.lazy_df.with_columns(zooms)
+        top = d.sort("priority", descending=True).head(5)
+        assert (top.get_column("pylifemap_zoom") == 0).all()
+
+    def test_tree_zoom_priority(self):
+        zooms = display_zooms(self.lazy_df, budget=5)
+        d = self.lazy_df.with_columns(zooms.alias("display_zoom"))
+        first = d.filter(pl.col("display_zoom") == 0)
+        assert first.get_column("pylifemap_zoom").max() <= d.get_column("pylifemap_zoom").min()
+
+    def test_invalid_budget(self):
+        with pytest.raises(ValueError, match="positive"):
+            display_zooms(self.lazy_df, budget=0)
+        with pytest.raises(ValueError, match="positive"):
+            display_zooms(self.lazy_df, budget=1, tile_size=0)
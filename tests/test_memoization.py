@@ -0,0 +1,97 @@
+"""
+Tests for layers data memoization.
+"""
+
+import os
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from pylifemap import Lifemap
+from pylifemap.data import memoization
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.memoization import LayersDataCache, layer_data_key
+
+taxids = BACKEND_DATA.get_column("taxid").head(200)
+d = pl.DataFrame({"taxid": taxids, "value": range(200), "other": range(200)})
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = LayersDataCache()
+    monkeypatch.setattr(memoization, "LAYERS_DATA_CACHE", cache)
+    return cache
+
+
+def points_data(data, **kwargs):
+    m = Lifemap(data).layer_points(**kwargs)
+    return m._layers_data[m._layers[0]["id"]]
+
+
+class TestMemoization:
+    def test_cache_hit(self, cache):
+        first = points_data(d, fill="value")
+        # Same data in another frame, with different unused columns
+        assert points_data(d.with_columns(other=pl.lit(0)), fill="value") is first
+        assert len(cache._memory) == 2
+
+    @pytest.mark.usefixtures("cache")
+    def test_cache_miss(self):
+        first = points_data(d, fill="value")
+        assert points_data(d.with_columns(value=pl.col("value") + 1), fill="value") is not first
+        assert points_data(d, fill="value", leaves="only") is not first
+        assert points_data(d, fill="other") is not first
+
+    @pytest.mark.usefixtures("cache")
+    def test_unknown_taxids(self):
+        data = pl.DataFrame({"taxid": [*taxids.head(3), -1]})
+        with pytest.warns(UserWarning, match="1 taxids have not been found"):
+            Lifemap(data)
+        with pytest.warns(UserWarning, match="1 taxids have not been found"):
+            Lifemap(data)
+
+    def test_no_cache(self, monkeypatch):
+        monkeypatch.setattr(memoization, "LAYERS_DATA_CACHE", None)
+        assert points_data(d) is not points_data(d)
+
+
+class TestLayersDataCache:
+    def test_memory_eviction(self):
+        frames = [pl.DataFrame({"x": [float(i)] * 100}) for i in range(3)]
+        cache = LayersDataCache(memory_size=2 * frames[0].estimated_size())
+        cache.put("a", frames[0])
+        cache.put("b", frames[1])
+        assert cache.get("a") is frames[0]
+        cache.put("c", frames[2])
+        # Least recently used data are dropped
+        assert cache.get("b") is None
+        assert cache.get("a") is frames[0]
+        assert cache.get("c") is frames[2]
+
+    def test_disk(self, tmp_path):
+        df = pl.DataFrame({"x": [1.0, 2.0], "s": ["a", None]})
+        LayersDataCache(path=tmp_path).put("key", df)
+        # Another cache, as in a new session, reads the data from disk
+        cache = LayersDataCache(path=tmp_path)
+        assert_frame_equal(cache.get("key"), df)
+        assert "key" in cache._memory
+        assert LayersDataCache(path=tmp_path / "other").get("key") is None
+
+    def test_disk_eviction(self, tmp_path):
+        df = pl.DataFrame({"x": range(1000)})
+        cache = LayersDataCache(memory_size=0, path=tmp_path, max_size=10**9)
+        for i, key in enumerate(("a", "b", "c")):
+            cache.put(key, df)
+            os.utime(tmp_path / f"{key}.arrow", (i, i))
+        cache.get("a")
+        cache.max_size = 2 * (tmp_path / "a.arrow").stat().st_size
+        cache.evict()
+        assert sorted(p.stem for p in tmp_path.glob("*.arrow")) == ["a", "c"]
+        cache.clear()
+        assert not list(tmp_path.glob("*.arrow"))
+
+    def test_key(self):
+        assert layer_data_key("f", "abc", {"a": 1, "b": 2}) == layer_data_key("f", "abc", {"b": 2, "a": 1})
+        assert layer_data_key("f", "abc", {"a": 1}) != layer_data_key("g", "abc", {"a": 1})
+        assert layer_data_key("f", "abc", {"a": 1}) != layer_data_key("f", "abd", {"a": 1})
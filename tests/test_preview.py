@@ -0,0 +1,184 @@
+"""
+Tests for headless raster previews functions.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pylifemap import Lifemap
+from pylifemap.data import preview
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.preview import (
+    CAT_SCHEMES,
+    clip_segments,
+    draw_disks,
+    encode_rgba_png,
+    hex_rgb,
+    preview_view,
+    render_preview,
+)
+from pylifemap.data.spatial_index import WORLD_HALF_SIZE
+from pylifemap.utils import is_categorical_column
+
+# Extent of a 100x100 pixels preview where 1 pixel is 1 map unit
+EXTENT = (-50.0, -50.0, 50.0, 50.0)
+
+
+def decode_png(content):
+    """Decode an RGBA PNG with "up" filtered scanlines."""
+    width, height = struct.unpack(">II", content[16:24])
+    pos, data = 8, b""
+    while pos < len(content):
+        (length,) = struct.unpack(">I", content[pos : pos + 4])
+        if content[pos + 4 : pos + 8] == b"IDAT":
+            data += content[pos + 8 : pos + 8 + length]
+        pos += length + 12
+    raw = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(height, width * 4 + 1)
+    assert (raw[:, 0] == 2).all()
+    return np.cumsum(raw[:, 1:], axis=0, dtype=np.uint8).reshape(height, width, 4)
+
+
+def render(layer, d, **kwargs):
+    resolution = 1.0
+    zoom = np.log2(2 * WORLD_HALF_SIZE / (256 * resolution))
+    return render_preview(
+        [layer], {layer["id"]: d}, width=100, height=100, extent=EXTENT, zoom=zoom, **kwargs
+    )
+
+
+def points(x, y, **columns):
+    return pl.DataFrame(
+        {"pylifemap_taxid": list(range(len(x))), "pylifemap_x": x, "pylifemap_y": y, **columns}
+    )
+
+
+class TestDrawing:
+    def test_encode_png(self):
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 256, (7, 5, 4), dtype=np.uint8)
+        content = encode_rgba_png(image)
+        assert content.startswith(b"\x89PNG\r\n\x1a\n")
+        assert (decode_png(content) == image).all()
+
+    def test_draw_disks(self):
+        drawn = draw_disks(
+            (20, 10), np.array([5.5, 8.5, 100.0]), np.array([5.5, 5.5, 5.5]), np.array([3, 2, 1])
+        )
+        # Later disks are drawn on top, out of view ones are ignored
+        assert drawn[5, 8] == 1
+        assert drawn[5, 5] == 0
+        assert drawn[5, 2] == 0
+        assert drawn[5, 12] == -1
+        assert (drawn == 0).sum() + (drawn == 1).sum() == (drawn >= 0).sum()
+
+    def test_dense_disks(self, monkeypatch):
+        rng = np.random.default_rng(1)
+        px, py, radii = rng.uniform(-30, 130, 5000), rng.uniform(-30, 80, 5000), rng.uniform(0, 12, 5000)
+        monkeypatch.setattr(preview, "DENSE_DISKS_RATIO", 1e18)
+        sparse = draw_disks((100, 50), px, py, radii)
+        monkeypatch.setattr(preview, "DENSE_DISKS_RATIO", 0)
+        dense = draw_disks((100, 50), px, py, radii)
+        assert (sparse == dense).all()
+
+    def test_clip_segments(self):
+        x0, y0 = np.array([-10.0, -10.0, 5.0]), np.array([5.0, -10.0, 5.0])
+        x1, y1 = np.array([20.0, -5.0, 6.0]), np.array([5.0, -1.0, 5.0])
+        idx, *coords = clip_segments(x0, y0, x1, y1, (0, 0, 10, 10))
+        assert idx.tolist() == [0, 2]
+        assert [c.tolist() for c in coords] == [[0.0, 5.0], [5.0, 5.0], [10.0, 6.0], [5.0, 5.0]]
+
+
+class TestRenderPreview:
+    def test_view(self):
+        left, top, resolution, zoom = preview_view(200, 100, (0, 0, 1000, 1000), None)
+        assert resolution == pytest.approx(10)
+        assert (left, top) == pytest.approx((-500, 1000))
+        assert zoom == pytest.approx(np.log2(2 * WORLD_HALF_SIZE / 2560))
+
+    def test_points(self):
+        layer = {
+            "id": "points",
+            "layer": "points",
+            "options": {"radius": 5, "fill": "#00ff00", "opacity": 0.5},
+        }
+        image = render(layer, points([0.0, 30.0], [0.0, -30.0]))
+        assert image.shape == (100, 100, 4)
+        assert image[50, 50].tolist() == [0, 255, 0, 128]
+        assert image[80, 80].tolist() == [0, 255, 0, 128]
+        assert image[50, 58].tolist() == [0, 0, 0, 0]
+
+    def test_fill_scales(self):
+        layer = {"id": "points", "layer": "points", "options": {"radius": 2, "fill": "cat", "opacity": 1}}
+        image = render(layer, points([-20.0, 20.0], [0.0, 0.0], cat=["b", "a"]))
+        a, b = (hex_rgb(c).tolist() for c in CAT_SCHEMES["observable10"][:2])
+        assert image[50, 70, :3].tolist() == a
+        assert image[50, 30, :3].tolist() == b
+        # Numeric fill columns use the viridis scheme over the colors range
+        layer["options"]["fill"] = "value"
+        image = render(layer, points([-20.0, 20.0], [0.0, 0.0], value=[0.5, 1.0]))
+        assert image[50, 70, :3].tolist() == [253, 231, 37]
+        assert image[50, 30, :3].tolist() == [68, 1, 84]
+
+    def test_categorical(self):
+        # Same rule as the frontend is_categorical_column function
+        assert is_categorical_column(pl.Series(["a", "b"]))
+        assert is_categorical_column(pl.Series([1.0, 2.0, None]))
+        assert not is_categorical_column(pl.Series([1.5, 2.0]))
+        assert not is_categorical_column(pl.Series(range(11)))
+
+    def test_lazy_points(self):
+        options = {"radius": 2, "fill": None, "opacity": 1, "lazy": True, "lazy_zoom": 0}
+        layer = {"id": "points", "layer": "points", "options": options}
+        d = points([-20.0, 20.0], [0.0, 0.0], pylifemap_zoom=[1, 30])
+        image = render(layer, d, background="#ffffff")
+        # Rows are only drawn from their display zoom level
+        assert image[50, 30].tolist() == [221, 0, 0, 255]
+        assert image[50, 70].tolist() == [255, 255, 255, 255]
+
+    def test_lines(self):
+        layer = {"id": "lines", "layer": "lines", "options": {"width": 4, "color": "#0000ff", "opacity": 1}}
+        d = points([40.0, 0.0], [0.0, 0.0], pylifemap_parent_x=[-40.0, None], pylifemap_parent_y=[0.0, None])
+        image = render(layer, d)
+        assert image[50, 10:90, 3].min() == 255
+        assert image[45, 10:90, 3].max() == 0
+
+    def test_donuts(self):
+        options = {"counts_col": "counts", "radius": 60, "opacity": 1, "show_totals": False}
+        layer = {"id": "donuts", "layer": "donuts", "options": options}
+        d = points([0.0], [0.0], pylifemap_total=[4], counts=[{"b": 3, "a": 1}])
+        image = render(layer, d)
+        a, b = (hex_rgb(c).tolist() for c in CAT_SCHEMES["observable10"][:2])
+        # Slices start from the top, clockwise, ordered by category
+        assert image[30, 60, :3].tolist() == a
+        assert image[60, 25, :3].tolist() == b
+        assert image[50, 50, 3] == 0
+
+    def test_heatmap(self):
+        options = {"radius": 5, "blur": 5, "opacity": 1, "gradient": ("#000000", "#ffffff"), "weight": None}
+        layer = {"id": "heatmap", "layer": "heatmap", "options": options}
+        image = render(layer, pl.DataFrame({"pylifemap_x": [0.0] * 10, "pylifemap_y": [0.0] * 10}))
+        assert image[50, 50, 3] > image[50, 55, 3] > image[50, 60, 3]
+        assert image[10, 10, 3] == 0
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError, match="must be positive"):
+            render_preview([], {}, width=0)
+
+
+class TestToPng:
+    def test_to_png(self, tmp_path):
+        d = pl.DataFrame({"taxid": BACKEND_DATA.get_column("taxid").head(50)}).with_columns(name=pl.lit("a"))
+        m = Lifemap(d, width=300, height=200).layer_points().layer_text(text="name")
+        # Text and raster heatmap layers are not drawn
+        m = m.layer_heatmap(raster=True, raster_max_zoom=4, raster_workers=1)
+        path = tmp_path / "lifemap.png"
+        content = m.to_png(path)
+        assert path.read_bytes() == content
+        image = decode_png(content)
+        assert image.shape == (200, 300, 4)
+        assert (image[..., 3] > 0).any()
+        assert decode_png(m.to_png(width=40, height=30)).shape == (30, 40, 4)
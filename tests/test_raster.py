@@ -0,0 +1,133 @@
+"""
+Tests for heatmap raster tiles rendering functions.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pylifemap import Lifemap
+from pylifemap.data import raster
+from pylifemap.data.raster import encode_png, gradient_palette, heatmap_tiles
+from pylifemap.data.tree_lod import MIN_VIEW_ZOOM
+from pylifemap.data.workers import RASTER_WORKERS_ENV
+
+gradient = ("#0000ff", "#00ff00", "#f00")
+
+
+def decode_png(png):
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks = {}
+    pos = 8
+    while pos < len(png):
+        (length,) = struct.unpack(">I", png[pos : pos + 4])
+        kind = png[pos + 4 : pos + 8]
+        data = png[pos + 8 : pos + 8 + length]
+        assert struct.unpack(">I", png[pos + 8 + length : pos + 12 + length])[0] == zlib.crc32(kind + data)
+        chunks[kind] = data
+        pos += 12 + length
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, width + 1)
+    assert (raw[:, 0] == 2).all()
+    levels = np.cumsum(raw[:, 1:], axis=0, dtype=np.uint8)
+    palette = np.column_stack(
+        [
+            np.frombuffer(chunks[b"PLTE"], dtype=np.uint8).reshape(-1, 3),
+            np.frombuffer(chunks[b"tRNS"], dtype=np.uint8),
+        ]
+    )
+    return levels, palette
+
+
+class TestEncoding:
+    def test_palette(self):
+        palette = gradient_palette(gradient)
+        assert palette.shape == (256, 4)
+        assert palette[0].tolist() == [0, 0, 255, 0]
+        assert palette[-1].tolist() == [255, 0, 0, 255]
+        assert (np.diff(palette[:, 3].astype(int)) == 1).all()
+
+    def test_invalid_gradient(self):
+        with pytest.raises(ValueError, match="hexadecimal"):
+            gradient_palette(("red", "#00ff00"))
+
+    def test_roundtrip(self):
+        levels = np.random.default_rng(0).integers(0, 256, (16, 32), dtype=np.uint8)
+        palette = gradient_palette(gradient)
+        decoded, decoded_palette = decode_png(encode_png(levels, palette))
+        assert (decoded == levels).all()
+        assert (decoded_palette == palette).all()
+
+
+class TestHeatmapTiles:
+    d = pl.DataFrame({"pylifemap_x": [0.0], "pylifemap_y": [0.0], "weight": [2.0]})
+
+    def test_tiles(self):
+        tiles = heatmap_tiles(self.d, gradient=gradient, max_zoom=MIN_VIEW_ZOOM + 1, workers=1)
+        # A point at the center of the map is at the corner of four tiles
+        assert tiles.height == 8
+        for zoom in (MIN_VIEW_ZOOM, MIN_VIEW_ZOOM + 1):
+            half = 2 ** (zoom - 1)
+            level = tiles.filter(pl.col("pylifemap_tile_z") == zoom).sort(
+                "pylifemap_tile_y", "pylifemap_tile_x"
+            )
+            assert level.get_column("pylifemap_tile_x").to_list() == [half - 1, half, half - 1, half]
+            assert level.get_column("pylifemap_tile_y").to_list() == [half - 1, half - 1, half, half]
+            top_left, top_right, bottom_left, bottom_right = (
+                decode_png(png)[0] for png in level["pylifemap_tile"]
+            )
+            image = np.block([[top_left, top_right], [bottom_left, bottom_right]])
+            # Density is maximal at the point pixel, next to the tiles corner, and symmetric
+            # around it
+            row, col = np.unravel_index(image.argmax(), image.shape)
+            assert abs(row - 256) <= 1
+            assert abs(col - 256) <= 1
+            around = image[row - 100 : row + 101, col - 100 : col + 101]
+            assert (around == around[::-1, ::-1]).all()
+            assert (around == around.T).all()
+            assert image.sum() == around.sum()
+
+    def test_workers(self):
+        rng = np.random.default_rng(0)
+        d = pl.DataFrame({"pylifemap_x": rng.normal(0, 3e6, 500), "pylifemap_y": rng.normal(0, 3e6, 500)})
+        tiles = heatmap_tiles(d, gradient=gradient, workers=1)
+        assert tiles.equals(heatmap_tiles(d, gradient=gradient, workers=2))
+
+    def test_in_process(self, monkeypatch):
+        monkeypatch.setattr(raster, "ProcessPoolExecutor", None)
+        # Small pyramids are rendered without worker processes
+        heatmap_tiles(self.d, gradient=gradient)
+        # As in batch worker processes, with a raster workers cap of 1
+        rng = np.random.default_rng(0)
+        d = pl.DataFrame({"pylifemap_x": rng.normal(0, 3e6, 500), "pylifemap_y": rng.normal(0, 3e6, 500)})
+        monkeypatch.setenv(RASTER_WORKERS_ENV, "1")
+        heatmap_tiles(d, gradient=gradient)
+
+    def test_weights(self):
+        d = self.d.vstack(pl.DataFrame({"pylifemap_x": [1e7], "pylifemap_y": [0.0], "weight": [0.0]}))
+        tiles = heatmap_tiles(d, gradient=gradient, weight="weight", max_zoom=MIN_VIEW_ZOOM, workers=1)
+        # Points with a null weight are not rendered
+        assert tiles.height == 4
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match="max zoom"):
+            heatmap_tiles(self.d, gradient=gradient, max_zoom=MIN_VIEW_ZOOM - 1)
+
+
+class TestLayerHeatmapRaster:
+    d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510, 55_559]})
+
+    def test_layer(self):
+        m = Lifemap(self.d).layer_heatmap(raster=True, raster_max_zoom=5, raster_workers=1)
+        layer = m._layers[-1]
+        data = m._layers_data[layer["id"]]
+        assert layer["options"]["raster"]
+        assert data.columns == ["pylifemap_tile_z", "pylifemap_tile_x", "pylifemap_tile_y", "pylifemap_tile"]
+        assert data.get_column("pylifemap_tile_z").max() == 5
+
+    def test_errors(self):
+        with pytest.raises(ValueError, match="together"):
+            Lifemap(self.d).layer_heatmap(raster=True, prebin=True)
@@ -0,0 +1,214 @@
+"""
+Tests for layers data coordinates refresh functions.
+"""
+
+import io
+from types import SimpleNamespace
+
+import polars as pl
+import pyarrow.feather as pf
+import pytest
+from polars.testing import assert_frame_equal
+
+from pylifemap import Lifemap
+from pylifemap.data.backend_data import BACKEND_DATA, BACKEND_DATA_VERSION
+from pylifemap.data.geo import project_to_3857
+from pylifemap.data.lazy_loading import lazy_offsets, sort_lazy_data
+from pylifemap.data.refresh import refresh_layer_data, refresh_layers_data, refresh_mode
+
+backend = pl.DataFrame(
+    {
+        "taxid": [0, 1, 2],
+        "pylifemap_x": [0.0, 10.0, 20.0],
+        "pylifemap_y": [0.0, 5.0, -5.0],
+        "pylifemap_zoom": [4, 5, 6],
+    }
+)
+projected = project_to_3857(backend, x_col="pylifemap_x", y_col="pylifemap_y")
+
+
+class TestRefreshLayerData:
+    def test_points(self):
+        d = pl.DataFrame(
+            {
+                "pylifemap_taxid": [2, 3, 1],
+                "pylifemap_x": [1.0, 2.0, 3.0],
+                "pylifemap_y": [1.0, 2.0, 3.0],
+                "pylifemap_zoom": pl.Series([1, 1, 1], dtype=pl.Int8),
+                "value": ["a", "b", "c"],
+            }
+        )
+        res = refresh_layer_data(d, backend)
+        # Taxid 3 is not in backend data anymore
+        assert res.schema == d.schema
+        assert res.get_column("pylifemap_taxid").to_list() == [2, 1]
+        assert (
+            res.get_column("pylifemap_x").to_list()
+            == projected.get_column("pylifemap_x").gather([2, 1]).to_list()
+        )
+        assert (
+            res.get_column("pylifemap_y").to_list()
+            == projected.get_column("pylifemap_y").gather([2, 1]).to_list()
+        )
+        assert res.get_column("pylifemap_zoom").to_list() == [6, 5]
+        assert res.get_column("value").to_list() == ["a", "c"]
+
+    def test_lines(self):
+        d = pl.DataFrame(
+            {
+                "pylifemap_taxid": [0, 1, 2],
+                "pylifemap_x": [1.0, 2.0, 3.0],
+                "pylifemap_y": [1.0, 2.0, 3.0],
+                "pylifemap_parent_taxid": [None, 0, 4],
+                "pylifemap_parent_x": [None, 2.0, 3.0],
+                "pylifemap_parent_y": [None, 2.0, 3.0],
+            }
+        )
+        res = refresh_layer_data(d, backend)
+        # Null parents are kept, unknown ones are removed
+        assert res.get_column("pylifemap_taxid").to_list() == [0, 1]
+        assert res.get_column("pylifemap_parent_x").to_list() == [None, 0.0]
+        assert res.get_column("pylifemap_x").to_list()[1] == pytest.approx(
+            projected.get_column("pylifemap_x")[1]
+        )
+
+    def test_positions(self):
+        d = pl.DataFrame(
+            {
+                "pylifemap_taxid": [1, 2],
+                "pylifemap_dest_taxid": [2, 0],
+                "pylifemap_positions": [[0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]],
+            },
+            schema_overrides={"pylifemap_positions": pl.Array(pl.Float32, 4)},
+        )
+        res = refresh_layer_data(d, backend)
+        assert res.schema == d.schema
+        assert res.get_column("pylifemap_positions").to_list() == [
+            [10.0, 5.0, 20.0, -5.0],
+            [20.0, -5.0, 0.0, 0.0],
+        ]
+
+    def test_null_taxids(self):
+        d = pl.DataFrame(
+            {
+                "pylifemap_taxid": [None, 1],
+                "pylifemap_x": [1.0, 2.0],
+                "pylifemap_y": [1.0, 2.0],
+                "pylifemap_zoom": pl.Series([3, 1], dtype=pl.Int8),
+                "pylifemap_positions": [[1.0, 1.0], [0.0, 0.0]],
+            },
+            schema_overrides={"pylifemap_positions": pl.Array(pl.Float32, 2)},
+        )
+        res = refresh_layer_data(d, backend)
+        # Rows without taxid, such as clusters, are kept as is
+        assert res.row(0) == d.row(0)
+        assert res.get_column("pylifemap_zoom").to_list() == [3, 5]
+        assert res.get_column("pylifemap_positions").to_list() == [[1.0, 1.0], [10.0, 5.0]]
+
+    def test_no_zoom(self):
+        d = pl.DataFrame(
+            {"pylifemap_taxid": [1], "pylifemap_x": [1.0], "pylifemap_y": [1.0], "pylifemap_zoom": [12]}
+        )
+        res = refresh_layer_data(d, backend, zoom=False)
+        assert res.get_column("pylifemap_zoom").to_list() == [12]
+        assert (
+            res.get_column("pylifemap_x").to_list()
+            == projected.get_column("pylifemap_x").gather([1]).to_list()
+        )
+
+    def test_no_taxids(self):
+        d = pl.DataFrame({"pylifemap_x": [1.0], "pylifemap_y": [1.0], "pylifemap_weight": [2.0]})
+        assert refresh_layer_data(d, backend).equals(d)
+
+    def test_layers_data(self):
+        layers = [{"id": "layer", "options": {}}, {"id": "other", "options": {}}]
+        data = {"layer": pl.DataFrame({"pylifemap_taxid": [1, 5]}), "other": [1]}
+        res_layers, res = refresh_layers_data(layers, data, backend)
+        assert res_layers == layers
+        assert res["layer"].get_column("pylifemap_taxid").to_list() == [1]
+        assert res["other"] == [1]
+
+    def test_refresh_mode(self):
+        assert refresh_mode({"lazy": True}) == "full"
+        assert refresh_mode({"lazy_budget": 10}) == "positions"
+        assert refresh_mode({"lazy_mode": "parent"}) == "positions"
+        assert refresh_mode({"declutter_mode": "precompute"}) == "positions"
+        assert refresh_mode({"cluster": True}) == "positions"
+        assert refresh_mode({"lazy_source": "static"}) == "none"
+
+    def test_lazy_offsets(self):
+        d = sort_lazy_data(
+            pl.DataFrame(
+                {
+                    "pylifemap_taxid": [0, 1, 2],
+                    "pylifemap_x": [0.0, 1.0, 2.0],
+                    "pylifemap_y": [0.0, 1.0, 2.0],
+                    "pylifemap_zoom": pl.Series([1, 1, 2], dtype=pl.Int8),
+                }
+            )
+        )
+        layers = [{"id": "layer", "options": {"lazy": True, "lazy_offsets": lazy_offsets(d)}}]
+        res_layers, res = refresh_layers_data(layers, {"layer": d}, backend)
+        # Data are sorted again with the new zoom levels
+        assert res["layer"].get_column("pylifemap_zoom").to_list() == [6, 5, 4]
+        assert res_layers[0]["options"]["lazy_offsets"] == {"zooms": [6, 5, 4], "offsets": [0, 1, 2, 3]}
+        # Layers definitions are not modified in place
+        assert layers[0]["options"]["lazy_offsets"]["zooms"] == [2, 1]
+
+    def test_segments_offsets(self):
+        d = pl.DataFrame(
+            {
+                "pylifemap_taxid": [1],
+                "pylifemap_x": [1.0],
+                "pylifemap_y": [1.0],
+                "pylifemap_zoom": [5],
+                "pylifemap_bbox_xmin": [1.0],
+            }
+        )
+        layers = [
+            {"id": "layer", "options": {"lazy": True, "lazy_offsets": {"zooms": [5], "offsets": [0, 1]}}}
+        ]
+        res_layers, _ = refresh_layers_data(layers, {"layer": d}, backend)
+        # Bounding boxes are outdated, the frontend scans all rows
+        assert "lazy_offsets" not in res_layers[0]["options"]
+
+    def test_static_tiles(self):
+        d = pl.DataFrame({"pylifemap_taxid": [1, 5]})
+        layers = [{"id": "layer", "options": {"lazy_source": "static"}}]
+        _, res = refresh_layers_data(layers, {"layer": d}, backend)
+        assert res["layer"] is d
+
+
+class TestDataVersion:
+    d = pl.DataFrame({"taxid": [2157, 1_783_263, 48510, 55_559]})
+
+    def test_version(self):
+        widget = Lifemap(self.d).layer_points()._to_widget()
+        assert widget.options["data_version"] == BACKEND_DATA_VERSION
+
+    def test_refresh_option(self):
+        d = pl.DataFrame({"taxid": BACKEND_DATA.get_column("taxid").head(50)})
+        widget = Lifemap(d).layer_points().layer_points(lazy=True, lazy_budget=10)._to_widget()
+        # Display zooms computed with lazy_budget are kept by the frontend refresh
+        assert [layer["options"]["refresh"] for layer in widget.layers] == ["full", "positions"]
+
+    def test_stale_data(self, monkeypatch):
+        calls = []
+        new_backend = SimpleNamespace(data=backend, version=-1, refresh=lambda: calls.append(True))
+        monkeypatch.setattr("pylifemap.lifemap.BACKEND", new_backend)
+        m = Lifemap(self.d, force_refresh=True).layer_points()
+        widget = m._to_widget()
+        assert calls == [True]
+        assert widget.options["data_version"] == -1
+        # Layers taxids are not in the new backend data
+        (entry,) = widget.data["store"].values()
+        assert pf.read_table(io.BytesIO(entry["value"])).num_rows == 0
+
+    def test_clusters(self):
+        d = pl.DataFrame({"taxid": BACKEND_DATA.get_column("taxid").head(200)})
+        m = Lifemap(d).layer_points(cluster=True)
+        data = m._layers_data[m._layers[0]["id"]]
+        assert data.get_column("pylifemap_taxid").null_count() > 0
+        _, res = refresh_layers_data(m._layers, m._layers_data, BACKEND_DATA)
+        # Clusters are kept, and points coordinates and zooms are unchanged
+        assert_frame_equal(res[m._layers[0]["id"]], data, check_exact=False)
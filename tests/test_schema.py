@@ -0,0 +1,101 @@
+"""
+Tests for layers data frontend contract functions.
+"""
+
+import polars as pl
+import pytest
+
+from pylifemap import Lifemap, aggregate_freq
+from pylifemap.data.schema import LAYER_SCHEMAS, check_layer_data, layer_format
+
+d = pl.DataFrame(
+    {
+        "taxid": [2157, 1_783_263, 48510, 55_559],
+        "dest": [55_559, 48510, 1_783_263, 2157],
+        "value": [1.0, 2.0, 3.0, 4.0],
+        "cat": ["a", "b", "a", "b"],
+    }
+)
+icon = "data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0cDovL3d3dy53My5vcmcvMjAwMC9zdmciLz4="
+
+layers = [
+    ("layer_points", {"radius": "value", "fill": "cat"}),
+    ("layer_points", {"cluster": True}),
+    ("layer_points", {"lod": True}),
+    ("layer_lines", {"width": "value"}),
+    ("layer_arcs", {"taxid_dest_col": "dest"}),
+    ("layer_heatmap", {"weight": "value"}),
+    ("layer_heatmap", {"prebin": True}),
+    ("layer_heatmap", {"raster": True, "raster_max_zoom": 4, "raster_workers": 1}),
+    ("layer_text", {"text": "cat"}),
+    ("layer_icons", {"icon": icon}),
+    ("layer_arcs_deck", {"taxid_dest_col": "dest"}),
+    ("layer_heatmap_deck", {}),
+    ("layer_screengrid", {}),
+]
+
+
+class TestLayerSchemas:
+    @pytest.mark.parametrize(("method", "kwargs"), layers)
+    def test_contract(self, method, kwargs):
+        m = getattr(Lifemap(d), method)(**kwargs)
+        layer = m._layers[-1]
+        data = m._layers_data[layer["id"]]
+        check_layer_data(layer, data)
+
+    def test_donuts_contract(self):
+        m = Lifemap(aggregate_freq(d, column="cat")).layer_donuts(counts_col="cat")
+        layer = m._layers[-1]
+        check_layer_data(layer, m._layers_data[layer["id"]])
+
+    def test_all_layers(self):
+        tested = {method.removeprefix("layer_") for method, _ in layers} | {"donuts"}
+        assert tested == set(LAYER_SCHEMAS)
+
+    def test_formats(self):
+        m = Lifemap(d).layer_points(fill="cat").layer_lines().layer_heatmap_deck()
+        points, lines, heatmap_deck = ((layer, m._layers_data[layer["id"]]) for layer in m._layers)
+        assert layer_format(*points) == "columnar"
+        assert layer_format(*lines) == "rows"
+        assert layer_format(*heatmap_deck) == "attributes"
+        widget = m._to_widget()
+        assert widget.data["layers"][points[0]["id"]]["format"] == "columnar"
+        # Nested columns cannot be sent as vectors
+        nested = points[1].with_columns(pl.concat_list("pylifemap_x", "pylifemap_y").alias("nested"))
+        assert layer_format(points[0], nested) == "rows"
+
+
+points_layer = {"id": "points", "layer": "points", "options": {}}
+
+
+class TestCheckLayerData:
+    df = pl.DataFrame({"pylifemap_taxid": [1, 2], "pylifemap_x": [0.0, 1.0], "pylifemap_y": [0.0, 1.0]})
+
+    def test_valid(self):
+        check_layer_data(points_layer, self.df)
+        check_layer_data(points_layer, self.df.with_columns(pl.col("pylifemap_x").cast(pl.Float32)))
+
+    def test_missing_column(self):
+        with pytest.raises(ValueError, match="must have a pylifemap_y column"):
+            check_layer_data(points_layer, self.df.drop("pylifemap_y"))
+
+    def test_invalid_dtype(self):
+        with pytest.raises(ValueError, match="invalid"):
+            check_layer_data(points_layer, self.df.with_columns(pl.col("pylifemap_taxid").cast(pl.String)))
+
+    def test_raster(self):
+        layer = {"id": "heatmap", "layer": "heatmap", "options": {"raster": True}}
+        with pytest.raises(ValueError, match="pylifemap_tile_z"):
+            check_layer_data(layer, self.df)
+
+    def test_attributes(self):
+        layer = {"id": "screengrid", "layer": "screengrid", "options": {}, "format": "attributes"}
+        df = pl.DataFrame({"pylifemap_positions": [[0.0, 1.0]], "label": ["a"]}).cast(
+            {"pylifemap_positions": pl.Array(pl.Float32, 2)}
+        )
+        with pytest.raises(ValueError, match="must be numeric"):
+            check_layer_data(layer, df)
+
+    def test_unknown_layer(self):
+        with pytest.raises(ValueError, match="unknown layer type"):
+            check_layer_data({"id": "foo", "layer": "foo"}, self.df)
@@ -0,0 +1,133 @@
+"""
+Tests for data serialization functions.
+"""
+
+import io
+
+import polars as pl
+import pytest
+from pyarrow import ipc
+
+from pylifemap.data.serialization import (
+    pl_to_arrow,
+    serialize_chunks,
+    serialize_data,
+    serialize_layers_data,
+)
+
+df = pl.DataFrame(
+    {
+        "pylifemap_taxid": [2, 9606, 33090, 2157],
+        "pylifemap_x": [0.5, 1.5, 2.5, 3.5],
+        "value": ["a", "b", "a", "c"],
+    }
+)
+
+
+def read_arrow(payload: bytes) -> pl.DataFrame:
+    return pl.from_arrow(ipc.open_file(io.BytesIO(payload)).read_all())  # type: ignore
+
+
+class TestPlToArrow:
+    @pytest.mark.parametrize("compression", ["uncompressed", "lz4", "zstd"])
+    @pytest.mark.parametrize("engine", ["pyarrow", "polars"])
+    def test_roundtrip(self, compression, engine):
+        payload = pl_to_arrow(df, compression=compression, engine=engine)
+        assert read_arrow(payload).equals(df)
+
+    def test_compression_level(self):
+        payload = pl_to_arrow(df, compression="zstd", compression_level=19)
+        assert read_arrow(payload).equals(df)
+
+    def test_polars_engine_no_string_view(self):
+        payload = pl_to_arrow(df, engine="polars")
+        schema = ipc.open_file(io.BytesIO(payload)).schema
+        assert "view" not in str(schema.field("value").type)
+
+    def test_wrong_options(self):
+        with pytest.raises(ValueError):
+            pl_to_arrow(df, compression="gzip")  # type: ignore
+        with pytest.raises(ValueError):
+            pl_to_arrow(df, engine="arrow")  # type: ignore
+        with pytest.raises(ValueError):
+            pl_to_arrow(df, compression="zstd", compression_level=3, engine="polars")
+        with pytest.raises(ValueError):
+            pl_to_arrow(df, compression="uncompressed", compression_level=3)
+
+
+class TestSerializeData:
+    def test_serialize_dataframe(self):
+        res = serialize_data(df, compression="zstd")
+        assert res["serialized"]
+        assert read_arrow(res["value"]).equals(df)
+
+    def test_serialize_other(self):
+        res = serialize_data({"a": 1})
+        assert res == {"serialized": False, "value": {"a": 1}}
+
+
+class TestSerializeLayersData:
+    def test_identical_layers_share_entry(self):
+        res = serialize_layers_data({"layer1": df, "layer2": df.clone(), "layer3": df.clone()})
+        assert len(res["store"]) == 1
+        keys = {v["key"] for v in res["layers"].values()}
+        assert len(keys) == 1
+        assert res["layers"]["layer2"]["columns"] == df.columns
+
+    def test_subset_layer_shares_entry(self):
+        subset = df.select("pylifemap_taxid", "pylifemap_x")
+        res = serialize_layers_data({"layer1": subset, "layer2": df})
+        assert len(res["store"]) == 1
+        assert res["layers"]["layer1"]["key"] == res["layers"]["layer2"]["key"]
+        assert res["layers"]["layer1"]["columns"] == ["pylifemap_taxid", "pylifemap_x"]
+        payload = next(iter(res["store"].values()))["value"]
+        assert read_arrow(payload).equals(df)
+
+    def test_different_layers(self):
+        other = df.with_columns(pl.col("pylifemap_x") * 2)
+        reordered = df.reverse()
+        res = serialize_layers_data({"layer1": df, "layer2": other, "layer3": reordered})
+        assert len(res["store"]) == 3
+
+    def test_layers_order_and_other_data(self):
+        res = serialize_layers_data({"layer1": df.select("value"), "layer2": df, "layer3": [1, 2]})
+        assert list(res["layers"].keys()) == ["layer1", "layer2", "layer3"]
+        assert res["layers"]["layer3"] == {"serialized": False, "value": [1, 2]}
+
+    def test_size_gain(self):
+        layers_data = {"layer1": df, "layer2": df.select("pylifemap_taxid", "pylifemap_x"), "layer3": df}
+        res = serialize_layers_data(layers_data)
+        deduplicated_size = sum(len(v["value"]) for v in res["store"].values())
+        separate_size = sum(len(serialize_data(v)["value"]) for v in layers_data.values())
+        assert deduplicated_size < separate_size / 2
+
+    def test_formats(self):
+        res = serialize_layers_data(
+            {"layer1": df, "layer2": df.select("value")}, formats={"layer1": "attributes"}
+        )
+        assert res["layers"]["layer1"]["format"] == "attributes"
+        assert "format" not in res["layers"]["layer2"]
+        assert res["layers"]["layer1"]["key"] == res["layers"]["layer2"]["key"]
+
+
+class TestSerializeChunks:
+    def test_chunks_roundtrip(self):
+        chunks = serialize_chunks(df, 3)
+        assert len(chunks) == 2
+        chunks = sorted(chunks, key=lambda c: c["index"])
+        res = pl.concat([read_arrow(c["value"]) for c in chunks])
+        assert res.equals(df)
+
+    def test_chunks_order_by_zoom(self):
+        d = pl.DataFrame({"pylifemap_zoom": [5, 5, 12, 12, 4, 8]})
+        chunks = serialize_chunks(d, 2)
+        assert [c["index"] for c in chunks] == [2, 0, 1]
+
+    def test_wrong_chunk_size(self):
+        with pytest.raises(ValueError):
+            serialize_chunks(df, 0)
+
+    def test_store_chunks(self):
+        res = serialize_layers_data({"layer1": df, "layer2": df.head(2)}, chunk_size=3)
+        assert "chunks" in res["store"][res["layers"]["layer1"]["key"]]
+        assert "value" in res["store"][res["layers"]["layer2"]["key"]]
@@ -0,0 +1,78 @@
+"""
+Tests for the lazy loading spatial and zoom index.
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pylifemap.data.spatial_index import (
+    WORLD_HALF_SIZE,
+    GridIndex,
+    ranges_to_indices,
+    tile_extent,
+)
+
+rng = np.random.default_rng(42)
+n = 5000
+df = pl.DataFrame(
+    {
+        "pylifemap_taxid": range(n),
+        "pylifemap_x": rng.uniform(-1e7, 1e7, n),
+        "pylifemap_y": rng.uniform(-5e6, 5e6, n),
+        "pylifemap_zoom": rng.integers(4, 30, n),
+    }
+)
+
+
+def brute_force(data, extent, max_zoom=None):
+    xmin, ymin, xmax, ymax = extent
+    x = pl.col("pylifemap_x")
+    y = pl.col("pylifemap_y")
+    expr = (x >= xmin) & (x < xmax) & (y >= ymin) & (y < ymax)
+    if max_zoom is not None:
+        expr = expr & (pl.col("pylifemap_zoom") <= max_zoom)
+    return data.filter(expr)
+
+
+def test_ranges_to_indices():
+    result = ranges_to_indices(np.array([0, 5, 8, 10]), np.array([2, 5, 11, 12]))
+    assert result.tolist() == [0, 1, 8, 9, 10, 10, 11]
+    assert len(ranges_to_indices(np.array([], dtype=int), np.array([], dtype=int))) == 0
+
+
+def test_tile_extent():
+    assert tile_extent(0, 0, 0) == (-WORLD_HALF_SIZE, -WORLD_HALF_SIZE, WORLD_HALF_SIZE, WORLD_HALF_SIZE)
+    assert tile_extent(1, 1, 0) == pytest.approx((0, -WORLD_HALF_SIZE, WORLD_HALF_SIZE, 0))
+
+
+class TestGridIndex:
+    index = GridIndex(df)
+
+    @pytest.mark.parametrize(
+        ("extent", "max_zoom"),
+        [
+            ((-1e6, -1e6, 1e6, 1e6), None),
+            ((-1e6, -1e6, 1e6, 1e6), 10),
+            ((-2e7, -2e7, 2e7, 2e7), 15.5),
+            ((3e6, -4e6, 9e6, -1e6), 29),
+            ((-1e7, -1e7, -9e6, 1e7), None),
+        ],
+    )
+    def test_same_as_brute_force(self, extent, max_zoom):
+        assert self.index.query(extent, max_zoom).equals(brute_force(df, extent, max_zoom))
+
+    def test_outside_extent(self):
+        assert self.index.query((1.5e7, 1.5e7, 2e7, 2e7)).height == 0
+
+    def test_query_tile(self):
+        result = self.index.query_tile(1, 0, 1, max_zoom=float("inf"))
+        assert result.equals(brute_force(df, tile_extent(1, 0, 1)))
+
+    def test_empty_data(self):
+        index = GridIndex(df.clear())
+        assert index.query((-1e6, -1e6, 1e6, 1e6)).height == 0
+
+    def test_missing_column(self):
+        with pytest.raises(ValueError):
+            GridIndex(df.drop("pylifemap_zoom"))
@@ -0,0 +1,82 @@
+"""
+Tests for the split of lazy loading layers data into static tiles.
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from pylifemap.data.spatial_index import tile_extent
+from pylifemap.data.tiling import split_static_tiles
+
+rng = np.random.default_rng(42)
+n = 5000
+df = pl.DataFrame(
+    {
+        "pylifemap_taxid": range(n),
+        "pylifemap_x": rng.uniform(-1e7, 1e7, n),
+        "pylifemap_y": rng.uniform(-5e6, 5e6, n),
+        "pylifemap_zoom": rng.integers(4, 30, n),
+    }
+)
+
+
+def view_rows(levels, tiles, tile_z, tile_x, tile_y):
+    """Get the rows of a view tile from static tiles, as done by the frontend."""
+    xmin, ymin, xmax, ymax = tile_extent(tile_z, tile_x, tile_y)
+    parts = []
+    for (bucket, x, y), tile in tiles.items():
+        level = levels[bucket]
+        txmin, tymin, txmax, tymax = tile_extent(level, x, y)
+        if bucket <= tile_z and txmin < xmax and txmax > xmin and tymin < ymax and tymax > ymin:
+            parts.append(tile)
+    rows = pl.concat(parts) if parts else df.clear()
+    x, y = pl.col("pylifemap_x"), pl.col("pylifemap_y")
+    return rows.filter((x >= xmin) & (x < xmax) & (y >= ymin) & (y < ymax))
+
+
+class TestSplitStaticTiles:
+    def test_rows(self):
+        levels, tiles = split_static_tiles(df, lazy_zoom=2, max_tile_zoom=8, min_rows=10)
+        # Each row is in exactly one tile, rows order being kept inside tiles
+        res = pl.concat(tiles.values())
+        assert sorted(res.get_column("pylifemap_taxid").to_list()) == list(range(n))
+        for tile in tiles.values():
+            assert tile.get_column("pylifemap_taxid").is_sorted()
+        assert len(levels) == 28
+        assert all(level <= min(bucket, 8) for bucket, level in enumerate(levels))
+        # Tiles have at least min_rows rows on average
+        for bucket in range(2, len(levels)):
+            heights = [tile.height for key, tile in tiles.items() if key[0] == bucket]
+            assert sum(heights) / len(heights) >= 10
+        levels, _ = split_static_tiles(df, lazy_zoom=2, max_tile_zoom=8, min_rows=1)
+        assert levels[2:] == [min(bucket, 8) for bucket in range(2, 28)]
+
+    @pytest.mark.parametrize(
+        ("lazy_zoom", "tile_z", "tile_x", "tile_y"), [(2, 3, 3, 4), (5, 6, 30, 33), (0, 12, 2000, 2100)]
+    )
+    def test_view(self, lazy_zoom, tile_z, tile_x, tile_y):
+        levels, tiles = split_static_tiles(df, lazy_zoom=lazy_zoom, max_tile_zoom=8, min_rows=10)
+        res = view_rows(levels, tiles, tile_z, tile_x, tile_y)
+        xmin, ymin, xmax, ymax = tile_extent(tile_z, tile_x, tile_y)
+        x, y = pl.col("pylifemap_x"), pl.col("pylifemap_y")
+        expected = df.filter(
+            (x >= xmin)
+            & (x < xmax)
+            & (y >= ymin)
+            & (y < ymax)
+            & (pl.col("pylifemap_zoom") <= tile_z + lazy_zoom)
+        )
+        assert (
+            sorted(res.get_column("pylifemap_taxid").to_list())
+            == expected.get_column("pylifemap_taxid").to_list()
+        )
+
+    def test_negative_lazy_zoom(self):
+        levels, tiles = split_static_tiles(df, lazy_zoom=-1)
+        assert levels == [0]
+        assert list(tiles) == [(0, 0, 0)]
+        assert tiles[0, 0, 0].equals(df)
+
+    def test_empty(self):
+        assert split_static_tiles(df.clear(), lazy_zoom=2) == ([], {})
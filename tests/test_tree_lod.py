@@ -0,0 +1,108 @@
+"""
+Tests for tree-based level of detail functions.
+"""
+
+import polars as pl
+import pytest
+
+from pylifemap import Lifemap
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.tree_lod import MIN_VIEW_ZOOM, tree_lod_levels
+
+pl_df = pl.DataFrame(
+    {
+        "pylifemap_taxid": [2157, 1_783_263, 48510, 55_559],
+        "value": [1.0, 2.0, 3.0, None],
+        "label": ["a", "b", "c", "d"],
+    }
+).with_columns(pl.col("pylifemap_taxid").cast(pl.Int32))
+
+
+@pytest.fixture
+def d():
+    return pl_df
+
+
+def level(result, zoom):
+    return result.filter((pl.col("pylifemap_lod_min") <= zoom) & (pl.col("pylifemap_lod_max") >= zoom))
+
+
+class TestTreeLodLevels:
+    def test_levels(self, d):
+        result, zooms = tree_lod_levels(d, depth=2, sum_cols=["value"])
+        assert zooms == list(range(MIN_VIEW_ZOOM, zooms[-1] + 1))
+        assert (result.get_column("pylifemap_lod_min") <= result.get_column("pylifemap_lod_max")).all()
+        # Each level represents all the taxa and values exactly once
+        for zoom in zooms:
+            lvl = level(result, zoom)
+            assert lvl.get_column("pylifemap_count").sum() == d.height
+            assert lvl.get_column("value").sum() == pytest.approx(d.get_column("value").sum())
+            assert lvl.get_column("pylifemap_taxid").is_unique().all()
+
+    def test_last_level(self, d):
+        result, zooms = tree_lod_levels(d, depth=2, sum_cols=["value"])
+        lvl = level(result, zooms[-1]).sort("pylifemap_taxid")
+        assert lvl.get_column("pylifemap_taxid").to_list() == [2157, 48510, 55559, 1783263]
+        assert (lvl.get_column("pylifemap_count") == 1).all()
+        assert lvl.get_column("label").to_list() == ["a", "c", "d", "b"]
+
+    def test_displayed_zooms(self, d):
+        depth = 2
+        result, _ = tree_lod_levels(d, depth=depth)
+        zooms = BACKEND_DATA.select(pl.col("taxid").alias("pylifemap_taxid"), "pylifemap_zoom")
+        result = result.join(zooms, on="pylifemap_taxid")
+        # Displayed taxa are visible at the lowest zoom of their interval
+        assert (result.get_column("pylifemap_zoom") <= result.get_column("pylifemap_lod_min") + depth).all()
+
+    def test_mean(self, d):
+        d = d.drop_nulls("value")
+        sums, _ = tree_lod_levels(d, depth=0, sum_cols=["value"])
+        means, _ = tree_lod_levels(d, depth=0, mean_cols=["value"])
+        assert means.select("pylifemap_taxid", "pylifemap_lod_min").equals(
+            sums.select("pylifemap_taxid", "pylifemap_lod_min")
+        )
+        assert (means.get_column("value") * means.get_column("pylifemap_count")).to_list() == pytest.approx(
+            sums.get_column("value").to_list()
+        )
+
+    def test_mean_nulls(self, d):
+        # Means ignore null values
+        result, _ = tree_lod_levels(d.filter(pl.col("value").is_null()), depth=0, mean_cols=["value"])
+        assert result.height > 0
+        assert result.get_column("value").is_null().all()
+
+    def test_large_depth(self, d):
+        result, zooms = tree_lod_levels(d, depth=50)
+        assert zooms == [MIN_VIEW_ZOOM]
+        assert result.height == d.height
+        assert (result.get_column("pylifemap_count") == 1).all()
+
+    def test_empty(self, d):
+        result, zooms = tree_lod_levels(d.clear(), depth=2, sum_cols=["value"])
+        assert result.height == 0
+        assert zooms == [MIN_VIEW_ZOOM]
+
+
+class TestLayerPointsLod:
+    def test_options(self, d):
+        # Float values which are all integers are considered categorical
+        m = Lifemap(d, taxid_col="pylifemap_taxid").layer_points(
+            radius="value", fill="value", fill_cat=False, lod=True
+        )
+        layer = m._layers[-1]
+        data = m._layers_data[layer["id"]]
+        assert layer["options"]["lod_zooms"][0] == MIN_VIEW_ZOOM
+        assert not layer["options"]["lazy"]
+        assert {"pylifemap_count", "pylifemap_lod_min", "pylifemap_lod_max", "value"} <= set(data.columns)
+
+    def test_errors(self, d):
+        m = Lifemap(d, taxid_col="pylifemap_taxid")
+        with pytest.raises(ValueError, match="lazy loading"):
+            m.layer_points(lod=True, lazy=True)
+        with pytest.raises(ValueError, match="together"):
+            m.layer_points(lod=True, cluster=True)
+        with pytest.raises(ValueError, match="categorical"):
+            m.layer_points(fill="label", lod=True)
+        # Invalid layers are not added to the map
+        assert m._layers == []
+        assert m._layers_data == {}
@@ -0,0 +1,213 @@
+"""
+Tests for Lifemap widget objects.
+"""
+
+import io
+
+import polars as pl
+import pyarrow.feather as pf
+import pytest
+
+from pylifemap import Lifemap
+from pylifemap.data.backend_data import BACKEND_DATA
+from pylifemap.data.serialization import serialize_layers_data
+from pylifemap.widget import MAX_PENDING_MESSAGES, LifemapWidgetNoDeck, data_messages
+
+df = pl.DataFrame({"pylifemap_taxid": [2, 9606, 33090], "pylifemap_x": [0.5, 1.5, 2.5]})
+other_df = pl.DataFrame({"pylifemap_taxid": [2157], "pylifemap_x": [3.5]})
+layers_data = {"layer1": df, "layer2": df.select("pylifemap_taxid"), "layer3": other_df}
+
+
+def create_widget(
+    *, binary_transfer: bool, chunk_size: int | None = None, data=None, kernel_lazy_data=None
+) -> LifemapWidgetNoDeck:
+    return LifemapWidgetNoDeck(
+        data=data if data is not None else layers_data,
+        layers=[],
+        options={},
+        color_ranges={},
+        width="800px",
+        height="600px",
+        binary_transfer=binary_transfer,
+        chunk_size=chunk_size,
+        kernel_lazy_data=kernel_lazy_data,
+    )
+
+
+@pytest.fixture
+def sent_messages(monkeypatch):
+    messages = []
+    monkeypatch.setattr(
+        LifemapWidgetNoDeck, "send", lambda _self, content, buffers=None: messages.append((content, buffers))
+    )
+    return messages
+
+
+class TestDataMessages:
+    def test_one_message_per_store_entry(self):
+        store = serialize_layers_data(layers_data)["store"]
+        messages = data_messages(store)
+        assert len(messages) == 2
+        for (content, buffers), (key, entry) in zip(messages, store.items(), strict=True):
+            assert content == {"type": "layer_data", "key": key, "index": 0, "n_chunks": 1}
+            assert len(buffers) == 1
+            assert bytes(buffers[0]) == entry["value"]
+
+
+class TestWidgetBinaryTransfer:
+    def test_state_transfer(self):
+        w = create_widget(binary_transfer=False)
+        assert len(w.data["store"]) == 2
+        assert "pending" not in w.data
+
+    def test_no_bytes_in_state(self):
+        w = create_widget(binary_transfer=True)
+        assert w.data["store"] == {}
+        assert len(w.data["pending"]) == 2
+        assert set(w.data["layers"].keys()) == {"layer1", "layer2", "layer3"}
+
+    def test_request_data(self, sent_messages):
+        w = create_widget(binary_transfer=True)
+        w._handle_custom_msg(w, {"type": "request_data"}, [])
+        assert [content["key"] for content, _ in sent_messages] == w.data["pending"]
+        assert not w.transfer_complete
+        for content, buffers in sent_messages:
+            assert content["type"] == "layer_data"
+            assert len(buffers) == 1
+            assert isinstance(buffers[0], memoryview)
+
+    def test_ignore_other_messages(self, sent_messages):
+        w = create_widget(binary_transfer=True)
+        w._handle_custom_msg(w, {"type": "whatever"}, [])
+        assert sent_messages == []
+
+
+class TestWidgetChunkedTransfer:
+    large_df = pl.DataFrame(
+        {
+            "pylifemap_taxid": range(100),
+            "pylifemap_zoom": [20 - i // 5 for i in range(100)],
+        }
+    )
+
+    def test_chunks_interleaved(self):
+        store = serialize_layers_data({"layer1": self.large_df, "layer2": other_df}, chunk_size=10)["store"]
+        messages = data_messages(store)
+        assert len(messages) == 11
+        keys = [content["key"] for content, _ in messages]
+        # The small layer is sent in the first round
+        assert len(set(keys[:2])) == 2
+        large_contents = [content for content, _ in messages if content["n_chunks"] == 10]
+        # Coarsest zoom levels first
+        assert [content["index"] for content in large_contents] == list(reversed(range(10)))
+
+    def test_back_pressure(self, sent_messages):
+        w = create_widget(binary_transfer=True, chunk_size=10, data={"layer1": self.large_df})
+        assert w.transfer_progress == 1.0
+        w._handle_custom_msg(w, {"type": "request_data"}, [])
+        assert len(sent_messages) == MAX_PENDING_MESSAGES
+        assert w.transfer_progress == 0
+        for i in range(3):
+            w._handle_custom_msg(w, {"type": "ack"}, [])
+            assert len(sent_messages) == MAX_PENDING_MESSAGES + i + 1
+        assert w.transfer_progress == pytest.approx(0.3)
+        for _ in range(20):
+            w._handle_custom_msg(w, {"type": "ack"}, [])
+        assert len(sent_messages) == 10
+        assert w.transfer_complete
+        assert w.transfer_progress == 1.0
+
+
+class TestWidgetKernelLazyLoading:
+    lazy_df = pl.DataFrame(
+        {
+            "pylifemap_taxid": range(4),
+            "pylifemap_x": [-1e6, 1e6, -1e6, 1e6],
+            "pylifemap_y": [-1e6, -1e6, 1e6, 1e6],
+            "pylifemap_zoom": [4, 6, 8, 10],
+        }
+    )
+
+    def create_lazy_widget(self):
+        return create_widget(
+            binary_transfer=True,
+            data={"layer1": self.lazy_df.tail(1)},
+            kernel_lazy_data={"layer1": self.lazy_df},
+        )
+
+    def test_kernel_layers(self):
+        w = self.create_lazy_widget()
+        assert w.data["kernel_layers"] == ["layer1"]
+
+    def test_lazy_tile(self, sent_messages):
+        w = self.create_lazy_widget()
+        msg = {
+            "type": "lazy_tile",
+            "request_id": "a-1",
+            "layer": "layer1",
+            "tile": [1, 1, 1],
+            "max_zoom": None,
+        }
+        w._handle_custom_msg(w, msg, [])
+        content, buffers = sent_messages[0]
+        assert content == {"type": "lazy_tile", "request_id": "a-1", "layer": "layer1", "tile": [1, 1, 1]}
+        result = pl.from_arrow(pf.read_table(io.BytesIO(buffers[0])))
+        assert result.get_column("pylifemap_taxid").to_list() == [3]
+
+    def test_lazy_tile_max_zoom(self, sent_messages):
+        w = self.create_lazy_widget()
+        msg = {"type": "lazy_tile", "request_id": "a-1", "layer": "layer1", "tile": [0, 0, 0], "max_zoom": 7}
+        w._handle_custom_msg(w, msg, [])
+        result = pl.from_arrow(pf.read_table(io.BytesIO(sent_messages[0][1][0])))
+        assert result.get_column("pylifemap_taxid").to_list() == [0, 1]
+
+    def test_lazy_tile_cache(self, sent_messages):
+        w = self.create_lazy_widget()
+        msg = {
+            "type": "lazy_tile",
+            "request_id": "a-1",
+            "layer": "layer1",
+            "tile": [0, 0, 0],
+            "max_zoom": None,
+        }
+        w._handle_custom_msg(w, msg, [])
+        w._handle_custom_msg(w, {**msg, "request_id": "a-2"}, [])
+        assert len(w._lazy_tiles_cache) == 1
+        assert bytes(sent_messages[0][1][0]) == bytes(sent_messages[1][1][0])
+
+    def test_unknown_layer(self, sent_messages):
+        w = self.create_lazy_widget()
+        msg = {
+            "type": "lazy_tile",
+            "request_id": "a-1",
+            "layer": "other",
+            "tile": [0, 0, 0],
+            "max_zoom": None,
+        }
+        w._handle_custom_msg(w, msg, [])
+        assert sent_messages == []
+
+
+class TestSerializedDataCache:
+    def test_shared_buffers(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            "pylifemap.widget.serialize_layers_data",
+            lambda *args, **kwargs: calls.append(1) or serialize_layers_data(*args, **kwargs),
+        )
+        m = Lifemap(pl.DataFrame({"taxid": BACKEND_DATA.get_column("taxid").head(20)})).layer_points()
+        w1, w2 = m._to_widget(), m._to_widget()
+        assert len(calls) == 1
+        # Buffers are shared, not copied
+        (key,) = w1.data["store"]
+        assert w2.data["store"][key]["value"] is w1.data["store"][key]["value"]
+        # Binary transfer data are serialized separately, once
+        w3, w4 = m._to_widget(binary_transfer=True), m._to_widget(binary_transfer=True)
+        assert len(calls) == 2
+        assert w4._pending_data[key]["value"] is w3._pending_data[key]["value"]
+        # Adding a layer invalidates the cache
+        m.layer_lines()
+        w5 = m._to_widget()
+        assert len(calls) == 3
+        assert len(w5.data["layers"]) == 2
+        assert "assets" not in w1.serialized_data